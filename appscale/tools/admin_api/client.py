@@ -4,6 +4,8 @@ import requests
 import yaml
 from retrying import retry
 
+from appscale.tools.tracing import traced
+
 
 # The default service.
 DEFAULT_SERVICE = 'default'
@@ -70,6 +72,7 @@ class AdminClient(object):
 
     return content
 
+  @traced('admin.create_version')
   @retry(**RETRY_POLICY)
   def create_version(self, version, source_path):
     """ Creates or updates a version.
@@ -119,6 +122,7 @@ class AdminClient(object):
 
     return operation_id
 
+  @traced('admin.delete_version')
   @retry(**RETRY_POLICY)
   def delete_version(self, project_id, service_id, version_id):
     """ Deletes a version.
@@ -147,6 +151,7 @@ class AdminClient(object):
 
     return operation_id
 
+  @traced('admin.delete_service')
   @retry(**RETRY_POLICY)
   def delete_service(self, project_id, service_id):
     """ Deletes a service.
@@ -173,6 +178,7 @@ class AdminClient(object):
 
     return operation_id
 
+  @traced('admin.delete_project')
   @retry(**RETRY_POLICY)
   def delete_project(self, project_id):
     """ Deletes a project.
@@ -189,6 +195,7 @@ class AdminClient(object):
     if response.status_code != 200:
       raise AdminError('Error asking Admin Server to delete project!')
 
+  @traced('admin.list_projects')
   @retry(**RETRY_POLICY)
   def list_projects(self):
     """ Lists projects.
@@ -203,6 +210,7 @@ class AdminClient(object):
     response = requests.get(url, headers=headers, verify=False)
     return self.extract_response(response)
 
+  @traced('admin.get_operation')
   @retry(**RETRY_POLICY)
   def get_operation(self, project, operation_id):
     """ Retrieves the status of an operation.
@@ -219,6 +227,7 @@ class AdminClient(object):
     response = requests.get(operation_url, headers=headers, verify=False)
     return self.extract_response(response)
 
+  @traced('admin.update_cron')
   @retry(**RETRY_POLICY)
   def update_cron(self, project_id, cron_config):
     """ Updates the the project's cron configuration.
@@ -246,6 +255,7 @@ class AdminClient(object):
 
     raise AdminError(message)
 
+  @traced('admin.update_queues')
   @retry(**RETRY_POLICY)
   def update_queues(self, project_id, queues):
     """ Updates the the project's queue configuration.
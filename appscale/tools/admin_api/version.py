@@ -10,8 +10,9 @@ import yaml
 
 from appscale.tools.admin_api.client import DEFAULT_SERVICE
 from appscale.tools.admin_api.handler import Handler
+from appscale.tools.archive_index import ArchiveIndex
 from appscale.tools.custom_exceptions import AppEngineConfigException
-from appscale.tools.utils import shortest_directory_path, shortest_path_from_list
+from appscale.tools.utils import shortest_directory_path
 
 # The namespace that appengine-web.xml uses.
 XML_NAMESPACE = '{http://appengine.google.com/ns/1.0}'
@@ -289,6 +290,31 @@ class Version(object):
 
       return Version.from_xml(appengine_web_xml)
 
+  @staticmethod
+  def from_archive(archive_location):
+    """ Constructs a Version from a gzipped tarball or a zip file.
+
+    Args:
+      archive_location: A string specifying a location to the archive.
+    Returns:
+      A Version object.
+    Raises:
+      AppengineConfigException if the config is invalid or cannot be extracted.
+    """
+    try:
+      index = ArchiveIndex.for_archive(archive_location)
+    except (IOError, OSError, tarfile.TarError, zipfile.BadZipfile) as error:
+      raise AppEngineConfigException(
+        'Unable to read {}: {}'.format(archive_location, error))
+
+    for file_name in ('app.yaml', 'appengine-web.xml'):
+      contents = index.config(file_name)
+      if contents is not None:
+        return Version.from_contents(contents, file_name)
+
+    raise AppEngineConfigException(
+      'Unable to find app.yaml or appengine-web.xml')
+
   @staticmethod
   def from_tar_gz(tar_location):
     """ Constructs a Version from a gzipped tarball.
@@ -300,25 +326,7 @@ class Version(object):
     Raises:
       AppengineConfigException if the config is invalid or cannot be extracted.
     """
-    with tarfile.open(tar_location, 'r:gz') as tar:
-      file_name = 'app.yaml'
-      name_list = [member.name for member in tar.getmembers()]
-      config_location = shortest_path_from_list(file_name, name_list)
-      if config_location is None:
-        file_name = 'appengine-web.xml'
-        config_location = shortest_path_from_list(file_name, name_list)
-
-      if config_location is None:
-        raise AppEngineConfigException(
-          'Unable to find app.yaml or appengine-web.xml')
-
-      config_file = tar.extractfile(config_location)
-      try:
-        contents = config_file.read()
-      finally:
-        config_file.close()
-
-      return Version.from_contents(contents, file_name)
+    return Version.from_archive(tar_location)
 
   @staticmethod
   def from_zip(zip_location):
@@ -331,19 +339,4 @@ class Version(object):
     Raises:
       AppengineConfigException if the config is invalid or cannot be extracted.
     """
-    with zipfile.ZipFile(zip_location) as zip_file:
-      file_name = 'app.yaml'
-      name_list = zip_file.namelist()
-      config_location = shortest_path_from_list(file_name, name_list)
-      if config_location is None:
-        file_name = 'appengine-web.xml'
-        config_location = shortest_path_from_list(file_name, name_list)
-
-      if config_location is None:
-        raise AppEngineConfigException(
-          'Unable to find app.yaml or appengine-web.xml')
-
-      with zip_file.open(config_location) as config_file:
-        contents = config_file.read()
-
-      return Version.from_contents(contents, file_name)
+    return Version.from_archive(zip_location)
@@ -77,6 +77,7 @@ from appscale.tools.local_state import LocalState
 from base_agent import AgentConfigurationException
 from base_agent import AgentRuntimeException
 from base_agent import BaseAgent
+from instance_types import AZURE_DISALLOWED_INSTANCE_TYPES
 
 class AzureAgent(BaseAgent):
   """ AzureAgent defines a specialized BaseAgent that allows for interaction
@@ -99,10 +100,7 @@ class AzureAgent(BaseAgent):
   # recommended by Cassandra. AppScale will still run on these instance types,
   # but is likely to crash after a day or two of use (as Cassandra will attempt
   # to malloc ~800MB of memory, which will fail on these instance types).
-  DISALLOWED_INSTANCE_TYPES = ["Basic_A0", "Basic_A1", "Basic_A2", "Basic_A3",
-                               "Basic_A4", "Standard_A0", "Standard_A1",
-                               "Standard_A2", "Standard_D1", "Standard_D1_v2",
-                               "Standard_DS1", "Standard_DS1_v2"]
+  DISALLOWED_INSTANCE_TYPES = AZURE_DISALLOWED_INSTANCE_TYPES
 
   # The following constants are string literals that can be used by callers to
   # index into the parameters that the user passes in, as opposed to having to
@@ -14,6 +14,7 @@ from base_agent import AgentConfigurationException
 from base_agent import AgentRuntimeException
 from base_agent import BaseAgent
 from boto.exception import EC2ResponseError
+from instance_types import EC2_DISALLOWED_INSTANCE_TYPES
 
 
 # pylint: disable-msg=W0511
@@ -85,7 +86,7 @@ class EC2Agent(BaseAgent):
   # recommended by Cassandra. AppScale will still run on these instance types,
   # but is likely to crash after a day or two of use (as Cassandra will attempt
   # to malloc ~800MB of memory, which will fail on these instance types).
-  DISALLOWED_INSTANCE_TYPES = ["m1.small", "c1.medium", "t1.micro"]
+  DISALLOWED_INSTANCE_TYPES = EC2_DISALLOWED_INSTANCE_TYPES
 
 
   def assert_credentials_are_valid(self, parameters):
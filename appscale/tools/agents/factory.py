@@ -1,14 +1,8 @@
+import importlib
 import struct
 
 from appscale.tools.custom_exceptions import UnknownInfrastructureException
-try:
-  from azure_agent import AzureAgent
-except (ImportError, struct.error):
-  AzureAgent = None
-from ec2_agent import EC2Agent
-from euca_agent import EucalyptusAgent
-from gce_agent import GCEAgent
-from openstack_agent import OpenStackAgent
+from appscale.tools.tracing import Tracer
 
 
 __author__ = 'hiranya'
@@ -25,17 +19,43 @@ class InfrastructureAgentFactory:
   VALID_AGENTS = ('ec2', 'euca', 'gce', 'openstack', 'azure')
 
 
-  # A dict that maps each VALID_AGENT above to the class that implements
-  # support for it in AppScale.
+  # A dict that maps each VALID_AGENT above to the module and class that
+  # implement support for it in AppScale. Agents are imported the first time
+  # they are needed, so that commands which never talk to a cloud don't pay to
+  # load its SDK.
   agents = {
-    'ec2': EC2Agent,
-    'euca': EucalyptusAgent,
-    'gce': GCEAgent,
-    'openstack': OpenStackAgent,
+    'ec2': ('appscale.tools.agents.ec2_agent', 'EC2Agent'),
+    'euca': ('appscale.tools.agents.euca_agent', 'EucalyptusAgent'),
+    'gce': ('appscale.tools.agents.gce_agent', 'GCEAgent'),
+    'openstack': ('appscale.tools.agents.openstack_agent', 'OpenStackAgent'),
+    'azure': ('appscale.tools.agents.azure_agent', 'AzureAgent')
   }
 
-  if AzureAgent is not None:
-    agents['azure'] = AzureAgent
+
+  @classmethod
+  def get_agent_class(cls, infrastructure):
+    """
+    Imports and returns the class that implements the given infrastructure.
+
+    Args:
+      infrastructure: A string indicating the type of infrastructure.
+    Returns:
+      The BaseAgent subclass for that infrastructure.
+    Raises:
+      UnknownInfrastructureException: If the infrastructure given is not one
+        that we support, or if the libraries it needs are not installed.
+    """
+    if infrastructure not in cls.agents:
+      raise UnknownInfrastructureException('Unrecognized infrastructure: {0}' \
+        .format(infrastructure))
+
+    module_name, class_name = cls.agents[infrastructure]
+    try:
+      module = importlib.import_module(module_name)
+    except (ImportError, struct.error) as import_error:
+      raise UnknownInfrastructureException('Unable to load support for {0}: ' \
+        '{1}'.format(infrastructure, import_error))
+    return getattr(module, class_name)
 
   @classmethod
   def create_agent(cls, infrastructure):
@@ -46,13 +66,11 @@ class InfrastructureAgentFactory:
       infrastructure: A string indicating the type of infrastructure
         agent to be initialized.
     Returns:
-      An infrastructure agent instance that implements the BaseAgent API
+      An infrastructure agent instance that implements the BaseAgent API. When
+      tracing is enabled, calls to the agent are recorded as spans.
     Raises:
       UnknownInfrastructureException: If the infrastructure given is not one
         that we support.
     """
-    if cls.agents.has_key(infrastructure):
-      return cls.agents[infrastructure]()
-    else:
-      raise UnknownInfrastructureException('Unrecognized infrastructure: {0}' \
-        .format(infrastructure))
+    agent_class = cls.get_agent_class(infrastructure)
+    return Tracer.wrap(agent_class(), infrastructure)
@@ -33,6 +33,7 @@ from appscale.tools.local_state import LocalState
 from base_agent import AgentConfigurationException
 from base_agent import AgentRuntimeException
 from base_agent import BaseAgent
+from instance_types import GCE_DISALLOWED_INSTANCE_TYPES
 
 
 class CredentialJSONKeys(object):
@@ -122,8 +123,7 @@ class GCEAgent(BaseAgent):
   # recommended by Cassandra. AppScale will still run on these instance types,
   # but is likely to crash after a day or two of use (as Cassandra will attempt
   # to malloc ~800MB of memory, which will fail on these instance types).
-  DISALLOWED_INSTANCE_TYPES = ["n1-highcpu-2", "n1-highcpu-2-d", "f1-micro",
-    "g1-small"]
+  DISALLOWED_INSTANCE_TYPES = GCE_DISALLOWED_INSTANCE_TYPES
 
   # The credentials files location on the machine.
   OAUTH2_STORAGE_LOCATION = '/etc/appscale/oauth2.dat'
@@ -0,0 +1,62 @@
+#!/usr/bin/env python
+""" Instance type constraints for each cloud infrastructure.
+
+These are kept apart from the agents so that callers like ParseArgs can check
+them without importing every cloud's SDK.
+"""
+
+
+# A list of the Amazon EC2 instance types that have less than 4 GB of RAM.
+EC2_DISALLOWED_INSTANCE_TYPES = ["m1.small", "c1.medium", "t1.micro"]
+
+
+# A list of the Google Compute Engine instance types that have less than 4 GB
+# of RAM.
+GCE_DISALLOWED_INSTANCE_TYPES = ["n1-highcpu-2", "n1-highcpu-2-d", "f1-micro",
+  "g1-small"]
+
+
+# A list of the Microsoft Azure instance types that have less than 4 GB of RAM.
+AZURE_DISALLOWED_INSTANCE_TYPES = ["Basic_A0", "Basic_A1", "Basic_A2",
+  "Basic_A3", "Basic_A4", "Standard_A0", "Standard_A1", "Standard_A2",
+  "Standard_D1", "Standard_D1_v2", "Standard_DS1", "Standard_DS1_v2"]
+
+
+# The number of vCPUs and megabytes of memory that each instance type has, for
+# planning where roles should run. Types that aren't listed are planned as if
+# they had DEFAULT_INSTANCE_RESOURCES.
+INSTANCE_RESOURCES = {
+  # Amazon EC2
+  "t1.micro": (1, 613), "m1.small": (1, 1740), "c1.medium": (2, 1740),
+  "m3.medium": (1, 3840), "m3.large": (2, 7680), "m3.xlarge": (4, 15360),
+  "m3.2xlarge": (8, 30720), "c3.large": (2, 3840), "c3.xlarge": (4, 7680),
+  "c3.2xlarge": (8, 15360), "c3.4xlarge": (16, 30720),
+  "c3.8xlarge": (32, 61440), "cc2.8xlarge": (32, 61952),
+  "cr1.8xlarge": (32, 249856), "cg1.4xlarge": (16, 23040),
+  "hi1.4xlarge": (16, 61952), "hs1.8xlarge": (16, 119808),
+
+  # Google Compute Engine
+  "f1-micro": (1, 614), "g1-small": (1, 1740), "n1-standard-1": (1, 3840),
+  "n1-standard-2": (2, 7680), "n1-standard-4": (4, 15360),
+  "n1-standard-8": (8, 30720), "n1-highcpu-2": (2, 1843),
+  "n1-highcpu-4": (4, 3686), "n1-highcpu-8": (8, 7373),
+  "n1-highmem-2": (2, 13312), "n1-highmem-4": (4, 26624),
+  "n1-highmem-8": (8, 53248),
+
+  # Microsoft Azure
+  "Standard_A3": (4, 7168), "Standard_A4": (8, 14336),
+  "Standard_A5": (2, 14336), "Standard_A6": (4, 28672),
+  "Standard_A7": (8, 57344), "Standard_D2": (2, 7168),
+  "Standard_D3": (4, 14336), "Standard_D4": (8, 28672),
+  "Standard_D11": (2, 14336), "Standard_D12": (4, 28672),
+  "Standard_D13": (8, 57344), "Standard_D14": (16, 114688),
+  "Standard_D2_v2": (2, 7168), "Standard_D3_v2": (4, 14336),
+  "Standard_D4_v2": (8, 28672), "Standard_D5_v2": (16, 57344),
+  "Standard_F4": (4, 8192), "Standard_F8": (8, 16384),
+  "Standard_F16": (16, 32768)
+}
+
+
+# The resources assumed for instance types that aren't in INSTANCE_RESOURCES,
+# and for machines in virtualized clusters.
+DEFAULT_INSTANCE_RESOURCES = (2, 7680)
@@ -0,0 +1,294 @@
+""" Decides which files in an application's directory get uploaded. """
+
+from __future__ import absolute_import
+
+import os
+import re
+
+import yaml
+
+
+# The file that lists paths to leave out of uploads, with .gitignore syntax.
+IGNORE_FILE = '.appscaleignore'
+
+
+# Compiled Python files are never uploaded, whatever else is configured.
+DEFAULT_SKIP_PATTERN = r'.*\.pyc'
+
+
+class IgnoreRule(object):
+  """ A single pattern from an ignore file. """
+
+
+  def __init__(self, regex, negated, directory_only):
+    """ Creates a new IgnoreRule.
+
+    Args:
+      regex: A compiled regular expression that matches the relative paths
+        the pattern covers.
+      negated: A bool that indicates if the pattern started with '!' and so
+        brings back paths that an earlier pattern left out.
+      directory_only: A bool that indicates if the pattern ended with '/' and
+        so only covers directories.
+    """
+    self.regex = regex
+    self.negated = negated
+    self.directory_only = directory_only
+
+
+  def matches(self, relative_path, is_dir):
+    """ Checks if the rule covers a path.
+
+    Args:
+      relative_path: A str, the path relative to the app's root, using '/'.
+      is_dir: A bool that indicates if the path is a directory.
+    Returns:
+      True if the rule covers the path, and False otherwise.
+    """
+    if self.directory_only and not is_dir:
+      return False
+    return self.regex.match(relative_path) is not None
+
+
+  @classmethod
+  def parse(cls, line):
+    """ Reads one line of an ignore file.
+
+    Args:
+      line: A str, a line in .gitignore syntax.
+    Returns:
+      An IgnoreRule, or None if the line is blank or a comment.
+    """
+    line = line.rstrip('\r\n')
+    if not line.endswith('\\ '):
+      line = line.rstrip(' ')
+    if not line or line.startswith('#'):
+      return None
+
+    negated = line.startswith('!')
+    if negated:
+      line = line[1:]
+    elif line.startswith('\\!') or line.startswith('\\#'):
+      line = line[1:]
+
+    directory_only = line.endswith('/')
+    line = line.rstrip('/')
+
+    # Patterns with a slash anywhere but the end are relative to the root.
+    # Others match a file or directory with that name at any depth.
+    anchored = '/' in line
+    line = line.lstrip('/')
+    if not line:
+      return None
+
+    regex = cls.translate(line)
+    if not anchored:
+      regex = '(?:.*/)?' + regex
+    return cls(re.compile(regex + r'\Z'), negated, directory_only)
+
+
+  @classmethod
+  def translate(cls, pattern):
+    """ Converts a .gitignore pattern into a regular expression.
+
+    Args:
+      pattern: A str without leading or trailing slashes.
+    Returns:
+      A str, the equivalent regular expression.
+    """
+    parts = pattern.split('/')
+    regex = ''
+    for index, part in enumerate(parts):
+      is_last = index == len(parts) - 1
+      if part == '**':
+        regex += '.*' if is_last else '(?:.*/)?'
+        continue
+
+      regex += cls.translate_part(part)
+      if not is_last:
+        regex += '/'
+    return regex
+
+
+  @staticmethod
+  def translate_part(part):
+    """ Converts one path component of a pattern into a regular expression.
+
+    Args:
+      part: A str that may contain '*', '?', and '[...]' wildcards.
+    Returns:
+      A str, a regular expression that never matches '/'.
+    """
+    regex = ''
+    index = 0
+    while index < len(part):
+      char = part[index]
+      index += 1
+      if char == '*':
+        regex += '[^/]*'
+      elif char == '?':
+        regex += '[^/]'
+      elif char == '\\' and index < len(part):
+        regex += re.escape(part[index])
+        index += 1
+      elif char == '[':
+        end = part.find(']', index + 1)
+        if end == -1:
+          regex += re.escape(char)
+          continue
+        members = part[index:end].replace('\\', '\\\\')
+        if members[0] in '!^':
+          members = '^' + members[1:]
+        regex += '[' + members + ']'
+        index = end + 1
+      else:
+        regex += re.escape(char)
+    return regex
+
+
+class UploadFilter(object):
+  """ UploadFilter combines an app's skip_files setting with the rules in its
+  .appscaleignore file. """
+
+
+  def __init__(self, skip_files=None, ignore_rules=None):
+    """ Creates a new UploadFilter.
+
+    Args:
+      skip_files: A list of strs, the regular expressions from app.yaml's
+        skip_files. Each one has to match a whole relative path.
+      ignore_rules: A list of IgnoreRules, in the order they were written.
+    """
+    self.skip_files = skip_files or []
+    self.ignore_rules = ignore_rules or []
+    patterns = [DEFAULT_SKIP_PATTERN] + self.skip_files
+    self.skip_regex = re.compile(
+      '|'.join(r'(?:{0})\Z'.format(pattern) for pattern in patterns))
+
+
+  def has_rules(self):
+    """ Checks if the app configures anything beyond the default filter.
+
+    Returns:
+      True if app.yaml has skip_files or the app has a .appscaleignore file.
+    """
+    return bool(self.skip_files or self.ignore_rules)
+
+
+  def skips(self, relative_path, is_dir=False):
+    """ Checks if a path should be left out of the upload.
+
+    Args:
+      relative_path: A str, the path relative to the app's root, using '/'.
+      is_dir: A bool that indicates if the path is a directory. A skipped
+        directory is left out along with everything in it.
+    Returns:
+      True if the path should not be uploaded, and False otherwise.
+    """
+    if is_dir:
+      skipped = (self.skip_regex.match(relative_path) is not None or
+                 self.skip_regex.match(relative_path + '/') is not None)
+    else:
+      skipped = self.skip_regex.match(relative_path) is not None
+    if skipped:
+      return True
+
+    # As with .gitignore, the last rule that covers a path wins.
+    ignored = False
+    for rule in self.ignore_rules:
+      if rule.matches(relative_path, is_dir):
+        ignored = not rule.negated
+    return ignored
+
+
+  @classmethod
+  def for_app(cls, app_location, app_yaml=None):
+    """ Reads an app's filter configuration.
+
+    Args:
+      app_location: A str, the directory that holds the app.
+      app_yaml: A str naming the app.yaml to read skip_files from, if it is
+        not the one at the top of app_location.
+    Returns:
+      An UploadFilter.
+    """
+    if app_yaml is None:
+      app_yaml = os.path.join(app_location, 'app.yaml')
+
+    skip_files = []
+    try:
+      with open(app_yaml) as app_yaml_file:
+        config = yaml.safe_load(app_yaml_file)
+    except (IOError, yaml.YAMLError):
+      config = None
+    if isinstance(config, dict) and config.get('skip_files'):
+      skip_files = config['skip_files']
+      if not isinstance(skip_files, list):
+        skip_files = [skip_files]
+
+    ignore_rules = []
+    try:
+      with open(os.path.join(app_location, IGNORE_FILE)) as ignore_file:
+        for line in ignore_file:
+          rule = IgnoreRule.parse(line)
+          if rule is not None:
+            ignore_rules.append(rule)
+    except IOError:
+      pass
+
+    return cls([str(pattern) for pattern in skip_files], ignore_rules)
+
+
+def collect_app_files(app_location, upload_filter=None):
+  """ Lists the files that make up an upload.
+
+  Skipped directories are pruned as the app is walked, so nothing under them
+  is read.
+
+  Args:
+    app_location: A str, the directory that holds the app.
+    upload_filter: An UploadFilter, or None to read the app's own.
+  Returns:
+    A dict mapping each file's path in the upload to its local path.
+  """
+  if upload_filter is None:
+    upload_filter = UploadFilter.for_app(app_location)
+
+  app_files = {}
+  for root, dirs, filenames in os.walk(app_location, followlinks=True):
+    relative_dir = os.path.relpath(root, app_location)
+    if relative_dir == '.':
+      prefix = ''
+    else:
+      prefix = relative_dir.replace(os.sep, '/') + '/'
+
+    dirs[:] = [directory for directory in dirs
+               if not upload_filter.skips(prefix + directory, is_dir=True)]
+    for filename in filenames:
+      if upload_filter.skips(prefix + filename):
+        continue
+      relative_path = os.path.join(relative_dir, filename)
+      app_files[relative_path] = os.path.join(root, filename)
+
+  return app_files
+
+
+def size_by_top_level_dir(app_files):
+  """ Adds up how much each top-level directory contributes to an upload.
+
+  Args:
+    app_files: A dict mapping paths in the upload to local paths.
+  Returns:
+    A list of (name, file count, bytes) tuples, largest first. Files at the
+    top of the app are counted under './'.
+  """
+  totals = {}
+  for upload_path, local_path in app_files.items():
+    parts = os.path.normpath(upload_path).split(os.sep)
+    name = parts[0] + '/' if len(parts) > 1 else './'
+    count, size = totals.get(name, (0, 0))
+    totals[name] = (count + 1, size + os.path.getsize(local_path))
+
+  return sorted(((name, count, size)
+                 for name, (count, size) in totals.items()),
+                key=lambda total: (-total[2], total[0]))
@@ -6,13 +6,14 @@ import json
 import signal
 import socket
 import ssl
+import threading
 import time
 
-import SOAPpy
-
 from appscale.tools.appscale_logger import AppScaleLogger
 from appscale.tools.custom_exceptions import (
   AppControllerException, BadSecretException, TimeoutException)
+from appscale.tools.tracing import Tracer
+from appscale.tools.tracing import traced
 
 
 class AppControllerClient():
@@ -66,6 +67,8 @@ class AppControllerClient():
         when talking to remote AppControllers.
     """
     self.host = host
+    # SOAPpy is slow to import, so only load it once a client is needed.
+    import SOAPpy
     self.server = SOAPpy.SOAPProxy('https://%s:%s' % (host,
       self.PORT))
     self.secret = secret
@@ -92,6 +95,11 @@ class AppControllerClient():
         not running at the given IP address, or if it rejects the SOAP request.
       TimeoutException: If the operation times out.
     """
+    # Signals can only be handled on the main thread. Elsewhere, e.g. in a
+    # CallOperation, the caller's deadline bounds the call instead.
+    if threading.current_thread().name != 'MainThread':
+      return self.run_without_alarm(num_retries, function, *args)
+
     def timeout_handler(_, __):
       """Raises a TimeoutException if the function we want to execute takes
       too long to run.
@@ -104,7 +112,8 @@ class AppControllerClient():
     signal.signal(signal.SIGALRM, timeout_handler)
     signal.alarm(timeout_time)  # trigger alarm in timeout_time seconds
     try:
-      retval = function(*args)
+      with Tracer.span('appcontroller.soap_call', host=self.host):
+        retval = function(*args)
 
     except ssl.SSLError:
       # these are intermittent, so don't decrement our retry count for this
@@ -130,6 +139,43 @@ class AppControllerClient():
 
     return retval
 
+  def run_without_alarm(self, num_retries, function, *args):
+    """Runs the given function with the same retries as run_with_timeout, but
+    without a timeout of its own.
+
+    Args:
+      num_retries: The number of times we should retry the SOAP call if we see
+        an unexpected exception.
+      function: The function that should be executed.
+      *args: The arguments that will be passed to function.
+    Returns:
+      Whatever function(*args) returns.
+    Raises:
+      AppControllerException: If the AppController we're trying to connect to is
+        not running at the given IP address, or if it rejects the SOAP request.
+    """
+    while True:
+      try:
+        with Tracer.span('appcontroller.soap_call', host=self.host):
+          retval = function(*args)
+        break
+      except ssl.SSLError:
+        # these are intermittent, so don't decrement our retry count for this
+        continue
+      except socket.error as exception:
+        if num_retries <= 0:
+          raise AppControllerException("Got exception from socket: {}".format(
+            exception))
+        num_retries -= 1
+        time.sleep(1)
+
+    if retval == self.BAD_SECRET_MESSAGE:
+      raise BadSecretException("Could not authenticate successfully" + \
+        " to the AppController. You may need to change the keyname in use.")
+
+    return retval
+
+  @traced('appcontroller.set_parameters')
   def set_parameters(self, locations, params):
     """Passes the given parameters to an AppController, allowing it to start
     configuring API services in this AppScale deployment.
@@ -153,6 +199,7 @@ class AppControllerClient():
     if result.startswith('Error'):
       raise AppControllerException(result)
 
+  @traced('appcontroller.get_all_public_ips')
   def get_all_public_ips(self):
     """Queries the AppController for a list of all the machines running in this
     AppScale deployment, and returns their public IP addresses.
@@ -175,6 +222,7 @@ class AppControllerClient():
 
     return json.loads(result)
 
+  @traced('appcontroller.get_all_private_ips')
   def get_all_private_ips(self):
     """Queries the AppController for a list of all the machines running in this
     AppScale deployment, and returns their private IP addresses.
@@ -197,6 +245,7 @@ class AppControllerClient():
 
     return json.loads(result)
 
+  @traced('appcontroller.get_role_info')
   def get_role_info(self):
     """Queries the AppController to determine what each node in the deployment
     is doing and how it can be externally or internally reached.
@@ -219,6 +268,7 @@ class AppControllerClient():
 
     return json.loads(result)
 
+  @traced('appcontroller.get_cluster_stats')
   def get_cluster_stats(self):
     """Queries the AppController to see what its internal state is.
 
@@ -239,6 +289,7 @@ class AppControllerClient():
 
     return json.loads(result)
 
+  @traced('appcontroller.is_initialized')
   def is_initialized(self):
     """Queries the AppController to see if it has started up all of the API
     services it is responsible for on its machine.
@@ -262,6 +313,7 @@ class AppControllerClient():
 
     return result
 
+  @traced('appcontroller.start_roles_on_nodes')
   def start_roles_on_nodes(self, roles_to_nodes):
     """Dynamically adds the given machines to an AppScale deployment, with the
     specified roles.
@@ -281,6 +333,7 @@ class AppControllerClient():
     if result.startswith('Error'):
       raise AppControllerException(result)
 
+  @traced('appcontroller.is_appscale_terminated')
   def is_appscale_terminated(self):
     """Queries the AppController to see if the system has been terminated.
 
@@ -303,6 +356,7 @@ class AppControllerClient():
 
     return result
 
+  @traced('appcontroller.run_terminate')
   def run_terminate(self, clean):
     """Tells the AppController to terminate AppScale on the deployment.
 
@@ -322,6 +376,7 @@ class AppControllerClient():
     if result.startswith('Error'):
       raise AppControllerException(result)
 
+  @traced('appcontroller.receive_server_message')
   def receive_server_message(self):
     """Queries the AppController for a message that the server wants to send
     to the tools.
@@ -345,6 +400,7 @@ class AppControllerClient():
 
     return server_message
 
+  @traced('appcontroller.get_app_info_map')
   def get_app_info_map(self):
     """Asks the AppController for a list of all the applications it is proxying
     via nginx, haproxy, or running itself.
@@ -368,6 +424,7 @@ class AppControllerClient():
 
     return json.loads(result)
 
+  @traced('appcontroller.relocate_version')
   def relocate_version(self, version_key, http_port, https_port):
     """Asks the AppController to start serving traffic for the named version
     on the given ports, instead of the ports that it was previously serving at.
@@ -394,6 +451,7 @@ class AppControllerClient():
     if result != 'OK':
       raise AppControllerException('Unable to relocate: {}'.format(result))
 
+  @traced('appcontroller.get_property')
   def get_property(self, property_regex):
     """Queries the AppController for a dictionary of its instance variables
     whose names match the given regular expression, along with their associated
@@ -421,6 +479,7 @@ class AppControllerClient():
 
     return json.loads(result)
 
+  @traced('appcontroller.set_property')
   def set_property(self, property_name, property_value):
     """Instructs the AppController to update one of its instance variables with
     a new value, provided by the caller.
@@ -441,6 +500,7 @@ class AppControllerClient():
     if result != 'OK':
       raise AppControllerException('Unable to set property: {}'.format(result))
 
+  @traced('appcontroller.deployment_id_exists')
   def deployment_id_exists(self):
     """ Asks the AppController if the deployment ID is stored in ZooKeeper.
 
@@ -462,6 +522,7 @@ class AppControllerClient():
 
     return result
 
+  @traced('appcontroller.get_deployment_id')
   def get_deployment_id(self):
     """ Retrieves the deployment ID from ZooKeeper.
 
@@ -479,6 +540,7 @@ class AppControllerClient():
 
     return result
 
+  @traced('appcontroller.set_deployment_id')
   def set_deployment_id(self, deployment_id):
     """ Tells the AppController to set the deployment ID in ZooKeeper.
 
@@ -497,6 +559,7 @@ class AppControllerClient():
     if result.startswith('Error'):
       raise AppControllerException(result)
 
+  @traced('appcontroller.reset_password')
   def reset_password(self, username, encrypted_password):
     """ Resets a user's password in the currently running AppScale deployment.
 
@@ -518,6 +581,7 @@ class AppControllerClient():
     if result != 'true':
       raise AppControllerException(result)
 
+  @traced('appcontroller.does_user_exist')
   def does_user_exist(self, username, silent=False):
     """ Queries the AppController to see if the given user exists.
 
@@ -551,6 +615,7 @@ class AppControllerClient():
     raise AppControllerException(
       'Exceeded retries when checking if user exists')
 
+  @traced('appcontroller.create_user')
   def create_user(self, username, password, account_type='xmpp_user'):
     """ Creates a new user account, with the given username and hashed password.
 
@@ -581,6 +646,7 @@ class AppControllerClient():
 
     raise AppControllerException('Exceeded retries when creating user')
 
+  @traced('appcontroller.set_admin_role')
   def set_admin_role(self, username, is_cloud_admin, capabilities):
     """ Grants the given user the ability to perform any administrative action.
 
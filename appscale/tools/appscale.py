@@ -5,6 +5,7 @@ from __future__ import absolute_import
 import base64
 import json
 import os
+import pipes
 import shutil
 import subprocess
 import sys
@@ -18,11 +19,15 @@ from appscale.tools.appscale_tools import AppScaleTools
 from appscale.tools.custom_exceptions import (
   AppScaleException, AppScalefileException, BadConfigurationException,
   ShellException)
+from appscale.tools.daemon import AppScaleDaemon
 from appscale.tools.local_state import LocalState
 from appscale.tools.node_layout import NodeLayout
 from appscale.tools.parse_args import ParseArgs
 from appscale.tools.registration_helper import RegistrationHelper
 from appscale.tools.remote_helper import RemoteHelper
+from appscale.tools.remote_streams import RemoteStream
+from appscale.tools.remote_streams import StreamMultiplexer
+from appscale.tools.scaling import ScalingAdvisor
 
 
 class AppScale():
@@ -55,6 +60,17 @@ class AppScale():
   # Role name for ZooKeeper node.
   ZOOKEEPER_ROLE = 'zookeeper'
 
+
+  # The target that 'appscale tail' accepts to follow logs on every node.
+  ALL_NODES = 'all'
+
+
+  # The order in which roles are preferred when labelling a machine's output,
+  # from the most to the least descriptive.
+  ROLE_LABEL_PRIORITY = ['shadow', 'load_balancer', 'db_master', 'database',
+    'taskqueue_master', 'zookeeper', 'compute', 'appengine', 'taskqueue',
+    'memcache', 'search', 'open']
+
   # The usage that should be displayed to users if they call 'appscale'
   # with a bad directive or ask for help.
   USAGE = """Usage: appscale command [<args>]
@@ -63,15 +79,24 @@ Available commands:
   deploy [--project <id>] <app>     Deploys a Google App Engine app to AppScale:
                                     <app> can be the top level directory with the
                                     code or a tar.gz of the source tree, and <id>
-                                    is the application/project name.
+                                    is the application/project name. With
+                                    --dry-run, lists how much each directory
+                                    would upload instead.
   create-user [--admin]             Creates a new user. If --admin option is specified,
                                     it will create the user as an admin.
+  daemon [start|stop|status]        Manages appscaled, an optional background
+                                    process that answers 'get', 'stats' and
+                                    'status' for this deployment faster.
   down [--clean][--terminate]       Gracefully terminates the currently
                                     running AppScale deployments. If
                                     instances were created, they will NOT
                                     be terminated, unless --terminate is
                                     specified. If --clean option is
                                     specified, ALL DATA WILL BE DELETED.
+  exec --role <role> | --all <cmd>  Runs <cmd> on every machine with <role>
+    [--max_parallel <number>]       (which can be given more than once), or
+    [--timeout <seconds>]           on every machine, in parallel. Machines
+    [--format text|json]            with the same output are shown together.
   get <regex>                       Gets all AppController properties matching
                                     the provided regex: for developers only.
   help                              Displays this message.
@@ -82,11 +107,20 @@ Available commands:
   logs <dir>                        Collects the logs produced by an AppScale
                                     deployment into a directory <dir>: the
                                     directory will be created.
+  logs search <pattern>             Prints the log lines matching <pattern> on
+    [--roles, -r <roles>]           every node (or only nodes with <roles>),
+    [--since <time>]                searching on the nodes themselves.
+    [--until <time>]                Times look like YYYY-MM-DD[ HH:MM:SS].
   register <deployment_id>          Registers an AppScale deployment with the
                                     AppScale Portal.
   relocate <appid> <http> <https>   Moves the application <appid> to
                                     different <http> and <https> ports.
   remove <appid>                    An alias for 'undeploy'.
+  scale                             Samples the deployment's stats and
+    [--samples <number>]            recommends nodes to add or roles to
+    [--interval <seconds>]          move. With --apply, adds the recommended
+    [--apply]                       compute nodes from the machines
+    [--spare_ips <ips>]             in <ips>.
   services                          Commands for services. Run appscale services
                                     help for usage.
   set <property> <value>            Sets an AppController <property> to the
@@ -104,10 +138,21 @@ Available commands:
     [--top <number>]                Limits a number of printed processes.
     [--verbose, -v]                 Prints verbose stats.
     [--apps-only]                   Prints only application proxy stats.
+    [--node-ips <ips>]              Prints only stats from these nodes.
+    [--apps <app ids>]              Prints only process and proxy stats of
+                                    these applications.
+    [--format json|ndjson]          Prints records for scripts, not tables.
+    [--watch <seconds>]             Fetches stats again every <seconds> and
+                                    prints only changed NDJSON records.
+    [--count <number>]              Stops --watch after <number> fetches.
   status                            Reports on the state of a currently
-                                    running AppScale deployment.
-  tail                              Follows the output of log files of an
-                                    AppScale deployment.
+    [--format json|ndjson]          running AppScale deployment. --format
+                                    prints records for scripts, not tables.
+  tail [#|role|all] [<regex>]       Follows the output of log files of an
+    [--grep <pattern>]              AppScale deployment on the #th node, on
+                                    every node with a role, or on all nodes.
+                                    Only lines matching <pattern> are shown
+                                    if --grep is given.
   up                                Starts the AppScale deployment (requires
                                     an AppScalefile).
   undeploy <appid>                  Removes <appid> from the current
@@ -509,6 +554,28 @@ Available commands:
     show_stats(options)
 
 
+  def scale(self, params_list=None):
+    """ 'scale' samples the statistics of the AppScale deployment described
+    in the user's AppScalefile, and recommends nodes to add or roles to move.
+
+    Args:
+      params_list: A list of additional options, such as how many samples to
+        take and whether the recommendations should be applied.
+    Raises:
+      AppScalefileException: If there is no AppScalefile in the current
+      directory.
+    """
+    contents = self.read_appscalefile()
+    command = params_list or []
+    contents_as_yaml = yaml.safe_load(contents)
+    if 'keyname' in contents_as_yaml:
+      command.append("--keyname")
+      command.append(contents_as_yaml['keyname'])
+
+    options = ParseArgs(command, "appscale-scale").args
+    ScalingAdvisor.advise(options)
+
+
   def status(self, extra_options_list=None):
     """ 'status' is a more accessible way to query the state of the AppScale
     deployment than 'appscale-describe-instances', and calls it with the
@@ -533,7 +600,38 @@ Available commands:
     AppScaleTools.print_cluster_status(options)
 
 
-  def deploy(self, app, project_id=None):
+  def daemon(self, action):
+    """ 'daemon' starts, stops, or checks on the appscaled process that serves
+    the deployment in the user's AppScalefile.
+
+    Args:
+      action: A str, one of 'start', 'stop', or 'status'.
+    Raises:
+      AppScalefileException: If there is no AppScalefile in the current
+      directory.
+      BadConfigurationException: If the action is not recognized.
+    """
+    contents_as_yaml = yaml.safe_load(self.read_appscalefile())
+    keyname = contents_as_yaml.get('keyname', ParseArgs.DEFAULT_KEYNAME)
+
+    if action == 'start':
+      AppScaleDaemon.start(keyname)
+    elif action == 'stop':
+      AppScaleDaemon.stop(keyname)
+    elif action == 'status':
+      pid = AppScaleDaemon.ping(keyname)
+      if pid is None:
+        AppScaleLogger.log('appscaled is not running for {}.'.format(keyname))
+      else:
+        AppScaleLogger.log('appscaled is running for {} (pid {}).'.format(
+          keyname, pid))
+    else:
+      raise BadConfigurationException(
+        "Unknown daemon action '{}'. Use start, stop, or status.".format(
+          action))
+
+
+  def deploy(self, app, project_id=None, dry_run=False):
     """ 'deploy' is a more accessible way to tell an AppScale deployment to run a
     Google App Engine application than 'appscale-upload-app'. It calls that
     command with the configuration options found in the AppScalefile in the
@@ -543,9 +641,11 @@ Available commands:
       app: The path (absolute or relative) to the Google App Engine application
         that should be uploaded.
       project_id: Which project ID to use to deploy the application.
+      dry_run: A bool that indicates if we should only report what would be
+        uploaded.
     Returns:
       A tuple containing the host and port where the application is serving
-        traffic from.
+        traffic from, or None if this was a dry run.
     Raises:
       AppScalefileException: If there is no AppScalefile in the current working
       directory.
@@ -572,9 +672,15 @@ Available commands:
       command.append("--project")
       command.append(project_id)
 
+    if dry_run:
+      command.append("--dry-run")
+
     # Finally, exec the command. Don't worry about validating it -
     # appscale-upload-app will do that for us.
     options = ParseArgs(command, "appscale-upload-app").args
+    if dry_run:
+      return AppScaleTools.upload_app(options)
+
     login_host, http_port = AppScaleTools.upload_app(options)
     AppScaleTools.update_cron(options.file, options.keyname, options.project)
     AppScaleTools.update_queues(options.file, options.keyname, options.project)
@@ -679,30 +785,36 @@ Available commands:
     AppScaleTools.set_property(options)
 
 
-  def tail(self, node, file_regex):
+  def tail(self, node, file_regex, grep_pattern=None):
     """ 'tail' provides a simple way to follow log files in an AppScale
     deployment, instead of having to ssh in to a machine, locate the logs
     directory, and then tail it.
 
     Args:
-      node: An int that indicates the id of the machine to tail logs from.
+      node: Which machines to tail logs from: an int that indicates the id of
+        a single machine, a role name (e.g. 'compute') to follow every machine
+        running that role, or 'all' to follow every machine.
       file_regex: The regular expression that should be used to indicate which
         logs to tail from on the remote host.
+      grep_pattern: A str that, if given, limits output to lines matching this
+        regular expression. Lines are filtered on each node before being sent.
     Raises:
       AppScalefileException: If there is no AppScalefile in the current working
         directory.
-      TypeError: If index is not an int.
+      TypeError: If node is not an int, a role, or 'all'.
     """
     contents = self.read_appscalefile()
     contents_as_yaml = yaml.safe_load(contents)
 
-    # ensure that index is an int
-    # TODO(cgb): Consider node = *, to tail from all nodes.
-    try:
-      index = int(node)
-    except ValueError:
-      raise TypeError("Usage: appscale tail <node id to tail from> " + \
-        "<regex of files to tail>\nExample: appscale tail 0 controller*")
+    # ensure that node is an int, a role, or 'all'
+    index = None
+    if node != self.ALL_NODES and node not in NodeLayout.VALID_ROLES:
+      try:
+        index = int(node)
+      except ValueError:
+        raise TypeError("Usage: appscale tail <node id, role, or 'all'> " + \
+          "<regex of files to tail> [--grep <pattern>]\n" + \
+          "Example: appscale tail compute app___* --grep ERROR")
 
     # get a list of the nodes running
     if 'keyname' in contents_as_yaml:
@@ -717,6 +829,10 @@ Available commands:
       raise AppScaleException("AppScale does not currently appear to" +
         " be running. Please start it and try again.")
 
+    if index is None:
+      self.tail_many(nodes, node, keyname, file_regex, grep_pattern)
+      return
+
     # make sure there is a node at position 'index'
     try:
       ip = nodes[index]['public_ip']
@@ -726,7 +842,7 @@ Available commands:
         " in the currently running AppScale deployment.")
 
     # construct the ssh command to exec with that IP address
-    tail = "tail -F /var/log/appscale/{0}".format(file_regex)
+    tail = self.get_tail_command(file_regex, grep_pattern)
     command = ["ssh", "-o", "StrictHostkeyChecking=no", "-i",
       self.get_key_location(keyname), "root@" + ip, tail]
 
@@ -734,6 +850,82 @@ Available commands:
     subprocess.call(command)
 
 
+  def tail_many(self, nodes, role, keyname, file_regex, grep_pattern=None):
+    """ Follows log files on several machines at once, merging their output
+    with each line prefixed by the machine and role it came from.
+
+    Args:
+      nodes: A list of dicts, the node_info entries from locations.json.
+      role: A str, the role whose machines should be followed, or 'all'.
+      keyname: A str, the name of the SSH keypair for this deployment.
+      file_regex: The regular expression that should be used to indicate which
+        logs to tail from on the remote hosts.
+      grep_pattern: A str that, if given, limits output to matching lines.
+    Raises:
+      AppScaleException: If no machine runs the given role.
+    """
+    if role != self.ALL_NODES:
+      nodes = [node for node in nodes if role in node.get('jobs', [])]
+    if not nodes:
+      raise AppScaleException("No machines in the currently running " +
+        "AppScale deployment have the {0} role.".format(role))
+
+    tail = self.get_tail_command(file_regex, grep_pattern)
+    # After reconnecting, only follow new lines so that none are repeated.
+    reconnect_tail = self.get_tail_command(file_regex, grep_pattern,
+                                           new_lines_only=True)
+    streams = []
+    for node in nodes:
+      if role == self.ALL_NODES:
+        label_role = self.get_primary_role(node.get('jobs', []))
+      else:
+        label_role = role
+      streams.append(RemoteStream(
+        node['public_ip'], keyname, tail,
+        label="{0} {1}".format(node['public_ip'], label_role),
+        reconnect_command=reconnect_tail))
+
+    StreamMultiplexer(streams).run()
+
+
+  @staticmethod
+  def get_tail_command(file_regex, grep_pattern=None, new_lines_only=False):
+    """ Constructs the command that follows logs on a single machine.
+
+    Args:
+      file_regex: The regular expression that should be used to indicate which
+        logs to tail.
+      grep_pattern: A str that, if given, limits output to matching lines.
+      new_lines_only: A bool that indicates if lines written before the
+        command starts should be skipped.
+    Returns:
+      A str containing the command to run on the remote machine.
+    """
+    if new_lines_only:
+      tail = "tail -n 0 -F /var/log/appscale/{0}".format(file_regex)
+    else:
+      tail = "tail -F /var/log/appscale/{0}".format(file_regex)
+
+    if grep_pattern:
+      tail += " | grep --line-buffered -E {0}".format(pipes.quote(grep_pattern))
+    return tail
+
+
+  @classmethod
+  def get_primary_role(cls, roles):
+    """ Picks the role that best describes a machine, for labelling output.
+
+    Args:
+      roles: A list of strs, the roles the machine runs.
+    Returns:
+      A str naming one of the given roles.
+    """
+    for role in cls.ROLE_LABEL_PRIORITY:
+      if role in roles:
+        return role
+    return roles[0] if roles else 'unknown'
+
+
   def logs(self, location, other_args=None):
     """ 'logs' provides a cleaner experience for users than the
     appscale-gather-logs command, by using the configuration options present in
@@ -765,6 +957,72 @@ Available commands:
     AppScaleTools.gather_logs(options)
 
 
+  def search_logs(self, pattern, other_args=None):
+    """ 'logs search' finds log lines matching a pattern across an AppScale
+    deployment, by searching on each machine instead of downloading its logs,
+    using the configuration options present in the AppScalefile found in the
+    current working directory.
+
+    Args:
+      pattern: A str, the extended regular expression to search for.
+      other_args: A list of other args from sys.argv, e.g. --roles, --since or
+        --until.
+    Raises:
+      AppScalefileException: If there is no AppScalefile in the current working
+      directory.
+    """
+    contents = self.read_appscalefile()
+    contents_as_yaml = yaml.safe_load(contents)
+
+    # construct the appscale-search-logs command
+    command = []
+    if 'keyname' in contents_as_yaml:
+      command.append("--keyname")
+      command.append(contents_as_yaml["keyname"])
+
+    command.append("--pattern")
+    command.append(pattern)
+    if other_args:
+      command += other_args
+
+    # and exec it
+    options = ParseArgs(command, "appscale-search-logs").args
+    AppScaleTools.search_logs(options)
+
+
+  def exec_command(self, args):
+    """ 'exec' runs a shell command on several machines in an AppScale
+    deployment at once, using the configuration options present in the
+    AppScalefile found in the current working directory.
+
+    Args:
+      args: A list of args from sys.argv: flags like --role or --all, followed
+        by the command to run.
+    Returns:
+      An int, 0 if the command succeeded on every machine and 1 otherwise.
+    Raises:
+      AppScalefileException: If there is no AppScalefile in the current working
+      directory.
+    """
+    contents = self.read_appscalefile()
+    contents_as_yaml = yaml.safe_load(contents)
+
+    # construct the appscale-exec command
+    command = []
+    if 'keyname' in contents_as_yaml:
+      command.append("--keyname")
+      command.append(contents_as_yaml["keyname"])
+
+    if 'verbose' in contents_as_yaml and contents_as_yaml['verbose'] == True:
+      command.append("--verbose")
+
+    command += args
+
+    # and exec it
+    options = ParseArgs(command, "appscale-exec").args
+    return AppScaleTools.exec_command(options)
+
+
   def relocate(self, appid, http_port, https_port):
     """ 'relocate' provides a nicer experience for users than the
     appscale-terminate-instances command, by using the configuration options
@@ -920,6 +1178,9 @@ Available commands:
     if 'test' in contents_as_yaml and contents_as_yaml['test'] == True:
       command.append('--test')
 
+    if contents_as_yaml.get('offline') == True:
+      command.append('--offline')
+
     options = ParseArgs(command, 'appscale-upgrade').args
     options.ips = yaml.safe_load(base64.b64decode(options.ips_layout))
     options.terminate = False
@@ -2,7 +2,12 @@
 
 
 # General-purpose Python library imports
+import atexit
 import httplib
+import json
+import os
+import threading
+import time
 
 
 # Third party library imports
@@ -25,6 +30,42 @@ class AppScaleLogger():
   }
 
 
+  # How long, in seconds, we wait on the remote logs service for each request.
+  LOGS_TIMEOUT = 5
+
+
+  # Setting this environment variable to anything but '' or '0' stops us from
+  # remotely logging anything.
+  OPT_OUT_VAR = 'APPSCALE_NO_REMOTE_LOGS'
+
+
+  # The file where messages that couldn't be sent wait for a later run, and
+  # the most messages that it keeps.
+  SPOOL_LOCATION = os.path.join(os.path.expanduser('~'), '.appscale',
+                                'remote-logs-spool.json')
+  MAX_SPOOLED_MESSAGES = 50
+
+
+  # How long, in seconds, we wait at exit for unsent messages before spooling
+  # them.
+  EXIT_GRACE_PERIOD = 1
+
+
+  # (state, payload, is_verbose) tuples for messages waiting to be sent, and
+  # the thread sending them, if there is one.
+  _pending = []
+  _sender = None
+  _condition = threading.Condition()
+
+
+  # Serializes reads and writes of the spool file.
+  _spool_lock = threading.Lock()
+
+
+  # Whether the spool has been picked up by this process yet.
+  _spool_taken = False
+
+
   @classmethod
   def log(cls, message):
     """Prints the specified message to the user as well as to a file.
@@ -69,11 +110,25 @@ class AppScaleLogger():
       print message
 
 
+  @classmethod
+  def remote_logs_enabled(cls):
+    """Checks if the user has not opted out of remote logging.
+
+    Returns:
+      True if messages should be sent to the remote logs service.
+    """
+    return os.environ.get(cls.OPT_OUT_VAR, '') in ('', '0')
+
+
   @classmethod
   def remote_log_tools_state(cls, options, my_id, state, version):
     """Converts the given debugging information to a message that we can
     remotely log, and then logs it.
 
+    The message is sent from a background thread, so callers never wait on
+    the remote logs service. Messages that can't be sent are spooled to disk
+    and retried the next time a message is sent successfully.
+
     Args:
       options: A Namespace containing the arguments used to invoke an AppScale
         tool.
@@ -86,6 +141,8 @@ class AppScaleLogger():
     """
     # turn namespace into a dict
     params = vars(options)
+    if not cls.remote_logs_enabled():
+      return params
 
     # next, turn it into a string that we can send over the wire
     payload = "?boo=baz&my_id={0}&state={1}&version={2}".format(my_id, state,
@@ -93,14 +150,154 @@ class AppScaleLogger():
     for key, value in params.iteritems():
       payload += "&{0}={1}".format(key, value)
 
-    # http post the result
+    # http post the result in the background
+    with cls._condition:
+      cls._pending.append((state, payload, options.verbose))
+      if cls._sender is None:
+        cls._sender = threading.Thread(target=cls.send_pending)
+        cls._sender.daemon = True
+        cls._sender.start()
+
+    return params
+
+
+  @classmethod
+  def send_payload(cls, payload):
+    """Posts a message to the remote logs service.
+
+    Args:
+      payload: A str, the message to post.
+    Raises:
+      Exception: If the message could not be posted in time.
+    """
+    conn = httplib.HTTPConnection(cls.LOGS_HOST, timeout=cls.LOGS_TIMEOUT)
     try:
-      conn = httplib.HTTPConnection(cls.LOGS_HOST)
       conn.request('POST', '/upload', payload, cls.HEADERS)
-      _ = conn.getresponse()
+      conn.getresponse().read()
+    finally:
       conn.close()
-    except Exception as exception:
-      cls.verbose("Unable to log {0} state: saw exception {1}".format(state,
-        str(exception)), options.verbose)
 
-    return params
+
+  @classmethod
+  def send_pending(cls):
+    """Sends waiting messages in order until there are none left. After the
+    first message gets through, spooled messages from earlier runs are sent
+    too. If any message fails, it and every message after it are spooled.
+    """
+    while True:
+      with cls._condition:
+        if not cls._pending:
+          cls._sender = None
+          cls._condition.notify_all()
+          return
+        message = cls._pending[0]
+
+      state, payload, is_verbose = message
+      try:
+        cls.send_payload(payload)
+      except Exception as exception:
+        cls.verbose("Unable to log {0} state: saw exception {1}".format(state,
+          str(exception)), is_verbose)
+        with cls._condition:
+          unsent, cls._pending = cls._pending, []
+          cls._sender = None
+          cls._condition.notify_all()
+        cls.spool([payload for _, payload, _ in unsent])
+        return
+
+      with cls._condition:
+        # The exit handler may have spooled the message while it was sent.
+        if cls._pending and cls._pending[0] is message:
+          cls._pending.pop(0)
+        cls._condition.notify_all()
+        take_spool = not cls._spool_taken
+        cls._spool_taken = True
+
+      if take_spool:
+        spooled = cls.take_spool()
+        with cls._condition:
+          cls._pending.extend(('spooled', payload, is_verbose)
+                              for payload in spooled)
+
+
+  @classmethod
+  def spool(cls, payloads):
+    """Saves messages that could not be sent, keeping only the newest ones.
+
+    Args:
+      payloads: A list of strs, the messages to save.
+    """
+    if not payloads:
+      return
+
+    with cls._spool_lock:
+      spooled = cls.read_spool() + payloads
+      temp_location = cls.SPOOL_LOCATION + '.tmp'
+      try:
+        handle = os.open(temp_location,
+                         os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0600)
+        with os.fdopen(handle, 'w') as file_handle:
+          json.dump(spooled[-cls.MAX_SPOOLED_MESSAGES:], file_handle)
+        os.rename(temp_location, cls.SPOOL_LOCATION)
+      except (IOError, OSError):
+        # Remote logging is best-effort, so there's nothing else to do.
+        pass
+
+
+  @classmethod
+  def read_spool(cls):
+    """Reads the messages saved by earlier runs.
+
+    Returns:
+      A list of strs, the spooled messages, oldest first.
+    """
+    try:
+      with open(cls.SPOOL_LOCATION) as file_handle:
+        spooled = json.load(file_handle)
+    except (IOError, OSError, ValueError):
+      return []
+
+    if not isinstance(spooled, list):
+      return []
+    return [payload for payload in spooled if isinstance(payload, basestring)]
+
+
+  @classmethod
+  def take_spool(cls):
+    """Reads and removes the messages saved by earlier runs.
+
+    Returns:
+      A list of strs, the spooled messages, oldest first.
+    """
+    with cls._spool_lock:
+      spooled = cls.read_spool()
+      try:
+        os.remove(cls.SPOOL_LOCATION)
+      except OSError:
+        pass
+    return spooled
+
+
+  @classmethod
+  def finish_remote_logs(cls, grace_period=None):
+    """Gives messages that are still waiting a moment to be sent, and spools
+    the ones that aren't. This runs when the tools exit.
+
+    Args:
+      grace_period: An int, how many seconds to wait. Defaults to
+        EXIT_GRACE_PERIOD.
+    """
+    if grace_period is None:
+      grace_period = cls.EXIT_GRACE_PERIOD
+    deadline = time.time() + grace_period
+    with cls._condition:
+      while cls._pending and cls._sender is not None:
+        remaining = deadline - time.time()
+        if remaining <= 0:
+          break
+        cls._condition.wait(remaining)
+      unsent, cls._pending = cls._pending, []
+    cls.spool([payload for _, payload, _ in unsent])
+
+
+atexit.register(AppScaleLogger.finish_remote_logs)
@@ -1,6 +1,7 @@
 from __future__ import absolute_import
 
 from collections import defaultdict
+import time
 
 import requests
 from requests.packages.urllib3.exceptions import InsecureRequestWarning
@@ -9,10 +10,12 @@ from tabulate import tabulate
 from appscale.tools.appcontroller_client import AppControllerClient
 from appscale.tools.appscale_logger import AppScaleLogger
 from appscale.tools.local_state import LocalState
+from appscale.tools.structured_output import RecordWriter
 from appscale.tools.utils import styled
 
 
-# Fields needed for node statistics
+# Fields needed for node statistics. Tables ask only for the parts of these
+# they render, see get_include_lists.
 INCLUDE_NODE_LIST = {
   'node': ['memory', 'loadavg', 'partitions_dict', 'cpu'],
   'node.loadavg': ['last_1min', 'last_5min', 'last_15min'],
@@ -39,13 +42,52 @@ INCLUDE_PROXY_LIST = {
   'proxy.server': ['status']
 }
 
+# Fields only rendered in verbose mode
+VERBOSE_PROCESS_FIELDS = ['monit_name']
+VERBOSE_FRONTEND_FIELDS = ['bin', 'bout', 'scur']
+VERBOSE_BACKEND_FIELDS = ['qtime', 'ttime']
+
+# The fields that identify a record of each section, used to tell which
+# records changed between two rounds of watched statistics
+RECORD_KEYS = {
+  "nodes": ("private_ip",),
+  "processes": ("service",),
+  "process_details": ("private_ip", "monit_name"),
+  "proxies": ("service",),
+  "failures": ("stats_kind", "ip"),
+  "errors": ("message",)
+}
+
 PROCESSES_NAME_COLUMN_NUMBER = 0
 PROCESSES_NAME_COLUMN_VERBOSE_NUMBER = 1
 PROCESSES_MEMORY_COLUMN_NUMBER = 2
 PROCESSES_CPU_COLUMN_NUMBER = 3
 
+# The names of the columns of process statistics rows, used as field names
+# when statistics are written as records
+PROCESS_FIELDS = ["private_ip", "monit_name", "memory_mb", "cpu_percent"]
+SUMMARY_PROCESS_FIELDS = [
+  "service", "instances", "memory_mb", "cpu_percent",
+  "cpu_percent_per_process", "cpu_percent_per_core"
+]
+
+# The session used to talk to Hermes. It is shared so that connections are
+# kept alive between requests, which long-lived processes like appscaled
+# benefit from.
+_session = None
+
+
+def _get_session():
+  """
+  Returns the session used to talk to Hermes, creating it if needed.
+  """
+  global _session
+  if _session is None:
+    _session = requests.Session()
+  return _session
+
 
-def _get_stats(keyname, stats_kind, include_lists):
+def _get_stats(keyname, stats_kind, include_lists, errors=None):
   """
   Returns statistics from Hermes.
 
@@ -53,6 +95,8 @@ def _get_stats(keyname, stats_kind, include_lists):
     keyname: A string representing an identifier from AppScaleFile.
     stats_kind: A string representing a kind of statistics.
     include_lists: A dict representing desired fields.
+    errors: A list to add a message to if the statistics can't be fetched,
+      instead of printing a warning.
 
   Returns:
     A dict of statistics.
@@ -73,7 +117,7 @@ def _get_stats(keyname, stats_kind, include_lists):
 
   try:
     requests.packages.urllib3.disable_warnings(InsecureRequestWarning)
-    resp = requests.get(
+    resp = _get_session().get(
       url=url,
       headers=headers,
       json=data,
@@ -81,34 +125,172 @@ def _get_stats(keyname, stats_kind, include_lists):
     )
     resp.raise_for_status()
   except requests.HTTPError as err:
-    AppScaleLogger.warn(
+    message = (
       "Failed to get {stats_kind} stats ({err})"
       .format(stats_kind=stats_kind, err=err)
     )
+    if errors is None:
+      AppScaleLogger.warn(message)
+    else:
+      errors.append(message)
     return {}, {}
 
   json_body = resp.json()
   return json_body["stats"], json_body["failures"]
 
 
+def get_include_lists(stats_kind, types, verbose, records=False):
+  """
+  Works out the fields Hermes should send for a kind of statistics, so that
+  only the fields behind the rendered columns are fetched.
+
+  Args:
+    stats_kind: A string representing a kind of statistics.
+    types: A list of the kinds of statistics being shown.
+    verbose: A boolean - verbose or not verbose mode.
+    records: A boolean - statistics are written as records rather than
+      rendered as tables, so every field the records have is needed.
+
+  Returns:
+    A dict representing desired fields.
+  """
+  if stats_kind == "nodes":
+    include_lists = {'node': []}
+    if "nodes" in types:
+      include_lists['node'] += ['memory', 'loadavg', 'partitions_dict']
+      include_lists['node.loadavg'] = INCLUDE_NODE_LIST['node.loadavg']
+      include_lists['node.partition'] = INCLUDE_NODE_LIST['node.partition']
+      if not records:
+        include_lists['node.memory'] = ['available', 'total']
+    if "processes" in types or (records and "nodes" in types):
+      # Summary process statistics are divided by the number of cores
+      include_lists['node'].append('cpu')
+      include_lists['node.cpu'] = INCLUDE_NODE_LIST['node.cpu']
+    return include_lists
+
+  if stats_kind == "processes":
+    include_lists = dict(INCLUDE_PROCESS_LIST)
+    if not verbose:
+      # Monit names are only shown in the detailed processes table
+      include_lists['process'] = [
+        field for field in INCLUDE_PROCESS_LIST['process']
+        if field not in VERBOSE_PROCESS_FIELDS
+      ]
+    return include_lists
+
+  include_lists = dict(INCLUDE_PROXY_LIST)
+  if not verbose and not records:
+    include_lists['proxy.frontend'] = [
+      field for field in INCLUDE_PROXY_LIST['proxy.frontend']
+      if field not in VERBOSE_FRONTEND_FIELDS
+    ]
+    include_lists['proxy.backend'] = [
+      field for field in INCLUDE_PROXY_LIST['proxy.backend']
+      if field not in VERBOSE_BACKEND_FIELDS
+    ]
+  return include_lists
+
+
+def fetch_stats(options, stats_kind, errors=None):
+  """
+  Fetches the fields of a kind of statistics that are shown, and keeps only
+  the nodes and applications that were asked for.
+
+  Args:
+    options: A Namespace that has fields for each parameter that can be
+      passed in via the command-line interface.
+    stats_kind: A string representing a kind of statistics.
+    errors: A list to add a message to if the statistics can't be fetched,
+      instead of printing a warning.
+
+  Returns:
+    A dict of statistics.
+    A dict of failures.
+  """
+  raw_stats, failures = _get_stats(
+    keyname=options.keyname,
+    stats_kind=stats_kind,
+    include_lists=get_include_lists(
+      stats_kind=stats_kind,
+      types=options.types,
+      verbose=options.verbose,
+      records=options.format != "text"
+    ),
+    errors=errors
+  )
+  raw_stats = filter_node_stats(raw_stats, options.node_ips)
+  failures = filter_node_stats(failures, options.node_ips)
+  if stats_kind != "nodes":
+    raw_stats = filter_app_stats(
+      raw_stats=raw_stats,
+      stats_key="{}_stats".format(stats_kind),
+      apps=options.apps
+    )
+  return raw_stats, failures
+
+
+def filter_node_stats(raw_stats, node_ips):
+  """
+  Keeps the statistics of the specified nodes.
+
+  Args:
+    raw_stats: A dict in which each key is an ip.
+    node_ips: A list of private ips, or None to keep every node.
+
+  Returns:
+    A dict with the specified nodes only.
+  """
+  if not node_ips:
+    return raw_stats
+  return {ip: stats for ip, stats in raw_stats.iteritems() if ip in node_ips}
+
+
+def filter_app_stats(raw_stats, stats_key, apps):
+  """
+  Keeps the process or proxy statistics of the specified applications.
+
+  Args:
+    raw_stats: A dict in which each key is an ip and value is a dict
+      of useful information.
+    stats_key: A string, either "processes_stats" or "proxies_stats".
+    apps: A list of application ids, or None to keep every service.
+
+  Returns:
+    A dict with statistics of the specified applications only.
+  """
+  if not apps:
+    return raw_stats
+  filtered_stats = {}
+  for ip, node in raw_stats.iteritems():
+    filtered_stats[ip] = dict(node)
+    filtered_stats[ip][stats_key] = [
+      stats for stats in node[stats_key] if stats["application_id"] in apps
+    ]
+  return filtered_stats
+
+
 def show_stats(options):
   """
-  Prints node, process and/or proxy statistics nicely.
+  Prints node, process and/or proxy statistics nicely, or as JSON or NDJSON
+  records when options.format asks for them.
 
   Args:
     options: A Namespace that has fields for each parameter that can be
       passed in via the command-line interface.
   """
+  if options.watch:
+    watch_stats(options)
+    return
+  if options.format != "text":
+    write_stats(options)
+    return
+
   failures = {}
 
   # NODES STATS:
   if "nodes" in options.types:
     # Fetch node stats from Hermes
-    raw_node_stats, node_failures = _get_stats(
-      keyname=options.keyname,
-      stats_kind="nodes",
-      include_lists=INCLUDE_NODE_LIST
-    )
+    raw_node_stats, node_failures = fetch_stats(options, "nodes")
     all_roles = get_roles(keyname=options.keyname)
     # Prepare and print table
     node_headers, node_stats = get_node_stats_rows(
@@ -135,18 +317,10 @@ def show_stats(options):
     order = order_columns_map[options.order_processes]
 
     # Fetch processes stats from Hermes
-    raw_process_stats, process_failures = _get_stats(
-      keyname=options.keyname,
-      stats_kind="processes",
-      include_lists=INCLUDE_PROCESS_LIST
-    )
+    raw_process_stats, process_failures = fetch_stats(options, "processes")
     if "nodes" not in options.types:
       # Fetch node stats from Hermes if it hasn't been fetched yet
-      raw_node_stats, node_failures = _get_stats(
-        keyname=options.keyname,
-        stats_kind="nodes",
-        include_lists=INCLUDE_NODE_LIST
-      )
+      raw_node_stats, node_failures = fetch_stats(options, "nodes")
       if node_failures:
         failures["nodes"] = node_failures
 
@@ -195,11 +369,7 @@ def show_stats(options):
   # PROXIES STATS
   if "proxies" in options.types:
     # Fetch proxies stats
-    raw_proxy_stats, proxy_failures = _get_stats(
-      keyname=options.keyname,
-      stats_kind="proxies",
-      include_lists=INCLUDE_PROXY_LIST
-    )
+    raw_proxy_stats, proxy_failures = fetch_stats(options, "proxies")
     # Prepare proxies stats table
     proxy_headers, proxy_stats = get_proxy_stats_rows(
       raw_proxy_stats=raw_proxy_stats,
@@ -223,6 +393,176 @@ def show_stats(options):
     print_failures(failures=failures)
 
 
+def write_stats(options):
+  """
+  Writes node, process and/or proxy statistics as records for scripts,
+  without rendering or styling any tables. Records are written as soon as
+  each kind of statistics is fetched.
+
+  Args:
+    options: A Namespace that has fields for each parameter that can be
+      passed in via the command-line interface.
+  """
+  writer = RecordWriter(options.format)
+  for kind, records in get_stats_sections(options):
+    writer.write(kind, records)
+  writer.close()
+
+
+def watch_stats(options):
+  """
+  Writes node, process and/or proxy statistics as NDJSON records every
+  options.watch seconds, until interrupted or until options.count rounds
+  have been written. The first round has every record, and later rounds
+  only have the records that changed since the round before. Each record
+  has the number of the round it was written in as its revision.
+
+  Args:
+    options: A Namespace that has fields for each parameter that can be
+      passed in via the command-line interface.
+  """
+  writer = RecordWriter("ndjson")
+  previous_sections = {}
+  revision = 0
+  try:
+    while True:
+      revision += 1
+      for kind, records in get_stats_sections(options):
+        records = list(records)
+        changes = get_record_changes(
+          kind=kind,
+          records=records,
+          previous_records=previous_sections.get(kind, [])
+        )
+        writer.write(kind, (dict(record, revision=revision)
+                            for record in changes))
+        previous_sections[kind] = records
+
+      if options.count and revision >= options.count:
+        break
+      time.sleep(options.watch)
+  except KeyboardInterrupt:
+    pass
+  writer.close()
+
+
+def get_stats_sections(options):
+  """
+  Fetches node, process and/or proxy statistics and turns them into
+  sections of records.
+
+  Args:
+    options: A Namespace that has fields for each parameter that can be
+      passed in via the command-line interface.
+
+  Yields:
+    Tuples of a section name and a list of records, as each kind of
+    statistics is fetched. Failures and errors come last.
+  """
+  failures = []
+  errors = []
+
+  if "nodes" in options.types or "processes" in options.types:
+    raw_node_stats, node_failures = fetch_stats(options, "nodes", errors)
+    failures += [("nodes", ip, failure)
+                 for ip, failure in node_failures.iteritems()]
+
+  if "nodes" in options.types:
+    yield "nodes", get_node_stats_records(
+      raw_node_stats=raw_node_stats,
+      all_roles=get_roles(keyname=options.keyname),
+      specified_roles=options.roles
+    )
+
+  if "processes" in options.types:
+    raw_process_stats, process_failures = fetch_stats(
+      options, "processes", errors)
+    failures += [("processes", ip, failure)
+                 for ip, failure in process_failures.iteritems()]
+    reverse = "name" not in options.order_processes
+
+    process_stats = sort_process_stats_rows(
+      process_stats=get_summary_process_stats_rows(
+        raw_process_stats=raw_process_stats,
+        raw_node_stats=raw_node_stats
+      )[1],
+      column={"name": PROCESSES_NAME_COLUMN_NUMBER,
+              "mem": PROCESSES_MEMORY_COLUMN_NUMBER,
+              "cpu": PROCESSES_CPU_COLUMN_NUMBER}[options.order_processes],
+      top=options.top,
+      reverse=reverse
+    )
+    yield "processes", [dict(zip(SUMMARY_PROCESS_FIELDS, row))
+                        for row in process_stats]
+
+    if options.verbose:
+      process_stats = sort_process_stats_rows(
+        process_stats=get_process_stats_rows(
+          raw_process_stats=raw_process_stats
+        )[1],
+        column={"name": PROCESSES_NAME_COLUMN_VERBOSE_NUMBER,
+                "mem": PROCESSES_MEMORY_COLUMN_NUMBER,
+                "cpu": PROCESSES_CPU_COLUMN_NUMBER}[options.order_processes],
+        top=options.top,
+        reverse=reverse
+      )
+      yield "process_details", [dict(zip(PROCESS_FIELDS, row))
+                                for row in process_stats]
+
+  if "proxies" in options.types:
+    raw_proxy_stats, proxy_failures = fetch_stats(options, "proxies", errors)
+    failures += [("proxies", ip, failure)
+                 for ip, failure in proxy_failures.iteritems()]
+    summaries = summarize_proxy_stats(
+      raw_proxy_stats=raw_proxy_stats,
+      apps_filter=options.apps_only
+    )
+    yield "proxies", [dict(summaries[service], service=service)
+                      for service in sorted(summaries)]
+
+  yield "failures", [
+    {"stats_kind": stats_kind, "ip": ip, "failure": failure}
+    for stats_kind, ip, failure in failures
+  ]
+  yield "errors", [{"message": message} for message in errors]
+
+
+def get_record_changes(kind, records, previous_records):
+  """
+  Finds the records of a section that changed since the previous round.
+
+  Args:
+    kind: A string naming the section, like 'nodes'.
+    records: A list of the section's current records.
+    previous_records: A list of the section's records from the previous
+      round, or an empty list if this is the first one.
+
+  Returns:
+    A list of the records that are new or changed, followed by a record
+    for each one that is gone, which only has its identifying fields and
+    "removed" set to True.
+  """
+  key_fields = RECORD_KEYS[kind]
+  get_key = lambda record: tuple(record.get(field) for field in key_fields)
+  previous = {get_key(record): record for record in previous_records}
+  current_keys = set()
+
+  changes = []
+  for record in records:
+    key = get_key(record)
+    current_keys.add(key)
+    if previous.get(key) != record:
+      changes.append(record)
+
+  for key, record in previous.iteritems():
+    if key not in current_keys:
+      removed = {field: record.get(field) for field in key_fields}
+      removed["removed"] = True
+      changes.append(removed)
+
+  return changes
+
+
 def render_loadavg(loadavg):
   """
   Renders loadavg information.
@@ -382,13 +722,8 @@ def get_node_stats_rows(raw_node_stats, all_roles, specified_roles, verbose):
   for ip, node in raw_node_stats.iteritems():
     ip_roles = all_roles.get(ip, ["?"])
 
-    if specified_roles:
-      matches = [
-        role for role in specified_roles
-        if role in ip_roles or ip_roles==["?"]
-      ]
-      if not matches:
-        continue
+    if not has_specified_roles(ip_roles, specified_roles):
+      continue
 
     is_master = ("master" in ip_roles) or ("shadow" in ip_roles)
 
@@ -408,6 +743,57 @@ def get_node_stats_rows(raw_node_stats, all_roles, specified_roles, verbose):
   return node_stats_headers, node_stats
 
 
+def get_node_stats_records(raw_node_stats, all_roles, specified_roles):
+  """
+  Obtains node statistics as they were reported, along with each node's
+  roles, without rendering them.
+
+  Args:
+    raw_node_stats: A dict in which each key is an ip and value is a dict
+      of useful information.
+    all_roles: A dict in which each key is an ip and value is a role list.
+    specified_roles: A list representing specified roles
+      that nodes should contain.
+
+  Returns:
+    A list of dicts, one for each node, ordered by ip.
+  """
+  node_stats = []
+  for ip, node in sorted(raw_node_stats.iteritems()):
+    ip_roles = all_roles.get(ip, ["?"])
+    if not has_specified_roles(ip_roles, specified_roles):
+      continue
+
+    node_stats.append({
+      "private_ip": ip,
+      "roles": ip_roles,
+      "memory": node["memory"],
+      "loadavg": node["loadavg"],
+      "partitions": node["partitions_dict"],
+      "cpu": node["cpu"]
+    })
+
+  return node_stats
+
+
+def has_specified_roles(ip_roles, specified_roles):
+  """
+  Checks if a node should be shown for the specified roles.
+
+  Args:
+    ip_roles: A list of the node's roles, or ["?"] if they are unknown.
+    specified_roles: A list representing specified roles
+      that nodes should contain.
+
+  Returns:
+    True if no roles were specified, if the node has one of them,
+    or if the node's roles are unknown.
+  """
+  if not specified_roles:
+    return True
+  return any(role in ip_roles or ip_roles==["?"] for role in specified_roles)
+
+
 def get_process_stats_rows(raw_process_stats):
   """
   Obtains useful information from process statistics and returns:
@@ -541,46 +927,12 @@ def get_proxy_stats_rows(raw_proxy_stats, verbose, apps_filter):
     ]
 
   proxy_stats = []
-  proxy_groups = []
-  unique_proxies = {}
-
-  for node in raw_proxy_stats.itervalues():
-    proxy_groups += node["proxies_stats"]
-
-  for node in proxy_groups:
-    if node["application_id"]:
-      service_name_id = "app ({app_id})".format(app_id=node["application_id"])
-    elif not apps_filter:
-      service_name_id = node["unified_service_name"]
-    else:
-      continue
-
-    if service_name_id not in unique_proxies:
-      summary_proxy = unique_proxies[service_name_id] = defaultdict(int)
-    else:
-      summary_proxy = unique_proxies[service_name_id]
-
-    summary_proxy["servers_count"] = node["servers_count"]
-    summary_proxy["servers_down_count"] = sum(1 for s in node["servers"]
-                                              if s["status"] != "UP")
-    summary_proxy["req_rate"] += node["frontend"]["req_rate"]
-    summary_proxy["req_tot"] += node["frontend"]["req_tot"]
-    summary_proxy["hrsp_5xx"] += node["frontend"]["hrsp_5xx"]
-    summary_proxy["hrsp_4xx"] += node["frontend"]["hrsp_4xx"]
-    summary_proxy["bin"] += node["frontend"]["bin"]
-    summary_proxy["bout"] += node["frontend"]["bout"]
-    summary_proxy["scur"] += node["frontend"]["scur"]
-    summary_proxy["qcur"] += node["backend"]["qcur"]
-
-    if "qtime" in node["backend"]:
-      # HAProxy 1.4 and lower doesn't provide qtime and rtime stats
-      summary_proxy["qtime"] += node["backend"]["qtime"]
-      summary_proxy["ttime"] += node["backend"]["ttime"]
+  unique_proxies = summarize_proxy_stats(raw_proxy_stats, apps_filter)
 
   for key, value in unique_proxies.iteritems():
     servers_down = value["servers_down_count"]
     proxy_row = [
-      key.replace("application", "app", 1),
+      key,
       "{} | {}".format(
         value["servers_count"],
         styled(servers_down, "red", "bold", if_=servers_down)
@@ -605,6 +957,56 @@ def get_proxy_stats_rows(raw_proxy_stats, verbose, apps_filter):
   return headers, proxy_stats
 
 
+def summarize_proxy_stats(raw_proxy_stats, apps_filter):
+  """
+  Sums up the proxy statistics of each service across all load balancers.
+
+  Args:
+    raw_proxy_stats: A dict in which each key is an ip and value is a dict
+      of useful information.
+    apps_filter: A boolean - summarize all services or applications only.
+
+  Returns:
+    A dict in which each key is a service name (with its id) and value is
+    a dict of summed up statistics.
+  """
+  proxy_groups = []
+  unique_proxies = {}
+
+  for node in raw_proxy_stats.itervalues():
+    proxy_groups += node["proxies_stats"]
+
+  for node in proxy_groups:
+    if node["application_id"]:
+      service_name_id = "app ({app_id})".format(app_id=node["application_id"])
+    elif not apps_filter:
+      service_name_id = node["unified_service_name"]
+    else:
+      continue
+
+    if service_name_id not in unique_proxies:
+      summary_proxy = unique_proxies[service_name_id] = defaultdict(int)
+    else:
+      summary_proxy = unique_proxies[service_name_id]
+
+    summary_proxy["servers_count"] = node["servers_count"]
+    summary_proxy["servers_down_count"] = sum(1 for s in node["servers"]
+                                              if s["status"] != "UP")
+    # Fields that aren't rendered aren't fetched, and HAProxy 1.4 and lower
+    # doesn't provide qtime and rtime stats
+    for field in INCLUDE_PROXY_LIST["proxy.frontend"]:
+      if field in node["frontend"]:
+        summary_proxy[field] += node["frontend"][field]
+    for field in INCLUDE_PROXY_LIST["proxy.backend"]:
+      if field in node["backend"]:
+        summary_proxy[field] += node["backend"][field]
+
+  return {
+    key.replace("application", "app", 1): dict(value)
+    for key, value in unique_proxies.iteritems()
+  }
+
+
 def print_table(table_name, headers, data):
   """
   Prints a list of statistics with specified headers.
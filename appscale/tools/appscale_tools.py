@@ -2,25 +2,23 @@
 
 from __future__ import absolute_import
 
-import Queue
 import datetime
 import getpass
 import json
 import os
+import pipes
 import re
 import shutil
 import socket
 import sys
-import threading
 import time
-import traceback
 import urllib2
 import uuid
+from urllib2 import URLError
 from collections import Counter
 from itertools import chain
 
 import yaml
-from SOAPpy import faultType
 from tabulate import tabulate
 
 from appscale.tools import utils
@@ -28,35 +26,35 @@ from appscale.tools.admin_api.client import (AdminClient, DEFAULT_SERVICE,
                                              DEFAULT_VERSION)
 from appscale.tools.admin_api.version import Version
 from appscale.tools.agents.factory import InfrastructureAgentFactory
+from appscale.tools.app_files import UploadFilter
+from appscale.tools.app_files import collect_app_files
+from appscale.tools.app_files import size_by_top_level_dir
 from appscale.tools.appcontroller_client import AppControllerClient
 from appscale.tools.appengine_helper import AppEngineHelper
 from appscale.tools.appscale_logger import AppScaleLogger
+from appscale.tools.archive_index import ArchiveIndex
 from appscale.tools.cluster_stats import NodeStats, ServiceInfo
 from appscale.tools.custom_exceptions import (
   AppControllerException, AppEngineConfigException, AppScaleException,
-  BadConfigurationException, ShellException)
+  BadConfigurationException, ShellException, TimeoutException)
 from appscale.tools.local_state import APPSCALE_VERSION, LocalState
+from appscale.tools.metadata_cache import MetadataCache
 from appscale.tools.node_layout import NodeLayout
+from appscale.tools.parallel import run_in_parallel
+from appscale.tools.placement import PlacementPlanner
+from appscale.tools.preflight import Preflight
 from appscale.tools.remote_helper import RemoteHelper
+from appscale.tools.remote_ops import Limit
+from appscale.tools.remote_ops import RemoteEngine
+from appscale.tools.remote_streams import RemoteStream
+from appscale.tools.remote_streams import StreamMultiplexer
+from appscale.tools.structured_output import RecordWriter
+from appscale.tools.tracing import traced
+from appscale.tools.upgrade_progress import UpgradeProgress
+from appscale.tools.version_helper import PYPI_JSON_URL
 from appscale.tools.version_helper import latest_tools_version
 
 
-def async_layout_upgrade(ip, keyname, script, error_bucket, verbose=False):
-  """ Run a command over SSH and place exceptions in a bucket.
-
-  Args:
-    ip: A string containing and IP address.
-    keyname: A string containing the deployment keyname.
-    script: A string to run as a command over SSH.
-    error_bucket: A thread-safe queue.
-    verbose: A boolean indicating whether or not to log verbosely.
-  """
-  try:
-    RemoteHelper.ssh(ip, keyname, script, verbose)
-  except ShellException as ssh_error:
-    error_bucket.put(ssh_error)
-
-
 MIN_FREE_DISK_DB = 40.0
 MIN_FREE_DISK = 10.0
 MIN_AVAILABLE_MEMORY = 7.0
@@ -89,10 +87,10 @@ class AppScaleTools(object):
   MAX_OPERATION_TIME = 200
 
 
-  # The location of the expect script, used to interact with ssh-copy-id
-  EXPECT_SCRIPT = os.path.join(
-    os.path.dirname(sys.modules['appscale.tools'].__file__),
-    'templates/sshcopyid')
+  # The most machines that add_keypair sets up at once, and how long each one
+  # may take, in seconds.
+  MAX_PARALLEL_KEY_COPIES = 20
+  KEY_COPY_TIMEOUT = 2 * 60
 
 
   # A regular expression that matches files compressed in the tar.gz format.
@@ -108,6 +106,11 @@ class AppScaleTools(object):
   ADMIN_CAPABILITIES = "upload_app"
 
 
+  # The key in an add_instances layout whose machines get their roles chosen
+  # by the placement planner.
+  AUTO_PLACEMENT_KEY = 'auto'
+
+
   # AppScale repository location on an AppScale image.
   APPSCALE_REPO = "~/appscale"
 
@@ -117,6 +120,40 @@ class AppScaleTools(object):
     format(APPSCALE_REPO)
 
 
+  # Where the code for a new AppScale version is checked out while the
+  # deployment keeps running, and where the replaced code is kept afterwards.
+  STAGED_REPO = APPSCALE_REPO + "-{version}"
+  PREVIOUS_REPO = APPSCALE_REPO + "-previous"
+
+
+  # Checks out the new version next to the running code, unless an earlier
+  # attempt already did. The marker file is written once the clone completes.
+  STAGE_UPGRADE_CMD = (
+    'if [ ! -f {staged}.staged ]; then '
+    'rm -rf {staged} && '
+    'git clone --quiet --depth 1 --branch {version} '
+    '"$(cd {repo} && git config --get remote.origin.url)" {staged} && '
+    'touch {staged}.staged; fi')
+
+
+  # Swaps the staged code into place (if that hasn't happened yet) and builds
+  # it. This is the only part of a code upgrade that needs AppScale stopped.
+  SWAP_AND_BOOTSTRAP_CMD = (
+    'if [ -f {staged}.staged ]; then '
+    'rm -rf {previous} && mv {repo} {previous} && mv {staged} {repo} && '
+    'rm {staged}.staged; fi && {bootstrap}')
+
+
+  # The most nodes that are staged or upgraded at once.
+  MAX_PARALLEL_UPGRADES = 10
+
+
+  # The longest we'll wait for a node to check out the new version, and to
+  # build it, in seconds.
+  STAGE_TIMEOUT = 30 * 60
+  BOOTSTRAP_TIMEOUT = 2 * 60 * 60
+
+
   # Command to run the upgrade script from /appscale/scripts directory.
   UPGRADE_SCRIPT = "python " + APPSCALE_REPO + "/scripts/upgrade.py"
 
@@ -128,7 +165,32 @@ class AppScaleTools(object):
   # Location of the upgrade status file on the remote machine.
   UPGRADE_STATUS_FILE_LOC = '/var/log/appscale/upgrade-status-'
 
+  # The log paths that we collect logs from and search through. 'local' names
+  # the subdirectory that gathered logs are copied into.
+  LOG_PATHS = [
+    {'remote': '/opt/cassandra/cassandra/logs/*', 'local': 'cassandra'},
+    {'remote': '/var/log/appscale'},
+    {'remote': '/var/log/haproxy.log*'},
+    {'remote': '/var/log/kern.log*'},
+    {'remote': '/var/log/monit.log*'},
+    {'remote': '/var/log/nginx'},
+    {'remote': '/var/log/rabbitmq/*', 'local': 'rabbitmq'},
+    {'remote': '/var/log/syslog*'},
+    {'remote': '/var/log/zookeeper'}
+  ]
+
+  # An awk filter applied to 'file:line' search results that drops lines whose
+  # leading ISO-8601 timestamp falls outside of [since, until]. Lines without
+  # a leading timestamp can't be placed in time, so they are kept.
+  LOG_TIME_FILTER = "awk -v since={since} -v until={until} '{{ " \
+    "line = substr($0, index($0, \":\") + 1); stamp = substr(line, 1, 19); " \
+    "if (stamp ~ /^[0-9][0-9][0-9][0-9]-[0-9][0-9]-[0-9][0-9][ T]" \
+    "[0-9][0-9]:[0-9][0-9]:[0-9][0-9]$/) {{ sub(\"T\", \" \", stamp); " \
+    "if (since != \"\" && stamp < since) next; " \
+    "if (until != \"\" && stamp > until) next }} print; fflush() }}'"
+
   @classmethod
+  @traced('tools.add_instances')
   def add_instances(cls, options):
     """Adds additional machines to an AppScale deployment.
 
@@ -140,6 +202,10 @@ class AppScaleTools(object):
       raise BadConfigurationException("Cannot add master nodes to an " + \
         "already running AppScale deployment.")
 
+    # Machines listed under 'auto' get roles picked for them.
+    if cls.AUTO_PLACEMENT_KEY in options.ips:
+      options.ips = cls.place_added_nodes(options.ips, options.keyname)
+
     # In virtualized cluster deployments, we need to make sure that the user
     # has already set up SSH keys.
     if LocalState.get_infrastructure_option(keyname=options.keyname,
@@ -166,18 +232,63 @@ class AppScaleTools(object):
 
 
   @classmethod
+  def place_added_nodes(cls, ips, keyname):
+    """ Chooses roles for the machines that add_instances should place.
+
+    Args:
+      ips: A dict mapping roles to the IP (or list of IPs) that should run
+        them. Machines under AUTO_PLACEMENT_KEY have their roles planned.
+      keyname: A str, the name of the deployment's SSH keypair.
+    Returns:
+      A dict mapping roles to lists of IPs, with the planned roles merged in.
+    """
+    hosts = ips[cls.AUTO_PLACEMENT_KEY]
+    if not isinstance(hosts, list):
+      hosts = [hosts]
+
+    existing_nodes = LocalState.get_local_nodes_info(keyname)
+    instance_types = Counter(node.get('instance_type')
+                             for node in existing_nodes
+                             if node.get('instance_type'))
+    instance_type = None
+    if instance_types:
+      instance_type = instance_types.most_common(1)[0][0]
+
+    placement = PlacementPlanner(instance_type).plan_additions(
+      existing_nodes, hosts)
+    for line in placement.explain():
+      AppScaleLogger.log(line)
+
+    roles_to_ips = {}
+    for role, role_ips in ips.items():
+      if role == cls.AUTO_PLACEMENT_KEY:
+        continue
+      roles_to_ips[role] = role_ips if isinstance(role_ips, list) \
+        else [role_ips]
+    for node in placement.nodes:
+      for role in node.roles:
+        roles_to_ips.setdefault(role, []).append(node.name)
+    return roles_to_ips
+
+  @classmethod
+  @traced('tools.add_keypair')
   def add_keypair(cls, options):
     """Sets up passwordless SSH login to the machines used in a virtualized
     cluster deployment.
 
+    With --auto, machines are set up in parallel with the given root password.
+    Otherwise, ssh-copy-id asks for each machine's password in turn. Either
+    way, every machine is tried before any failures are reported.
+
     Args:
       options: A Namespace that has fields for each parameter that can be
         passed in via the command-line interface.
     Raises:
       AppScaleException: If any of the machines named in the ips_layout are
-        not running, or do not have the SSH daemon running.
+        not running, do not have the SSH daemon running, or would not accept
+        our key.
     """
-    LocalState.require_ssh_commands(options.auto, options.verbose)
+    LocalState.require_ssh_commands(not options.auto, options.verbose)
     LocalState.make_appscale_directory()
 
     path = LocalState.LOCAL_APPSCALE_PATH + options.keyname
@@ -198,38 +309,74 @@ class AppScaleTools(object):
         password = getpass.getpass()
 
     node_layout = NodeLayout(options)
-
     all_ips = [node.public_ip for node in node_layout.nodes]
-    for ip in all_ips:
-      # first, make sure ssh is actually running on the host machine
-      if not RemoteHelper.is_port_open(ip, RemoteHelper.SSH_PORT,
-        options.verbose):
-        raise AppScaleException("SSH does not appear to be running at {0}. " \
-          "Is the machine at {0} up and running? Make sure your IPs are " \
-          "correct!".format(ip))
-
-      # next, set up passwordless ssh
-      AppScaleLogger.log("Executing ssh-copy-id for host: {0}".format(ip))
-      if options.auto:
-        LocalState.shell("{0} root@{1} {2} {3}".format(cls.EXPECT_SCRIPT, ip,
-          private_key, password), options.verbose)
+    failures = []
+
+    # First, make sure ssh is actually running on each host machine.
+    results = run_in_parallel(
+      lambda ip: RemoteHelper.is_port_open(ip, RemoteHelper.SSH_PORT,
+                                           options.verbose),
+      all_ips, max_workers=cls.MAX_PARALLEL_KEY_COPIES,
+      timeout=cls.KEY_COPY_TIMEOUT)
+    reachable = []
+    for result in results:
+      if result.succeeded and result.value:
+        reachable.append(result.item)
       else:
-        LocalState.shell("ssh-copy-id -i {0} root@{1}".format(private_key, ip),
-          options.verbose)
+        failures.append((result.item, 'SSH does not appear to be running'))
+
+    # Next, set up passwordless ssh.
+    if options.auto:
+      AppScaleLogger.log("Copying the SSH key to {0} machine(s)".format(
+        len(reachable)))
+      askpass = RemoteHelper.create_askpass_script()
+      try:
+        results = run_in_parallel(
+          lambda ip: RemoteHelper.authorize_key(ip, private_key + '.pub',
+                                                password, askpass,
+                                                options.verbose),
+          reachable, max_workers=cls.MAX_PARALLEL_KEY_COPIES,
+          timeout=cls.KEY_COPY_TIMEOUT)
+      finally:
+        os.remove(askpass)
+      failures.extend((result.item, result.describe_failure())
+                      for result in results if not result.succeeded)
+    else:
+      # ssh-copy-id asks for each machine's password on the terminal, so
+      # machines are set up one at a time.
+      for ip in reachable:
+        AppScaleLogger.log("Executing ssh-copy-id for host: {0}".format(ip))
+        try:
+          LocalState.shell("ssh-copy-id -i {0} root@{1}".format(
+            private_key, ip), options.verbose)
+        except ShellException as error:
+          failures.append((ip, str(error)))
+
+    if failures:
+      raise AppScaleException(
+        "Unable to set up passwordless SSH on {0} of {1} machine(s). Are "
+        "they up and running, and are your IPs correct?\n{2}".format(
+          len(failures), len(all_ips),
+          tabulate(failures, headers=['MACHINE', 'PROBLEM'],
+                   tablefmt='plain')))
 
     AppScaleLogger.success("Generated a new SSH key for this deployment " + \
       "at {0}".format(private_key))
 
 
   @classmethod
+  @traced('tools.print_cluster_status')
   def print_cluster_status(cls, options):
     """
-    Gets cluster stats and prints it nicely.
+    Gets cluster stats and prints it nicely, or as JSON or NDJSON records
+    when options.format asks for them.
 
     Args:
       options: A Namespace that has fields for each parameter that can be
         passed in via the command-line interface.
     """
+    from SOAPpy import faultType
+
     try:
       login_host = LocalState.get_login_host(options.keyname)
       login_acc = AppControllerClient(login_host,
@@ -237,19 +384,17 @@ class AppScaleTools(object):
       all_private_ips = login_acc.get_all_private_ips()
       cluster_stats = login_acc.get_cluster_stats()
     except (faultType, AppControllerException, BadConfigurationException):
-      AppScaleLogger.warn("AppScale deployment is probably down")
+      if options.format == 'text':
+        AppScaleLogger.warn("AppScale deployment is probably down")
       raise
 
-    # Convert cluster stats to useful structures
-    node_stats = {
-      ip: next((n for n in cluster_stats if n["private_ip"] == ip), None)
-      for ip in all_private_ips
-    }
-    apps_dict = next((n["apps"] for n in cluster_stats if n["apps"]), {})
-    services = [ServiceInfo(key.split('_')[0], key.split('_')[1], app_info)
-                for key, app_info in apps_dict.iteritems()]
-    nodes = [NodeStats(ip, node) for ip, node in node_stats.iteritems() if node]
-    invisible_nodes = [ip for ip, node in node_stats.iteritems() if not node]
+    nodes, invisible_nodes, services = cls.parse_cluster_stats(
+      all_private_ips, cluster_stats)
+
+    if options.format != 'text':
+      cls._write_cluster_status(options.format, login_host, nodes,
+                                invisible_nodes, services)
+      return
 
     if options.verbose:
       AppScaleLogger.log("-"*76)
@@ -277,6 +422,66 @@ class AppScaleTools(object):
         .format(login_host, RemoteHelper.APP_DASHBOARD_PORT)
       )
 
+  @classmethod
+  def parse_cluster_stats(cls, all_private_ips, cluster_stats):
+    """ Converts the AppController's cluster stats to useful structures.
+
+    Args:
+      all_private_ips: A list of private IPs of every node in the deployment.
+      cluster_stats: A list of dicts returned by get_cluster_stats.
+    Returns:
+      A tuple of a list of NodeStats, a list of IPs of nodes which didn't
+      report their stats, and a list of ServiceInfo objects.
+    """
+    node_stats = {
+      ip: next((n for n in cluster_stats if n["private_ip"] == ip), None)
+      for ip in all_private_ips
+    }
+    apps_dict = next((n["apps"] for n in cluster_stats if n["apps"]), {})
+    services = [ServiceInfo(key.split('_')[0], key.split('_')[1], app_info)
+                for key, app_info in apps_dict.iteritems()]
+    nodes = [NodeStats(ip, node) for ip, node in node_stats.iteritems() if node]
+    invisible_nodes = [ip for ip, node in node_stats.iteritems() if not node]
+    return nodes, invisible_nodes, services
+
+  @classmethod
+  def _write_cluster_status(cls, output_format, login_host, nodes,
+                            invisible_nodes, services):
+    """ Writes the deployment's state as records for scripts, without
+    rendering any tables.
+
+    Args:
+      output_format: A str, 'json' or 'ndjson'.
+      login_host: A str, the public IP of the login node.
+      nodes: a list of NodeStats
+      invisible_nodes: IPs of nodes which didn't report its status yet
+      services: a list of ServiceInfo objects
+    """
+    writer = RecordWriter(output_format)
+    writer.write('summary', [{
+      'nodes': len(nodes) + len(invisible_nodes),
+      'reported_nodes': len(nodes),
+      'initialized_nodes': sum(1 for node in nodes if node.is_initialized),
+      'loaded_nodes': sum(1 for node in nodes if node.is_loaded),
+      'services': len(services),
+      'started_services': sum(1 for service in services
+                              if service.appservers > 0),
+      'dashboard_url': 'http://{}:{}/status'.format(
+        login_host, RemoteHelper.APP_DASHBOARD_PORT)
+    }])
+    writer.write('nodes', (node.to_dict() for node in nodes))
+    writer.write('unreported_nodes',
+                 ({'private_ip': ip} for ip in invisible_nodes))
+    writer.write('services', (
+      dict(service.to_dict(),
+           state="Ready" if service.appservers > 0 else "Starting")
+      for service in services))
+    writer.write('alerts', (
+      {'public_ip': node.public_ip, 'private_ip': node.private_ip,
+       'message': message}
+      for node, message in cls.get_status_alerts(nodes)))
+    writer.close()
+
   @classmethod
   def _print_nodes_info(cls, nodes, invisible_nodes):
     """ Prints table with details about cluster nodes
@@ -388,6 +593,23 @@ class AppScaleTools(object):
     Args:
       nodes: a list of NodeStats
     """
+    hardware_alerts = cls.get_status_alerts(nodes)
+    if hardware_alerts:
+      AppScaleLogger.warn("\nSome nodes are in alarm state:")
+      header = ("PUBLIC IP", "PRIVATE IP", "ALERT MESSAGE")
+      table = ((n.public_ip, n.private_ip, msg) for n, msg in hardware_alerts)
+      AppScaleLogger.warn(tabulate(table, headers=header, tablefmt="plain"))
+
+  @classmethod
+  def get_status_alerts(cls, nodes):
+    """ Detects if there are hardware issues in the cluster.
+
+    Args:
+      nodes: a list of NodeStats
+    Returns:
+      A list of (NodeStats, str) tuples, each holding a node and a message
+      describing one of its problems.
+    """
     hardware_alerts = []
     for node in nodes:
       # Check disk space
@@ -422,14 +644,11 @@ class AppScaleTools(object):
                        node.loadavg.last_15_min))
         hardware_alerts.append((node, msg))
 
-    if hardware_alerts:
-      AppScaleLogger.warn("\nSome nodes are in alarm state:")
-      header = ("PUBLIC IP", "PRIVATE IP", "ALERT MESSAGE")
-      table = ((n.public_ip, n.private_ip, msg) for n, msg in hardware_alerts)
-      AppScaleLogger.warn(tabulate(table, headers=header, tablefmt="plain"))
+    return hardware_alerts
 
 
   @classmethod
+  @traced('tools.gather_logs')
   def gather_logs(cls, options):
     """Collects logs from each machine in the currently running AppScale
     deployment.
@@ -475,19 +694,6 @@ class AppScaleTools(object):
     private_ips_dir = os.path.join(location, 'symlinks', 'private-ips')
     utils.mkdir(private_ips_dir)
 
-    # The log paths that we collect logs from.
-    log_paths = [
-      {'remote': '/opt/cassandra/cassandra/logs/*', 'local': 'cassandra'},
-      {'remote': '/var/log/appscale'},
-      {'remote': '/var/log/haproxy.log*'},
-      {'remote': '/var/log/kern.log*'},
-      {'remote': '/var/log/monit.log*'},
-      {'remote': '/var/log/nginx'},
-      {'remote': '/var/log/rabbitmq/*', 'local': 'rabbitmq'},
-      {'remote': '/var/log/syslog*'},
-      {'remote': '/var/log/zookeeper'}
-    ]
-
     failures = False
     for public_ip in all_ips:
       # Get the logs from each node, and store them in our local directory
@@ -505,7 +711,7 @@ class AppScaleTools(object):
           utils.mkdir(role_dir)
           os.symlink(local_link, os.path.join(role_dir, public_ip))
 
-      for log_path in log_paths:
+      for log_path in cls.LOG_PATHS:
         sub_dir = local_dir
 
         if 'local' in log_path:
@@ -534,6 +740,184 @@ class AppScaleTools(object):
 
 
   @classmethod
+  @traced('tools.search_logs')
+  def search_logs(cls, options):
+    """Searches the logs on each machine in the currently running AppScale
+    deployment in parallel, printing matching lines as they are found.
+
+    The search runs on the machines themselves (including rotated and
+    gzipped logs), so only the matching lines are sent back.
+
+    Args:
+      options: A Namespace that has fields for each parameter that can be
+        passed in via the command-line interface.
+    Raises:
+      AppScaleException: If no machine runs any of the requested roles.
+    """
+    nodes = LocalState.get_local_nodes_info(options.keyname)
+    if options.roles:
+      nodes = [node for node in nodes
+               if set(options.roles).intersection(node['jobs'])]
+    if not nodes:
+      raise AppScaleException("No machines in the currently running " \
+        "AppScale deployment have the roles {0}.".format(options.roles))
+
+    command = cls.get_log_search_command(options.pattern, options.since,
+                                         options.until)
+    AppScaleLogger.verbose("Searching logs with: {0}".format(command),
+                           options.verbose)
+    streams = [RemoteStream(node['public_ip'], options.keyname, command)
+               for node in nodes]
+    StreamMultiplexer(streams).run()
+
+    # ssh exits with 255 when it can't reach a machine.
+    unreachable = [stream.host for stream in streams
+                   if stream.returncode == 255]
+    if unreachable:
+      AppScaleLogger.warn("Unable to search logs on {0}.".format(
+        ', '.join(unreachable)))
+
+
+  @classmethod
+  def get_log_search_command(cls, pattern, since=None, until=None):
+    """Constructs the command that searches the logs on a single machine.
+
+    Args:
+      pattern: A str, the extended regular expression to search for.
+      since: A str of the form 'YYYY-MM-DD HH:MM:SS'. If given, files last
+        modified before this time are skipped, as are lines stamped earlier.
+      until: A str of the form 'YYYY-MM-DD HH:MM:SS'. If given, lines stamped
+        after this time are skipped.
+    Returns:
+      A str containing the shell command to run on the machine. It prints
+      each match as 'file:line'.
+    """
+    paths = ' '.join(log_path['remote'] for log_path in cls.LOG_PATHS)
+    newer = ''
+    if since:
+      newer = ' -newermt {0}'.format(pipes.quote(since))
+    grep_flags = '-H -I -E -e {0}'.format(pipes.quote(pattern))
+
+    find = 'find {0} -type f{{0}}{1} -print0 2>/dev/null'.format(paths, newer)
+    command = '{{ {0} | xargs -0 -r grep {1}; {2} | xargs -0 -r zgrep {1}; }}'\
+      .format(find.format(" ! -name '*.gz'"), grep_flags,
+              find.format(" -name '*.gz'"))
+
+    if since or until:
+      command += ' | ' + cls.LOG_TIME_FILTER.format(
+        since=pipes.quote(since or ''), until=pipes.quote(until or ''))
+    return command
+
+
+  @classmethod
+  @traced('tools.exec_command')
+  def exec_command(cls, options):
+    """Runs a command on the machines in the currently running AppScale
+    deployment that have the given roles (or on every machine) in parallel,
+    and prints what they printed. Machines that printed the same thing and
+    exited the same way are shown together.
+
+    Args:
+      options: A Namespace that has fields for each parameter that can be
+        passed in via the command-line interface.
+    Returns:
+      An int, 0 if the command succeeded on every machine and 1 otherwise.
+    Raises:
+      AppScaleException: If no machine runs any of the requested roles.
+    """
+    nodes = LocalState.get_local_nodes_info(options.keyname)
+    if not options.all:
+      nodes = [node for node in nodes
+               if set(options.roles).intersection(node['jobs'])]
+    if not nodes:
+      raise AppScaleException("No machines in the currently running " \
+        "AppScale deployment have the roles {0}.".format(options.roles))
+
+    # Commands may not be safe to run twice, so they aren't retried.
+    engine = RemoteEngine()
+    limit = Limit(options.max_parallel)
+    operations = [engine.submit(RemoteHelper.ssh_operation(
+      node['public_ip'], options.keyname, options.remote_command,
+      options.verbose, num_retries=1, timeout=options.timeout, limit=limit))
+      for node in nodes]
+    try:
+      engine.wait()
+    except KeyboardInterrupt:
+      # The commands run in their own sessions, so Ctrl-C doesn't reach them.
+      engine.cancel_all()
+      raise
+
+    results = []
+    groups = []
+    group_indexes = {}
+    for node, operation in zip(nodes, operations):
+      timed_out = isinstance(operation.error, TimeoutException)
+      output = operation.get_output()
+      if operation.returncode is None and not timed_out:
+        output = str(operation.error)
+      key = (output, operation.returncode, timed_out)
+      if key not in group_indexes:
+        group_indexes[key] = len(groups)
+        groups.append({'hosts': [], 'exit_code': operation.returncode,
+                       'timed_out': timed_out, 'output': output})
+      groups[group_indexes[key]]['hosts'].append(node['public_ip'])
+      results.append({'host': node['public_ip'],
+                      'roles': node['jobs'],
+                      'exit_code': operation.returncode,
+                      'timed_out': timed_out,
+                      'duration': round(operation.duration or 0, 3),
+                      'group': group_indexes[key]})
+
+    failures = len([result for result in results
+                    if result['exit_code'] != 0])
+    if options.format == 'json':
+      print json.dumps({'command': options.remote_command,
+                        'results': results, 'groups': groups},
+                       indent=2, sort_keys=True)
+      return 1 if failures else 0
+
+    for group in groups:
+      print "==> {0} ({1}) <==".format(', '.join(group['hosts']),
+        cls.describe_exec_status(group, options.timeout))
+      if group['output']:
+        sys.stdout.write(group['output'])
+        if not group['output'].endswith('\n'):
+          sys.stdout.write('\n')
+      print ""
+
+    statuses = Counter(cls.describe_exec_status(result, options.timeout)
+                       for result in results)
+    print tabulate(sorted(statuses.items()), headers=['STATUS', 'MACHINES'],
+                   tablefmt='plain')
+    if failures:
+      AppScaleLogger.warn("The command failed on {0} of {1} machine(s).".
+                          format(failures, len(results)))
+      return 1
+
+    AppScaleLogger.success("The command succeeded on {0} machine(s).".format(
+      len(results)))
+    return 0
+
+
+  @staticmethod
+  def describe_exec_status(result, timeout):
+    """Describes how a command ended on a machine.
+
+    Args:
+      result: A dict with the command's 'exit_code' and 'timed_out'.
+      timeout: An int, the seconds the command was allowed to run.
+    Returns:
+      A str like 'exit 0' or 'timed out after 300s'.
+    """
+    if result['timed_out']:
+      return 'timed out after {0}s'.format(timeout)
+    if result['exit_code'] is None:
+      return 'failed to run'
+    return 'exit {0}'.format(result['exit_code'])
+
+
+  @classmethod
+  @traced('tools.get_property')
   def get_property(cls, options):
     """Queries AppScale for a list of system properties matching the provided
     regular expression, as well as the values associated with each matching
@@ -554,6 +938,7 @@ class AppScaleTools(object):
 
 
   @classmethod
+  @traced('tools.relocate_app')
   def relocate_app(cls, options):
     """Instructs AppScale to move the named application to a different port.
 
@@ -592,6 +977,7 @@ class AppScaleTools(object):
 
 
   @classmethod
+  @traced('tools.remove_app')
   def remove_app(cls, options):
     """Instructs AppScale to no longer host the named application.
 
@@ -632,6 +1018,7 @@ class AppScaleTools(object):
 
 
   @classmethod
+  @traced('tools.remove_service')
   def remove_service(cls, options):
     """Instructs AppScale to no longer host the named application.
 
@@ -668,6 +1055,7 @@ class AppScaleTools(object):
 
 
   @classmethod
+  @traced('tools.reset_password')
   def reset_password(cls, options):
     """Resets a user's password the currently running AppScale deployment.
 
@@ -692,6 +1080,7 @@ class AppScaleTools(object):
       sys.exit(1)
 
   @classmethod
+  @traced('tools.create_user')
   def create_user(cls, options, is_admin):
     """Create a new user with the parameters given.
 
@@ -722,6 +1111,7 @@ class AppScaleTools(object):
       sys.exit(1)
 
   @classmethod
+  @traced('tools.run_instances')
   def run_instances(cls, options):
     """Starts a new AppScale deployment with the parameters given.
 
@@ -764,9 +1154,13 @@ class AppScaleTools(object):
     AppScaleLogger.verbose("Node Layout: {}".format(node_layout.to_list()),
                            options.verbose)
 
-    # Ensure all nodes are compatible.
-    RemoteHelper.ensure_machine_is_compatible(
-      head_node.public_ip, options.keyname, options.verbose)
+    # Ensure all nodes are compatible. In clouds, only the head node allows
+    # root logins at this point.
+    if options.infrastructure:
+      preflight_hosts = [head_node.public_ip]
+    else:
+      preflight_hosts = cls.get_unique_public_ips(node_layout)
+    Preflight.check_nodes(preflight_hosts, options.keyname, options.verbose)
 
     # Use rsync to move custom code into the deployment.
     if options.rsync_source:
@@ -775,6 +1169,21 @@ class AppScaleTools(object):
       RemoteHelper.rsync_files(head_node.public_ip, options.keyname,
                                options.rsync_source, options.verbose)
 
+      # Have the head node pass the code on to the other machines, instead of
+      # uploading it from here once per machine.
+      relay_nodes = [(head_node.public_ip, head_node.private_ip)]
+      for node in node_layout.nodes:
+        if node.public_ip not in [public_ip for public_ip, _ in relay_nodes]:
+          relay_nodes.append((node.public_ip, node.private_ip))
+      if not options.infrastructure and len(relay_nodes) > 1:
+        RemoteHelper.relay_files(relay_nodes, options.keyname,
+                                 RemoteHelper.APPSCALE_SOURCE_DIR,
+                                 options.verbose, RemoteHelper.RSYNC_EXCLUDES)
+      RemoteHelper.verify_files(preflight_hosts, options.keyname,
+                                options.rsync_source,
+                                RemoteHelper.APPSCALE_SOURCE_DIR,
+                                options.verbose, RemoteHelper.RSYNC_EXCLUDES)
+
     # Start services on head node.
     RemoteHelper.start_head_node(options, my_id, node_layout)
 
@@ -839,6 +1248,7 @@ class AppScaleTools(object):
 
 
   @classmethod
+  @traced('tools.set_property')
   def set_property(cls, options):
     """Instructs AppScale to replace the value it uses for a particular
     AppController instance variable (property) with a new value.
@@ -855,6 +1265,7 @@ class AppScaleTools(object):
 
 
   @classmethod
+  @traced('tools.terminate_instances')
   def terminate_instances(cls, options):
     """Stops all services running in an AppScale deployment, and in cloud
     deployments, also powers off the instances previously spawned.
@@ -922,6 +1333,7 @@ class AppScaleTools(object):
 
 
   @classmethod
+  @traced('tools.upload_app')
   def upload_app(cls, options):
     """Uploads the given App Engine application into AppScale.
 
@@ -930,7 +1342,7 @@ class AppScaleTools(object):
         passed in via the command-line interface.
     Returns:
       A tuple containing the host and port where the application is serving
-        traffic from.
+        traffic from, or None if this was a dry run.
     """
     custom_service_yaml = None
     if cls.TAR_GZ_REGEX.search(options.file):
@@ -977,9 +1389,19 @@ class AppScaleTools(object):
 
     AppEngineHelper.validate_app_id(version.project_id)
 
+    # The same walk decides what is uploaded and which Go files to resolve.
+    upload_filter = UploadFilter.for_app(file_location, custom_service_yaml)
+    app_files = collect_app_files(file_location, upload_filter)
+    if options.dry_run:
+      cls.print_upload_size(app_files, version.project_id)
+      if created_dir:
+        shutil.rmtree(file_location)
+      return None
+
     extras = {}
     if version.runtime == 'go':
-      extras = LocalState.get_extra_go_dependencies(options.file, options.test)
+      extras = LocalState.get_extra_go_dependencies(options.file, options.test,
+                                                    app_files)
 
     if (version.runtime == 'java'
         and AppEngineHelper.is_sdk_mismatch(file_location)):
@@ -992,9 +1414,18 @@ class AppScaleTools(object):
     secret_key = LocalState.get_secret_key(options.keyname)
     admin_client = AdminClient(login_host, secret_key)
 
+    # Tarballs that are already laid out like an app can be sent unchanged
+    # rather than being repacked.
+    upload_archive = None
+    archive_index = ArchiveIndex.cached(options.file)
+    if (archive_index is not None and archive_index.can_upload_as_is() and
+        not extras and version.runtime != 'java' and
+        not upload_filter.has_rules()):
+      upload_archive = options.file
+
     remote_file_path = RemoteHelper.copy_app_to_host(
       file_location, version.project_id, options.keyname, options.verbose,
-      extras, custom_service_yaml)
+      extras, custom_service_yaml, upload_archive, app_files)
 
     AppScaleLogger.log(
       'Deploying service {} for {}'.format(version.service_id,
@@ -1029,6 +1460,42 @@ class AppScaleTools(object):
     return (login_host, http_port)
 
   @classmethod
+  def print_upload_size(cls, app_files, project_id):
+    """ Shows how much each top-level directory adds to an upload.
+
+    Args:
+      app_files: A dict mapping paths in the upload to local paths.
+      project_id: A str, the project the upload is for.
+    """
+    totals = size_by_top_level_dir(app_files)
+    rows = [(name, count, cls.format_size(size))
+            for name, count, size in totals]
+    rows.append(('TOTAL', sum(count for _, count, _ in totals),
+                 cls.format_size(sum(size for _, _, size in totals))))
+    AppScaleLogger.log('Files that would be uploaded for {0} (before '
+                       'compression):\n{1}'.format(
+      project_id, tabulate(rows, headers=['DIRECTORY', 'FILES', 'SIZE'],
+                           tablefmt='plain')))
+
+  @staticmethod
+  def format_size(size):
+    """ Formats a number of bytes for people to read.
+
+    Args:
+      size: An int, a number of bytes.
+    Returns:
+      A str such as '12.5 MB'.
+    """
+    for unit in ['B', 'KB', 'MB', 'GB']:
+      if size < 1024 or unit == 'GB':
+        break
+      size /= 1024.0
+    if unit == 'B':
+      return '{0} B'.format(size)
+    return '{0:.1f} {1}'.format(size, unit)
+
+  @classmethod
+  @traced('tools.update_cron')
   def update_cron(cls, source_location, keyname, project_id):
     """ Updates a project's cron jobs from the configuration file.
 
@@ -1075,6 +1542,7 @@ class AppScaleTools(object):
     admin_client.update_cron(version.project_id, cron_jobs)
 
   @classmethod
+  @traced('tools.update_queues')
   def update_queues(cls, source_location, keyname, project_id):
     """ Updates a project's queues from the configuration file.
 
@@ -1121,6 +1589,7 @@ class AppScaleTools(object):
     admin_client.update_queues(version.project_id, queues)
 
   @classmethod
+  @traced('tools.upgrade')
   def upgrade(cls, options):
     """ Upgrades the deployment to the latest AppScale version.
     Args:
@@ -1129,11 +1598,16 @@ class AppScaleTools(object):
     """
     node_layout = NodeLayout(options)
 
+    # Both lookups are needed, so stale ones are refreshed at the same time.
+    cache = MetadataCache(LocalState.get_metadata_cache_location(),
+                          offline=options.offline)
+    cache.get_many([PYPI_JSON_URL, cls.get_tags_url()])
+
     latest_tools = APPSCALE_VERSION
     try:
       AppScaleLogger.log(
         'Checking if an update is available for appscale-tools')
-      latest_tools = latest_tools_version()
+      latest_tools = latest_tools_version(cache)
     except (URLError, ValueError):
       # Prompt the user if version metadata can't be fetched.
       if not options.test:
@@ -1150,7 +1624,7 @@ class AppScaleTools(object):
         format(latest_tools))
 
     master_ip = node_layout.head_node().public_ip
-    upgrade_version_available = cls.get_upgrade_version_available()
+    upgrade_version_available = cls.get_upgrade_version_available(cache)
 
     current_version = RemoteHelper.get_host_appscale_version(
       master_ip, options.keyname, options.verbose)
@@ -1167,10 +1641,17 @@ class AppScaleTools(object):
       cls.run_upgrade_script(options, node_layout)
       return
 
+    # Fetch the new code while the deployment is still serving, so that the
+    # outage only covers swapping it in and building it.
+    progress = UpgradeProgress.load(
+      LocalState.get_upgrade_progress_location(options.keyname),
+      upgrade_version_available)
+    cls.stage_upgrade(options, node_layout, progress)
     cls.shut_down_appscale_if_running(options)
-    cls.upgrade_appscale(options, node_layout)
+    cls.upgrade_appscale(options, node_layout, progress)
 
   @classmethod
+  @traced('tools.run_upgrade_script')
   def run_upgrade_script(cls, options, node_layout):
     """ Runs the upgrade script which checks for any upgrades needed to be performed.
       Args:
@@ -1202,47 +1683,51 @@ class AppScaleTools(object):
     master_public_ip = node_layout.head_node().public_ip
 
     AppScaleLogger.log("Running upgrade script to check if any other upgrade is needed.")
-    # Run the upgrade command as a background process.
-    error_bucket = Queue.Queue()
-    threading.Thread(
-      target=async_layout_upgrade,
-      args=(master_public_ip, options.keyname, upgrade_script_command,
-            error_bucket, options.verbose)
-    ).start()
-
-    last_message = None
-    while True:
-      # Check if the SSH thread has crashed.
-      try:
-        ssh_error = error_bucket.get(block=False)
-        AppScaleLogger.warn('Error executing upgrade script')
-        LocalState.generate_crash_log(ssh_error, traceback.format_exc())
-      except Queue.Empty:
-        pass
-
-      upgrade_status_file = cls.UPGRADE_STATUS_FILE_LOC + timestamp + ".json"
-      command = 'cat' + " " + upgrade_status_file
-      upgrade_status = RemoteHelper.ssh(
-        master_public_ip, options.keyname, command, options.verbose)
-      json_status = json.loads(upgrade_status)
-
-      if 'status' not in json_status or 'message' not in json_status:
-        raise AppScaleException('Invalid status log format')
-
-      if json_status['status'] == 'complete':
-        AppScaleLogger.success(json_status['message'])
-        break
+    # Run the upgrade command in the background, checking on its progress
+    # from the same engine.
+    engine = RemoteEngine()
+    upgrade = engine.submit(RemoteHelper.ssh_operation(
+      master_public_ip, options.keyname, upgrade_script_command,
+      options.verbose))
+    reported_error = False
 
-      if json_status['status'] == 'inProgress':
-        if json_status['message'] != last_message:
-          AppScaleLogger.log(json_status['message'])
-          last_message = json_status['message']
-        time.sleep(cls.SLEEP_TIME)
-        continue
+    try:
+      last_message = None
+      while True:
+        # Check if the upgrade script has crashed.
+        if upgrade.done() and upgrade.error is not None and not reported_error:
+          AppScaleLogger.warn('Error executing upgrade script')
+          LocalState.generate_crash_log(upgrade.error, str(upgrade.error))
+          reported_error = True
+
+        upgrade_status_file = cls.UPGRADE_STATUS_FILE_LOC + timestamp + ".json"
+        command = 'cat' + " " + upgrade_status_file
+        upgrade_status = engine.run_one(RemoteHelper.ssh_operation(
+          master_public_ip, options.keyname, command, options.verbose))
+        json_status = json.loads(upgrade_status)
+
+        if 'status' not in json_status or 'message' not in json_status:
+          raise AppScaleException('Invalid status log format')
+
+        if json_status['status'] == 'complete':
+          AppScaleLogger.success(json_status['message'])
+          engine.wait([upgrade])
+          break
 
-      # Assume the message is an error.
-      AppScaleLogger.warn(json_status['message'])
-      raise AppScaleException(json_status['message'])
+        if json_status['status'] == 'inProgress':
+          if json_status['message'] != last_message:
+            AppScaleLogger.log(json_status['message'])
+            last_message = json_status['message']
+          engine.sleep(cls.SLEEP_TIME)
+          continue
+
+        # Assume the message is an error.
+        AppScaleLogger.warn(json_status['message'])
+        raise AppScaleException(json_status['message'])
+    except KeyboardInterrupt:
+      # The upgrade runs in its own session, so Ctrl-C doesn't reach it.
+      engine.cancel_all()
+      raise
 
   @classmethod
   def shut_down_appscale_if_running(cls, options):
@@ -1276,50 +1761,153 @@ class AppScaleTools(object):
         raise AppScaleException("Cancelled AppScale upgrade.")
 
   @classmethod
-  def upgrade_appscale(cls, options, node_layout):
-    """ Runs the bootstrap script on each of the remote machines.
+  @traced('tools.stage_upgrade')
+  def stage_upgrade(cls, options, node_layout, progress):
+    """ Checks out the new AppScale version next to the running code on each
+    machine, without interrupting the deployment.
+
       Args:
         options: A Namespace that has fields for each parameter that can be
           passed in via the command-line interface.
         node_layout: A NodeLayout object for the deployment.
+        progress: An UpgradeProgress for the version being upgraded to.
+      Raises:
+        AppScaleException: If any machine could not stage the new version.
     """
-    unique_ips = [node.public_ip for node in node_layout.nodes]
+    all_ips = cls.get_unique_public_ips(node_layout)
+    ips = [ip for ip in all_ips
+           if not progress.has_finished(ip, UpgradeProgress.STAGED)]
+    if not ips:
+      AppScaleLogger.log('AppScale {} is already staged on all machines.'.
+                         format(progress.version))
+      return
 
-    AppScaleLogger.log("Upgrading AppScale code to the latest version on "
-      "these machines: {}".format(unique_ips))
-    threads = []
-    error_ips = []
-    for ip in unique_ips:
-      t = threading.Thread(target=cls.run_bootstrap, args=(ip, options, error_ips))
-      threads.append(t)
+    AppScaleLogger.log("Staging AppScale {} on these machines while they keep "
+                       "running: {}".format(progress.version, ips))
+    staged = cls.STAGED_REPO.format(version=progress.version)
+    command = cls.STAGE_UPGRADE_CMD.format(staged=staged, repo=cls.APPSCALE_REPO,
+                                           version=progress.version)
+
+    finished = []
+    def on_result(result):
+      """ Records and reports each machine as soon as it is done. """
+      if result.succeeded:
+        progress.mark(result.item, UpgradeProgress.STAGED)
+        finished.append(result.item)
+        AppScaleLogger.success('Staged AppScale {} on {} ({}/{})'.format(
+          progress.version, result.item, len(finished), len(ips)))
+      else:
+        AppScaleLogger.warn('Unable to stage AppScale {} on {}: {}'.format(
+          progress.version, result.item, result.describe_failure()))
 
-    for x in threads:
-      x.start()
+    results = run_in_parallel(
+      lambda ip: RemoteHelper.ssh(ip, options.keyname, command,
+                                  options.verbose),
+      ips, max_workers=cls.MAX_PARALLEL_UPGRADES, timeout=cls.STAGE_TIMEOUT,
+      on_result=on_result)
 
-    for x in threads:
-      x.join()
+    failed = [result.item for result in results if not result.succeeded]
+    if failed:
+      raise AppScaleException(
+        'Unable to stage the new AppScale version on {}. The deployment has '
+        'not been stopped. Please correct the problem and re-run appscale '
+        'upgrade.'.format(', '.join(failed)))
 
-    if not error_ips:
+  @classmethod
+  @traced('tools.upgrade_appscale')
+  def upgrade_appscale(cls, options, node_layout, progress):
+    """ Swaps in the staged code and runs the bootstrap script on each of the
+    remote machines.
+      Args:
+        options: A Namespace that has fields for each parameter that can be
+          passed in via the command-line interface.
+        node_layout: A NodeLayout object for the deployment.
+        progress: An UpgradeProgress for the version being upgraded to.
+    """
+    ips = [ip for ip in cls.get_unique_public_ips(node_layout)
+           if not progress.has_finished(ip, UpgradeProgress.UPGRADED)]
+
+    if ips:
+      AppScaleLogger.log("Upgrading AppScale code to the latest version on "
+        "these machines: {}".format(ips))
+
+    finished = []
+    def on_result(result):
+      """ Records and reports each machine as soon as it is done. """
+      if result.succeeded:
+        progress.mark(result.item, UpgradeProgress.UPGRADED)
+        finished.append(result.item)
+        AppScaleLogger.success(
+          'Successfully updated and built AppScale on {} ({}/{}, {:.0f}s)'.
+          format(result.item, len(finished), len(ips), result.duration))
+      else:
+        AppScaleLogger.warn('Unable to upgrade AppScale code on {} ({}).\n'
+          'Please correct any errors listed in /var/log/appscale/bootstrap.log '
+          'on that machine and re-run appscale upgrade.'.format(
+            result.item, result.describe_failure()))
+
+    results = run_in_parallel(
+      lambda ip: cls.run_bootstrap(ip, options, progress.version), ips,
+      max_workers=cls.MAX_PARALLEL_UPGRADES, timeout=cls.BOOTSTRAP_TIMEOUT,
+      on_result=on_result)
+
+    if all(result.succeeded for result in results):
       cls.run_upgrade_script(options, node_layout)
+      progress.remove()
 
   @classmethod
-  def run_bootstrap(cls, ip, options, error_ips):
-    try:
-      RemoteHelper.ssh(ip, options.keyname, cls.BOOTSTRAP_CMD, options.verbose)
-      AppScaleLogger.success(
-        'Successfully updated and built AppScale on {}'.format(ip))
-    except ShellException:
-      error_ips.append(ip)
-      AppScaleLogger.warn('Unable to upgrade AppScale code on {}.\n'
-        'Please correct any errors listed in /var/log/appscale/bootstrap.log '
-        'on that machine and re-run appscale upgrade.'.format(ip))
-      return error_ips
+  def run_bootstrap(cls, ip, options, version):
+    """ Swaps the staged code into place on a machine and builds it.
+
+      Args:
+        ip: A str, the public IP of the machine.
+        options: A Namespace that has fields for each parameter that can be
+          passed in via the command-line interface.
+        version: A str, the AppScale version that was staged.
+      Raises:
+        ShellException: If the swap or the build failed.
+    """
+    AppScaleLogger.log('Upgrading AppScale on {}'.format(ip))
+    command = cls.SWAP_AND_BOOTSTRAP_CMD.format(
+      staged=cls.STAGED_REPO.format(version=version),
+      previous=cls.PREVIOUS_REPO, repo=cls.APPSCALE_REPO,
+      bootstrap=cls.BOOTSTRAP_CMD)
+    RemoteHelper.ssh(ip, options.keyname, command, options.verbose)
 
   @classmethod
-  def get_upgrade_version_available(cls):
-    """ Gets the latest release tag version available.
+  def get_unique_public_ips(cls, node_layout):
+    """ Lists the public IP of each machine in a deployment once.
+
+      Args:
+        node_layout: A NodeLayout object for the deployment.
+      Returns:
+        A list of strs, in the order the machines appear in the layout.
+    """
+    ips = []
+    for node in node_layout.nodes:
+      if node.public_ip not in ips:
+        ips.append(node.public_ip)
+    return ips
+
+  @classmethod
+  def get_tags_url(cls):
+    """ Gets the location of AppScale's release tags in the GitHub API.
     """
     github_api = cls.GITHUB_API.format(owner='AppScale', repo='appscale')
-    response = urllib2.urlopen('{}/tags'.format(github_api))
-    tag_list = json.loads(response.read())
+    return '{}/tags'.format(github_api)
+
+  @classmethod
+  def get_upgrade_version_available(cls, cache=None):
+    """ Gets the latest release tag version available.
+
+    Args:
+      cache: A MetadataCache to look the tags up in. If None, they are always
+        fetched from GitHub.
+    """
+    if cache is not None:
+      tag_list = cache.get(cls.get_tags_url())
+    else:
+      response = urllib2.urlopen(cls.get_tags_url(),
+                                 timeout=MetadataCache.DEFAULT_TIMEOUT)
+      tag_list = json.loads(response.read())
     return tag_list[0]['name']
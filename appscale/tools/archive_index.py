@@ -0,0 +1,315 @@
+""" Reads application archives once and keeps what deployments need from them
+in memory. """
+
+from __future__ import absolute_import
+
+import os
+import posixpath
+import tarfile
+import threading
+import zipfile
+
+
+# The configuration files that deployment steps read from an archive.
+CONFIG_FILES = frozenset(['app.yaml', 'appengine-web.xml', 'cron.yaml',
+                          'cron.xml', 'queue.yaml', 'queue.xml'])
+
+
+class ArchiveIndex(object):
+  """ ArchiveIndex holds the member names of an application archive and the
+  contents of its configuration files.
+
+  Indexes are cached by the archive's path, size, and modification time, so
+  the steps of a single deployment (reading the version, updating cron and
+  queues, uploading) share one scan of the archive.
+  """
+
+
+  # Maps (absolute path, size, mtime) to an ArchiveIndex.
+  cache = {}
+
+
+  # Guards cache.
+  cache_lock = threading.Lock()
+
+
+  def __init__(self, location, names, configs, unsafe_names):
+    """ Creates a new ArchiveIndex.
+
+    Args:
+      location: A str, the path of the archive.
+      names: A list of strs, the names of the archive's members.
+      configs: A dict mapping each configuration file name to a
+        (member name, contents) tuple for the shallowest copy of that file.
+      unsafe_names: A list of strs, members that would have been extracted
+        outside of the target directory and were skipped.
+    """
+    self.location = location
+    self.names = names
+    self.configs = configs
+    self.unsafe_names = unsafe_names
+
+
+  def config(self, file_name):
+    """ Returns the contents of a configuration file.
+
+    Args:
+      file_name: A str, one of CONFIG_FILES.
+    Returns:
+      A str, or None if the archive doesn't have the file.
+    """
+    if file_name not in self.configs:
+      return None
+    return self.configs[file_name][1]
+
+
+  def config_path(self, file_name):
+    """ Returns the member name of a configuration file.
+
+    Args:
+      file_name: A str, one of CONFIG_FILES.
+    Returns:
+      A str, or None if the archive doesn't have the file.
+    """
+    if file_name not in self.configs:
+      return None
+    return self.configs[file_name][0]
+
+
+  def can_upload_as_is(self):
+    """ Checks if the archive is laid out the way AppScale stores apps, so
+    that it can be uploaded without being repacked.
+
+    Returns:
+      True if app.yaml is at the top of the archive and there is nothing that
+      copying the app would leave out, and False otherwise.
+    """
+    if self.unsafe_names or not isinstance(self, TarGzIndex):
+      return False
+    if posixpath.normpath(self.config_path('app.yaml') or '') != 'app.yaml':
+      return False
+    return not any(name.endswith('.pyc') for name in self.names)
+
+
+  @classmethod
+  def get_cache_key(cls, location):
+    """ Identifies the current contents of an archive.
+
+    Args:
+      location: A str, the path of the archive.
+    Returns:
+      A tuple of the archive's absolute path, size, and modification time.
+    """
+    stat = os.stat(location)
+    return os.path.abspath(location), stat.st_size, stat.st_mtime
+
+
+  @classmethod
+  def cached(cls, location):
+    """ Returns an index for the archive if one was already built.
+
+    Args:
+      location: A str, the path of the archive.
+    Returns:
+      An ArchiveIndex, or None if the archive hasn't been read yet (or has
+      changed since).
+    """
+    try:
+      key = cls.get_cache_key(location)
+    except OSError:
+      return None
+    with cls.cache_lock:
+      return cls.cache.get(key)
+
+
+  @classmethod
+  def for_archive(cls, location, extract_to=None):
+    """ Returns an index for a tar.gz or zip archive, reading it if needed.
+
+    Args:
+      location: A str, the path of the archive.
+      extract_to: A str naming a directory to extract the archive into while
+        it is being read. Passing this always reads the archive.
+    Returns:
+      An ArchiveIndex.
+    """
+    key = cls.get_cache_key(location)
+    if extract_to is None:
+      with cls.cache_lock:
+        if key in cls.cache:
+          return cls.cache[key]
+
+    if zipfile.is_zipfile(location):
+      index = ZipIndex.scan(location, extract_to)
+    else:
+      index = TarGzIndex.scan(location, extract_to)
+
+    with cls.cache_lock:
+      cls.cache[key] = index
+    return index
+
+
+  @staticmethod
+  def is_unsafe(name):
+    """ Checks if extracting a member would write outside the target directory.
+
+    Args:
+      name: A str, the name of an archive member.
+    Returns:
+      True if the name is absolute or climbs out with '..'.
+    """
+    normalized = posixpath.normpath(name)
+    return (normalized.startswith('/') or normalized == '..' or
+            normalized.startswith('../'))
+
+
+  @staticmethod
+  def add_config(configs, name, read_contents):
+    """ Records a configuration file if it is the shallowest copy seen so far.
+
+    Args:
+      configs: The dict of configuration files being built.
+      name: A str, the member name.
+      read_contents: A callable that returns the member's contents.
+    """
+    file_name = name.split('/')[-1]
+    if file_name not in CONFIG_FILES:
+      return
+    if (file_name in configs and
+        len(configs[file_name][0].split('/')) <= len(name.split('/'))):
+      return
+    configs[file_name] = (name, read_contents())
+
+
+class TarGzIndex(ArchiveIndex):
+  """ An index of a gzipped tarball. """
+
+
+  @classmethod
+  def scan(cls, location, extract_to=None):
+    """ Reads a tarball from start to end, once.
+
+    The tarball is read as a stream, so each member is decompressed a single
+    time whether it is being listed, kept in memory, or extracted.
+
+    Args:
+      location: A str, the path of the tarball.
+      extract_to: A str naming a directory to extract members into, or None.
+    Returns:
+      A TarGzIndex.
+    """
+    names = []
+    configs = {}
+    unsafe_names = []
+    with tarfile.open(location, 'r|gz') as tar:
+      for member in tar:
+        names.append(member.name)
+        if cls.is_unsafe_member(member, extract_to):
+          unsafe_names.append(member.name)
+          continue
+
+        if extract_to is not None:
+          tar.extract(member, extract_to)
+          if member.isfile():
+            cls.add_config(configs, member.name, lambda: cls.read_file(
+              os.path.join(extract_to, member.name)))
+        elif member.isfile():
+          cls.add_config(configs, member.name,
+                         lambda: tar.extractfile(member).read())
+
+    return cls(location, names, configs, unsafe_names)
+
+
+  @classmethod
+  def is_unsafe_member(cls, member, extract_to=None):
+    """ Checks if extracting a member would write, or link, outside the target
+    directory.
+
+    Python 2's tarfile follows links that were extracted before a member, so
+    when extracting, paths are also checked as they resolve on disk.
+
+    Args:
+      member: A TarInfo.
+      extract_to: A str naming the directory members are extracted into, or
+        None if nothing is being extracted.
+    Returns:
+      True if the member's name is unsafe, if it is a link to somewhere
+      outside of the archive, or if it would end up outside of extract_to.
+    """
+    if cls.is_unsafe(member.name):
+      return True
+
+    target = None
+    if member.issym():
+      target = posixpath.join(posixpath.dirname(member.name), member.linkname)
+    elif member.islnk():
+      target = member.linkname
+    if target is not None and cls.is_unsafe(target):
+      return True
+
+    if extract_to is None:
+      return False
+    root = os.path.realpath(extract_to)
+    paths = [member.name] if target is None else [member.name, target]
+    return not all(cls.is_within(root, os.path.join(root, path))
+                   for path in paths)
+
+
+  @staticmethod
+  def is_within(directory, path):
+    """ Checks if a path resolves to somewhere inside a directory.
+
+    Args:
+      directory: A str, the real path of a directory.
+      path: A str, the path to check.
+    Returns:
+      True if the path, with any links resolved, is in the directory.
+    """
+    path = os.path.realpath(path)
+    return path == directory or path.startswith(directory + os.sep)
+
+
+  @staticmethod
+  def read_file(path):
+    """ Returns the contents of an extracted file.
+
+    Args:
+      path: A str, the path of the file.
+    Returns:
+      A str.
+    """
+    with open(path) as extracted_file:
+      return extracted_file.read()
+
+
+class ZipIndex(ArchiveIndex):
+  """ An index of a zip file. """
+
+
+  @classmethod
+  def scan(cls, location, extract_to=None):
+    """ Lists a zip file and reads its configuration files.
+
+    Zip files keep a table of their members, so only the configuration files
+    (and extracted members) are decompressed.
+
+    Args:
+      location: A str, the path of the zip file.
+      extract_to: A str naming a directory to extract members into, or None.
+    Returns:
+      A ZipIndex.
+    """
+    configs = {}
+    unsafe_names = []
+    with zipfile.ZipFile(location) as zip_file:
+      names = zip_file.namelist()
+      for name in names:
+        if cls.is_unsafe(name):
+          unsafe_names.append(name)
+          continue
+        if extract_to is not None:
+          zip_file.extract(name, extract_to)
+        if not name.endswith('/'):
+          cls.add_config(configs, name, lambda: zip_file.read(name))
+
+    return cls(location, names, configs, unsafe_names)
@@ -1,4 +1,18 @@
-class ServiceInfo(object):
+class StatsRecord(object):
+  """ A base for stats that can be turned into plain dicts, e.g. for JSON. """
+  def to_dict(self):
+    return {name: _to_plain(value) for name, value in vars(self).iteritems()}
+
+
+def _to_plain(value):
+  if isinstance(value, StatsRecord):
+    return value.to_dict()
+  if isinstance(value, list):
+    return [_to_plain(item) for item in value]
+  return value
+
+
+class ServiceInfo(StatsRecord):
   def __init__(self, project_id, service_id, app_info_dict):
     self.project_id = project_id
     self.service_id = service_id
@@ -11,8 +25,8 @@ class ServiceInfo(object):
     self.total_reqs = app_info_dict["total_reqs"]
 
 
-class NodeStats(object):
-  class CPU(object):
+class NodeStats(StatsRecord):
+  class CPU(StatsRecord):
     def __init__(self, cpu_dict):
       self.idle = cpu_dict["idle"]
       self.system = cpu_dict["system"]
@@ -20,7 +34,7 @@ class NodeStats(object):
       self.load = 100.0 - self.idle
       self.count = cpu_dict["count"]
 
-  class Memory(object):
+  class Memory(StatsRecord):
     def __init__(self, memory_dict):
       self.total = memory_dict["total"]
       self.available = memory_dict["available"]
@@ -28,7 +42,7 @@ class NodeStats(object):
       self.available_percent = 100.0 * self.available / self.total
       self.used_percent = 100.0 * self.used / self.total
 
-  class Swap(object):
+  class Swap(StatsRecord):
     def __init__(self, swap_dict):
       self.free = swap_dict["free"]
       self.used = swap_dict["used"]
@@ -36,7 +50,7 @@ class NodeStats(object):
       self.free_percent = 100.0 * self.free / self.total if self.total else None
       self.used_percent = 100.0 - self.free_percent if self.total else None
 
-  class Partition(object):
+  class Partition(StatsRecord):
     def __init__(self, mountpoint, partition_dict):
       self.mountpoint = mountpoint
       self.total = partition_dict["total"]
@@ -45,7 +59,7 @@ class NodeStats(object):
       self.free_percent = 100.0 * self.free / self.total
       self.used_percent = 100.0 - self.free_percent
 
-  class LoadAvg(object):
+  class LoadAvg(StatsRecord):
     def __init__(self, loadavg_dict):
       self.last_1_min = loadavg_dict["last_1_min"]
       self.last_5_min = loadavg_dict["last_5_min"]
@@ -53,11 +67,15 @@ class NodeStats(object):
       self.runnable_entities = loadavg_dict["runnable_entities"]
       self.scheduling_entities = loadavg_dict["scheduling_entities"]
 
-  class Disk(object):
+  class Disk(StatsRecord):
     def __init__(self, partitions):
       self.partitions = partitions
       self.most_loaded = max(partitions, key=lambda partition: partition.used)
 
+    def to_dict(self):
+      return {"partitions": _to_plain(self.partitions),
+              "most_loaded": self.most_loaded.mountpoint}
+
   def __init__(self, private_ip, node_stats_dict):
     self.private_ip = private_ip
     self.public_ip = node_stats_dict["public_ip"]
@@ -50,11 +50,27 @@ class BadConfigurationException(Exception):
   pass
 
 
+class CancelledException(Exception):
+  """A special Exception class that should be thrown if an operation is
+  stopped before it finishes because the caller no longer needs it.
+  """
+  pass
+
+
 class ShellException(Exception):
   """A special Exception class that should be thrown if a shell command is
   executed and has a non-zero return value.
   """
-  pass
+  def __init__(self, message='', output=None):
+    """Creates a new ShellException.
+
+    Args:
+      message: A str describing what failed.
+      output: A str with whatever the failed command printed, so that callers
+        can report it without repeating the command (or its stdin).
+    """
+    super(ShellException, self).__init__(message)
+    self.output = output
 
 
 class TimeoutException(Exception):
@@ -0,0 +1,430 @@
+""" appscaled is an optional background process that runs read-only commands,
+like 'appscale status', for one deployment. It keeps the modules and
+connections those commands need warm and briefly reuses their output, so that
+tools polling a deployment every few seconds don't pay for a fresh process on
+each call. The appscale command forwards those commands to it when it is
+running, and runs them itself when it is not. """
+
+from __future__ import absolute_import
+
+import errno
+import json
+import os
+import select
+import socket
+import StringIO
+import subprocess
+import sys
+import time
+import traceback
+
+import yaml
+
+from appscale.tools.appscale_logger import AppScaleLogger
+from appscale.tools.custom_exceptions import AppScaleException
+from appscale.tools.local_state import LocalState
+
+
+class AppScaleDaemon(object):
+  """ AppScaleDaemon serves requests from the appscale command over a Unix
+  socket in ~/.appscale.
+
+  Each connection carries one JSON request and one JSON response. Requests
+  are handled one at a time on the main thread, since AppControllerClient
+  relies on SIGALRM for its timeouts.
+  """
+
+
+  # The commands that the appscale command forwards to a running daemon.
+  COMMANDS = ['get', 'stats', 'status']
+
+
+  # How long, in seconds, a command's output is reused for identical requests.
+  RESPONSE_TTL = 5
+
+
+  # How long, in seconds, the daemon waits for a request before exiting.
+  IDLE_TIMEOUT = 30 * 60
+
+
+  # How long, in seconds, clients wait to connect to the daemon, and for it
+  # to answer a request.
+  CONNECT_TIMEOUT = 1
+  RESPONSE_TIMEOUT = 10 * 60
+
+
+  # How long, in seconds, 'appscale daemon start' waits for a new daemon.
+  START_TIMEOUT = 15
+
+
+  # The largest request, in bytes, that the daemon reads.
+  MAX_REQUEST_SIZE = 64 * 1024
+
+
+  def __init__(self, keyname):
+    """ Creates a new AppScaleDaemon.
+
+    Args:
+      keyname: A str, the name of the deployment that the daemon serves.
+    """
+    self.keyname = keyname
+    self.location = LocalState.get_daemon_socket_location(keyname)
+    # Maps a JSON-encoded request to a (time, response) tuple.
+    self.responses = {}
+    self.running = False
+
+
+  def serve(self):
+    """ Handles requests until asked to shut down, or until no requests have
+    come in for IDLE_TIMEOUT seconds.
+    """
+    # Load what the commands need up front, so that the first request is as
+    # fast as the rest.
+    from appscale.tools import appscale
+    import SOAPpy
+
+    listener = self.listen()
+    self.running = True
+    last_request = time.time()
+    try:
+      while self.running:
+        remaining = self.IDLE_TIMEOUT - (time.time() - last_request)
+        if remaining <= 0:
+          break
+
+        try:
+          readable, _, _ = select.select([listener], [], [], remaining)
+        except select.error as error:
+          if error.args[0] == errno.EINTR:
+            continue
+          raise
+        if not readable:
+          continue
+
+        connection, _ = listener.accept()
+        try:
+          self.handle(connection)
+        except (socket.error, ValueError):
+          # The client went away or sent garbage, so there's no one to tell.
+          pass
+        finally:
+          connection.close()
+        last_request = time.time()
+    finally:
+      listener.close()
+      try:
+        os.remove(self.location)
+      except OSError:
+        pass
+
+
+  def listen(self):
+    """ Creates the socket that the daemon listens on. Only the current user
+    can connect to it.
+
+    Returns:
+      A listening socket.
+    Raises:
+      AppScaleException: If a daemon is already serving this deployment.
+    """
+    if self.ping(self.keyname) is not None:
+      raise AppScaleException('appscaled is already running for {}.'.format(
+        self.keyname))
+
+    # Whatever is left is from a daemon that didn't exit cleanly.
+    try:
+      os.remove(self.location)
+    except OSError:
+      pass
+
+    listener = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    old_umask = os.umask(0177)
+    try:
+      listener.bind(self.location)
+    finally:
+      os.umask(old_umask)
+    listener.listen(5)
+    return listener
+
+
+  def handle(self, connection):
+    """ Reads one request from a client and answers it.
+
+    Args:
+      connection: A socket connected to a client.
+    """
+    connection.settimeout(self.CONNECT_TIMEOUT)
+    request = json.loads(read_all(connection, self.MAX_REQUEST_SIZE))
+    command = request.get('command')
+
+    if command == 'ping':
+      response = {'status': 0, 'output': '', 'pid': os.getpid()}
+    elif command == 'shutdown':
+      self.running = False
+      response = {'status': 0, 'output': 'appscaled stopped.\n'}
+    elif command in self.COMMANDS:
+      response = self.run_command(command, request.get('args', []),
+                                  request.get('cwd', os.getcwd()))
+    else:
+      response = {'status': 1,
+                  'output': 'Unknown command: {}\n'.format(command)}
+
+    connection.settimeout(self.RESPONSE_TIMEOUT)
+    connection.sendall(json.dumps(response))
+
+
+  def run_command(self, command, args, cwd):
+    """ Runs a command as the appscale command would, capturing what it
+    prints. Successful output is reused for RESPONSE_TTL seconds.
+
+    Args:
+      command: A str, one of COMMANDS.
+      args: A list of strs, the command's arguments.
+      cwd: A str, the directory the client ran the command in.
+    Returns:
+      A dict with the command's exit status and output.
+    """
+    key = json.dumps([command, args, cwd])
+    now = time.time()
+    for cached_key, (cached_at, _) in self.responses.items():
+      if now - cached_at >= self.RESPONSE_TTL:
+        del self.responses[cached_key]
+    if key in self.responses:
+      return self.responses[key][1]
+
+    output = StringIO.StringIO()
+    old_stdout, old_stderr = sys.stdout, sys.stderr
+    old_cwd = os.getcwd()
+    sys.stdout = sys.stderr = output
+    try:
+      os.chdir(cwd)
+      getattr(self, 'run_{}'.format(command))(list(args))
+      status = 0
+    except SystemExit as exit_error:
+      if exit_error.code is None:
+        status = 0
+      elif isinstance(exit_error.code, int):
+        status = exit_error.code
+      else:
+        output.write('{}\n'.format(exit_error.code))
+        status = 1
+    except Exception as exception:
+      LocalState.generate_crash_log(exception, traceback.format_exc())
+      status = 1
+    finally:
+      sys.stdout, sys.stderr = old_stdout, old_stderr
+      os.chdir(old_cwd)
+
+    response = {'status': status, 'output': output.getvalue()}
+    if status == 0:
+      self.responses[key] = (time.time(), response)
+    return response
+
+
+  @staticmethod
+  def run_get(args):
+    """ Runs 'appscale get'.
+
+    Args:
+      args: A list holding the regex of the properties to print.
+    """
+    from appscale.tools.appscale import AppScale
+    if len(args) != 1:
+      AppScaleLogger.warn("Usage: appscale get <regex of properties to "
+                          "retrieve>")
+      raise SystemExit(1)
+
+    properties = AppScale().get(args[0])
+    for property_name, property_value in sorted(properties.iteritems()):
+      print "{0} -> {1}".format(property_name, property_value)
+
+
+  @staticmethod
+  def run_stats(args):
+    """ Runs 'appscale stats'.
+
+    Args:
+      args: A list of strs, the options to show the stats with.
+    """
+    from appscale.tools.appscale import AppScale
+    AppScale().stats(args)
+
+
+  @staticmethod
+  def run_status(args):
+    """ Runs 'appscale status'.
+
+    Args:
+      args: A list of strs, the options to show the status with.
+    """
+    from appscale.tools.appscale import AppScale
+    AppScale().status(args)
+
+
+  @classmethod
+  def request(cls, keyname, request, timeout):
+    """ Sends a request to the daemon for a deployment.
+
+    Args:
+      keyname: A str, the name of the deployment.
+      request: A dict to send.
+      timeout: An int, how many seconds to wait for the response.
+    Returns:
+      The dict that the daemon answered with.
+    Raises:
+      socket.error: If the daemon isn't running or went away.
+      ValueError: If the daemon's answer isn't JSON.
+    """
+    client = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+      client.settimeout(cls.CONNECT_TIMEOUT)
+      client.connect(LocalState.get_daemon_socket_location(keyname))
+      client.sendall(json.dumps(request))
+      client.shutdown(socket.SHUT_WR)
+      client.settimeout(timeout)
+      return json.loads(read_all(client))
+    finally:
+      client.close()
+
+
+  @classmethod
+  def ping(cls, keyname):
+    """ Checks if a daemon is serving a deployment.
+
+    Args:
+      keyname: A str, the name of the deployment.
+    Returns:
+      The daemon's process ID, or None if it isn't running.
+    """
+    try:
+      return cls.request(keyname, {'command': 'ping'},
+                         cls.CONNECT_TIMEOUT)['pid']
+    except (socket.error, ValueError, KeyError):
+      return None
+
+
+  @classmethod
+  def forward(cls, command, args):
+    """ Runs a command in the daemon for the deployment in the current
+    directory's AppScalefile, if one is running.
+
+    Args:
+      command: A str, the appscale command to run.
+      args: A list of strs, the command's arguments.
+    Returns:
+      The command's exit status, after printing its output, or None if the
+      command should be run directly.
+    """
+    if command not in cls.COMMANDS:
+      return None
+
+    # Watching stats never finishes, and its records are written as they
+    # change rather than all at the end.
+    if any(arg.startswith('--watch') for arg in args):
+      return None
+
+    keyname = get_appscalefile_keyname()
+    if keyname is None:
+      return None
+
+    request = {'command': command, 'args': args, 'cwd': os.getcwd()}
+    try:
+      response = cls.request(keyname, request, cls.RESPONSE_TIMEOUT)
+    except (socket.error, ValueError):
+      return None
+
+    sys.stdout.write(response.get('output', ''))
+    sys.stdout.flush()
+    return response.get('status', 1)
+
+
+  @classmethod
+  def start(cls, keyname):
+    """ Starts a daemon for a deployment in the background.
+
+    Args:
+      keyname: A str, the name of the deployment.
+    Raises:
+      AppScaleException: If the daemon does not start in time.
+    """
+    pid = cls.ping(keyname)
+    if pid is not None:
+      AppScaleLogger.log('appscaled is already running for {} (pid {}).'.
+                         format(keyname, pid))
+      return
+
+    LocalState.make_appscale_directory()
+    log_location = LocalState.get_daemon_log_location(keyname)
+    with open(os.devnull) as devnull, open(log_location, 'a') as log:
+      subprocess.Popen(
+        [sys.executable, '-m', 'appscale.tools.scripts.appscaled', keyname],
+        stdin=devnull, stdout=log, stderr=subprocess.STDOUT, close_fds=True,
+        preexec_fn=os.setsid, cwd='/')
+
+    deadline = time.time() + cls.START_TIMEOUT
+    while time.time() < deadline:
+      pid = cls.ping(keyname)
+      if pid is not None:
+        AppScaleLogger.success('appscaled is running for {} (pid {}).'.
+                               format(keyname, pid))
+        return
+      time.sleep(0.2)
+
+    raise AppScaleException('appscaled did not start. See {} for details.'.
+                            format(log_location))
+
+
+  @classmethod
+  def stop(cls, keyname):
+    """ Asks the daemon for a deployment to exit.
+
+    Args:
+      keyname: A str, the name of the deployment.
+    """
+    try:
+      cls.request(keyname, {'command': 'shutdown'}, cls.CONNECT_TIMEOUT)
+    except (socket.error, ValueError):
+      AppScaleLogger.log('appscaled is not running for {}.'.format(keyname))
+      return
+    AppScaleLogger.success('appscaled stopped for {}.'.format(keyname))
+
+
+def read_all(connection, limit=None):
+  """ Reads from a socket until the other end stops sending.
+
+  Args:
+    connection: A connected socket.
+    limit: An int, the most bytes to read, or None.
+  Returns:
+    A str, everything that was read.
+  Raises:
+    ValueError: If more than limit bytes were sent.
+  """
+  chunks = []
+  size = 0
+  while True:
+    chunk = connection.recv(64 * 1024)
+    if not chunk:
+      return ''.join(chunks)
+    chunks.append(chunk)
+    size += len(chunk)
+    if limit is not None and size > limit:
+      raise ValueError('Request is larger than {} bytes'.format(limit))
+
+
+def get_appscalefile_keyname():
+  """ Reads the keyname from the AppScalefile in the current directory.
+
+  Returns:
+    A str, the keyname, or None if there is no readable AppScalefile.
+  """
+  from appscale.tools.parse_args import ParseArgs
+  try:
+    with open(os.path.join(os.getcwd(), 'AppScalefile')) as appscalefile:
+      contents = yaml.safe_load(appscalefile)
+  except (IOError, yaml.YAMLError):
+    return None
+
+  if not isinstance(contents, dict):
+    return None
+  return contents.get('keyname', ParseArgs.DEFAULT_KEYNAME)
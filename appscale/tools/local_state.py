@@ -21,13 +21,16 @@ from string import ascii_lowercase, digits
 
 
 # AppScale-specific imports
+from app_files import collect_app_files
 from appcontroller_client import AppControllerClient
+from archive_index import ArchiveIndex
 from appscale_logger import AppScaleLogger
 from custom_exceptions import AppControllerException
 from custom_exceptions import AppScaleException
 from custom_exceptions import AppScalefileException
 from custom_exceptions import BadConfigurationException
 from custom_exceptions import ShellException
+from tracing import Tracer
 
 
 # The version of the AppScale Tools we're running on.
@@ -362,6 +365,76 @@ class LocalState(object):
     """
     return cls.LOCAL_APPSCALE_PATH + "locations-" + keyname + ".json"
 
+  @classmethod
+  def get_upgrade_progress_location(cls, keyname):
+    """Determines the location where the progress of an interrupted
+    'appscale upgrade' is kept.
+
+    Args:
+      keyname: A str that indicates the name of the SSH keypair that
+        uniquely identifies this AppScale deployment.
+    Returns:
+      A str that indicates where the upgrade progress file can be found.
+    """
+    return cls.LOCAL_APPSCALE_PATH + "upgrade-" + keyname + ".json"
+
+  @classmethod
+  def get_go_dependencies_cache_location(cls):
+    """Determines the location where resolved Go dependencies are cached.
+
+    Returns:
+      A str that indicates where the Go dependency cache can be found.
+    """
+    return cls.LOCAL_APPSCALE_PATH + "go-dependencies.json"
+
+  @classmethod
+  def get_daemon_socket_location(cls, keyname):
+    """Determines the location of the Unix socket that appscaled listens on.
+
+    Args:
+      keyname: A str that indicates the name of the SSH keypair that
+        uniquely identifies this AppScale deployment.
+    Returns:
+      A str that indicates where the daemon's socket can be found.
+    """
+    return cls.LOCAL_APPSCALE_PATH + "appscaled-" + keyname + ".sock"
+
+  @classmethod
+  def get_daemon_log_location(cls, keyname):
+    """Determines the location where appscaled writes anything it prints
+    outside of a request, like errors that stop it.
+
+    Args:
+      keyname: A str that indicates the name of the SSH keypair that
+        uniquely identifies this AppScale deployment.
+    Returns:
+      A str that indicates where the daemon's log can be found.
+    """
+    return cls.LOCAL_APPSCALE_PATH + "appscaled-" + keyname + ".log"
+
+  @classmethod
+  def get_metadata_cache_location(cls):
+    """Determines the location where release metadata fetched from PyPI and
+    GitHub is cached.
+
+    Returns:
+      A str that indicates where the metadata cache can be found.
+    """
+    return cls.LOCAL_APPSCALE_PATH + "metadata-cache.json"
+
+  @classmethod
+  def get_scaling_state_location(cls, keyname):
+    """Determines the location where we record the nodes that scaling added
+    to a deployment, and when.
+
+    Args:
+      keyname: A str that indicates the name of the SSH keypair that
+        uniquely identifies this AppScale deployment.
+    Returns:
+      A str that indicates where the scaling state file can be found.
+    """
+    return cls.LOCAL_APPSCALE_PATH + "scaling-" + keyname + ".json"
+
   @classmethod
   def cleanup_keyname(cls, keyname):
     """Cleans up all the files starting with the keyname upon termination
@@ -946,76 +1019,71 @@ class LocalState(object):
       command executes.
     Raises:
       ShellException: If, after five attempts, executing the named command
-      failed.
+      failed. Its message never includes stdin, which can hold credentials.
     """
     tries_left = num_retries
-    try:
-      while tries_left:
-        AppScaleLogger.verbose("shell> {0}".format(command), is_verbose)
-        the_temp_file = tempfile.NamedTemporaryFile()
-        if stdin is not None:
-          stdin_strio = tempfile.TemporaryFile()
-          stdin_strio.write(stdin)
-          stdin_strio.seek(0)
-          AppScaleLogger.verbose("       stdin str: {0}"\
-            .format(stdin), is_verbose)
-          result = subprocess.Popen(command, shell=True, stdout=the_temp_file,
-            stdin=stdin_strio, stderr=subprocess.STDOUT)
-        else:
-          result = subprocess.Popen(command, shell=True, stdout=the_temp_file,
-            stderr=subprocess.STDOUT)
-        AppScaleLogger.verbose("       stdout buffer: {0}"\
-          .format(the_temp_file.name), is_verbose)
-        result.wait()
-        if stdin is not None:
-          stdin_strio.close()
-        if result.returncode == 0:
-          the_temp_file.seek(0)
-          output = the_temp_file.read()
-          the_temp_file.close()
-          return output
-        tries_left -= 1
-        if tries_left:
-          the_temp_file.close()
-          AppScaleLogger.verbose("Command failed. Trying again momentarily." \
-            .format(command), is_verbose)
-        else:
-          the_temp_file.seek(0)
-          output = the_temp_file.read()
-          the_temp_file.close()
-          if stdin:
-            raise ShellException("Executing command '{0} {1}' failed:\n{2}"\
-                    .format(command, stdin, output))
+    with Tracer.span('shell', command=command) as span:
+      try:
+        while tries_left:
+          span.set('attempts', num_retries - tries_left + 1)
+          AppScaleLogger.verbose("shell> {0}".format(command), is_verbose)
+          the_temp_file = tempfile.NamedTemporaryFile()
+          if stdin is not None:
+            stdin_strio = tempfile.TemporaryFile()
+            stdin_strio.write(stdin)
+            stdin_strio.seek(0)
+            AppScaleLogger.verbose("       stdin str: {0}"\
+              .format(stdin), is_verbose)
+            result = subprocess.Popen(command, shell=True,
+              stdout=the_temp_file, stdin=stdin_strio, stderr=subprocess.STDOUT)
           else:
+            result = subprocess.Popen(command, shell=True,
+              stdout=the_temp_file, stderr=subprocess.STDOUT)
+          AppScaleLogger.verbose("       stdout buffer: {0}"\
+            .format(the_temp_file.name), is_verbose)
+          result.wait()
+          if stdin is not None:
+            stdin_strio.close()
+          if result.returncode == 0:
+            the_temp_file.seek(0)
+            output = the_temp_file.read()
+            the_temp_file.close()
+            return output
+          tries_left -= 1
+          if tries_left:
+            the_temp_file.close()
+            AppScaleLogger.verbose("Command failed. Trying again " \
+              "momentarily.".format(command), is_verbose)
+          else:
+            the_temp_file.seek(0)
+            output = the_temp_file.read()
+            the_temp_file.close()
             raise ShellException("Executing command '{0}' failed:\n{1}"\
-                    .format(command, output))
-        time.sleep(1)
-    except OSError as os_error:
-      if stdin:
-        raise ShellException("Error executing command: '{0} {1}':{2}"\
-                .format(command, stdin, os_error))
-      else:
+                    .format(command, output), output=output)
+          time.sleep(1)
+      except OSError as os_error:
         raise ShellException("Error executing command: '{0}':{1}"\
-                .format(command, os_error))
+                .format(command, os_error), output=str(os_error))
 
 
   @classmethod
-  def require_ssh_commands(cls, needs_expect, is_verbose):
+  def require_ssh_commands(cls, needs_copy_id, is_verbose):
     """Checks to make sure the commands needed to set up passwordless SSH
     access are installed on this machine.
 
     Args:
-      needs_expect: A bool that indicates if we should also check for the
-        'expect' command.
+      needs_copy_id: A bool that indicates if we should also check for the
+        'ssh-copy-id' command, which is only used when the user types in
+        each machine's password.
       is_verbose: A bool that indicates if we should print how we check for
         each command to stdout.
     Raises:
       BadConfigurationException: If any of the required commands aren't present
         on this machine.
     """
-    required_commands = ['ssh-keygen', 'ssh-copy-id']
-    if needs_expect:
-      required_commands.append('expect')
+    required_commands = ['ssh-keygen']
+    if needs_copy_id:
+      required_commands.append('ssh-copy-id')
 
     for command in required_commands:
       try:
@@ -1057,6 +1125,9 @@ class LocalState(object):
     """Extracts the given tar.gz file to a randomly generated location and
     returns that location.
 
+    The tarball is indexed while it is extracted, so later steps that need its
+    configuration files don't have to read it again.
+
     Args:
       archive_location: The location on the local filesystem where the tar.gz
         file to extract can be found.
@@ -1066,7 +1137,11 @@ class LocalState(object):
       The location on the local filesystem where the file was extracted
         to.
     """
-    return cls.extract_app_to_dir(tar_location, "tar zxvf", is_verbose)
+    extracted_location = cls.make_extraction_dir()
+    AppScaleLogger.verbose("Extracting {0} to {1}".format(
+      tar_location, extracted_location), is_verbose)
+    ArchiveIndex.for_archive(tar_location, extract_to=extracted_location)
+    return cls.find_app_root(extracted_location)
 
 
   @classmethod
@@ -1102,13 +1177,36 @@ class LocalState(object):
       The location on the local filesystem where the file was extracted
         to.
     """
+    extracted_location = cls.make_extraction_dir()
+    cls.shell("cd {0} && {1} '{2}'".format(extracted_location, extract_command,
+      os.path.abspath(archive_location)), is_verbose)
+    return cls.find_app_root(extracted_location)
+
+
+  @classmethod
+  def make_extraction_dir(cls):
+    """Creates a randomly named directory to extract an application into.
+
+    Returns:
+      A str naming the new directory.
+    """
     extracted_location = "/tmp/appscale-app-{0}".format(str(uuid.uuid4()) \
       .replace('-', '')[:8])
-
     os.mkdir(extracted_location)
-    cls.shell("cd {0} && {1} '{2}'".format(extracted_location, extract_command,
-      os.path.abspath(archive_location)), is_verbose)
+    return extracted_location
+
+
+  @classmethod
+  def find_app_root(cls, extracted_location):
+    """Determines where an extracted application starts.
 
+    Args:
+      extracted_location: A str naming the directory an archive was extracted
+        into.
+    Returns:
+      A str naming extracted_location, or the single directory inside of it if
+      the archive held a directory rather than the application's files.
+    """
     file_list = os.listdir(extracted_location)
     if len(file_list) > 0:
       # Users can upload an archive containing their application or a directory
@@ -1248,12 +1346,18 @@ class LocalState(object):
     return False
 
   @classmethod
-  def get_extra_go_dependencies(cls, app_base, test=False):
+  def get_extra_go_dependencies(cls, app_base, test=False, app_files=None):
     """ Collects a list of additional source files to include in the Go app.
 
+    Resolving dependencies with go-app-builder can be slow, so the result is
+    cached and reused until the app's Go files, GOROOT, or GOPATH change.
+
     Args:
       app_base: A string specifying the application directory.
       test: A boolean indicating that the user does not want to be prompted.
+      app_files: A dictionary mapping the app's files to their location on the
+        file system, as collected for the upload. If not given, the
+        application directory is walked.
     Returns:
       A dictionary mapping file names to their location on the file system.
     """
@@ -1301,12 +1405,17 @@ class LocalState(object):
           raise AppScaleException('Your application was not deployed.')
       return {}
 
-    go_files = []
-    for root, _, filenames in os.walk(app_base):
-      relative_dir = os.path.relpath(root, app_base)
-      for filename in fnmatch.filter(filenames, '*.go'):
-        relative_path = os.path.join(relative_dir, filename)
-        go_files.append(relative_path)
+    if app_files is None:
+      app_files = collect_app_files(app_base)
+    go_files = sorted(relative_path for relative_path in app_files
+                      if fnmatch.fnmatch(relative_path, '*.go'))
+
+    cache_key = cls.get_go_dependencies_cache_key(
+      app_files, go_files, goroot, gopath)
+    extras = cls.get_cached_go_dependencies(app_base, cache_key)
+    if extras is not None:
+      AppScaleLogger.log('Using cached Go dependencies')
+      return extras
 
     gab_args = [gab,
                 '-app_base', app_base,
@@ -1338,8 +1447,87 @@ class LocalState(object):
       relative_path = os.path.join('gopath', 'src', relative_path)
       extras[relative_path] = absolute_path
 
+    cls.cache_go_dependencies(app_base, cache_key, extras)
     return extras
 
+  @classmethod
+  def get_go_dependencies_cache_key(cls, app_files, go_files, goroot, gopath):
+    """ Identifies everything that go-app-builder's output depends on.
+
+    Args:
+      app_files: A dictionary mapping the app's files to their location on the
+        file system.
+      go_files: A list of the app's Go files, relative to the app.
+      goroot: A string specifying GOROOT.
+      gopath: A string specifying GOPATH.
+    Returns:
+      A string that changes whenever a Go file is added, removed, or
+      modified, or the Go environment changes.
+    """
+    inputs = [goroot, gopath]
+    for relative_path in go_files:
+      inputs.append([relative_path,
+                     os.path.getmtime(app_files[relative_path])])
+    return hashlib.sha1(json.dumps(inputs)).hexdigest()
+
+  @classmethod
+  def get_cached_go_dependencies(cls, app_base, cache_key):
+    """ Looks up the Go dependencies resolved for an earlier upload.
+
+    Args:
+      app_base: A string specifying the application directory.
+      cache_key: A string returned by get_go_dependencies_cache_key.
+    Returns:
+      A dictionary mapping file names to their location on the file system, or
+      None if the cache has nothing for these inputs (or its files are gone).
+    """
+    try:
+      with open(cls.get_go_dependencies_cache_location()) as cache_file:
+        cache = json.load(cache_file)
+      entry = cache[os.path.abspath(app_base)]
+    except (IOError, ValueError, KeyError, TypeError):
+      return None
+
+    if entry.get('key') != cache_key:
+      return None
+    extras = entry.get('extras')
+    if not isinstance(extras, dict):
+      return None
+    if not all(os.path.exists(path) for path in extras.values()):
+      return None
+    return extras
+
+  @classmethod
+  def cache_go_dependencies(cls, app_base, cache_key, extras):
+    """ Saves resolved Go dependencies for later uploads of the same app.
+
+    Each application keeps a single entry, which is replaced when its inputs
+    change.
+
+    Args:
+      app_base: A string specifying the application directory.
+      cache_key: A string returned by get_go_dependencies_cache_key.
+      extras: A dictionary mapping file names to their location on the file
+        system.
+    """
+    location = cls.get_go_dependencies_cache_location()
+    try:
+      with open(location) as cache_file:
+        cache = json.load(cache_file)
+    except (IOError, ValueError):
+      cache = {}
+    if not isinstance(cache, dict):
+      cache = {}
+
+    cache[os.path.abspath(app_base)] = {'key': cache_key, 'extras': extras}
+    temp_location = location + '.tmp'
+    try:
+      with open(temp_location, 'w') as cache_file:
+        json.dump(cache, cache_file)
+      os.rename(temp_location, location)
+    except (IOError, OSError) as error:
+      AppScaleLogger.warn('Unable to cache Go dependencies: {}'.format(error))
+
   @classmethod
   def generate_xmpp_username(cls, username, length=6, chars=ascii_lowercase + digits):
     AppScaleLogger.log("Generating a new XMPP username...")
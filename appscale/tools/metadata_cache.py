@@ -0,0 +1,162 @@
+""" Caches small JSON documents, like release metadata, that the tools fetch
+over HTTP. """
+
+from __future__ import absolute_import
+
+import json
+import os
+import socket
+import threading
+import time
+import urllib2
+
+from appscale.tools.appscale_logger import AppScaleLogger
+from appscale.tools.parallel import run_in_parallel
+
+
+class MetadataCache(object):
+  """ MetadataCache keeps fetched documents in a JSON file, along with when
+  they were fetched and their ETags.
+
+  Documents younger than the TTL are used without any network round-trips.
+  Older ones are revalidated with If-None-Match, so unchanged documents
+  don't count against rate limits like GitHub's. If a document can't be
+  fetched, or the cache is offline, the cached copy is used no matter its age.
+  """
+
+
+  # How long, in seconds, a document is used before it is revalidated.
+  DEFAULT_TTL = 6 * 60 * 60
+
+
+  # How long, in seconds, we wait on a server for each document.
+  DEFAULT_TIMEOUT = 10
+
+
+  def __init__(self, location, ttl=DEFAULT_TTL, timeout=DEFAULT_TIMEOUT,
+               offline=False):
+    """ Creates a new MetadataCache.
+
+    Args:
+      location: A str, the path of the file that holds the cache.
+      ttl: An int, how many seconds documents stay fresh.
+      timeout: An int, how many seconds to wait on a server.
+      offline: A bool that indicates if only cached documents should be used.
+    """
+    self.location = location
+    self.ttl = ttl
+    self.timeout = timeout
+    self.offline = offline
+    self._lock = threading.Lock()
+
+
+  def get(self, url):
+    """ Fetches a JSON document, from the cache if possible.
+
+    Args:
+      url: A str, the location of the document.
+    Returns:
+      The decoded document.
+    Raises:
+      URLError: If the document is not cached and could not be fetched.
+      ValueError: If the document is not valid JSON.
+    """
+    entry = self.read_entries().get(url)
+    if entry is not None:
+      if self.offline or time.time() - entry['fetched'] < self.ttl:
+        return entry['body']
+    elif self.offline:
+      raise urllib2.URLError('{} is not cached, and the tools are offline'.
+                             format(url))
+
+    request = urllib2.Request(url)
+    if entry is not None and entry.get('etag'):
+      request.add_header('If-None-Match', entry['etag'])
+
+    try:
+      response = urllib2.urlopen(request, timeout=self.timeout)
+      body = json.loads(response.read())
+      etag = response.info().getheader('ETag')
+    except urllib2.HTTPError as error:
+      if error.code != 304 or entry is None:
+        return self.use_stale(url, entry, error)
+      body, etag = entry['body'], entry.get('etag')
+    except (urllib2.URLError, socket.error) as error:
+      return self.use_stale(url, entry, error)
+
+    self.save_entry(url, {'body': body, 'etag': etag, 'fetched': time.time()})
+    return body
+
+
+  def get_many(self, urls):
+    """ Fetches several JSON documents at once, so that the ones that aren't
+    fresh only cost one round-trip between them.
+
+    Args:
+      urls: A list of strs, the locations of the documents.
+    Returns:
+      A dict mapping each url that could be fetched to its decoded document.
+    """
+    results = run_in_parallel(self.get, urls, max_workers=len(urls) or 1,
+                              timeout=self.timeout * 2)
+    return {result.item: result.value for result in results
+            if result.succeeded}
+
+
+  def use_stale(self, url, entry, error):
+    """ Falls back to a cached document when fetching a new one failed.
+
+    Args:
+      url: A str, the location of the document.
+      entry: A dict, the document's cache entry, or None.
+      error: The exception that fetching the document raised.
+    Returns:
+      The cached document.
+    Raises:
+      The given error, if nothing is cached.
+    """
+    if entry is None:
+      raise error
+
+    AppScaleLogger.warn('Unable to fetch {}: {}. Using the copy from {}.'.
+                        format(url, error, time.ctime(entry['fetched'])))
+    return entry['body']
+
+
+  def read_entries(self):
+    """ Reads every cached document.
+
+    Returns:
+      A dict mapping urls to dicts with the body, etag, and fetched time of
+      each document.
+    """
+    try:
+      with open(self.location) as cache_file:
+        entries = json.load(cache_file)
+    except (IOError, ValueError):
+      return {}
+
+    if not isinstance(entries, dict):
+      return {}
+    return {url: entry for url, entry in entries.iteritems()
+            if isinstance(entry, dict) and 'body' in entry and
+            isinstance(entry.get('fetched'), (int, float))}
+
+
+  def save_entry(self, url, entry):
+    """ Adds or replaces a document in the cache.
+
+    Args:
+      url: A str, the location of the document.
+      entry: A dict with the body, etag, and fetched time of the document.
+    """
+    with self._lock:
+      entries = self.read_entries()
+      entries[url] = entry
+      temp_location = '{}.{}.tmp'.format(self.location, os.getpid())
+      try:
+        with open(temp_location, 'w') as cache_file:
+          json.dump(entries, cache_file)
+        os.rename(temp_location, self.location)
+      except (IOError, OSError) as error:
+        AppScaleLogger.warn('Unable to cache {}: {}'.format(url, error))
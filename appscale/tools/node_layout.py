@@ -2,8 +2,10 @@
 
 
 # General-purpose Python library imports
+import itertools
 import re
 import yaml
+from collections import deque
 
 
 # AppScale-specific imports
@@ -12,9 +14,10 @@ from appscale_logger import AppScaleLogger
 from custom_exceptions import BadConfigurationException
 from local_state import LocalState
 from parse_args import ParseArgs
+from placement import PlacementPlanner
 
 
-class NodeLayout():
+class NodeLayout(object):
   """NodeLayout represents the relationship between IP addresses and the API
   services (roles) that will be used to host them in an AppScale deployment.
 
@@ -139,6 +142,9 @@ class NodeLayout():
     self.default_instance_type = options.get('instance_type')
     self.test = options.get('test')
     self.force = options.get('force')
+    self.placement = options.get('placement')
+    self.expected_app_servers = options.get('expected_app_servers')
+    self.app_server_memory = options.get('default_max_appserver_memory')
 
     if 'login_host' in options and options['login_host'] is not None:
       self.login_host = options['login_host']
@@ -146,8 +152,38 @@ class NodeLayout():
       self.login_host = None
 
     self.nodes = []
+    self.indexed_version = None
+    self.nodes_by_role = {}
+    self.nodes_by_ip = {}
+    self.nodes_by_instance_id = {}
     self.validate_node_layout()
 
+  def update_indexes(self):
+    """ Rebuilds the role, IP, and instance ID indexes if any node has
+    changed since they were built.
+
+    Nodes bump Node.generation whenever their roles or addresses change, so
+    a layout only has to compare one number to know if its indexes are stale.
+    """
+    version = (Node.generation, id(self.nodes), len(self.nodes))
+    if version == self.indexed_version:
+      return
+
+    self.nodes_by_role = {}
+    self.nodes_by_ip = {}
+    self.nodes_by_instance_id = {}
+    for node in self.nodes:
+      for role in node.roles:
+        self.nodes_by_role.setdefault(role, []).append(node)
+      # Public IPs take precedence when a node's private IP matches another
+      # node's public IP.
+      self.nodes_by_ip.setdefault(node.private_ip, node)
+      if node.instance_id != Node.DUMMY_INSTANCE_ID:
+        self.nodes_by_instance_id.setdefault(node.instance_id, node)
+    for node in self.nodes:
+      self.nodes_by_ip[node.public_ip] = node
+    self.indexed_version = version
+
   def is_cloud_ip(self, ip_address):
     """Parses the given IP address or node ID and returns it and a str
     indicating whether or not we are in a cloud deployment.
@@ -436,6 +472,23 @@ class NodeLayout():
       Returns:
         A dict that has one controller node and the other nodes set as servers.
     """
+    if self.placement == 'balanced':
+      planner = PlacementPlanner(self.default_instance_type, self.replication,
+                                 self.expected_app_servers,
+                                 self.app_server_memory)
+      try:
+        placement = planner.plan(self.min_machines)
+      except BadConfigurationException as error:
+        try:
+          needed = len(planner.plan_smallest().nodes)
+        except BadConfigurationException:
+          raise error
+        self.invalid('{0} The roles fit on {1} nodes of this instance type.'.
+                     format(error, needed))
+      for line in placement.explain():
+        AppScaleLogger.log(line)
+      return placement.to_layout()
+
     master_node_roles = ['master', 'database', 'memcache', 'login',
                          'zookeeper', 'taskqueue']
     layout = [{'roles' : master_node_roles, 'nodes' : 1}]
@@ -477,7 +530,7 @@ class NodeLayout():
       A list of nodes not running the 'shadow' role, or the empty list if the
       NodeLayout isn't acceptable for use with AppScale.
     """
-    return [node for node in self.nodes if not node.is_role('shadow')]
+    return self.get_nodes('shadow', False)
 
   def get_nodes(self, role, is_role, nodes=None):
     """ Searches through the nodes in this NodeLayout for all nodes with or
@@ -497,8 +550,37 @@ class NodeLayout():
     """
     if role not in self.VALID_ROLES:
       return []
-    nodes = nodes or self.nodes
-    return [node for node in nodes if node.is_role(role) == is_role]
+    if nodes:
+      return [node for node in nodes if node.is_role(role) == is_role]
+
+    self.update_indexes()
+    with_role = self.nodes_by_role.get(role, [])
+    if is_role:
+      return list(with_role)
+    with_role_ids = set(id(node) for node in with_role)
+    return [node for node in self.nodes if id(node) not in with_role_ids]
+
+  def node_with_ip(self, ip):
+    """ Finds the node with the given public or private IP address.
+
+    Args:
+      ip: A str, the IP address to look up.
+    Returns:
+      The Node with that IP, or None if no node has it.
+    """
+    self.update_indexes()
+    return self.nodes_by_ip.get(ip)
+
+  def node_with_instance_id(self, instance_id):
+    """ Finds the node that runs on the given instance.
+
+    Args:
+      instance_id: A str, the instance ID to look up.
+    Returns:
+      The Node on that instance, or None if no node has it.
+    """
+    self.update_indexes()
+    return self.nodes_by_instance_id.get(instance_id)
 
   def db_master(self):
     """ Searches through the nodes in this NodeLayout for the node with the
@@ -508,9 +590,9 @@ class NodeLayout():
       The node running the 'db_master' role, or None if (1) the NodeLayout isn't
       acceptable for use with AppScale, or (2) no db_master node was specified.
     """
-    for node in self.nodes:
-      if node.is_role('db_master'):
-        return node
+    db_masters = self.get_nodes('db_master', True)
+    if db_masters:
+      return db_masters[0]
     return None
 
   def are_disks_used(self):
@@ -559,34 +641,34 @@ class NodeLayout():
                                       "change the node layout use "
                                       "down --terminate before an up.")
 
-    # Place defined nodes first so they will be matched before open nodes.
-    old_nodes = [node for node in locations_nodes_list if
-                 node['jobs'] != ['open']]
-    old_nodes.extend(
-        [node for node in locations_nodes_list if node['jobs'] == ['open']])
-
-    def nodes_match(old_node, new_node):
-      """ Determines if old node is a sufficient match for the new node. """
-      if old_node.get('instance_type') != new_node.instance_type:
-        return False
-
+    # Group the old nodes by what they can be matched with. A new node
+    # matches an old node with the same instance type and roles, or failing
+    # that, an open node with the same instance type.
+    defined_nodes = {}
+    open_nodes = {}
+    for old_node in locations_nodes_list:
+      instance_type = old_node.get('instance_type')
       if old_node['jobs'] == ['open']:
-        return True
+        open_nodes.setdefault(instance_type, deque()).append(old_node)
+        continue
 
-      old_roles = {self.DEPRECATED_ROLES.get(role, role)
-                   for role in old_node.get('jobs', [])}
-      return old_roles == set(new_node.roles)
+      old_roles = frozenset(self.DEPRECATED_ROLES.get(role, role)
+                            for role in old_node.get('jobs', []))
+      defined_nodes.setdefault((instance_type, old_roles), deque()).\
+        append(old_node)
 
     # Ensure each node has a matching locations.json entry.
     for new_node in self.nodes:
-      index = next((index for index, old_node in enumerate(old_nodes)
-                    if nodes_match(old_node, new_node)), -1)
+      candidates = defined_nodes.get(
+        (new_node.instance_type, frozenset(new_node.roles)))
+      if not candidates:
+        candidates = open_nodes.get(new_node.instance_type)
 
-      if index == -1:
+      if not candidates:
         raise BadConfigurationException('Unable to find a match for {}'
                                         'in locations.json'.format(new_node))
       roles = new_node.roles
-      old_node = old_nodes.pop(index)
+      old_node = candidates.popleft()
       new_node.from_json(old_node)
       new_node.roles = roles
 
@@ -604,12 +686,25 @@ class NodeLayout():
     raise BadConfigurationException(message)
 
 
-class Node():
+class Node(object):
   """Nodes are a representation of a virtual machine in an AppScale deployment.
   """
 
   DUMMY_INSTANCE_ID = "i-APPSCALE"
 
+
+  # The attributes that NodeLayouts index nodes by.
+  INDEXED_ATTRIBUTES = frozenset(['roles', 'public_ip', 'private_ip',
+                                  'instance_id'])
+
+
+  # Hands out a new generation each time an indexed attribute changes.
+  generations = itertools.count(1)
+
+
+  # The generation of the last change to any Node's indexed attributes.
+  generation = 0
+
   def __init__(self, public_ip, cloud, roles=[], disk=None, instance_type=None):
     """Creates a new Node, representing the given id in the specified cloud.
 
@@ -631,6 +726,14 @@ class Node():
     self.expand_roles()
 
 
+  def __setattr__(self, name, value):
+    """Sets an attribute, noting when it is one that NodeLayouts index by.
+    """
+    object.__setattr__(self, name, value)
+    if name in self.INDEXED_ATTRIBUTES:
+      Node.generation = next(Node.generations)
+
+
   def __str__(self):
     return str(self.to_json())
 
@@ -0,0 +1,193 @@
+""" Runs operations against many nodes at once, with bounded concurrency. """
+
+from __future__ import absolute_import
+
+import Queue
+import threading
+import time
+
+
+# The number of operations run at once unless a caller asks for another limit.
+DEFAULT_MAX_WORKERS = 10
+
+
+# How long the coordinating thread waits for results before checking
+# deadlines again, in seconds.
+POLL_INTERVAL = 0.5
+
+
+class TaskResult(object):
+  """ The outcome of running a function for one item. """
+
+
+  def __init__(self, item):
+    """ Creates a new TaskResult.
+
+    Args:
+      item: The item the function was called with.
+    """
+    self.item = item
+    self.value = None
+    self.error = None
+    self.timed_out = False
+    self.duration = None
+
+
+  @property
+  def succeeded(self):
+    """ Returns True if the function returned without raising or timing out.
+    """
+    return self.error is None and not self.timed_out
+
+
+  def describe_failure(self):
+    """ Returns a short str explaining why the function failed. """
+    if self.timed_out:
+      return 'timed out after {0:.0f}s'.format(self.duration)
+    return '{0}: {1}'.format(type(self.error).__name__, self.error)
+
+
+def run_in_parallel(function, items, max_workers=DEFAULT_MAX_WORKERS,
+                    timeout=None, on_result=None):
+  """ Calls function once for each item, with at most max_workers calls
+  running at the same time.
+
+  Each call runs in its own daemon thread. Threads can't be interrupted, so a
+  call that exceeds its timeout is reported as timed out and abandoned: its
+  slot is given to the next item and whatever it returns later is ignored.
+  Since calls run off the main thread, they must not rely on signals (e.g.
+  AppControllerClient's SIGALRM-based timeouts).
+
+  Args:
+    function: A callable that takes a single item.
+    items: A list of items to call function with.
+    max_workers: An int, the most calls to run at once.
+    timeout: A number of seconds to allow each call, or None to wait forever.
+    on_result: A callable that is passed each TaskResult, on the calling
+      thread, as soon as that call finishes. It lets callers start follow-up
+      work without waiting for the slowest item.
+  Returns:
+    A list of TaskResults, in the same order as items.
+  """
+  results = [TaskResult(item) for item in items]
+  finished = Queue.Queue()
+  pending = list(range(len(results)))
+  pending.reverse()
+  running = {}
+
+  def worker(index):
+    """ Runs function for one item and reports back to the calling thread. """
+    try:
+      finished.put((index, function(results[index].item), None))
+    except Exception as error:
+      finished.put((index, None, error))
+
+  def complete(result):
+    """ Hands a finished result to the caller. """
+    if on_result is not None:
+      on_result(result)
+
+  while pending or running:
+    while pending and len(running) < max(max_workers, 1):
+      index = pending.pop()
+      running[index] = time.time()
+      thread = threading.Thread(target=worker, args=(index,))
+      thread.daemon = True
+      thread.start()
+
+    try:
+      index, value, error = finished.get(timeout=POLL_INTERVAL)
+    except Queue.Empty:
+      index = None
+
+    if index is not None and index in running:
+      result = results[index]
+      result.duration = time.time() - running.pop(index)
+      result.value = value
+      result.error = error
+      complete(result)
+
+    if timeout is None:
+      continue
+
+    now = time.time()
+    for index, started in running.items():
+      if now - started > timeout:
+        result = results[index]
+        result.duration = now - started
+        result.timed_out = True
+        del running[index]
+        complete(result)
+
+  return results
+
+
+class BatchWorker(object):
+  """ BatchWorker hands items to a function in batches from a background
+  thread. Items that arrive while a batch is being processed are grouped into
+  the next batch, so slow batch operations (like terminating instances) can
+  start before all of their inputs are known.
+  """
+
+
+  def __init__(self, function):
+    """ Creates a new BatchWorker.
+
+    Args:
+      function: A callable that takes a list of items.
+    """
+    self.function = function
+    self.items = Queue.Queue()
+    self.failures = []
+    self.thread = threading.Thread(target=self.run)
+    self.thread.daemon = True
+
+
+  def start(self):
+    """ Starts processing items in the background. """
+    self.thread.start()
+
+
+  def put(self, item):
+    """ Queues an item for the next batch.
+
+    Args:
+      item: The item to pass to function.
+    """
+    self.items.put(item)
+
+
+  def close(self):
+    """ Processes any queued items and waits for the background thread.
+
+    Returns:
+      A list of (batch, exception) tuples for each batch that failed.
+    """
+    self.items.put(None)
+    while self.thread.is_alive():
+      self.thread.join(POLL_INTERVAL)
+    return self.failures
+
+
+  def run(self):
+    """ Processes batches until close is called. """
+    done = False
+    while not done:
+      batch = []
+      item = self.items.get()
+      while True:
+        if item is None:
+          done = True
+          break
+        batch.append(item)
+        try:
+          item = self.items.get_nowait()
+        except Queue.Empty:
+          break
+
+      if not batch:
+        continue
+      try:
+        self.function(batch)
+      except Exception as error:
+        self.failures.append((batch, error))
@@ -4,6 +4,7 @@
 # General-purpose Python library imports
 import argparse
 import base64
+import datetime
 import os
 import uuid
 
@@ -13,17 +14,16 @@ import yaml
 
 
 # AppScale-specific imports
-try:
-  from agents.azure_agent import AzureAgent
-except ImportError:
-  AzureAgent = None
 from agents.base_agent import BaseAgent
-from agents.ec2_agent import EC2Agent
-from agents.gce_agent import GCEAgent
 from agents.factory import InfrastructureAgentFactory
+from agents.instance_types import AZURE_DISALLOWED_INSTANCE_TYPES
+from agents.instance_types import EC2_DISALLOWED_INSTANCE_TYPES
+from agents.instance_types import GCE_DISALLOWED_INSTANCE_TYPES
 from custom_exceptions import BadConfigurationException
 from local_state import APPSCALE_VERSION
 from local_state import LocalState
+from structured_output import OUTPUT_FORMATS
+from tracing import Tracer
 
 
 class ParseArgs(object):
@@ -106,12 +106,9 @@ class ParseArgs(object):
 
   # A combined list of instance types for different clouds that have less
   # than 4 GB RAM, the amount recommended for Cassandra.
-  DISALLOWED_INSTANCE_TYPES = EC2Agent.DISALLOWED_INSTANCE_TYPES + \
-                              GCEAgent.DISALLOWED_INSTANCE_TYPES
-
-  # This check is to avoid import errors whenever Azure agent is not required.
-  if AzureAgent is not None:
-    DISALLOWED_INSTANCE_TYPES += AzureAgent.DISALLOWED_INSTANCE_TYPES
+  DISALLOWED_INSTANCE_TYPES = EC2_DISALLOWED_INSTANCE_TYPES + \
+                              GCE_DISALLOWED_INSTANCE_TYPES + \
+                              AZURE_DISALLOWED_INSTANCE_TYPES
 
   # The default security group to create and use for AppScale cloud deployments.
   DEFAULT_SECURITY_GROUP = "appscale"
@@ -130,6 +127,9 @@ class ParseArgs(object):
   # explicitly provide a value, in megabytes.
   DEFAULT_MAX_APPSERVER_MEMORY = 400
 
+  # The ways that roles can be placed when the user doesn't give a layout.
+  ALLOWED_PLACEMENTS = ['simple', 'balanced']
+
 
   def __init__(self, argv, function):
     """Creates a new ParseArgs for a set of acceptable flags.
@@ -155,6 +155,9 @@ class ParseArgs(object):
 
     self.validate_allowed_flags(function)
 
+    if self.args.trace:
+      Tracer.trace_to(self.args.trace)
+
 
   def add_allowed_flags(self, function):
     """Adds flag parsing capabilities based on the given function.
@@ -173,6 +176,10 @@ class ParseArgs(object):
     self.parser.add_argument('--verbose', '-v', action='store_true',
       default=False,
       help="prints additional output (useful for debugging)")
+    self.parser.add_argument('--trace',
+      help="records how long each phase of this command takes and writes " \
+        "it to the given file (Chrome trace-event JSON if the file ends in " \
+        ".json, and a summary table otherwise)")
     #TODO: remove arguments in appscale-run-instances that are no longer
     # supported. (min, max, appengine, max_memory, scp)
     if function == "appscale-run-instances":
@@ -185,6 +192,14 @@ class ParseArgs(object):
         help="a YAML file dictating the placement strategy")
       self.parser.add_argument('--ips_layout',
         help="a base64-encoded YAML dictating the placement strategy")
+      self.parser.add_argument('--placement', default='simple',
+        choices=self.ALLOWED_PLACEMENTS,
+        help="how roles are placed in clouds when no layout is given: " \
+          "'simple' uses a fixed formula, and 'balanced' packs roles by " \
+          "each instance type's CPU and memory")
+      self.parser.add_argument('--expected_app_servers', type=int,
+        help="the number of app servers that 'balanced' placement should " \
+          "reserve room for")
 
       # Infrastructure-agnostic flags
       self.parser.add_argument('--disks',
@@ -308,6 +323,34 @@ class ParseArgs(object):
         help="the keypair name to use")
       self.parser.add_argument('--location',
         help="the location to store the collected logs")
+    elif function == "appscale-search-logs":
+      self.parser.add_argument('--keyname', '-k', default=self.DEFAULT_KEYNAME,
+        help="the keypair name to use")
+      self.parser.add_argument('--pattern',
+        help="the extended regular expression to search the logs for")
+      self.parser.add_argument('--roles', '-r', nargs='*', default=[],
+        help="only search machines running one of these roles")
+      self.parser.add_argument('--since',
+        help="skip lines logged before this time (YYYY-MM-DD[ HH:MM[:SS]])")
+      self.parser.add_argument('--until',
+        help="skip lines logged after this time (YYYY-MM-DD[ HH:MM[:SS]])")
+    elif function == "appscale-exec":
+      self.parser.add_argument('--keyname', '-k', default=self.DEFAULT_KEYNAME,
+        help="the keypair name to use")
+      self.parser.add_argument('--role', '-r', dest='roles', action='append',
+        default=[],
+        help="run on machines with this role (can be given more than once)")
+      self.parser.add_argument('--all', action='store_true', default=False,
+        help="run on every machine in the deployment")
+      self.parser.add_argument('--max_parallel', type=int, default=20,
+        help="the most machines to run the command on at once")
+      self.parser.add_argument('--timeout', type=int, default=300,
+        help="how many seconds the command may run on each machine")
+      self.parser.add_argument('--format', default='text',
+        choices=['text', 'json'],
+        help="print grouped output for people, or JSON for scripts")
+      self.parser.add_argument('remote_command', nargs=argparse.REMAINDER,
+        help="the command to run on each machine")
     elif function == "appscale-add-keypair":
       # flags relating to how many VMs we should spawn
       self.parser.add_argument('--ips',
@@ -345,6 +388,10 @@ class ParseArgs(object):
       self.parser.add_argument('--test', action='store_true',
         default=False,
         help="avoids prompting for user input")
+      self.parser.add_argument('--dry-run', action='store_true',
+        default=False,
+        help="lists how much each directory would add to the upload " \
+          "without deploying the app")
     elif function == "appscale-terminate-instances":
       self.parser.add_argument('--keyname', '-k',
         default=self.DEFAULT_KEYNAME,
@@ -415,6 +462,44 @@ class ParseArgs(object):
         action='store_true',
         default=False,
         help="print only application proxy statistics")
+      self.parser.add_argument('--node-ips',
+        nargs='+',
+        help="print only stats from nodes with these private IPs")
+      self.parser.add_argument('--apps',
+        nargs='+',
+        help="print only process and proxy stats of these applications")
+      self.parser.add_argument('--format', default='text',
+        choices=OUTPUT_FORMATS,
+        help="print tables for people, or JSON or NDJSON records for scripts")
+      self.parser.add_argument('--watch',
+        type=int,
+        help="fetch stats every this many seconds, and print only records " \
+          "that changed")
+      self.parser.add_argument('--count',
+        type=int,
+        default=0,
+        help="the number of times to fetch stats with --watch, or 0 to " \
+          "keep going until interrupted")
+    elif function == "appscale-scale":
+      self.parser.add_argument('--keyname', '-k',
+        default=self.DEFAULT_KEYNAME,
+        help="the keypair name to use")
+      self.parser.add_argument('--samples',
+        type=int,
+        default=6,
+        help="the number of times to sample the deployment's stats")
+      self.parser.add_argument('--interval',
+        type=int,
+        default=10,
+        help="the number of seconds between samples")
+      self.parser.add_argument('--apply',
+        action='store_true',
+        default=False,
+        help="adds the recommended compute nodes to the deployment")
+      self.parser.add_argument('--spare_ips',
+        nargs='+',
+        default=[],
+        help="machines that --apply may add to the deployment")
     elif function == "appscale-create-user":
       self.parser.add_argument('--keyname', '-k',
         default=self.DEFAULT_KEYNAME,
@@ -422,6 +507,9 @@ class ParseArgs(object):
     elif function == "appscale-describe-instances":
       self.parser.add_argument('--keyname', '-k', default=self.DEFAULT_KEYNAME,
         help="the keypair name to use")
+      self.parser.add_argument('--format', default='text',
+        choices=OUTPUT_FORMATS,
+        help="print tables for people, or JSON or NDJSON records for scripts")
     elif function == "appscale-relocate-app":
       self.parser.add_argument('--keyname', '-k', default=self.DEFAULT_KEYNAME,
         help="the keypair name to use")
@@ -455,6 +543,10 @@ class ParseArgs(object):
       self.parser.add_argument(
         '--test', action='store_true', default=False,
         help='Skips user input when upgrading deployment')
+      self.parser.add_argument(
+        '--offline', action='store_true', default=False,
+        help='Uses cached release metadata instead of contacting PyPI and '
+             'GitHub')
     else:
       raise SystemExit
 
@@ -488,6 +580,23 @@ class ParseArgs(object):
     elif function == "appscale-gather-logs":
       if not self.args.location:
         self.args.location = "/tmp/{0}-logs/".format(self.args.keyname)
+    elif function == "appscale-search-logs":
+      if not self.args.pattern:
+        raise BadConfigurationException("Must specify --pattern.")
+      self.args.since = self.parse_log_time(self.args.since, end_of_day=False)
+      self.args.until = self.parse_log_time(self.args.until, end_of_day=True)
+    elif function == "appscale-exec":
+      if self.args.remote_command and self.args.remote_command[0] == '--':
+        self.args.remote_command = self.args.remote_command[1:]
+      if not self.args.remote_command:
+        raise BadConfigurationException("Must specify a command to run.")
+      self.args.remote_command = ' '.join(self.args.remote_command)
+      if bool(self.args.roles) == self.args.all:
+        raise BadConfigurationException("Must specify either --role or --all.")
+      if self.args.max_parallel < 1:
+        raise BadConfigurationException("--max_parallel must be at least 1.")
+      if self.args.timeout < 1:
+        raise BadConfigurationException("--timeout must be at least 1.")
     elif function == "appscale-terminate-instances":
       if self.args.EC2_ACCESS_KEY and not self.args.EC2_SECRET_KEY:
         raise BadConfigurationException("When specifying EC2_ACCESS_KEY, " + \
@@ -509,6 +618,15 @@ class ParseArgs(object):
     elif function == "appscale-reset-pwd":
       pass
     elif function == "appscale-show-stats":
+      if self.args.watch is not None:
+        if self.args.watch < 1:
+          raise BadConfigurationException("--watch must be at least 1.")
+        if self.args.format != 'ndjson':
+          raise BadConfigurationException("--watch prints changed records, " \
+            "so it needs --format ndjson.")
+      if self.args.count < 0:
+        raise BadConfigurationException("--count can't be negative.")
+    elif function == "appscale-scale":
       pass
     elif function == "appscale-create-user":
       pass
@@ -641,7 +759,8 @@ class ParseArgs(object):
 
     # In Google Compute Engine, we have to specify the availability zone.
     if self.args.infrastructure == 'gce' and not self.args.zone:
-      self.args.zone = GCEAgent.DEFAULT_ZONE
+      gce_agent = InfrastructureAgentFactory.get_agent_class('gce')
+      self.args.zone = gce_agent.DEFAULT_ZONE
 
     # If the user wants to use spot instances in a cloud, make sure that it's
     # EC2 (since Euca doesn't have spot instances).
@@ -799,6 +918,36 @@ class ParseArgs(object):
         "admin_pass, and test.")
 
 
+  def parse_log_time(self, value, end_of_day):
+    """Normalizes a time given on the command line for log searches.
+
+    Args:
+      value: A str of the form 'YYYY-MM-DD', 'YYYY-MM-DD HH:MM', or
+        'YYYY-MM-DD HH:MM:SS' (a 'T' may separate the date and time), or None.
+      end_of_day: A bool that indicates if a bare date should refer to the end
+        of that day instead of its start.
+    Returns:
+      A str of the form 'YYYY-MM-DD HH:MM:SS', or None if value is None.
+    Raises:
+      BadConfigurationException: If value is not in a recognized format.
+    """
+    if value is None:
+      return None
+
+    value = value.strip().replace('T', ' ')
+    for time_format in ('%Y-%m-%d %H:%M:%S', '%Y-%m-%d %H:%M', '%Y-%m-%d'):
+      try:
+        parsed = datetime.datetime.strptime(value, time_format)
+      except ValueError:
+        continue
+      if time_format == '%Y-%m-%d' and end_of_day:
+        parsed = parsed.replace(hour=23, minute=59, second=59)
+      return parsed.strftime('%Y-%m-%d %H:%M:%S')
+
+    raise BadConfigurationException("Times must look like YYYY-MM-DD or " \
+      "YYYY-MM-DD HH:MM:SS, not {0}.".format(value))
+
+
   def shell_check(self, argument):
     """ Checks for special characters in arguments that are part of shell
     commands.
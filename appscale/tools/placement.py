@@ -0,0 +1,426 @@
+""" Plans which roles run on each machine in a deployment, based on the
+resources each instance type has. """
+
+from __future__ import absolute_import
+
+from collections import Counter
+
+from appscale.tools.agents.instance_types import DEFAULT_INSTANCE_RESOURCES
+from appscale.tools.agents.instance_types import INSTANCE_RESOURCES
+from appscale.tools.custom_exceptions import BadConfigurationException
+
+
+# The vCPUs and megabytes of memory that each role's services need, not
+# counting the app servers that run on compute nodes. Memory is a hard limit
+# when placing roles. CPU can be oversubscribed, but placement tries to
+# spread it out.
+ROLE_RESOURCES = {
+  'master': (0.5, 768),
+  'login': (0.1, 64),
+  'database': (0.5, 1024),
+  'zookeeper': (0.25, 256),
+  'taskqueue': (0.25, 384),
+  'memcache': (0.1, 128),
+  'compute': (0.25, 256)
+}
+
+
+# The vCPUs each app server is expected to use.
+APP_SERVER_CPU = 0.25
+
+
+# The megabytes of memory each app server may use unless the deployment sets
+# another limit.
+DEFAULT_APP_SERVER_MEMORY = 400
+
+
+# The share of a machine's resources that roles may use. The rest is left
+# for the operating system and for load spikes.
+NODE_CAPACITY = 0.9
+
+
+# The share of the head node's resources that roles may use. The head node
+# runs the controller and load balancer for the whole deployment, so it is
+# kept lightly loaded unless it is the only machine.
+HEAD_NODE_CAPACITY = 0.6
+
+
+# The most nodes to consider when looking for a layout that fits.
+MAX_PLANNED_NODES = 100
+
+
+class PlannedNode(object):
+  """ A machine in a placement plan and the roles assigned to it. """
+
+
+  def __init__(self, name, resources, capacity):
+    """ Creates a new PlannedNode.
+
+    Args:
+      name: A str that identifies the machine in explanations.
+      resources: A (vCPUs, memory in MB) tuple for the machine.
+      capacity: A float, the share of the machine's resources that roles may
+        use.
+    """
+    self.name = name
+    self.cpu_limit = resources[0] * capacity
+    self.memory_limit = resources[1] * capacity
+    self.cpu_used = 0.0
+    self.memory_used = 0
+    self.roles = []
+    self.app_servers = 0
+
+
+  def fits(self, cpu, memory):
+    """ Checks if the machine has the memory for more work.
+
+    Args:
+      cpu: A float, the vCPUs the work needs.
+      memory: An int, the megabytes of memory the work needs.
+    Returns:
+      True if the memory fits within the machine's limit.
+    """
+    return self.memory_used + memory <= self.memory_limit
+
+
+  def load_with(self, cpu, memory):
+    """ Measures how busy the machine would be with more work.
+
+    Args:
+      cpu: A float, the vCPUs the work needs.
+      memory: An int, the megabytes of memory the work needs.
+    Returns:
+      A float, the larger of the CPU and memory shares that would be in use.
+    """
+    return max((self.cpu_used + cpu) / self.cpu_limit,
+               float(self.memory_used + memory) / self.memory_limit)
+
+
+  def add(self, role, cpu, memory):
+    """ Assigns work to the machine.
+
+    Args:
+      role: A str naming the role, or None for an app server.
+      cpu: A float, the vCPUs the work needs.
+      memory: An int, the megabytes of memory the work needs.
+    """
+    if role is None:
+      self.app_servers += 1
+    else:
+      self.roles.append(role)
+    self.cpu_used += cpu
+    self.memory_used += memory
+
+
+  def describe(self):
+    """ Returns a str listing the machine's roles and resource use. """
+    roles = ', '.join(self.roles)
+    if self.app_servers:
+      roles += ', {0} app server(s)'.format(self.app_servers)
+    return '{0}: {1} (CPU {2:.2f}/{3:.2f}, memory {4}/{5} MB)'.format(
+      self.name, roles, self.cpu_used, self.cpu_limit, int(self.memory_used),
+      int(self.memory_limit))
+
+
+class Placement(object):
+  """ The outcome of planning a deployment: the machines, their roles, and
+  why they were chosen. """
+
+
+  def __init__(self, instance_type, nodes, notes):
+    """ Creates a new Placement.
+
+    Args:
+      instance_type: A str, the instance type every machine uses.
+      nodes: A list of PlannedNodes, with the head node first.
+      notes: A list of strs explaining the plan.
+    """
+    self.instance_type = instance_type
+    self.nodes = nodes
+    self.notes = notes
+
+
+  def to_layout(self):
+    """ Converts the plan into the ips_layout format used for clouds.
+
+    Returns:
+      A list of dicts, each with the roles, the number of nodes, and the
+      instance type for a group of identical nodes.
+    """
+    groups = []
+    counts = Counter()
+    for node in self.nodes:
+      roles = tuple(node.roles)
+      if roles not in counts:
+        groups.append(roles)
+      counts[roles] += 1
+
+    layout = []
+    for roles in groups:
+      node_set = {'roles': list(roles), 'nodes': counts[roles]}
+      if self.instance_type is not None:
+        node_set['instance_type'] = self.instance_type
+      layout.append(node_set)
+    return layout
+
+
+  def explain(self):
+    """ Returns a list of strs describing the plan and each machine in it. """
+    lines = list(self.notes)
+    lines.extend(node.describe() for node in self.nodes)
+    for node in self.nodes:
+      if node.cpu_used > node.cpu_limit:
+        lines.append('{0} has more work than CPU; consider a larger instance '
+                     'type or more nodes.'.format(node.name))
+    return lines
+
+
+class PlacementPlanner(object):
+  """ PlacementPlanner assigns roles to machines as a bin-packing problem.
+
+  Each role needs a share of a machine's CPU and memory. Replicated roles
+  (database and zookeeper) are spread across separate machines, and each one
+  goes to the machine that would be least loaded afterwards, which keeps the
+  machines balanced and the head node free for the controller and load
+  balancer whenever other machines have room.
+  """
+
+
+  def __init__(self, instance_type, replication=None, app_servers=None,
+               app_server_memory=None):
+    """ Creates a new PlacementPlanner.
+
+    Args:
+      instance_type: A str, the instance type every machine uses, or None in
+        virtualized clusters.
+      replication: An int, the database replication factor, or None to pick
+        one from the number of machines.
+      app_servers: An int, the number of app servers the deployment is
+        expected to need, or None to leave compute capacity unreserved.
+      app_server_memory: An int, the megabytes of memory each app server may
+        use.
+    """
+    self.instance_type = instance_type
+    self.replication = replication
+    self.app_servers = app_servers
+    self.app_server_memory = app_server_memory or DEFAULT_APP_SERVER_MEMORY
+
+
+  def get_resources(self):
+    """ Looks up the resources of the planner's instance type.
+
+    Returns:
+      A tuple of (vCPUs, memory in MB) and a str note about where the numbers
+      came from.
+    """
+    if self.instance_type in INSTANCE_RESOURCES:
+      resources = INSTANCE_RESOURCES[self.instance_type]
+      note = 'Planning for {0} nodes with {1} vCPU(s) and {2} MB of memory.'
+    else:
+      resources = DEFAULT_INSTANCE_RESOURCES
+      note = 'The size of {0} nodes is unknown, so planning as if they had ' \
+             '{1} vCPU(s) and {2} MB of memory.'
+    return resources, note.format(self.instance_type or 'these', *resources)
+
+
+  def get_role_counts(self, node_count):
+    """ Decides how many copies of each replicated role to run.
+
+    Args:
+      node_count: An int, the number of machines.
+    Returns:
+      A list of (role, count) tuples, in the order they should be placed.
+    Raises:
+      BadConfigurationException: If the replication factor needs more
+        machines than there are.
+    """
+    databases = self.replication or min(3, node_count)
+    if databases > node_count:
+      raise BadConfigurationException(
+        'A replication factor of {0} needs at least {0} nodes, since each '
+        'replica runs on its own node.'.format(databases))
+
+    zookeepers = 3 if node_count >= 5 else 1
+    taskqueues = 2 if node_count >= 8 else 1
+    return [('database', databases), ('zookeeper', zookeepers),
+            ('taskqueue', taskqueues)]
+
+
+  def plan(self, node_count):
+    """ Assigns roles to a fixed number of machines.
+
+    Args:
+      node_count: An int, the number of machines to use.
+    Returns:
+      A Placement.
+    Raises:
+      BadConfigurationException: If the roles don't fit on that many
+        machines of this instance type.
+    """
+    if node_count < 1:
+      raise BadConfigurationException('A deployment needs at least one node.')
+
+    resources, note = self.get_resources()
+    notes = [note]
+    if node_count == 1:
+      nodes = [PlannedNode('node-0', resources, NODE_CAPACITY)]
+      notes.append('With one node, every role runs on the head node.')
+    else:
+      nodes = [PlannedNode('node-0', resources, HEAD_NODE_CAPACITY)]
+      nodes.extend(PlannedNode('node-{0}'.format(index), resources,
+                               NODE_CAPACITY)
+                   for index in range(1, node_count))
+      notes.append('The head node (node-0) may only use {0:.0%} of its '
+                   'resources, so other nodes take on work first.'.
+                   format(HEAD_NODE_CAPACITY))
+
+    head = nodes[0]
+    for role in ['master', 'login']:
+      self.place(role, [head])
+
+    for role, count in self.get_role_counts(node_count):
+      for _ in range(count):
+        self.place(role, [node for node in nodes if role not in node.roles])
+      if role == 'database':
+        notes.append('database: {0} replica(s), each on its own node.'.
+                     format(count))
+      else:
+        notes.append('{0}: {1} node(s).'.format(role, count))
+
+    # Compute goes on every node but the head node when there are others,
+    # with memcache alongside it.
+    compute_nodes = [node for node in nodes[1:]
+                     if node.fits(*self.compute_resources())]
+    if not compute_nodes:
+      compute_nodes = [node for node in nodes
+                       if node.fits(*self.compute_resources())][:1]
+    if not compute_nodes:
+      raise BadConfigurationException(
+        'No node has room for the compute role and an app server.')
+    for node in compute_nodes:
+      node.add('compute', *ROLE_RESOURCES['compute'])
+      if node.fits(*ROLE_RESOURCES['memcache']):
+        node.add('memcache', *ROLE_RESOURCES['memcache'])
+
+    notes.append(self.place_app_servers(compute_nodes))
+    return Placement(self.instance_type, nodes, notes)
+
+
+  def plan_smallest(self, max_nodes=MAX_PLANNED_NODES):
+    """ Finds the fewest machines that the deployment fits on.
+
+    Args:
+      max_nodes: An int, the most machines to consider.
+    Returns:
+      A Placement.
+    Raises:
+      BadConfigurationException: If the deployment doesn't fit on max_nodes
+        machines.
+    """
+    error = None
+    for node_count in range(1, max_nodes + 1):
+      try:
+        return self.plan(node_count)
+      except BadConfigurationException as plan_error:
+        error = plan_error
+    raise error
+
+
+  def plan_additions(self, existing_nodes, new_hosts):
+    """ Decides which roles machines being added to a running deployment
+    should get.
+
+    Replicated services can't be resized while they run, so new machines
+    take on compute work, which moves app servers off of busier nodes.
+
+    Args:
+      existing_nodes: A list of dicts describing the deployment's machines,
+        as stored in the locations JSON file.
+      new_hosts: A list of strs, the machines being added.
+    Returns:
+      A Placement whose nodes are named after new_hosts.
+    Raises:
+      BadConfigurationException: If the new machines don't have room for the
+        compute role and an app server.
+    """
+    resources, note = self.get_resources()
+    notes = [note]
+    for node in existing_nodes:
+      jobs = node.get('jobs', [])
+      if 'shadow' in jobs and 'compute' in jobs:
+        notes.append('The head node ({0}) runs app servers; new compute '
+                     'nodes take that load off of it.'.format(
+                       node.get('public_ip')))
+
+    nodes = [PlannedNode(host, resources, NODE_CAPACITY)
+             for host in new_hosts]
+    for node in nodes:
+      if not node.fits(*self.compute_resources()):
+        raise BadConfigurationException(
+          '{0} does not have room for the compute role and an app server.'.
+          format(node.name))
+      node.add('compute', *ROLE_RESOURCES['compute'])
+      if node.fits(*ROLE_RESOURCES['memcache']):
+        node.add('memcache', *ROLE_RESOURCES['memcache'])
+
+    notes.append(self.place_app_servers(nodes))
+    return Placement(self.instance_type, nodes, notes)
+
+
+  def compute_resources(self):
+    """ Returns the (vCPUs, memory) a compute node needs to run at least one
+    app server. """
+    cpu, memory = ROLE_RESOURCES['compute']
+    return cpu + APP_SERVER_CPU, memory + self.app_server_memory
+
+
+  def place(self, role, candidates):
+    """ Puts a role on the candidate that would be least loaded with it.
+
+    Args:
+      role: A str, the role to place.
+      candidates: A list of PlannedNodes that may run the role.
+    Raises:
+      BadConfigurationException: If no candidate has room for the role.
+    """
+    cpu, memory = ROLE_RESOURCES[role]
+    fitting = [node for node in candidates if node.fits(cpu, memory)]
+    if not fitting:
+      raise BadConfigurationException(
+        'There is no room for another {0} role ({1} MB of memory) on {2} '
+        'node(s) of this instance type.'.format(role, memory,
+                                                len(candidates)))
+    min(fitting, key=lambda node: node.load_with(cpu, memory)).add(
+      role, cpu, memory)
+
+
+  def place_app_servers(self, compute_nodes):
+    """ Reserves room for the expected app servers, or reports how many
+    would fit.
+
+    Args:
+      compute_nodes: A list of PlannedNodes that run the compute role.
+    Returns:
+      A str describing the app server capacity.
+    Raises:
+      BadConfigurationException: If the expected app servers don't fit.
+    """
+    if self.app_servers is None:
+      room = sum(int((node.memory_limit - node.memory_used) //
+                     self.app_server_memory) for node in compute_nodes)
+      return 'compute: {0} node(s) with room for about {1} app server(s) of ' \
+             '{2} MB.'.format(len(compute_nodes), room, self.app_server_memory)
+
+    for _ in range(self.app_servers):
+      fitting = [node for node in compute_nodes
+                 if node.fits(APP_SERVER_CPU, self.app_server_memory)]
+      if not fitting:
+        raise BadConfigurationException(
+          'There is only room for {0} of the {1} expected app servers.'.format(
+            sum(node.app_servers for node in compute_nodes),
+            self.app_servers))
+      min(fitting, key=lambda node: node.load_with(
+        APP_SERVER_CPU, self.app_server_memory)).add(
+          None, APP_SERVER_CPU, self.app_server_memory)
+    return 'compute: {0} node(s) running {1} app server(s) of {2} MB.'.format(
+      len(compute_nodes), self.app_servers, self.app_server_memory)
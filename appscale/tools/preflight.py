@@ -0,0 +1,270 @@
+""" Checks that every machine in a deployment is ready to run AppScale before
+any services are started on it. """
+
+from __future__ import absolute_import
+
+import time
+
+from tabulate import tabulate
+
+from appscale.tools.appscale_logger import AppScaleLogger
+from appscale.tools.custom_exceptions import AppScaleException
+from appscale.tools.custom_exceptions import ShellException
+from appscale.tools.local_state import APPSCALE_VERSION
+from appscale.tools.parallel import run_in_parallel
+from appscale.tools.remote_helper import RemoteHelper
+
+
+class Preflight(object):
+  """ Preflight runs a single script on each machine over SSH, collecting
+  everything AppScale needs to know about the machine in one round trip, and
+  reports all of the problems it finds at once.
+
+  Problems that stop AppScale from working fail the deployment. Low resources
+  and a clock that differs from this machine's are only warned about.
+  """
+
+
+  # The directory that holds the AppScale source on each machine.
+  APPSCALE_DIR = '/root/appscale'
+
+
+  # Gathers facts about a machine as 'key=value' lines. It always exits
+  # cleanly, so that a failed SSH connection is the only way for it to fail.
+  SCRIPT = '\n'.join([
+    'echo "version=$(sed -n \'s/.*AppScale version//p\' {config_dir}/VERSION '
+    '2>/dev/null | tr -d \'[:space:]\')"',
+    'if [ -d {appscale_dir} ]; then echo "appscale_dir=yes"; '
+    'else echo "appscale_dir=no"; fi',
+    'echo "disk_free_mb=$(df -Pm / | awk \'NR == 2 {{print $4}}\')"',
+    'echo "memory_available_mb=$(awk \'/^MemAvailable:/ {{available = $2}} '
+    '/^MemFree:/ {{free = $2}} END {{print int((available ? available : free) '
+    '/ 1024)}}\' /proc/meminfo)"',
+    'echo "time=$(date +%s)"',
+    'exit 0'
+  ]).format(config_dir=RemoteHelper.CONFIG_DIR, appscale_dir=APPSCALE_DIR)
+
+
+  # The least free space, in megabytes, that the root partition should have.
+  MIN_FREE_DISK_MB = 2048
+
+
+  # The least available memory, in megabytes, that a machine should have.
+  MIN_AVAILABLE_MEMORY_MB = 512
+
+
+  # The most a machine's clock may differ from the other machines', in seconds.
+  MAX_CLOCK_SKEW = 5
+
+
+  # The longest we'll wait for a machine to answer, in seconds.
+  TIMEOUT = 30
+
+
+  # The most machines that are checked at once.
+  MAX_PARALLEL_CHECKS = 20
+
+
+  @classmethod
+  def check_nodes(cls, hosts, keyname, is_verbose):
+    """ Checks every machine at once and fails if any of them has a problem,
+    after warning about anything that AppScale can run with.
+
+    Args:
+      hosts: A list of strs, the public IPs of the machines to check.
+      keyname: A str, the name of the SSH keypair that can log into the
+        machines as root.
+      is_verbose: A bool that indicates if we should print the commands we
+        execute to stdout.
+    Raises:
+      AppScaleException: If any machine has a problem. The message holds a
+        table of every problem that was found.
+    """
+    AppScaleLogger.log('Checking {0} machine(s) before starting AppScale'.
+                       format(len(hosts)))
+    results = run_in_parallel(
+      lambda host: cls.check_node(host, keyname, is_verbose), hosts,
+      max_workers=cls.MAX_PARALLEL_CHECKS, timeout=cls.TIMEOUT)
+
+    problems = []
+    warnings = []
+    clocks = {}
+    for result in results:
+      if result.timed_out:
+        problems.append((result.item, 'no answer after {0}s'.format(
+          cls.TIMEOUT)))
+      elif result.error is not None:
+        problems.append((result.item, str(result.error)))
+      else:
+        node_problems, node_warnings, clock = result.value
+        problems.extend((result.item, problem) for problem in node_problems)
+        warnings.extend((result.item, warning) for warning in node_warnings)
+        if clock is not None:
+          clocks[result.item] = clock
+
+    clock_problems, clock_warning = cls.find_clock_skew(clocks)
+    problems.extend(clock_problems)
+    if clock_warning:
+      AppScaleLogger.warn(clock_warning)
+    if warnings:
+      AppScaleLogger.warn(
+        'AppScale may run poorly on {0} machine(s):\n{1}'.format(
+          len(set(host for host, _ in warnings)),
+          tabulate(warnings, headers=['MACHINE', 'WARNING'], tablefmt='plain')))
+
+    if problems:
+      raise AppScaleException(
+        'Found problems with {0} machine(s):\n{1}'.format(
+          len(set(host for host, _ in problems)),
+          tabulate(problems, headers=['MACHINE', 'PROBLEM'], tablefmt='plain')))
+
+
+  @classmethod
+  def check_node(cls, host, keyname, is_verbose):
+    """ Gathers facts about a machine and checks them.
+
+    Args:
+      host: A str, the public IP of the machine to check.
+      keyname: A str, the name of the SSH keypair that can log into the machine.
+      is_verbose: A bool that indicates if we should print the commands we
+        execute to stdout.
+    Returns:
+      A tuple of a list of strs describing each problem with the machine, a
+      list of strs describing each warning, and the machine's clock as
+      returned by get_clock (or None if it couldn't be read).
+    """
+    started = time.time()
+    try:
+      output = RemoteHelper.ssh(host, keyname, cls.SCRIPT, is_verbose,
+                                num_retries=1)
+    except ShellException:
+      return ['unable to log in as root over SSH'], [], None
+    finished = time.time()
+
+    facts = {}
+    for line in output.splitlines():
+      if '=' in line:
+        key, value = line.split('=', 1)
+        facts[key.strip()] = value.strip()
+    return (cls.find_problems(facts), cls.find_warnings(facts),
+            cls.get_clock(facts, (started + finished) / 2,
+                          (finished - started) / 2))
+
+
+  @classmethod
+  def find_problems(cls, facts):
+    """ Compares the facts gathered from a machine to what AppScale needs.
+
+    Args:
+      facts: A dict of the 'key=value' pairs printed by SCRIPT.
+    Returns:
+      A list of strs describing each problem with the machine.
+    """
+    problems = []
+    version = facts.get('version')
+    if not version:
+      problems.append('AppScale is not installed')
+    else:
+      reduced_version = '.'.join(version.split('.')[:2])
+      if not APPSCALE_VERSION.startswith(reduced_version):
+        problems.append('runs AppScale {0}, but these tools are version {1}'.
+                        format(version, APPSCALE_VERSION))
+
+    if facts.get('appscale_dir') != 'yes':
+      problems.append('{0} is missing'.format(cls.APPSCALE_DIR))
+
+    return problems
+
+
+  @classmethod
+  def find_warnings(cls, facts):
+    """ Checks if a machine has the resources that AppScale should have.
+
+    Args:
+      facts: A dict of the 'key=value' pairs printed by SCRIPT.
+    Returns:
+      A list of strs describing each resource the machine is low on.
+    """
+    warnings = []
+    disk_free = cls.to_number(facts.get('disk_free_mb'))
+    if disk_free is not None and disk_free < cls.MIN_FREE_DISK_MB:
+      warnings.append('only {0} MB free on / (should have {1} MB)'.format(
+        disk_free, cls.MIN_FREE_DISK_MB))
+
+    memory = cls.to_number(facts.get('memory_available_mb'))
+    if memory is not None and memory < cls.MIN_AVAILABLE_MEMORY_MB:
+      warnings.append('only {0} MB of memory available (should have {1} MB)'.
+                      format(memory, cls.MIN_AVAILABLE_MEMORY_MB))
+
+    return warnings
+
+
+  @classmethod
+  def get_clock(cls, facts, local_time, uncertainty):
+    """ Works out how far a machine's clock is from ours.
+
+    Args:
+      facts: A dict of the 'key=value' pairs printed by SCRIPT.
+      local_time: A float, our clock's best guess of when the machine read its
+        clock.
+      uncertainty: A float, how far off local_time could be because of the time
+        the round trip took.
+    Returns:
+      A tuple of the machine's clock minus ours and the uncertainty, in
+      seconds, or None if the machine didn't report its clock.
+    """
+    remote_time = cls.to_number(facts.get('time'))
+    if remote_time is None:
+      return None
+    return remote_time - local_time, uncertainty
+
+
+  @classmethod
+  def find_clock_skew(cls, clocks):
+    """ Compares the machines' clocks with each other.
+
+    Only the machines in the deployment have to agree on the time, so each
+    one is compared to the median machine. This machine's clock is only
+    warned about, since it doesn't have to be synchronized.
+
+    Args:
+      clocks: A dict mapping each machine to its clock, as returned by
+        get_clock.
+    Returns:
+      A tuple of a list of (machine, problem) tuples for the machines whose
+      clocks are too far from the others, and a str warning that the
+      deployment's clocks are off from this machine's (or None).
+    """
+    if not clocks:
+      return [], None
+
+    ordered = sorted(clocks.values())
+    reference, reference_uncertainty = ordered[(len(ordered) - 1) / 2]
+    problems = []
+    for host, (offset, uncertainty) in sorted(clocks.items()):
+      skew = offset - reference
+      if abs(skew) - uncertainty > cls.MAX_CLOCK_SKEW:
+        problems.append((host, 'clock is {0:+.0f}s off from the other '
+                               'machines'.format(skew)))
+
+    warning = None
+    if abs(reference) - reference_uncertainty > cls.MAX_CLOCK_SKEW:
+      warning = ("The deployment's clocks are {0:+.0f}s off from this "
+                 "machine's, so times it reports may not match yours.".
+                 format(reference))
+    return problems, warning
+
+
+  @staticmethod
+  def to_number(value):
+    """ Converts a fact to an int.
+
+    Args:
+      value: A str, or None if the fact is missing.
+    Returns:
+      An int, or None if the value is missing or isn't a number.
+    """
+    try:
+      return int(value)
+    except (TypeError, ValueError):
+      return None
@@ -2,7 +2,9 @@
 
 
 # General-purpose Python library imports
+import fnmatch
 import getpass
+import hashlib
 import os
 import re
 import socket
@@ -12,11 +14,12 @@ import tempfile
 import time
 import uuid
 import yaml
-
-from boto.exception import BotoServerError
+from tabulate import tabulate
 
 # AppScale-specific imports
 from agents.factory import InfrastructureAgentFactory
+from app_files import UploadFilter
+from app_files import collect_app_files
 from appcontroller_client import AppControllerClient
 from appscale_logger import AppScaleLogger
 from custom_exceptions import AppControllerException
@@ -25,10 +28,14 @@ from custom_exceptions import BadConfigurationException
 from custom_exceptions import ShellException
 from custom_exceptions import TimeoutException
 from agents.base_agent import AgentRuntimeException
-from agents.gce_agent import CredentialTypes
-from agents.gce_agent import GCEAgent
 from local_state import APPSCALE_VERSION
 from local_state import LocalState
+from parallel import BatchWorker
+from parallel import run_in_parallel
+from remote_ops import PortOperation
+from remote_ops import ProcessOperation
+from remote_script import RemoteScript
+from tracing import traced
 
 
 class RemoteHelper(object):
@@ -89,7 +96,51 @@ class RemoteHelper(object):
   CONFIG_DIR = '/etc/appscale'
 
 
+  # The longest we'll wait for all nodes to report that AppScale stopped.
+  TERMINATE_TIMEOUT = 30 * 60
+
+
+  # The bounds, in seconds, on how long to wait between requests for
+  # termination progress when the AppController has nothing new to report.
+  MIN_TERMINATE_POLL_INTERVAL = 1
+  MAX_TERMINATE_POLL_INTERVAL = 16
+
+
+  # The most nodes that we unmount and detach persistent disks from at once.
+  MAX_PARALLEL_NODE_OPERATIONS = 10
+
+
+  # The longest we'll wait to release a single node's persistent disk before
+  # terminating its instance anyway, in seconds.
+  RELEASE_DISK_TIMEOUT = 5 * 60
+
+
+  # Where the AppScale source lives on each machine.
+  APPSCALE_SOURCE_DIR = '/root/appscale'
+
+
+  # Paths in an AppScale source directory that rsync_files doesn't copy.
+  RSYNC_EXCLUDES = ['AppDB/logs/*', 'AppDB/cassandra/cassandra/*']
+
+
+  # The longest we'll wait for one node to copy files to another, in seconds.
+  RELAY_TIMEOUT = 30 * 60
+
+
+  # The environment variable that passes a password to the askpass script.
+  ASKPASS_PASSWORD_VAR = 'APPSCALE_SSH_PASSWORD'
+
+
+  # Adds the public key on stdin to root's authorized_keys, unless it is
+  # already there.
+  AUTHORIZE_KEY_COMMAND = (
+    'umask 077 && mkdir -p ~/.ssh && touch ~/.ssh/authorized_keys && '
+    'key="$(cat)" && { grep -qxF "$key" ~/.ssh/authorized_keys || '
+    'echo "$key" >> ~/.ssh/authorized_keys; }')
+
+
   @classmethod
+  @traced('remote.start_all_nodes')
   def start_all_nodes(cls, options, node_layout):
     """ Starts all nodes in the designated public cloud.
 
@@ -102,6 +153,9 @@ class RemoteHelper(object):
       The node layout (dummy values in non-cloud deployments)
       corresponding to the nodes that were started.
     """
+    # Cloud SDKs are only imported once a cloud deployment needs them.
+    from boto.exception import BotoServerError
+
     agent = InfrastructureAgentFactory.create_agent(options.infrastructure)
     params = agent.get_params_from_args(options)
 
@@ -130,16 +184,17 @@ class RemoteHelper(object):
       previous_node_list = node_layout.from_locations_json_list(node_info)
       node_layout.nodes = previous_node_list
 
-      for node_index, node in enumerate(node_layout.nodes):
-        try:
-          index = instance_ids.index(node.instance_id)
-        except ValueError:
+      running = {instance_id: index
+                 for index, instance_id in enumerate(instance_ids)}
+      for node in node_layout.nodes:
+        if node.instance_id not in running:
           raise BadConfigurationException("Previous instance_id {} does not "
                                           "currently exist."
                                           .format(node.instance_id))
-        node_layout.nodes[node_index].public_ip = public_ips[index]
-        node_layout.nodes[node_index].private_ip = private_ips[index]
-        node_layout.nodes[node_index].instance_id = instance_ids[index]
+        index = running[node.instance_id]
+        node.public_ip = public_ips[index]
+        node.private_ip = private_ips[index]
+        node.instance_id = instance_ids[index]
       return node_layout
 
     agent.configure_instance_security(params)
@@ -181,11 +236,11 @@ class RemoteHelper(object):
       # Keep track of instances we have started.
       spawned_instance_ids.extend(instance_ids)
 
+      # These are the layout's own nodes, so they can be updated in place.
       for node_index, node in enumerate(load_balancer_nodes):
-        index = node_layout.nodes.index(node)
-        node_layout.nodes[index].public_ip = public_ips[node_index]
-        node_layout.nodes[index].private_ip = private_ips[node_index]
-        node_layout.nodes[index].instance_id = instance_ids[node_index]
+        node.public_ip = public_ips[node_index]
+        node.private_ip = private_ips[node_index]
+        node.instance_id = instance_ids[node_index]
 
     if options.static_ip:
       node = node_layout.head_node()
@@ -225,14 +280,14 @@ class RemoteHelper(object):
         spawned_instance_ids.extend(_instance_ids)
 
         for node_index, node in enumerate(nodes):
-          index = node_layout.nodes.index(node)
-          node_layout.nodes[index].public_ip = _public_ips[node_index]
-          node_layout.nodes[index].private_ip = _private_ips[node_index]
-          node_layout.nodes[index].instance_id = _instance_ids[node_index]
+          node.public_ip = _public_ips[node_index]
+          node.private_ip = _private_ips[node_index]
+          node.instance_id = _instance_ids[node_index]
 
     return node_layout
 
   @classmethod
+  @traced('remote.enable_root_ssh', record=('public_ip',))
   def enable_root_ssh(cls, options, public_ip):
     """Enables root logins and SSH access on the machine
     and copies the user's SSH key to the head node. On the tools side this
@@ -252,6 +307,7 @@ class RemoteHelper(object):
     cls.copy_ssh_keys_to_node(public_ip, options.keyname, options.verbose)
 
   @classmethod
+  @traced('remote.start_head_node')
   def start_head_node(cls, options, my_id, node_layout):
     """Starts the first node in an AppScale deployment and instructs it to start
     API services on its own node, as well as the other nodes in the deployment.
@@ -300,12 +356,7 @@ class RemoteHelper(object):
 
       time.sleep(10)  # gives machines in cloud extra time to boot up
 
-    cls.copy_deployment_credentials(head_node, options)
-
-    cls.run_user_commands(head_node, options.user_commands, options.keyname,
-                          options.verbose)
-
-    cls.start_remote_appcontroller(head_node, options.keyname, options.verbose)
+    cls.bootstrap_head_node(head_node, options)
     AppScaleLogger.log("Head node successfully initialized at {0}.".
                        format(head_node))
     AppScaleLogger.remote_log_tools_state(
@@ -329,6 +380,87 @@ class RemoteHelper(object):
 
 
   @classmethod
+  @traced('remote.bootstrap_head_node', record=('host',))
+  def bootstrap_head_node(cls, host, options):
+    """Copies the deployment's credentials to the head node, runs the user's
+    commands there, and starts its AppController, all in one SSH session.
+
+    Args:
+      host: A str representing the head node's public IP.
+      options: A Namespace that indicates which SSH keypair to use, whether
+        or not we are running in a cloud infrastructure, and which commands
+        the user wants to run.
+    Returns:
+      A list of StepResults describing how long each step took.
+    Raises:
+      ShellException: If a step fails. The message names the step and holds
+        its output.
+    """
+    AppScaleLogger.log("Starting AppController at {0}".format(host))
+    script = RemoteScript()
+    cls.add_credential_steps(script, options)
+    cls.add_user_command_steps(script, options.user_commands)
+    cls.add_appcontroller_steps(script)
+    results = cls.run_script(host, options.keyname, script, options.verbose)
+
+    AppScaleLogger.log("Please wait for the AppController to finish " + \
+      "pre-processing tasks.")
+    cls.sleep_until_port_is_open(host, AppControllerClient.PORT,
+                                 options.verbose)
+    return results
+
+
+  @classmethod
+  @traced('remote.run_script', record=('host',))
+  def run_script(cls, host, keyname, script, is_verbose, user='root'):
+    """Runs every step of a RemoteScript on a machine over one SSH session.
+
+    Args:
+      host: A str representing the machine that we should log into.
+      keyname: A str representing the name of the SSH keypair to log in with.
+      script: A RemoteScript.
+      is_verbose: A bool that indicates if we should print the steps we run,
+        and how long they took, to stdout. The script itself is never
+        printed, since it can hold credentials.
+      user: A str representing the user to log in as.
+    Returns:
+      A list of StepResults, one for each step.
+    Raises:
+      ShellException: If we can't log into the machine, or if a step fails.
+    """
+    step_names = ", ".join(script.get_step_names())
+    AppScaleLogger.verbose("Running {0} on {1}".format(step_names, host),
+                           is_verbose)
+    try:
+      output = cls.ssh(host, keyname, script.render(), False, user=user)
+    except ShellException as shell_exception:
+      # The script exits 0 even when a step fails, so only ssh itself gets
+      # here. Report the steps rather than the script, which holds secrets.
+      raise ShellException("Unable to run {0} on {1}:\n{2}".format(
+        step_names, host, shell_exception.output),
+        output=shell_exception.output)
+    results = script.parse(output)
+
+    for result in results:
+      if result.ran():
+        AppScaleLogger.verbose("{0}: {1} exited with {2} after {3:.2f}s".format(
+          host, result.name, result.status, result.duration or 0.0),
+          is_verbose)
+
+    failed = next((result for result in results if not result.succeeded()),
+                  None)
+    if failed is None:
+      return results
+    if failed.ran():
+      raise ShellException("Step '{0}' failed on {1} with status {2}:\n{3}".
+                           format(failed.name, host, failed.status,
+                                  failed.output))
+    raise ShellException("{0} stopped before finishing step '{1}':\n{2}".
+                         format(host, failed.name, failed.output or output))
+
+
+  @classmethod
+  @traced('remote.spawn_nodes_in_cloud', record=('count',))
   def spawn_nodes_in_cloud(cls, agent, params, count=1, load_balancer=False):
     """Starts count number of virtual machines in a cloud infrastructure with
     public ips.
@@ -353,6 +485,7 @@ class RemoteHelper(object):
     return instance_ids, public_ips, private_ips
 
   @classmethod
+  @traced('remote.sleep_until_port_is_open', record=('host', 'port'))
   def sleep_until_port_is_open(cls, host, port, is_verbose):
     """Queries the given host to see if the named port is open, and if not,
     waits until it is.
@@ -378,6 +511,29 @@ class RemoteHelper(object):
                            "Aborting...".format(host, port))
 
 
+  @classmethod
+  def port_operation(cls, host, port, wait=False, timeout=None, limit=None):
+    """Builds an operation that does what is_port_open (or, with wait,
+    sleep_until_port_is_open) does, for a RemoteEngine to run alongside
+    others.
+
+    Args:
+      host: A str representing the host whose port we should be querying.
+      port: An int representing the port to query.
+      wait: A bool that indicates if we should wait for the port to open.
+      timeout: A number of seconds to wait. Defaults to MAX_WAIT_TIME when
+        waiting.
+      limit: A Limit shared with other operations, or None.
+    Returns:
+      A PortOperation whose value is True if the port is open. When waiting,
+      it fails with a TimeoutException if the port does not open in time.
+    """
+    if wait and timeout is None:
+      timeout = cls.MAX_WAIT_TIME
+    return PortOperation(host, port, wait=wait, interval=cls.WAIT_TIME,
+                         timeout=timeout, limit=limit)
+
+
   @classmethod
   def is_port_open(cls, host, port, is_verbose):
     """Queries the given host to see if the named port is open.
@@ -400,6 +556,7 @@ class RemoteHelper(object):
       return False
 
   @classmethod
+  @traced('remote.merge_authorized_keys', record=('host',))
   def merge_authorized_keys(cls, host, keyname, user, is_verbose):
     """ Adds the contents of the user's authorized_keys file to the root's
     authorized_keys file.
@@ -414,27 +571,23 @@ class RemoteHelper(object):
     AppScaleLogger.log('Root login not enabled for {} - enabling it '
                        'now.'.format(host))
 
-    create_root_keys = 'sudo touch /root/.ssh/authorized_keys'
-    cls.ssh(host, keyname, create_root_keys, is_verbose, user=user)
-
-    set_permissions = 'sudo chmod 600 /root/.ssh/authorized_keys'
-    cls.ssh(host, keyname, set_permissions, is_verbose, user=user)
-
-    temp_file = cls.ssh(host, keyname, 'mktemp', is_verbose, user=user)
-
-    merge_to_tempfile = 'sudo sort -u ~/.ssh/authorized_keys '\
-      '/root/.ssh/authorized_keys -o {}'.format(temp_file)
-    cls.ssh(host, keyname, merge_to_tempfile, is_verbose, user=user)
-
-    overwrite_root_keys = "sudo sed -n '/.*Please login/d; "\
-      "w/root/.ssh/authorized_keys' {}".format(temp_file)
-    cls.ssh(host, keyname, overwrite_root_keys, is_verbose, user=user)
-
-    remove_tempfile = 'rm -f {0}'.format(temp_file)
-    cls.ssh(host, keyname, remove_tempfile, is_verbose, user=user)
-    return
+    script = RemoteScript()
+    script.add_step('create_root_keys', '\n'.join([
+      'sudo touch /root/.ssh/authorized_keys',
+      'sudo chmod 600 /root/.ssh/authorized_keys']))
+    # The merged keys leave out the line that makes some clouds reject root
+    # logins.
+    script.add_step('merge_keys', '\n'.join([
+      'temp_file=$(mktemp)',
+      'trap \'rm -f "$temp_file"\' EXIT',
+      'sudo sort -u ~/.ssh/authorized_keys /root/.ssh/authorized_keys '
+      '-o "$temp_file"',
+      "sudo sed -n '/.*Please login/d; w/root/.ssh/authorized_keys' "
+      '"$temp_file"']))
+    cls.run_script(host, keyname, script, is_verbose, user=user)
 
   @classmethod
+  @traced('remote.enable_root_login', record=('host',))
   def enable_root_login(cls, host, keyname, infrastructure, is_verbose):
     """Logs into the named host and alters its ssh configuration to enable the
     root user to directly log in.
@@ -474,6 +627,7 @@ class RemoteHelper(object):
 
 
   @classmethod
+  @traced('remote.ssh', record=('host', 'user'))
   def ssh(cls, host, keyname, command, is_verbose, user='root',
             num_retries=LocalState.DEFAULT_NUM_RETRIES):
     """Logs into the named host and executes the given command.
@@ -489,13 +643,144 @@ class RemoteHelper(object):
       A str representing the standard output of the remote command and a str
         representing the standard error of the remote command.
     """
-    ssh_key = LocalState.get_key_path_from_name(keyname)
-    return LocalState.shell("ssh -F /dev/null -i {0} {1} {2}@{3} bash".format(
-      ssh_key, cls.SSH_OPTIONS, user, host),
+    return LocalState.shell(cls.get_ssh_command(host, keyname, user),
       is_verbose, num_retries, stdin=command)
 
 
   @classmethod
+  def get_ssh_command(cls, host, keyname, user='root'):
+    """Builds the command that logs into a host and runs a script from stdin.
+
+    Args:
+      host: A str representing the machine that we should log into.
+      keyname: A str representing the name of the SSH keypair to log in with.
+      user: A str representing the user to log in as.
+    Returns:
+      A str, the ssh command.
+    """
+    ssh_key = LocalState.get_key_path_from_name(keyname)
+    return "ssh -F /dev/null -i {0} {1} {2}@{3} bash".format(
+      ssh_key, cls.SSH_OPTIONS, user, host)
+
+
+  @classmethod
+  def ssh_operation(cls, host, keyname, command, is_verbose, user='root',
+                    num_retries=LocalState.DEFAULT_NUM_RETRIES, timeout=None,
+                    limit=None):
+    """Builds an operation that does what ssh does, for a RemoteEngine to run
+    alongside others.
+
+    Args:
+      host: A str representing the machine that we should log into.
+      keyname: A str representing the name of the SSH keypair to log in with.
+      command: A str representing what to execute on the remote host.
+      is_verbose: A bool indicating if we should print the ssh command to
+        stdout.
+      user: A str representing the user to log in as.
+      num_retries: The number of times to try the command.
+      timeout: A number of seconds the command may take, or None.
+      limit: A Limit shared with other operations, or None.
+    Returns:
+      A ProcessOperation whose value is the output of the remote command.
+    """
+    ssh_command = cls.get_ssh_command(host, keyname, user)
+    AppScaleLogger.verbose("shell> {0}".format(ssh_command), is_verbose)
+    return ProcessOperation(ssh_command, stdin=command,
+                            num_retries=num_retries, timeout=timeout,
+                            limit=limit)
+
+
+  @classmethod
+  def create_askpass_script(cls):
+    """Writes a script that ssh can run to get a password, instead of asking
+    for it on the terminal. The password itself is passed to the script
+    through the environment, so it is never written to disk.
+
+    Returns:
+      A str, the path of the script. Callers should remove it when done.
+    """
+    handle, path = tempfile.mkstemp(prefix='appscale-askpass-')
+    with os.fdopen(handle, 'w') as script:
+      script.write('#!/bin/sh\nprintf \'%s\\n\' "${0}"\n'.format(
+        cls.ASKPASS_PASSWORD_VAR))
+    os.chmod(path, 0700)
+    return path
+
+
+  @classmethod
+  @traced('remote.authorize_key', record=('host',))
+  def authorize_key(cls, host, public_key, password, askpass, is_verbose):
+    """Logs into a machine as root with a password and authorizes a public
+    key, so that later logins don't need the password.
+
+    ssh only asks an askpass program for passwords when it has no terminal,
+    so it runs in a session of its own. This lets many machines be set up at
+    once, which ssh-copy-id's prompts don't allow.
+
+    Args:
+      host: A str representing the machine that we should log into.
+      public_key: A str, the path of the public key to authorize.
+      password: A str, root's password on the machine.
+      askpass: A str, the path of a script made by create_askpass_script.
+      is_verbose: A bool that indicates if we should print the ssh command to
+        stdout.
+    Raises:
+      ShellException: If we can't log into the machine or add the key.
+    """
+    with open(public_key) as key_file:
+      key = key_file.read().strip()
+
+    environment = os.environ.copy()
+    environment.update({
+      'SSH_ASKPASS': askpass,
+      'SSH_ASKPASS_REQUIRE': 'force',
+      'DISPLAY': environment.get('DISPLAY', ':0'),
+      cls.ASKPASS_PASSWORD_VAR: password
+    })
+    command = ['ssh', '-F', '/dev/null', '-o', 'LogLevel=error',
+               '-o', 'StrictHostKeyChecking=no',
+               '-o', 'UserKnownHostsFile=/dev/null',
+               '-o', 'ConnectTimeout=10', '-o', 'NumberOfPasswordPrompts=1',
+               '-o', 'PubkeyAuthentication=no',
+               'root@{0}'.format(host), cls.AUTHORIZE_KEY_COMMAND]
+    AppScaleLogger.verbose("shell> {0}".format(' '.join(command)), is_verbose)
+    process = subprocess.Popen(command, stdin=subprocess.PIPE,
+      stdout=subprocess.PIPE, stderr=subprocess.STDOUT, env=environment,
+      preexec_fn=os.setsid)
+    output, _ = process.communicate(key + '\n')
+    if process.returncode != 0:
+      raise ShellException('Unable to authorize our key on {0}: {1}'.format(
+        host, output.strip() or 'ssh exited with {0}'.format(
+          process.returncode)))
+
+
+  @classmethod
+  def open_remote_stream(cls, host, keyname, command, user='root'):
+    """Starts a long-running command on a remote machine without waiting for
+    it to finish, e.g. to follow a log file.
+
+    Args:
+      host: A str representing the machine that we should log into.
+      keyname: A str representing the name of the SSH keypair to log in with.
+      command: A str representing what to execute on the remote host.
+      user: A str representing the user to log in as.
+    Returns:
+      A subprocess.Popen whose stdout yields the command's output (with stderr
+      merged in) as it is produced.
+    """
+    ssh_key = LocalState.get_key_path_from_name(keyname)
+    # ServerAlive options make ssh exit when the connection silently drops, so
+    # that callers can notice and reconnect.
+    ssh_command = ['ssh', '-n', '-F', '/dev/null', '-i', ssh_key] + \
+      cls.SSH_OPTIONS.split() + \
+      ['-o', 'ServerAliveInterval=15', '-o', 'ServerAliveCountMax=3',
+       '{0}@{1}'.format(user, host), command]
+    return subprocess.Popen(ssh_command, stdout=subprocess.PIPE,
+      stderr=subprocess.STDOUT)
+
+
+  @classmethod
+  @traced('remote.scp', record=('host', 'source', 'dest'))
   def scp(cls, host, keyname, source, dest, is_verbose, user='root',
     num_retries=LocalState.DEFAULT_NUM_RETRIES):
     """Securely copies a file from this machine to the named machine.
@@ -514,14 +799,60 @@ class RemoteHelper(object):
       A str representing the standard output of the secure copy and a str
         representing the standard error of the secure copy.
     """
+    command = cls.get_scp_command(host, keyname, source, dest, user)
+    return LocalState.shell(command, is_verbose, num_retries)
+
+
+  @classmethod
+  def get_scp_command(cls, host, keyname, source, dest, user='root'):
+    """Builds the command that copies a local file to a host.
+
+    Args:
+      host: A str representing the machine that we should log into.
+      keyname: A str representing the name of the SSH keypair to log in with.
+      source: A str representing the path on the local machine where the
+        file should be copied from.
+      dest: A str representing the path on the remote machine where the file
+        should be copied to.
+      user: A str representing the user to log in as.
+    Returns:
+      A str, the scp command.
+    """
     ssh_key = LocalState.get_key_path_from_name(keyname)
-    command = "scp -r -i {0} {1} '{2}' {3}@{4}:'{5}'".format(
+    return "scp -r -i {0} {1} '{2}' {3}@{4}:'{5}'".format(
       ssh_key, cls.SSH_OPTIONS, source, user, host, dest.replace(" ", "\ ")
     )
-    return LocalState.shell(command, is_verbose, num_retries)
 
 
   @classmethod
+  def scp_operation(cls, host, keyname, source, dest, is_verbose, user='root',
+                    num_retries=LocalState.DEFAULT_NUM_RETRIES, timeout=None,
+                    limit=None):
+    """Builds an operation that does what scp does, for a RemoteEngine to run
+    alongside others.
+
+    Args:
+      host: A str representing the machine that we should log into.
+      keyname: A str representing the name of the SSH keypair to log in with.
+      source: A str representing the local path to copy from.
+      dest: A str representing the remote path to copy to.
+      is_verbose: A bool that indicates if we should print the scp command to
+        stdout.
+      user: A str representing the user to log in as.
+      num_retries: The number of times to try the copy.
+      timeout: A number of seconds the copy may take, or None.
+      limit: A Limit shared with other operations, or None.
+    Returns:
+      A ProcessOperation whose value is the output of scp.
+    """
+    command = cls.get_scp_command(host, keyname, source, dest, user)
+    AppScaleLogger.verbose("shell> {0}".format(command), is_verbose)
+    return ProcessOperation(command, num_retries=num_retries, timeout=timeout,
+                            limit=limit)
+
+
+  @classmethod
+  @traced('remote.scp_remote_to_local', record=('host', 'source'))
   def scp_remote_to_local(cls, host, keyname, source, dest, is_verbose,
     user='root'):
     """Securely copies a file from a remote machine to this machine.
@@ -540,14 +871,61 @@ class RemoteHelper(object):
       A str representing the standard output of the secure copy and a str
         representing the standard error of the secure copy.
     """
+    command = cls.get_scp_remote_to_local_command(host, keyname, source,
+                                                  dest, user)
+    return LocalState.shell(command, is_verbose)
+
+
+  @classmethod
+  def get_scp_remote_to_local_command(cls, host, keyname, source, dest,
+                                      user='root'):
+    """Builds the command that copies a file from a host to this machine.
+
+    Args:
+      host: A str representing the machine that we should log into.
+      keyname: A str representing the name of the SSH keypair to log in with.
+      source: A str representing the path on the remote machine where the
+        file should be copied from.
+      dest: A str representing the path on the local machine where the file
+        should be copied to.
+      user: A str representing the user to log in as.
+    Returns:
+      A str, the scp command.
+    """
     ssh_key = LocalState.get_key_path_from_name(keyname)
-    command = "scp -r -i {0} {1} {2}@{3}:'{4}' '{5}'".format(
+    return "scp -r -i {0} {1} {2}@{3}:'{4}' '{5}'".format(
       ssh_key, cls.SSH_OPTIONS, user, host, source.replace(" ", "\ "), dest
     )
-    return LocalState.shell(command, is_verbose)
 
 
   @classmethod
+  def scp_remote_to_local_operation(cls, host, keyname, source, dest,
+                                    is_verbose, user='root', timeout=None,
+                                    limit=None):
+    """Builds an operation that does what scp_remote_to_local does, for a
+    RemoteEngine to run alongside others.
+
+    Args:
+      host: A str representing the machine that we should log into.
+      keyname: A str representing the name of the SSH keypair to log in with.
+      source: A str representing the remote path to copy from.
+      dest: A str representing the local path to copy to.
+      is_verbose: A bool that indicates if we should print the scp command to
+        stdout.
+      user: A str representing the user to log in as.
+      timeout: A number of seconds the copy may take, or None.
+      limit: A Limit shared with other operations, or None.
+    Returns:
+      A ProcessOperation whose value is the output of scp.
+    """
+    command = cls.get_scp_remote_to_local_command(host, keyname, source, dest,
+                                                  user)
+    AppScaleLogger.verbose("shell> {0}".format(command), is_verbose)
+    return ProcessOperation(command, timeout=timeout, limit=limit)
+
+
+  @classmethod
+  @traced('remote.copy_ssh_keys_to_node', record=('host',))
   def copy_ssh_keys_to_node(cls, host, keyname, is_verbose):
     """Sets the given SSH keypair as the default key for the named host,
     enabling it to log into other machines in the AppScale deployment without
@@ -557,46 +935,15 @@ class RemoteHelper(object):
     Args:
       host: A str representing the machine that we should log into.
       keyname: A str representing the name of the SSH keypair to log in with.
-      is_verbose: A bool that indicates if we should print the SCP commands
-        needed to copy the SSH keys over to stdout.
+      is_verbose: A bool that indicates if we should print the steps needed
+        to copy the SSH keys over to stdout.
     """
     ssh_key = LocalState.get_key_path_from_name(keyname)
-    cls.scp(host, keyname, ssh_key, '/root/.ssh/id_dsa', is_verbose)
-    cls.scp(host, keyname, ssh_key, '/root/.ssh/id_rsa', is_verbose)
-    cls.scp(host, keyname, ssh_key, '{}/{}.key'.format(cls.CONFIG_DIR, keyname),
-      is_verbose)
-
-  @classmethod
-  def ensure_machine_is_compatible(cls, host, keyname, is_verbose):
-    """Verifies that the specified host has AppScale installed on it.
-
-    This also validates that the host has the right version of AppScale
-    installed on it.
-
-    Args:
-      host: A str representing the host that may or may not be
-        AppScale-compatible.
-      keyname: A str representing the SSH keypair name that can log into the
-        named host.
-      is_verbose: A bool that indicates if we should print the commands we
-        execute to validate the machine to stdout.
-    Raises:
-      AppScaleException: If the specified host does not have AppScale installed,
-        or has the wrong version of AppScale installed.
-    """
-    # First, make sure the image is an AppScale image.
-    remote_version = cls.get_host_appscale_version(host, keyname, is_verbose)
-    if not remote_version:
-      raise AppScaleException("The machine at {0} does not have " \
-        "AppScale installed.".format(host))
-
-    # Make sure the remote version is compatible with the tools version.
-    reduced_version = '.'.join(x for x in remote_version.split('.')[:2])
-    if not APPSCALE_VERSION.startswith(reduced_version):
-      raise AppScaleException("The machine at {0} has AppScale {1} installed,"
-        " but you are trying to use it with version {2} of the AppScale "
-        "Tools. Please use the same version of the AppScale Tools that the "
-        "host machine runs.".format(host, remote_version, APPSCALE_VERSION))
+    script = RemoteScript()
+    for remote_path in ['/root/.ssh/id_dsa', '/root/.ssh/id_rsa',
+                        '{}/{}.key'.format(cls.CONFIG_DIR, keyname)]:
+      script.bundle.add_file(ssh_key, remote_path)
+    cls.run_script(host, keyname, script, is_verbose)
 
 
   @classmethod
@@ -652,6 +999,7 @@ class RemoteHelper(object):
 
 
   @classmethod
+  @traced('remote.rsync_files', record=('host',))
   def rsync_files(cls, host, keyname, local_appscale_dir, is_verbose):
     """Copies over an AppScale source directory from this machine to the
     specified host.
@@ -674,13 +1022,171 @@ class RemoteHelper(object):
     if not os.path.exists(local_path):
       raise BadConfigurationException("The location you specified to copy " \
         "from, {0}, doesn't exist.".format(local_path))
-    LocalState.shell("rsync -e 'ssh -i {0} {1}' -arv "
-      "--exclude='AppDB/logs/*' " \
-      "--exclude='AppDB/cassandra/cassandra/*' " \
-      "{2}/* root@{3}:/root/appscale/".format(ssh_key, cls.SSH_OPTIONS,
-      local_path, host), is_verbose)
+    excludes = ' '.join("--exclude='{0}'".format(pattern)
+                        for pattern in cls.RSYNC_EXCLUDES)
+    LocalState.shell("rsync -e 'ssh -i {0} {1}' -arv {2} "
+      "{3}/* root@{4}:{5}/".format(ssh_key, cls.SSH_OPTIONS, excludes,
+      local_path, host, cls.APPSCALE_SOURCE_DIR), is_verbose)
+
+
+  @classmethod
+  @traced('remote.relay_files')
+  def relay_files(cls, nodes, keyname, remote_path, is_verbose,
+                  excludes=()):
+    """Copies a directory from the first node to all of the others, over the
+    deployment's private network.
+
+    Every node that has the directory passes it on to one that doesn't, so the
+    number of nodes that have it doubles each round and N nodes are done in
+    about log2(N) rounds. Only the SSH key is sent from this machine, so the
+    upload from here doesn't grow with the size of the deployment.
+
+    Args:
+      nodes: A list of (public IP, private IP) tuples. The first node must
+        already have the directory.
+      keyname: A str representing the name of the SSH keypair that the nodes
+        accept for root logins.
+      remote_path: A str naming the directory to copy.
+      is_verbose: A bool that indicates if we should print the commands we
+        execute to stdout.
+      excludes: A list of rsync patterns for files that shouldn't be copied.
+    Raises:
+      AppScaleException: If any node could not get a copy.
+    """
+    key_path = '{0}/{1}.key'.format(cls.CONFIG_DIR, keyname)
+    cls.scp(nodes[0][0], keyname, LocalState.get_key_path_from_name(keyname),
+            key_path, is_verbose)
+
+    relay_ssh = "ssh -i {0} {1}".format(key_path, cls.SSH_OPTIONS)
+    exclude_args = ' '.join("--exclude='{0}'".format(pattern)
+                            for pattern in excludes)
+    def relay(pair):
+      """ Has one node copy the directory and the key to another. """
+      (source_ip, _), (_, target_private_ip) = pair
+      command = "chmod 600 {key} && " \
+        "rsync -az -e '{ssh}' {excludes} {path}/ root@{target}:{path}/ && " \
+        "rsync -a -e '{ssh}' {key} root@{target}:{key}".format(
+          key=key_path, ssh=relay_ssh, excludes=exclude_args,
+          path=remote_path, target=target_private_ip)
+      cls.ssh(source_ip, keyname, command, is_verbose)
+
+    have_copy = [nodes[0]]
+    waiting = list(nodes[1:])
+    failed = []
+    while waiting:
+      pairs = zip(have_copy, waiting)
+      waiting = waiting[len(pairs):]
+      AppScaleLogger.log("Relaying {0} to {1} more node(s)".format(
+        remote_path, len(pairs)))
+
+      results = run_in_parallel(relay, pairs,
+                                max_workers=cls.MAX_PARALLEL_NODE_OPERATIONS,
+                                timeout=cls.RELAY_TIMEOUT)
+      for result in results:
+        target = result.item[1]
+        if result.succeeded:
+          have_copy.append(target)
+        else:
+          failed.append((target[0], result.describe_failure()))
+
+    if failed:
+      raise AppScaleException("Unable to copy {0} to {1} node(s):\n{2}".format(
+        remote_path, len(failed),
+        tabulate(failed, headers=['NODE', 'ERROR'], tablefmt="plain")))
+
 
   @classmethod
+  @traced('remote.verify_files')
+  def verify_files(cls, hosts, keyname, local_path, remote_path, is_verbose,
+                   excludes=()):
+    """Checks that every file copied from a local directory arrived intact on
+    each of the given hosts.
+
+    Args:
+      hosts: A list of strs, the public IPs of the machines to check.
+      keyname: A str representing the name of the SSH keypair to log in with.
+      local_path: A str naming the directory that was copied.
+      remote_path: A str naming the directory it was copied to.
+      is_verbose: A bool that indicates if we should print the commands we
+        execute to stdout.
+      excludes: A list of rsync patterns for files that weren't copied.
+    Raises:
+      AppScaleException: If any host has missing or different files.
+    """
+    manifest = cls.get_file_manifest(local_path, excludes)
+    if not manifest:
+      return
+
+    # md5sum prints '<digest>  <path>' for each file, so hashing that listing
+    # on both ends compares every file with a single value per host.
+    listing = ''.join('{0}  {1}\n'.format(digest, path)
+                      for path, digest in manifest)
+    expected = hashlib.md5(listing).hexdigest()
+    command = "cd {0} && xargs -d '\\n' md5sum -- <<'EOF' | md5sum\n{1}\nEOF"\
+      .format(remote_path, '\n'.join(path for path, _ in manifest))
+
+    def checksum(host):
+      """ Returns the combined checksum of the copied files on a host. """
+      return cls.ssh(host, keyname, command, is_verbose).split()[0]
+
+    mismatched = []
+    results = run_in_parallel(checksum, hosts,
+                              max_workers=cls.MAX_PARALLEL_NODE_OPERATIONS,
+                              timeout=cls.RELAY_TIMEOUT)
+    for result in results:
+      if not result.succeeded:
+        mismatched.append((result.item, result.describe_failure()))
+      elif result.value != expected:
+        mismatched.append((result.item, 'files differ from {0}'.format(
+          local_path)))
+
+    if mismatched:
+      raise AppScaleException("Copied files did not check out on {0} node(s):"
+        "\n{1}".format(len(mismatched), tabulate(
+          mismatched, headers=['NODE', 'PROBLEM'], tablefmt="plain")))
+    AppScaleLogger.log("Verified {0} files on {1} node(s)".format(
+      len(manifest), len(hosts)))
+
+
+  @classmethod
+  def get_file_manifest(cls, local_path, excludes=()):
+    """Lists the regular files under a directory that rsync_files copies,
+    along with their MD5 digests.
+
+    Like the shell glob rsync_files uses, this skips hidden entries at the top
+    of the directory. Symlinks, and names that md5sum would escape, are skipped
+    as well.
+
+    Args:
+      local_path: A str naming the directory to list.
+      excludes: A list of rsync patterns for files to leave out.
+    Returns:
+      A list of (relative path, hex digest) tuples, sorted by path.
+    """
+    manifest = []
+    for root, dirs, files in os.walk(local_path):
+      relative_root = os.path.relpath(root, local_path)
+      if relative_root == '.':
+        relative_root = ''
+        dirs[:] = [name for name in dirs if not name.startswith('.')]
+        files = [name for name in files if not name.startswith('.')]
+      for name in files:
+        relative_path = os.path.join(relative_root, name)
+        full_path = os.path.join(root, name)
+        if os.path.islink(full_path) or '\\' in relative_path:
+          continue
+        if any(fnmatch.fnmatch(relative_path, pattern)
+               for pattern in excludes):
+          continue
+        digest = hashlib.md5()
+        with open(full_path, 'rb') as file_handle:
+          for chunk in iter(lambda: file_handle.read(1024 * 1024), ''):
+            digest.update(chunk)
+        manifest.append((relative_path, digest.hexdigest()))
+    return sorted(manifest)
+
+  @classmethod
+  @traced('remote.copy_deployment_credentials', record=('host',))
   def copy_deployment_credentials(cls, host, options):
     """Copies credentials needed to start the AppController and have it create
     other instances (in cloud deployments).
@@ -691,48 +1197,64 @@ class RemoteHelper(object):
       options: A Namespace that indicates which SSH keypair to use, and whether
         or not we are running in a cloud infrastructure.
     """
-    local_secret_key = LocalState.get_secret_key_location(options.keyname)
-    cls.scp(host, options.keyname, local_secret_key,
-      '{}/secret.key'.format(cls.CONFIG_DIR), options.verbose)
+    script = RemoteScript()
+    cls.add_credential_steps(script, options)
+    cls.run_script(host, options.keyname, script, options.verbose)
 
-    local_ssh_key = LocalState.get_key_path_from_name(options.keyname)
-    cls.scp(host, options.keyname, local_ssh_key,
-      '{}/ssh.key'.format(cls.CONFIG_DIR), options.verbose)
+  @classmethod
+  def add_credential_steps(cls, script, options):
+    """Adds the deployment's credentials to a RemoteScript's files, along with
+    a step that makes the deployment's certificate trusted.
+
+    Args:
+      script: A RemoteScript.
+      options: A Namespace that indicates which SSH keypair to use, and whether
+        or not we are running in a cloud infrastructure.
+    Raises:
+      AppScaleException: If the client secrets needed in Google Compute Engine
+        are missing.
+    """
+    script.bundle.add_file(LocalState.get_secret_key_location(options.keyname),
+      '{}/secret.key'.format(cls.CONFIG_DIR))
+    script.bundle.add_file(LocalState.get_key_path_from_name(options.keyname),
+      '{}/ssh.key'.format(cls.CONFIG_DIR))
 
     LocalState.generate_ssl_cert(options.keyname, options.verbose)
 
     local_cert = LocalState.get_certificate_location(options.keyname)
-    cls.scp(host, options.keyname, local_cert,
-      '{}/certs/mycert.pem'.format(cls.CONFIG_DIR), options.verbose)
-
-    local_private_key = LocalState.get_private_key_location(options.keyname)
-    cls.scp(host, options.keyname, local_private_key,
-      '{}/certs/mykey.pem'.format(cls.CONFIG_DIR), options.verbose)
+    script.bundle.add_file(local_cert,
+      '{}/certs/mycert.pem'.format(cls.CONFIG_DIR), mode=0644)
+    script.bundle.add_file(
+      LocalState.get_private_key_location(options.keyname),
+      '{}/certs/mykey.pem'.format(cls.CONFIG_DIR))
 
     hash_id = subprocess.Popen(["openssl", "x509", "-hash", "-noout", "-in",
-      LocalState.get_certificate_location(options.keyname)],
-      stdout=subprocess.PIPE).communicate()[0]
-    symlink_cert = 'ln -fs {}/certs/mycert.pem /etc/ssl/certs/{}.0'.\
-      format(cls.CONFIG_DIR, hash_id.rstrip())
-    cls.ssh(host, options.keyname, symlink_cert, options.verbose)
+      local_cert], stdout=subprocess.PIPE).communicate()[0]
+    script.add_step('link_certificate',
+      'ln -fs {}/certs/mycert.pem /etc/ssl/certs/{}.0'.format(
+        cls.CONFIG_DIR, hash_id.rstrip()))
 
     # In Google Compute Engine, we also need to copy over our client_secrets
     # file and the OAuth2 file that the user has approved for use with their
     # credentials, otherwise the AppScale VMs won't be able to interact with
     # GCE.
     if options.infrastructure and options.infrastructure == 'gce':
+      from agents.gce_agent import CredentialTypes
+      from agents.gce_agent import GCEAgent
+
       secrets_location = LocalState.get_client_secrets_location(options.keyname)
       if not os.path.exists(secrets_location):
         raise AppScaleException('{} does not exist.'.format(secrets_location))
       secrets_type = GCEAgent.get_secrets_type(secrets_location)
-      cls.scp(host, options.keyname, secrets_location,
-        '{}/client_secrets.json'.format(cls.CONFIG_DIR), options.verbose)
+      script.bundle.add_file(secrets_location,
+        '{}/client_secrets.json'.format(cls.CONFIG_DIR))
       if secrets_type == CredentialTypes.OAUTH:
         local_oauth = LocalState.get_oauth2_storage_location(options.keyname)
-        cls.scp(host, options.keyname, local_oauth,
-          '{}/oauth2.dat'.format(cls.CONFIG_DIR), options.verbose)
+        script.bundle.add_file(local_oauth,
+          '{}/oauth2.dat'.format(cls.CONFIG_DIR))
 
   @classmethod
+  @traced('remote.run_user_commands', record=('host',))
   def run_user_commands(cls, host, commands, keyname, is_verbose):
     """Runs any commands specified by the user before the AppController is
     started.
@@ -746,14 +1268,29 @@ class RemoteHelper(object):
       is_verbose: A bool that indicates if we should print the commands needed
         to start the AppController to stdout.
     """
-    if commands:
-      AppScaleLogger.log("Running user-specified commands at {0}".format(host))
+    if not commands:
+      return
 
-    for command in commands:
-      cls.ssh(host, keyname, command, is_verbose)
+    AppScaleLogger.log("Running user-specified commands at {0}".format(host))
+    script = RemoteScript()
+    cls.add_user_command_steps(script, commands)
+    cls.run_script(host, keyname, script, is_verbose)
+
+  @classmethod
+  def add_user_command_steps(cls, script, commands):
+    """Adds a step to a RemoteScript for each command the user wants run
+    before the AppController is started.
+
+    Args:
+      script: A RemoteScript.
+      commands: A list of strs, the commands to run.
+    """
+    for index, command in enumerate(commands or []):
+      script.add_step('user_command_{0}'.format(index + 1), command)
 
 
   @classmethod
+  @traced('remote.start_remote_appcontroller', record=('host',))
   def start_remote_appcontroller(cls, host, keyname, is_verbose):
     """Starts the AppController daemon on the specified host.
 
@@ -765,26 +1302,33 @@ class RemoteHelper(object):
         to start the AppController to stdout.
     """
     AppScaleLogger.log("Starting AppController at {0}".format(host))
-
-    # Remove any previous state. TODO: Don't do this with the tools.
-    cls.ssh(host, keyname,
-      'rm -rf {}/appcontroller-state.json'.format(cls.CONFIG_DIR), is_verbose)
-
-    # Remove any monit configuration files from previous AppScale deployments.
-    cls.ssh(host, keyname, 'rm -rf /etc/monit/conf.d/appscale-*.cfg', is_verbose)
-
-    cls.ssh(host, keyname, 'service monit start', is_verbose)
-
-    # Start the AppController.
-    cls.ssh(host, keyname, 'service appscale-controller start', is_verbose)
+    script = RemoteScript()
+    cls.add_appcontroller_steps(script)
+    cls.run_script(host, keyname, script, is_verbose)
 
     AppScaleLogger.log("Please wait for the AppController to finish " + \
       "pre-processing tasks.")
 
     cls.sleep_until_port_is_open(host, AppControllerClient.PORT, is_verbose)
 
+  @classmethod
+  def add_appcontroller_steps(cls, script):
+    """Adds the steps that start the AppController to a RemoteScript.
+
+    Args:
+      script: A RemoteScript.
+    """
+    # Remove any previous state, and any monit configuration files from
+    # previous AppScale deployments. TODO: Don't do this with the tools.
+    script.add_step('clear_state', '\n'.join([
+      'rm -rf {}/appcontroller-state.json'.format(cls.CONFIG_DIR),
+      'rm -rf /etc/monit/conf.d/appscale-*.cfg']))
+    script.add_step('start_monit', 'service monit start')
+    script.add_step('start_appcontroller', 'service appscale-controller start')
+
 
   @classmethod
+  @traced('remote.copy_local_metadata', record=('host',))
   def copy_local_metadata(cls, host, keyname, is_verbose):
     """Copies the locations.json file found locally (which
     contain metadata about this AppScale deployment) to the specified host.
@@ -796,13 +1340,15 @@ class RemoteHelper(object):
       is_verbose: A bool that indicates if we should print the SCP commands we
         exec to stdout.
     """
-    # and copy the json file if the tools on that box wants to use it
-    cls.scp(host, keyname, LocalState.get_locations_json_location(keyname),
-      '{}/locations-{}.json'.format(cls.CONFIG_DIR, keyname), is_verbose)
-
-    # and copy the secret file if the tools on that box wants to use it
-    cls.scp(host, keyname, LocalState.get_secret_key_location(keyname),
-      cls.CONFIG_DIR, is_verbose)
+    # Copy the json file and the secret file, in case the tools on that box
+    # want to use them.
+    script = RemoteScript()
+    script.bundle.add_file(LocalState.get_locations_json_location(keyname),
+      '{}/locations-{}.json'.format(cls.CONFIG_DIR, keyname))
+    secret_location = LocalState.get_secret_key_location(keyname)
+    script.bundle.add_file(secret_location, '{}/{}'.format(
+      cls.CONFIG_DIR, os.path.basename(secret_location)))
+    cls.run_script(host, keyname, script, is_verbose)
 
 
   @classmethod
@@ -859,6 +1405,7 @@ class RemoteHelper(object):
 
 
   @classmethod
+  @traced('remote.wait_for_machines_to_finish_loading', record=('host',))
   def wait_for_machines_to_finish_loading(cls, host, keyname):
     """Queries all of the AppControllers in this AppScale deployment to see if
     they have started all of the API services on their machine, and if not,
@@ -890,6 +1437,8 @@ class RemoteHelper(object):
       agent: The agent to call terminate instance with.
       params: Agent parameters.
     """
+    from boto.exception import BotoServerError
+
     terminate_params = params.copy()
     terminate_params[agent.PARAM_INSTANCE_IDS] = spawned_instance_ids
     try:
@@ -920,6 +1469,7 @@ class RemoteHelper(object):
 
 
   @classmethod
+  @traced('remote.terminate_cloud_infrastructure')
   def terminate_cloud_infrastructure(cls, keyname, is_verbose):
     """Powers off all machines in the currently running AppScale deployment.
 
@@ -934,8 +1484,8 @@ class RemoteHelper(object):
     time.sleep(2)
 
     # get all the instance IDs for machines in our deployment
-    agent = InfrastructureAgentFactory.create_agent(
-      LocalState.get_infrastructure(keyname))
+    infrastructure = LocalState.get_infrastructure(keyname)
+    agent = InfrastructureAgentFactory.create_agent(infrastructure)
     params = agent.get_cloud_params(keyname)
     params['IS_VERBOSE'] = is_verbose
     params['autoscale_agent'] = False
@@ -944,21 +1494,59 @@ class RemoteHelper(object):
     pending = True
     _, _, instance_ids = agent.describe_instances(params, pending=pending)
 
-    # If using persistent disks, unmount them and detach them before we blow
-    # away the instances.
-    nodes = LocalState.get_local_nodes_info(keyname)
-    for node in nodes:
-      if node.get('disk'):
-        AppScaleLogger.log("Unmounting persistent disk at {0}".
-                           format(node['public_ip']))
-        cls.unmount_persistent_disk(node['public_ip'], keyname, is_verbose)
-        agent.detach_disk(params, node['disk'], node['instance_id'])
-
-    # terminate all the machines
+    # Instances without persistent disks can be terminated right away. The
+    # others are terminated as soon as their disks have been unmounted and
+    # detached, which happens for several nodes at once. Instances whose disks
+    # could not be released are left running, so that their data is safe.
     AppScaleLogger.log("Terminating instances spawned with keyname {0}"
                        .format(keyname))
     params[agent.PARAM_INSTANCE_IDS] = instance_ids
-    agent.terminate_instances(params)
+    terminator = BatchWorker(
+      lambda batch: cls.terminate_instance_batch(agent, params, batch))
+    terminator.start()
+
+    nodes_with_disks = [node for node in LocalState.get_local_nodes_info(keyname)
+                        if node.get('disk')]
+    instances_with_disks = set(node['instance_id'] for node in nodes_with_disks)
+    for instance_id in instance_ids:
+      if instance_id not in instances_with_disks:
+        terminator.put(instance_id)
+
+    def on_disk_released(result):
+      """ Starts terminating a node once its disk is out of the way. """
+      instance_id = result.item['instance_id']
+      if result.succeeded and instance_id in instance_ids:
+        terminator.put(instance_id)
+
+    # The clouds' SDK clients aren't safe to share between threads, so each
+    # disk is released with its own agent while the terminator uses the first.
+    disk_results = run_in_parallel(
+      lambda node: cls.release_persistent_disk(
+        InfrastructureAgentFactory.create_agent(infrastructure), params, node,
+        keyname, is_verbose),
+      nodes_with_disks, max_workers=cls.MAX_PARALLEL_NODE_OPERATIONS,
+      timeout=cls.RELEASE_DISK_TIMEOUT, on_result=on_disk_released)
+    termination_failures = terminator.close()
+
+    failures = []
+    left_running = 0
+    for result in disk_results:
+      if not result.succeeded:
+        failures.append((result.item['public_ip'], 'release disk {0}'.format(
+          result.item['disk']), result.describe_failure()))
+        left_running += 1
+    for batch, error in termination_failures:
+      failures.append((', '.join(batch), 'terminate', str(error)))
+      left_running += len(batch)
+    if failures:
+      AppScaleLogger.warn("Some nodes could not be shut down cleanly:\n" +
+        tabulate(failures, headers=['NODE', 'STEP', 'ERROR'], tablefmt="plain"))
+    if left_running:
+      # The deployment's local state is kept so that terminating can be
+      # retried once the problems above are fixed.
+      raise AppScaleException("Left {0} instance(s) running. Run "
+        "'appscale down' again once the problems above are fixed.".format(
+        left_running))
 
     # Delete the network configuration created for the cloud.
     agent.cleanup_state(params)
@@ -970,6 +1558,48 @@ class RemoteHelper(object):
 
 
   @classmethod
+  @traced('remote.terminate_instance_batch')
+  def terminate_instance_batch(cls, agent, params, instance_ids):
+    """Terminates some of the machines in an AppScale deployment.
+
+    Args:
+      agent: The InfrastructureAgent for the deployment's cloud.
+      params: A dict with the parameters needed to talk to the cloud.
+      instance_ids: A list of strs, the instance IDs to terminate.
+    """
+    AppScaleLogger.log("Terminating instances: {0}".format(
+      ', '.join(instance_ids)))
+    batch_params = dict(params)
+    batch_params[agent.PARAM_INSTANCE_IDS] = instance_ids
+    agent.terminate_instances(batch_params)
+
+
+  @classmethod
+  @traced('remote.release_persistent_disk')
+  def release_persistent_disk(cls, agent, params, node, keyname, is_verbose):
+    """Unmounts a node's persistent disk and detaches it from the instance, so
+    that the disk survives the instance being terminated.
+
+    Args:
+      agent: The InfrastructureAgent for the deployment's cloud.
+      params: A dict with the parameters needed to talk to the cloud.
+      node: A dict with the node's 'public_ip', 'instance_id', and 'disk'.
+      keyname: The name of the SSH keypair used for this AppScale deployment.
+      is_verbose: A bool that indicates if we should print the commands executed
+        to stdout.
+    Raises:
+      ShellException: If the disk is still mounted.
+      AppScaleException: If the disk could not be detached.
+    """
+    AppScaleLogger.log("Unmounting persistent disk at {0}".
+                       format(node['public_ip']))
+    cls.unmount_persistent_disk(node['public_ip'], keyname, is_verbose)
+    if agent.detach_disk(params, node['disk'], node['instance_id']) is False:
+      raise AppScaleException("Could not detach disk {0}".format(node['disk']))
+
+
+  @classmethod
+  @traced('remote.unmount_persistent_disk', record=('host',))
   def unmount_persistent_disk(cls, host, keyname, is_verbose):
     """Unmounts the persistent disk that was previously mounted on the named
     machine.
@@ -980,16 +1610,17 @@ class RemoteHelper(object):
       keyname: The name of the SSH keypair used for this AppScale deployment.
       is_verbose: A bool that indicates if we should print the commands executed
         to stdout.
+    Raises:
+      ShellException: If the disk is still mounted afterwards. A disk that
+        wasn't mounted is fine.
     """
-    try:
-      remote_output = cls.ssh(host, keyname, 'umount {0}'.format(
-        cls.PERSISTENT_MOUNT_POINT), is_verbose)
-      AppScaleLogger.verbose(remote_output, is_verbose)
-    except ShellException:
-      pass
+    remote_output = cls.ssh(host, keyname, 'umount {0} || ! mountpoint -q {0}'
+      .format(cls.PERSISTENT_MOUNT_POINT), is_verbose)
+    AppScaleLogger.verbose(remote_output, is_verbose)
 
 
   @classmethod
+  @traced('remote.terminate_virtualized_cluster')
   def terminate_virtualized_cluster(cls, keyname, clean, is_verbose):
     """Stops all API services running on all nodes in the currently running
     AppScale deployment.
@@ -1016,38 +1647,28 @@ class RemoteHelper(object):
     try:
       machines = len(acc.get_all_public_ips()) - 1
       acc.run_terminate(clean)
-      terminated_successfully = True
-      log_dump = u""
-      while not acc.is_appscale_terminated():
-        # For terminate receive_server_message will return a JSON string that
-        # is a list of dicts with keys: ip, status, output
-        try:
-          output_list = yaml.safe_load(acc.receive_server_message())
-        except Exception as e:
-          log_dump += e.message
-          continue
-        for node in output_list:
-          if node.get("status"):
-            machines -= 1
-            AppScaleLogger.success("Node at {node_ip}: {status}".format(
-              node_ip=node.get("ip"), status="Stopping AppScale finished"))
-          else:
-            AppScaleLogger.warn("Node at {node_ip}: {status}".format(
-              node_ip=node.get("ip"), status="Stopping AppScale failed"))
-            terminated_successfully = False
-            log_dump += u"Node at {node_ip}: {status}\nNode Output:"\
-                        u"{output}".format(node_ip=node.get("ip"),
-                                           status="Stopping AppScale failed",
-                                           output=node.get("output"))
-          AppScaleLogger.verbose(u"Output of node at {node_ip}:\n"
-                                 u"{output}".format(node_ip=node.get("ip"),
-                                                    output=node.get("output")),
-                                 is_verbose)
-      if not terminated_successfully or machines > 0:
+      node_statuses, terminated = cls.wait_for_nodes_to_stop(acc, machines,
+                                                             is_verbose)
+      cls.print_terminate_progress(node_statuses, machines)
+
+      failed = [ip for ip, status in node_statuses.items()
+                if not status['success']]
+      unreported = machines - len(node_statuses)
+      if failed or unreported > 0:
+        log_dump = u""
+        for ip in sorted(failed):
+          log_dump += u"Node at {node_ip}: {status}\nNode Output:" \
+                      u"{output}".format(node_ip=ip,
+                                         status="Stopping AppScale failed",
+                                         output=node_statuses[ip]['output'])
         LocalState.generate_crash_log(AppControllerException, log_dump)
         raise AppScaleException("{0} node(s) failed stopping AppScale, "
                                 "head node is still running AppScale services."
-                                .format(machines))
+                                .format(len(failed) + max(unreported, 0)))
+      if not terminated:
+        raise AppScaleException("AppScale didn't finish stopping within {0} "
+                                "seconds, head node is still running AppScale "
+                                "services.".format(cls.TERMINATE_TIMEOUT))
       cls.stop_remote_appcontroller(shadow_host, keyname, is_verbose, clean)
     except socket.error as socket_error:
       AppScaleLogger.warn(u'Unable to talk to AppController: {}'.
@@ -1060,6 +1681,102 @@ class RemoteHelper(object):
 
 
   @classmethod
+  def wait_for_nodes_to_stop(cls, acc, machines, is_verbose):
+    """Collects the per-node results of a terminate request from the
+    AppController, until the AppController says that termination is done or
+    TERMINATE_TIMEOUT passes. Even once every node has reported, the head node
+    may still be stopping its own services, so we keep waiting for it.
+
+    The AppController holds each request for messages open until it has one
+    (or until its own timeout). When there's nothing new, we back off between
+    requests so that a quiet deployment isn't flooded with SOAP calls.
+
+    Args:
+      acc: An AppControllerClient for the head node.
+      machines: An int, the number of nodes (excluding the head node) that we
+        expect to hear from.
+      is_verbose: A bool that indicates if we should print each node's output.
+    Returns:
+      A dict mapping each node's IP to a dict with 'success' (a bool) and
+      'output' (a str), and a bool that is True if the AppController said
+      that termination is done.
+    """
+    node_statuses = {}
+    deadline = time.time() + cls.TERMINATE_TIMEOUT
+    poll_interval = cls.MIN_TERMINATE_POLL_INTERVAL
+    while True:
+      if time.time() > deadline:
+        AppScaleLogger.warn("Timed out after {0} seconds waiting for nodes to "
+                            "stop AppScale.".format(cls.TERMINATE_TIMEOUT))
+        return node_statuses, False
+
+      # For terminate receive_server_message will return a JSON string that
+      # is a list of dicts with keys: ip, status, output
+      output_list = None
+      if len(node_statuses) < machines:
+        try:
+          output_list = yaml.safe_load(acc.receive_server_message())
+        except (AppControllerException, yaml.YAMLError) as error:
+          AppScaleLogger.verbose(u"Couldn't read terminate status: {0}"
+                                 .format(error), is_verbose)
+
+      new_reports = 0
+      if isinstance(output_list, list):
+        for node in output_list:
+          node_ip = node.get("ip")
+          if node_ip in node_statuses:
+            continue
+          new_reports += 1
+          node_statuses[node_ip] = {'success': bool(node.get("status")),
+                                    'output': node.get("output")}
+          if node.get("status"):
+            AppScaleLogger.success(
+              "Node at {node_ip}: Stopping AppScale finished ({done}/{total})"
+              .format(node_ip=node_ip, done=len(node_statuses),
+                      total=machines))
+          else:
+            AppScaleLogger.warn(
+              "Node at {node_ip}: Stopping AppScale failed ({done}/{total})"
+              .format(node_ip=node_ip, done=len(node_statuses),
+                      total=machines))
+          AppScaleLogger.verbose(u"Output of node at {node_ip}:\n"
+                                 u"{output}".format(node_ip=node_ip,
+                                                    output=node.get("output")),
+                                 is_verbose)
+
+      if new_reports:
+        poll_interval = cls.MIN_TERMINATE_POLL_INTERVAL
+        continue
+
+      if acc.is_appscale_terminated():
+        return node_statuses, True
+
+      time.sleep(poll_interval)
+      poll_interval = min(poll_interval * 2, cls.MAX_TERMINATE_POLL_INTERVAL)
+
+
+  @classmethod
+  def print_terminate_progress(cls, node_statuses, machines):
+    """Prints a table with the termination result of each node.
+
+    Args:
+      node_statuses: A dict mapping each node's IP to a dict with 'success'.
+      machines: An int, the number of nodes that were expected to report.
+    """
+    if not machines:
+      return
+
+    table = [(ip, 'stopped' if node_statuses[ip]['success'] else 'failed')
+             for ip in sorted(node_statuses)]
+    unreported = machines - len(node_statuses)
+    if unreported > 0:
+      table.append(('({0} more)'.format(unreported), 'no report'))
+    AppScaleLogger.log("\n" + tabulate(table, headers=['NODE', 'STATUS'],
+                                       tablefmt="plain"))
+
+
+  @classmethod
+  @traced('remote.stop_remote_appcontroller', record=('host',))
   def stop_remote_appcontroller(cls, host, keyname, is_verbose, clean=False):
     """Stops the AppController daemon on the specified host.
 
@@ -1077,8 +1794,10 @@ class RemoteHelper(object):
 
 
   @classmethod
+  @traced('remote.copy_app_to_host', record=('app_id',))
   def copy_app_to_host(cls, app_location, app_id, keyname, is_verbose,
-                       extras=None, custom_service_yaml=None):
+                       extras=None, custom_service_yaml=None,
+                       app_archive=None, app_files=None):
     """Copies the given application to a machine running the Login service
     within an AppScale deployment.
 
@@ -1093,26 +1812,33 @@ class RemoteHelper(object):
       extras: A dictionary containing a list of files to include in the upload.
       custom_service_yaml: A string specifying the location of the service
         yaml being deployed.
+      app_archive: A str naming a tar.gz file that already holds the
+        application exactly as it should be deployed. If given, it is copied
+        instead of packing up app_location.
+      app_files: A dict mapping paths in the upload to local paths, as
+        returned by collect_app_files. If not given, app_location is walked,
+        honoring the app's skip_files and .appscaleignore.
 
     Returns:
       A str corresponding to the location on the remote filesystem where the
         application was copied to.
     """
+    remote_app_tar = "{0}/{1}.tar.gz".format(cls.REMOTE_APP_DIR, app_id)
+    if app_archive is not None:
+      AppScaleLogger.log("Copying over application")
+      cls.scp(LocalState.get_login_host(keyname), keyname, app_archive,
+              remote_app_tar, is_verbose)
+      return remote_app_tar
+
     AppScaleLogger.log("Tarring application")
     rand = str(uuid.uuid4()).replace('-', '')[:8]
     local_tarred_app = "{0}/appscale-app-{1}-{2}.tar.gz".\
       format(tempfile.gettempdir(), app_id, rand)
 
-    # Collect list of files that should be included in the tarball.
-    app_files = {}
-    for root, _, filenames in os.walk(app_location, followlinks=True):
-      relative_dir = os.path.relpath(root, app_location)
-      for filename in filenames:
-        # Ignore compiled Python files.
-        if filename.endswith('.pyc'):
-          continue
-        relative_path = os.path.join(relative_dir, filename)
-        app_files[relative_path] = os.path.join(root, filename)
+    if app_files is None:
+      app_files = collect_app_files(
+        app_location, UploadFilter.for_app(app_location, custom_service_yaml))
+    app_files = dict(app_files)
 
     if extras is not None:
       app_files.update(extras)
@@ -1129,7 +1855,6 @@ class RemoteHelper(object):
         app_tar.add(custom_service_yaml, 'app.yaml')
 
     AppScaleLogger.log("Copying over application")
-    remote_app_tar = "{0}/{1}.tar.gz".format(cls.REMOTE_APP_DIR, app_id)
     cls.scp(LocalState.get_login_host(keyname), keyname, local_tarred_app,
             remote_app_tar, is_verbose)
 
@@ -0,0 +1,754 @@
+""" Runs many remote operations at once from a single thread.
+
+Python 2 has no asyncio, so RemoteEngine plays the part of its event loop for
+the operations that RemoteHelper performs: ssh and scp processes, port probes,
+and blocking calls like AppController and AdminServer requests. The engine
+waits on all of them with poll(), enforces each operation's deadline, and
+lets operations share a Limit on how many of them run at once. """
+
+from __future__ import absolute_import
+
+import errno
+import os
+import select
+import signal
+import socket
+import subprocess
+import tempfile
+import threading
+import time
+
+from appscale.tools.custom_exceptions import AppScaleException
+from appscale.tools.custom_exceptions import CancelledException
+from appscale.tools.custom_exceptions import ShellException
+from appscale.tools.custom_exceptions import TimeoutException
+
+
+# The most bytes read from a process's output at a time.
+READ_SIZE = 64 * 1024
+
+
+class Limit(object):
+  """ Limit caps how many of the operations that share it run at once, like a
+  semaphore. Operations beyond the limit wait their turn in the order they
+  were submitted. """
+
+
+  def __init__(self, size):
+    """ Creates a new Limit.
+
+    Args:
+      size: An int, the most operations to run at once.
+    """
+    self.size = max(size, 1)
+    self.active = 0
+
+
+  def has_room(self):
+    """ Checks if another operation can start. """
+    return self.active < self.size
+
+
+class Operation(object):
+  """ An Operation is one unit of remote work that a RemoteEngine drives.
+
+  Subclasses start their work in start(), tell the engine which file
+  descriptors and times they are waiting for, and call finish() when done.
+  """
+
+
+  # The states an operation goes through.
+  WAITING = 'waiting'
+  RUNNING = 'running'
+  DONE = 'done'
+
+
+  def __init__(self, timeout=None, limit=None):
+    """ Creates a new Operation.
+
+    Args:
+      timeout: A number of seconds the operation may run once started, or
+        None to let it run until it finishes.
+      limit: A Limit shared with other operations, or None.
+    """
+    self.timeout = timeout
+    self.limit = limit
+    self.state = self.WAITING
+    self.started = None
+    self.deadline = None
+    self.duration = None
+    self.value = None
+    self.error = None
+    self.cancel_requested = False
+    self.callbacks = []
+
+
+  def done(self):
+    """ Checks if the operation has finished, successfully or not. """
+    return self.state == self.DONE
+
+
+  def succeeded(self):
+    """ Checks if the operation finished without an error. """
+    return self.done() and self.error is None
+
+
+  def result(self):
+    """ Gets what the operation produced.
+
+    Returns:
+      The operation's value.
+    Raises:
+      The operation's error, if it failed.
+      AppScaleException: If the operation has not finished.
+    """
+    if not self.done():
+      raise AppScaleException('The operation has not finished')
+    if self.error is not None:
+      raise self.error
+    return self.value
+
+
+  def cancel(self):
+    """ Asks the engine to stop the operation. Operations that have not
+    started never will, and running ones are aborted. Either way, they fail
+    with a CancelledException. """
+    if not self.done():
+      self.cancel_requested = True
+
+
+  def add_done_callback(self, callback):
+    """ Arranges for a function to be called with the operation once it is
+    done, which lets callers chain operations without waiting on them.
+
+    Args:
+      callback: A callable that takes the operation.
+    """
+    if self.done():
+      callback(self)
+    else:
+      self.callbacks.append(callback)
+
+
+  def finish(self, value=None, error=None):
+    """ Records the outcome of the operation and runs its callbacks.
+
+    Args:
+      value: What the operation produced.
+      error: An Exception, if the operation failed.
+    """
+    if self.done():
+      return
+    self.state = self.DONE
+    self.value = value
+    self.error = error
+    if self.started is not None:
+      self.duration = time.time() - self.started
+    for callback in self.callbacks:
+      callback(self)
+    self.callbacks = []
+
+
+  def describe(self):
+    """ Returns a short str naming the operation in errors. """
+    return type(self).__name__
+
+
+  def start(self):
+    """ Begins the operation's work. """
+    pass
+
+
+  def get_events(self):
+    """ Lists what the operation is waiting for.
+
+    Returns:
+      A list of (file descriptor, is_write) tuples.
+    """
+    return []
+
+
+  def handle_event(self, fd):
+    """ Continues the operation once a file descriptor is ready.
+
+    Args:
+      fd: An int, one of the descriptors from get_events.
+    """
+    pass
+
+
+  def get_wakeup(self):
+    """ Returns the time at which the operation wants handle_wakeup to be
+    called, or None. """
+    return None
+
+
+  def handle_wakeup(self, now):
+    """ Continues the operation once its wakeup time has passed.
+
+    Args:
+      now: A float, the current time.
+    """
+    pass
+
+
+  def abort(self):
+    """ Stops the operation's work and releases its resources. """
+    pass
+
+
+class ProcessOperation(Operation):
+  """ Runs a local command, like ssh or scp, and collects its output. """
+
+
+  def __init__(self, command, stdin=None, num_retries=1, retry_delay=1,
+               timeout=None, limit=None):
+    """ Creates a new ProcessOperation.
+
+    Args:
+      command: A str, the command to run with the shell.
+      stdin: A str to pass to the command on stdin, or None.
+      num_retries: An int, the number of times to try the command.
+      retry_delay: A number of seconds to wait between tries.
+      timeout: A number of seconds the command may run, over all tries.
+      limit: A Limit shared with other operations, or None.
+    """
+    super(ProcessOperation, self).__init__(timeout, limit)
+    self.command = command
+    self.stdin = stdin
+    self.num_retries = max(num_retries, 1)
+    self.retry_delay = retry_delay
+    self.attempts = 0
+    self.process = None
+    self.output = []
+    self.returncode = None
+    self.retry_at = None
+
+
+  def describe(self):
+    """ Returns a short str naming the operation in errors. """
+    return "Command '{0}'".format(self.command)
+
+
+  def get_output(self):
+    """ Returns a str with what the last try of the command printed, even if
+    it failed or was stopped. """
+    return ''.join(self.output)
+
+
+  def start(self):
+    """ Starts the command. """
+    self.spawn()
+
+
+  def spawn(self):
+    """ Runs the command once, in a session of its own so that it and any
+    processes it starts can be stopped together. """
+    self.attempts += 1
+    self.output = []
+    self.returncode = None
+    if self.stdin is not None:
+      stdin_file = tempfile.TemporaryFile()
+      stdin_file.write(self.stdin)
+      stdin_file.seek(0)
+    else:
+      stdin_file = open(os.devnull)
+
+    try:
+      self.process = subprocess.Popen(
+        self.command, shell=True, stdin=stdin_file, stdout=subprocess.PIPE,
+        stderr=subprocess.STDOUT, close_fds=True, preexec_fn=os.setsid)
+    except OSError as os_error:
+      self.finish(error=ShellException("Error executing command: '{0}':{1}".
+                                       format(self.command, os_error)))
+    finally:
+      stdin_file.close()
+
+
+  def get_events(self):
+    """ Waits for output while the command runs. """
+    if self.process is None:
+      return []
+    return [(self.process.stdout.fileno(), False)]
+
+
+  def handle_event(self, fd):
+    """ Collects output, and once the command exits, finishes or retries. """
+    chunk = os.read(fd, READ_SIZE)
+    if chunk:
+      self.output.append(chunk)
+      return
+
+    self.process.stdout.close()
+    returncode = self.process.wait()
+    self.process = None
+    self.returncode = returncode
+    output = self.get_output()
+    if returncode == 0:
+      self.finish(value=output)
+    elif self.attempts < self.num_retries:
+      self.retry_at = time.time() + self.retry_delay
+    else:
+      self.finish(error=ShellException("Executing command '{0}' failed:\n{1}".
+                                       format(self.command, output)))
+
+
+  def get_wakeup(self):
+    """ Returns when the command should be tried again, if it failed. """
+    return self.retry_at
+
+
+  def handle_wakeup(self, now):
+    """ Tries the command again. """
+    if self.retry_at is not None and now >= self.retry_at:
+      self.retry_at = None
+      self.spawn()
+
+
+  def abort(self):
+    """ Stops the command and everything it started. """
+    self.retry_at = None
+    if self.process is None:
+      return
+    try:
+      os.killpg(self.process.pid, signal.SIGTERM)
+    except OSError:
+      pass
+    self.process.stdout.close()
+    self.process.wait()
+    self.process = None
+
+
+class PortOperation(Operation):
+  """ Checks if a port on a host accepts connections, optionally waiting
+  until it does. """
+
+
+  def __init__(self, host, port, wait=False, interval=1, probe_timeout=5,
+               timeout=None, limit=None):
+    """ Creates a new PortOperation.
+
+    Args:
+      host: A str, the host to connect to.
+      port: An int, the port to connect to.
+      wait: A bool that indicates if the port should be probed until it
+        opens. If False, the operation reports whether the first probe
+        succeeded.
+      interval: A number of seconds between probes.
+      probe_timeout: A number of seconds to allow each connection attempt.
+      timeout: A number of seconds to wait for the port in total.
+      limit: A Limit shared with other operations, or None.
+    """
+    super(PortOperation, self).__init__(timeout, limit)
+    self.host = host
+    self.port = port
+    self.wait = wait
+    self.interval = interval
+    self.probe_timeout = probe_timeout
+    self.sock = None
+    self.probe_deadline = None
+    self.retry_at = None
+
+
+  def describe(self):
+    """ Returns a short str naming the operation in errors. """
+    return 'Port {0}:{1}'.format(self.host, self.port)
+
+
+  def start(self):
+    """ Makes the first connection attempt. """
+    self.probe()
+
+
+  def probe(self):
+    """ Starts connecting to the port without blocking. """
+    self.sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    self.sock.setblocking(0)
+    try:
+      code = self.sock.connect_ex((self.host, self.port))
+    except socket.error as error:
+      code = error.errno
+    if code == 0:
+      self.close()
+      self.finish(value=True)
+    elif code in (errno.EINPROGRESS, errno.EWOULDBLOCK, errno.EAGAIN):
+      self.probe_deadline = time.time() + self.probe_timeout
+    else:
+      self.closed()
+
+
+  def closed(self):
+    """ Handles a failed connection attempt. """
+    self.close()
+    if self.wait:
+      self.retry_at = time.time() + self.interval
+    else:
+      self.finish(value=False)
+
+
+  def close(self):
+    """ Closes the socket of the current attempt, if there is one. """
+    if self.sock is not None:
+      self.sock.close()
+      self.sock = None
+    self.probe_deadline = None
+
+
+  def get_events(self):
+    """ Waits for the connection attempt to complete. """
+    if self.sock is None:
+      return []
+    return [(self.sock.fileno(), True)]
+
+
+  def handle_event(self, fd):
+    """ Checks whether the connection attempt succeeded. """
+    code = self.sock.getsockopt(socket.SOL_SOCKET, socket.SO_ERROR)
+    if code == 0:
+      self.close()
+      self.finish(value=True)
+    else:
+      self.closed()
+
+
+  def get_wakeup(self):
+    """ Returns when the current attempt gives up, or the next one starts. """
+    times = [wakeup for wakeup in (self.probe_deadline, self.retry_at)
+             if wakeup is not None]
+    return min(times) if times else None
+
+
+  def handle_wakeup(self, now):
+    """ Gives up on slow attempts and starts new ones. """
+    if self.probe_deadline is not None and now >= self.probe_deadline:
+      self.closed()
+    if self.retry_at is not None and now >= self.retry_at:
+      self.retry_at = None
+      self.probe()
+
+
+  def abort(self):
+    """ Stops probing. """
+    self.retry_at = None
+    self.close()
+
+
+class CallOperation(Operation):
+  """ Runs a blocking function, like an AppController or AdminServer
+  request, on a helper thread, so that the engine can wait on it alongside
+  other operations.
+
+  Threads can't be interrupted, so a call that is aborted is abandoned and
+  whatever it returns later is ignored. Calls that run off the main thread
+  can't use SIGALRM, so the operation's timeout is what bounds them.
+  """
+
+
+  def __init__(self, function, args=(), timeout=None, limit=None):
+    """ Creates a new CallOperation.
+
+    Args:
+      function: The callable to run.
+      args: A tuple of arguments to pass to function.
+      timeout: A number of seconds the call may take.
+      limit: A Limit shared with other operations, or None.
+    """
+    super(CallOperation, self).__init__(timeout, limit)
+    self.function = function
+    self.args = args
+    self.read_fd = None
+    self.outcome = None
+
+
+  def describe(self):
+    """ Returns a short str naming the operation in errors. """
+    return 'Call to {0}'.format(getattr(self.function, '__name__',
+                                        self.function))
+
+
+  def start(self):
+    """ Starts the call on a helper thread. """
+    self.read_fd, write_fd = os.pipe()
+    thread = threading.Thread(target=self.call, args=(write_fd,))
+    thread.daemon = True
+    thread.start()
+
+
+  def call(self, write_fd):
+    """ Runs the function and wakes up the engine.
+
+    Args:
+      write_fd: An int, the end of a pipe that the engine is waiting on.
+    """
+    try:
+      self.outcome = (self.function(*self.args), None)
+    except Exception as error:
+      self.outcome = (None, error)
+    finally:
+      try:
+        os.write(write_fd, 'x')
+      except OSError:
+        # The operation was aborted, so no one is listening.
+        pass
+      os.close(write_fd)
+
+
+  def get_events(self):
+    """ Waits for the helper thread. """
+    if self.read_fd is None:
+      return []
+    return [(self.read_fd, False)]
+
+
+  def handle_event(self, fd):
+    """ Finishes with whatever the function returned or raised. """
+    os.read(fd, 1)
+    self.close()
+    value, error = self.outcome
+    self.finish(value=value, error=error)
+
+
+  def close(self):
+    """ Stops waiting for the helper thread. """
+    if self.read_fd is not None:
+      os.close(self.read_fd)
+      self.read_fd = None
+
+
+  def abort(self):
+    """ Abandons the call. """
+    self.close()
+
+
+class RemoteEngine(object):
+  """ RemoteEngine drives many operations at once from the calling thread.
+
+  Operations are submitted, and then make progress whenever the engine runs,
+  i.e. while a caller waits on some of them or sleeps through the engine.
+  """
+
+
+  def __init__(self):
+    """ Creates a new RemoteEngine with no operations. """
+    self.waiting = []
+    self.running = []
+
+
+  def submit(self, operation):
+    """ Queues an operation to run.
+
+    Args:
+      operation: An Operation that has not been submitted before.
+    Returns:
+      The operation.
+    """
+    self.waiting.append(operation)
+    return operation
+
+
+  def wait(self, operations=None, timeout=None):
+    """ Runs the engine until the given operations are done.
+
+    Args:
+      operations: A list of Operations, which are submitted if they have not
+        been. Defaults to every operation submitted so far.
+      timeout: A number of seconds to wait, or None to wait until they are
+        done. Operations that are still running when it elapses keep running
+        the next time the engine does.
+    Returns:
+      A list of the operations.
+    """
+    if operations is None:
+      operations = self.waiting + self.running
+    operations = list(operations)
+    for operation in operations:
+      if (operation.state == Operation.WAITING and
+          operation not in self.waiting):
+        self.submit(operation)
+
+    until = None if timeout is None else time.time() + timeout
+    self.run(until, lambda: all(operation.done() for operation in operations))
+    return operations
+
+
+  def run_one(self, operation):
+    """ Runs a single operation, along with anything else submitted.
+
+    Args:
+      operation: An Operation.
+    Returns:
+      What the operation produced.
+    Raises:
+      The operation's error, if it failed.
+    """
+    self.wait([operation])
+    return operation.result()
+
+
+  def sleep(self, seconds):
+    """ Keeps running the engine's operations for a while.
+
+    Args:
+      seconds: A number of seconds to wait.
+    """
+    self.run(time.time() + seconds, lambda: False)
+
+
+  def cancel_all(self):
+    """ Cancels every operation that has not finished, and waits for them to
+    stop. """
+    for operation in self.waiting + self.running:
+      operation.cancel()
+    self.wait()
+
+
+  def run(self, until, is_finished):
+    """ Drives operations until a condition holds or a time passes.
+
+    Args:
+      until: A time to stop at, or None.
+      is_finished: A callable that returns True when the engine can stop.
+    """
+    while True:
+      self.advance()
+      if is_finished():
+        return
+      if until is not None and time.time() >= until:
+        return
+      if not self.running and not self.waiting and until is None:
+        return
+      self.poll(until)
+
+
+  def advance(self):
+    """ Starts waiting operations that have room, and handles cancellations,
+    deadlines, and wakeups. """
+    progressed = True
+    while progressed:
+      self.sweep()
+      progressed = self.start_waiting()
+
+
+  def start_waiting(self):
+    """ Starts operations in the order they were submitted, as their limits
+    allow.
+
+    Returns:
+      True if any operation started or was cancelled.
+    """
+    progressed = False
+    still_waiting = []
+    for operation in self.waiting:
+      if operation.cancel_requested:
+        operation.finish(error=CancelledException(
+          '{0} was cancelled'.format(operation.describe())))
+        progressed = True
+        continue
+
+      limit = operation.limit
+      if limit is not None and not limit.has_room():
+        still_waiting.append(operation)
+        continue
+
+      if limit is not None:
+        limit.active += 1
+      operation.state = Operation.RUNNING
+      operation.started = time.time()
+      if operation.timeout is not None:
+        operation.deadline = operation.started + operation.timeout
+      self.running.append(operation)
+      progressed = True
+      try:
+        operation.start()
+      except Exception as error:
+        operation.abort()
+        operation.finish(error=error)
+
+    self.waiting = still_waiting
+    return progressed
+
+
+  def sweep(self):
+    """ Handles cancellations, deadlines, and wakeups of running operations,
+    and releases the limits of the ones that are done. """
+    now = time.time()
+    for operation in self.running:
+      if operation.done():
+        continue
+
+      if operation.cancel_requested:
+        operation.abort()
+        operation.finish(error=CancelledException(
+          '{0} was cancelled'.format(operation.describe())))
+      elif operation.deadline is not None and now >= operation.deadline:
+        operation.abort()
+        operation.finish(error=TimeoutException(
+          '{0} did not finish within {1}s'.format(operation.describe(),
+                                                  operation.timeout)))
+      else:
+        wakeup = operation.get_wakeup()
+        if wakeup is not None and now >= wakeup:
+          self.dispatch(operation, operation.handle_wakeup, now)
+
+    still_running = []
+    for operation in self.running:
+      if not operation.done():
+        still_running.append(operation)
+      elif operation.limit is not None:
+        operation.limit.active -= 1
+    self.running = still_running
+
+
+  def poll(self, until):
+    """ Waits for a running operation to be ready, for an operation's wakeup
+    or deadline, or for the given time, whichever comes first.
+
+    Args:
+      until: A time to stop waiting at, or None.
+    """
+    times = [] if until is None else [until]
+    poller = select.poll()
+    operations_by_fd = {}
+    for operation in self.running:
+      for fd, is_write in operation.get_events():
+        operations_by_fd[fd] = operation
+        poller.register(fd, select.POLLOUT if is_write else select.POLLIN)
+      for wakeup in (operation.get_wakeup(), operation.deadline):
+        if wakeup is not None:
+          times.append(wakeup)
+
+    if times:
+      wait = max(min(times) - time.time(), 0)
+    elif operations_by_fd:
+      wait = None
+    else:
+      return
+
+    try:
+      events = poller.poll(None if wait is None else int(wait * 1000) + 1)
+    except select.error as error:
+      if error.args[0] == errno.EINTR:
+        return
+      raise
+
+    for fd, _ in events:
+      operation = operations_by_fd[fd]
+      if not operation.done():
+        self.dispatch(operation, operation.handle_event, fd)
+
+
+  @staticmethod
+  def dispatch(operation, handler, argument):
+    """ Calls one of an operation's handlers, failing the operation if the
+    handler raises.
+
+    Args:
+      operation: The Operation whose handler this is.
+      handler: The bound method to call.
+      argument: What to pass to handler.
+    """
+    try:
+      handler(argument)
+    except Exception as error:
+      operation.abort()
+      operation.finish(error=error)
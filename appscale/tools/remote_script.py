@@ -0,0 +1,248 @@
+""" Builds shell scripts that run several steps on a remote machine in a single
+SSH session, along with any files those steps need, and reads back how each
+step went. """
+
+from __future__ import absolute_import
+
+import base64
+import binascii
+import io
+import os
+import tarfile
+import time
+
+
+class FileBundle(object):
+  """ FileBundle packs files, with the paths and modes they should have on a
+  remote machine, into one in-memory tarball. """
+
+
+  def __init__(self):
+    """ Creates a new, empty FileBundle. """
+    # A list of (remote path, mode, local path, contents) tuples. Exactly one
+    # of local path and contents is set.
+    self.files = []
+
+
+  def __len__(self):
+    """ Returns the number of files in the bundle. """
+    return len(self.files)
+
+
+  def add_file(self, local_path, remote_path, mode=0600):
+    """ Adds a local file to the bundle. The file is read when the bundle is
+    packed.
+
+    Args:
+      local_path: A str, the path of the file on this machine.
+      remote_path: A str, the absolute path the file should have on the
+        remote machine.
+      mode: An int, the file's permissions on the remote machine.
+    """
+    self.files.append((remote_path, mode, local_path, None))
+
+
+  def add_contents(self, contents, remote_path, mode=0600):
+    """ Adds a file with the given contents to the bundle.
+
+    Args:
+      contents: A str, what the file should hold.
+      remote_path: A str, the absolute path the file should have on the
+        remote machine.
+      mode: An int, the file's permissions on the remote machine.
+    """
+    self.files.append((remote_path, mode, None, contents))
+
+
+  def to_tarball(self):
+    """ Packs the bundle's files.
+
+    Returns:
+      A str holding a gzipped tarball whose members are named relative to
+      '/', owned by root, and have the requested modes.
+    """
+    buffer = io.BytesIO()
+    tar = tarfile.open(fileobj=buffer, mode='w:gz')
+    now = time.time()
+    for remote_path, mode, local_path, contents in self.files:
+      if local_path is not None:
+        with open(local_path, 'rb') as local_file:
+          contents = local_file.read()
+
+      info = tarfile.TarInfo(remote_path.lstrip('/'))
+      info.size = len(contents)
+      info.mode = mode
+      info.mtime = now
+      info.uid = info.gid = 0
+      info.uname = info.gname = 'root'
+      tar.addfile(info, io.BytesIO(contents))
+    tar.close()
+    return buffer.getvalue()
+
+
+class StepResult(object):
+  """ How one step of a RemoteScript went. """
+
+
+  def __init__(self, name, status=None, duration=None, output=''):
+    """ Creates a new StepResult.
+
+    Args:
+      name: A str, the name of the step.
+      status: An int, the step's exit status, or None if the step never ran.
+      duration: A float, how many seconds the step took on the remote machine,
+        or None if the step never ran.
+      output: A str, what the step printed to stdout and stderr.
+    """
+    self.name = name
+    self.status = status
+    self.duration = duration
+    self.output = output
+
+
+  def ran(self):
+    """ Checks if the step ran to completion, successfully or not. """
+    return self.status is not None
+
+
+  def succeeded(self):
+    """ Checks if the step ran and exited cleanly. """
+    return self.status == 0
+
+
+class RemoteScript(object):
+  """ RemoteScript composes named steps, and the files they need, into a
+  single script for bash to read from stdin.
+
+  Each step runs in its own subshell that stops at the first failing command.
+  Steps are separated by marker lines that record their exit status and how
+  long they took, and the script stops after the first step that fails. The
+  script itself always exits cleanly, so that a failed SSH connection is the
+  only thing that makes it fail as a whole.
+  """
+
+
+  # The name of the step that installs the bundled files.
+  INSTALL_STEP = 'install_files'
+
+
+  # The number of base64 characters on each line of an embedded tarball.
+  BASE64_LINE_LENGTH = 76
+
+
+  def __init__(self):
+    """ Creates a new, empty RemoteScript. """
+    self.steps = []
+    self.bundle = FileBundle()
+    # Names the marker lines and temporary files, so that they can't clash
+    # with a step's output or with another script.
+    self.token = binascii.hexlify(os.urandom(16))
+    self.marker = '@@appscale-step-{0}'.format(self.token)
+
+
+  def add_step(self, name, command):
+    """ Adds a step to the end of the script.
+
+    Args:
+      name: A str without spaces that identifies the step in results and
+        errors.
+      command: A str, one or more lines of shell commands.
+    """
+    self.steps.append((name, command))
+
+
+  def get_step_names(self):
+    """ Lists the names of the steps the script runs, in order. """
+    names = [name for name, _ in self.steps]
+    if self.bundle:
+      names.insert(0, self.INSTALL_STEP)
+    return names
+
+
+  def get_install_command(self):
+    """ Generates the commands that unpack the bundled files.
+
+    Returns:
+      A str holding the tarball, base64-encoded, and the commands that
+      extract it over '/'.
+    """
+    encoded = base64.b64encode(self.bundle.to_tarball())
+    lines = [encoded[start:start + self.BASE64_LINE_LENGTH]
+             for start in range(0, len(encoded), self.BASE64_LINE_LENGTH)]
+    tarball = '/tmp/appscale-bundle-{0}.tar.gz'.format(self.token)
+    end_of_data = 'END_OF_BUNDLE_{0}'.format(self.token)
+    return '\n'.join(
+      ["base64 -d > {0} <<'{1}'".format(tarball, end_of_data)] + lines +
+      [end_of_data,
+       'tar -xzpf {0} -C / || {{ rm -f {0}; exit 1; }}'.format(tarball),
+       'rm -f {0}'.format(tarball)])
+
+
+  def render(self):
+    """ Generates the script.
+
+    Returns:
+      A str that bash can run.
+    """
+    steps = list(self.steps)
+    if self.bundle:
+      steps.insert(0, (self.INSTALL_STEP, self.get_install_command()))
+
+    lines = []
+    for name, command in steps:
+      lines.extend([
+        'started=$(date +%s.%N)',
+        "echo '{0} begin {1}'".format(self.marker, name),
+        '(',
+        'set -e',
+        command,
+        ') < /dev/null 2>&1',
+        'status=$?',
+        'echo',
+        'echo "{0} end {1} $status $started $(date +%s.%N)"'.format(
+          self.marker, name),
+        'if [ $status -ne 0 ]; then exit 0; fi'
+      ])
+    lines.append('exit 0')
+    return '\n'.join(lines) + '\n'
+
+
+  def parse(self, output):
+    """ Reads how each step went from the script's output.
+
+    Args:
+      output: A str, everything the script printed.
+    Returns:
+      A list of StepResults, one for each step in the order they run. Steps
+      that never finished have no status.
+    """
+    results = [StepResult(name) for name in self.get_step_names()]
+    by_name = dict((result.name, result) for result in results)
+
+    current = None
+    lines = []
+    for line in output.splitlines():
+      if not line.startswith(self.marker + ' '):
+        if current is not None:
+          lines.append(line)
+        continue
+
+      fields = line.split()
+      if fields[1] == 'begin' and len(fields) == 3:
+        current = by_name.get(fields[2])
+        lines = []
+      elif fields[1] == 'end' and len(fields) == 6 and current is not None:
+        current.status = int(fields[3])
+        try:
+          current.duration = max(float(fields[5]) - float(fields[4]), 0.0)
+        except ValueError:
+          current.duration = None
+        # The line break before the end marker isn't part of the output.
+        if lines and not lines[-1]:
+          lines.pop()
+        current.output = '\n'.join(lines)
+        current = None
+
+    if current is not None:
+      current.output = '\n'.join(lines)
+    return results
@@ -0,0 +1,215 @@
+""" Follows the output of commands on many AppScale nodes at once. """
+
+from __future__ import absolute_import
+
+import Queue
+import sys
+import threading
+import time
+
+from appscale.tools.remote_helper import RemoteHelper
+
+
+class RemoteStream(object):
+  """ RemoteStream runs a command on a single node over SSH and buffers its
+  output one line at a time, optionally reconnecting if the connection drops.
+
+  The buffer is bounded: once it is full, the reader stops pulling from SSH,
+  which in turn lets TCP flow control slow down the remote side.
+  """
+
+
+  # The number of lines buffered per node before the reader stops reading.
+  DEFAULT_BUFFER_SIZE = 1000
+
+
+  # The number of seconds to wait before the first reconnection attempt. The
+  # delay doubles after each connection that fails quickly.
+  INITIAL_RECONNECT_DELAY = 1
+
+
+  # The longest we'll wait between reconnection attempts, in seconds.
+  MAX_RECONNECT_DELAY = 30
+
+
+  # A connection that stays up for this many seconds resets the delay.
+  HEALTHY_CONNECTION_TIME = 30
+
+
+  # How often a blocked reader checks whether it has been stopped, in seconds.
+  POLL_INTERVAL = 0.5
+
+
+  def __init__(self, host, keyname, command, label=None,
+               reconnect_command=None, buffer_size=DEFAULT_BUFFER_SIZE):
+    """ Creates a new RemoteStream.
+
+    Args:
+      host: A str, the public IP of the node to run the command on.
+      keyname: A str, the name of the SSH keypair for this deployment.
+      command: A str, the command to run on the node.
+      label: A str that prefixes each line of output. Defaults to host.
+      reconnect_command: A str, the command to run after reconnecting (e.g. a
+        tail that doesn't repeat old lines). If None, the stream ends when the
+        command finishes instead of reconnecting.
+      buffer_size: An int, the number of lines to buffer.
+    """
+    self.host = host
+    self.keyname = keyname
+    self.command = command
+    self.label = label or host
+    self.reconnect_command = reconnect_command
+    self.lines = Queue.Queue(maxsize=buffer_size)
+    self.returncode = None
+    self.finished = False
+    self.stopped = threading.Event()
+    self.process = None
+    self.notify = threading.Event()
+    self.thread = None
+
+
+  def start(self, notify):
+    """ Starts reading from the node in a background thread.
+
+    Args:
+      notify: A threading.Event to set whenever new output is available.
+    """
+    self.notify = notify
+    self.thread = threading.Thread(target=self.run)
+    self.thread.daemon = True
+    self.thread.start()
+
+
+  def stop(self):
+    """ Stops reading and closes the SSH connection. """
+    self.stopped.set()
+    process = self.process
+    if process is not None and process.poll() is None:
+      try:
+        process.terminate()
+      except OSError:
+        pass
+
+
+  def run(self):
+    """ Reads output from the node until the command finishes or the stream is
+    stopped, reconnecting in between if requested. """
+    command = self.command
+    delay = self.INITIAL_RECONNECT_DELAY
+    while not self.stopped.is_set():
+      connected_at = time.time()
+      try:
+        self.process = RemoteHelper.open_remote_stream(self.host, self.keyname,
+                                                       command)
+        for line in iter(self.process.stdout.readline, ''):
+          if not self.put(line):
+            break
+        self.returncode = self.process.wait()
+      except OSError as error:
+        self.put('*** unable to run ssh: {0}\n'.format(error))
+
+      if self.stopped.is_set() or self.reconnect_command is None:
+        break
+
+      if time.time() - connected_at > self.HEALTHY_CONNECTION_TIME:
+        delay = self.INITIAL_RECONNECT_DELAY
+      self.put('*** connection lost, reconnecting in {0}s\n'.format(delay))
+      self.stopped.wait(delay)
+      delay = min(delay * 2, self.MAX_RECONNECT_DELAY)
+      command = self.reconnect_command
+
+    self.finished = True
+    self.notify.set()
+
+
+  def put(self, line):
+    """ Buffers a line of output, blocking while the buffer is full.
+
+    Args:
+      line: A str, the line to buffer.
+    Returns:
+      True if the line was buffered, and False if the stream was stopped.
+    """
+    if not line.endswith('\n'):
+      line += '\n'
+    while not self.stopped.is_set():
+      try:
+        self.lines.put(line, timeout=self.POLL_INTERVAL)
+      except Queue.Full:
+        continue
+      self.notify.set()
+      return True
+    return False
+
+
+class StreamMultiplexer(object):
+  """ StreamMultiplexer merges the output of several RemoteStreams into one,
+  prefixing each line with the label of the node it came from. """
+
+
+  # The most lines written from one stream before moving to the next, so that
+  # a chatty node can't starve the others.
+  LINES_PER_TURN = 50
+
+
+  # How long to wait for new output before checking the streams again.
+  IDLE_WAIT = 0.5
+
+
+  def __init__(self, streams, output=None):
+    """ Creates a new StreamMultiplexer.
+
+    Args:
+      streams: A list of RemoteStreams to merge.
+      output: A file-like object to write merged lines to. Defaults to stdout.
+    """
+    self.streams = streams
+    self.output = output or sys.stdout
+    self.label_width = max([len(stream.label) for stream in streams] or [0])
+
+
+  def run(self):
+    """ Writes output from all streams until every stream has finished.
+
+    The streams are stopped when this returns, including when it is
+    interrupted with Ctrl-C.
+    """
+    notify = threading.Event()
+    for stream in self.streams:
+      stream.start(notify)
+
+    try:
+      while True:
+        notify.clear()
+        if self.write_available():
+          continue
+
+        if all(stream.finished and stream.lines.empty()
+               for stream in self.streams):
+          break
+        notify.wait(self.IDLE_WAIT)
+    finally:
+      for stream in self.streams:
+        stream.stop()
+
+
+  def write_available(self):
+    """ Writes one turn's worth of buffered lines from each stream.
+
+    Returns:
+      True if any lines were written, and False otherwise.
+    """
+    wrote = False
+    for stream in self.streams:
+      prefix = '[{0}] '.format(stream.label.ljust(self.label_width))
+      for _ in range(self.LINES_PER_TURN):
+        try:
+          line = stream.lines.get_nowait()
+        except Queue.Empty:
+          break
+        self.output.write(prefix + line)
+        wrote = True
+
+    if wrote:
+      self.output.flush()
+    return wrote
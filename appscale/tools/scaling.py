@@ -0,0 +1,585 @@
+""" Turns cluster and proxy statistics gathered over a sampling window into
+advice about which nodes a deployment needs, and optionally adds them. """
+
+from __future__ import absolute_import
+
+import argparse
+import json
+import math
+import os
+import time
+
+import requests
+from tabulate import tabulate
+
+from appscale.tools.appcontroller_client import AppControllerClient
+from appscale.tools.appscale_logger import AppScaleLogger
+from appscale.tools.appscale_stats import _get_stats
+from appscale.tools.appscale_tools import AppScaleTools
+from appscale.tools.appscale_tools import MAX_LOADAVG
+from appscale.tools.appscale_tools import MIN_AVAILABLE_MEMORY
+from appscale.tools.appscale_tools import MIN_FREE_DISK_DB
+from appscale.tools.custom_exceptions import BadConfigurationException
+from appscale.tools.local_state import LocalState
+
+
+# The proxy fields that ClusterSample.summarize_proxies uses.
+SAMPLE_PROXY_LIST = {
+  'proxy': ['application_id', 'backend'],
+  'proxy.backend': ['qcur', 'qtime']
+}
+
+# The roles that make up each kind of node the advisor can recommend.
+ROLE_GROUPS = {
+  'compute': ('compute', 'appengine'),
+  'database': ('database', 'db_master', 'db_slave'),
+  'taskqueue': ('taskqueue', 'taskqueue_master', 'taskqueue_slave')
+}
+
+
+# The order in which roles are suggested to move off of an overloaded node.
+# App servers are the cheapest to start elsewhere.
+MOVABLE_GROUPS = ['compute', 'taskqueue']
+
+
+# A node is scaled for when its load reaches MAX_LOADAVG per CPU, but enough
+# nodes are added to bring the load down to TARGET_LOADAVG. The gap between
+# the two keeps a deployment from hovering around a single threshold.
+TARGET_LOADAVG = MAX_LOADAVG / 2
+
+
+# Likewise, database nodes are added when free disk drops below
+# MIN_FREE_DISK_DB percent, and enough are added to reach this much.
+TARGET_FREE_DISK_DB = MIN_FREE_DISK_DB + 10.0
+
+
+# The most requests that may wait for each app server, counting both the
+# AppController's queue and HAProxy's.
+MAX_QUEUED_PER_APPSERVER = 5
+
+
+# The longest that requests may wait in HAProxy's queue, in milliseconds.
+MAX_QUEUE_TIME = 500
+
+
+# The share of samples in which a problem has to show up before it's acted on.
+SUSTAINED_FRACTION = 2.0 / 3
+
+
+# The most nodes of each kind recommended at once.
+MAX_NODES_PER_STEP = 5
+
+
+# How long to wait after adding nodes before adding more, in seconds. New
+# nodes take a while to take load off of the others.
+COOLDOWN = 15 * 60
+
+
+class ClusterSample(object):
+  """ The state of a deployment at one point in the sampling window. """
+
+
+  def __init__(self, nodes, services, proxies):
+    """ Creates a new ClusterSample.
+
+    Args:
+      nodes: A list of NodeStats.
+      services: A list of ServiceInfo objects.
+      proxies: A dict mapping application IDs to (queued requests, queue time
+        in ms) tuples from HAProxy, or None if Hermes didn't answer.
+    """
+    self.nodes = nodes
+    self.services = services
+    self.proxies = proxies
+
+
+  def queued_requests(self):
+    """ Returns the number of requests waiting for an app server. """
+    queued = sum(service.reqs_enqueued for service in self.services)
+    if self.proxies:
+      queued += sum(qcur for qcur, _ in self.proxies.values())
+    return queued
+
+
+  def appservers(self):
+    """ Returns the number of running app servers. """
+    return sum(service.appservers for service in self.services)
+
+
+  def max_queue_time(self):
+    """ Returns the longest HAProxy queue time, in milliseconds. """
+    if not self.proxies:
+      return 0
+    return max(qtime for _, qtime in self.proxies.values())
+
+
+  def has_queue_pressure(self):
+    """ Checks if requests are waiting too long for an app server. """
+    limit = MAX_QUEUED_PER_APPSERVER * max(self.appservers(), 1)
+    return (self.queued_requests() > limit or
+            self.max_queue_time() > MAX_QUEUE_TIME)
+
+
+  @staticmethod
+  def summarize_proxies(raw_proxy_stats):
+    """ Adds up HAProxy's queues for each application.
+
+    Args:
+      raw_proxy_stats: A dict mapping IPs to proxy stats from Hermes.
+    Returns:
+      A dict mapping application IDs to (queued requests, queue time) tuples.
+    """
+    proxies = {}
+    for node in raw_proxy_stats.itervalues():
+      for proxy in node.get('proxies_stats', []):
+        if not proxy.get('application_id'):
+          continue
+        backend = proxy['backend']
+        qcur, qtime = proxies.get(proxy['application_id'], (0, 0))
+        proxies[proxy['application_id']] = (
+          qcur + backend['qcur'], max(qtime, backend.get('qtime', 0)))
+    return proxies
+
+
+class NodeWindow(object):
+  """ What a node reported over the whole sampling window. """
+
+
+  def __init__(self, node):
+    """ Creates a new NodeWindow.
+
+    Args:
+      node: The first NodeStats reported for the node.
+    """
+    self.private_ip = node.private_ip
+    self.public_ip = node.public_ip
+    self.roles = node.roles
+    self.cpu_count = node.cpu.count
+    self.loads = []
+    self.low_memory = []
+    self.disk = node.disk.most_loaded
+
+
+  def add(self, node):
+    """ Records a sample of the node.
+
+    Args:
+      node: A NodeStats.
+    """
+    self.roles = node.roles
+    self.loads.append(node.loadavg.last_1_min / node.cpu.count)
+    self.low_memory.append(node.memory.available_percent <
+                           MIN_AVAILABLE_MEMORY)
+    self.disk = node.disk.most_loaded
+
+
+  def groups(self):
+    """ Returns the kinds of nodes (from ROLE_GROUPS) this node acts as. """
+    return [group for group, roles in sorted(ROLE_GROUPS.items())
+            if any(role in self.roles for role in roles)]
+
+
+  def mean_load(self):
+    """ Returns the node's average load per CPU over the window. """
+    return sum(self.loads) / len(self.loads)
+
+
+  def is_overloaded(self):
+    """ Checks if the node was overloaded for most of the window. """
+    overloaded = [load > MAX_LOADAVG or low_memory
+                  for load, low_memory in zip(self.loads, self.low_memory)]
+    return sum(overloaded) >= SUSTAINED_FRACTION * len(overloaded)
+
+
+  def is_low_on_memory(self):
+    """ Checks if the node was short on memory for most of the window. """
+    return sum(self.low_memory) >= SUSTAINED_FRACTION * len(self.low_memory)
+
+
+class Recommendation(object):
+  """ A number of nodes of one kind that a deployment should add. """
+
+
+  def __init__(self, group, count, reason):
+    """ Creates a new Recommendation.
+
+    Args:
+      group: A str, a key of ROLE_GROUPS.
+      count: An int, how many nodes to add.
+      reason: A str explaining why.
+    """
+    self.group = group
+    self.count = count
+    self.reason = reason
+
+
+class Move(object):
+  """ A role that should run somewhere other than on an overloaded node. """
+
+
+  def __init__(self, node, group, reason):
+    """ Creates a new Move.
+
+    Args:
+      node: A NodeWindow.
+      group: A str, a key of ROLE_GROUPS.
+      reason: A str explaining why.
+    """
+    self.node = node
+    self.group = group
+    self.reason = reason
+
+
+class ScalingAdvisor(object):
+  """ ScalingAdvisor samples a running deployment and works out which nodes
+  it needs. A problem has to persist through most of the sampling window to
+  count, nodes are added until load falls well below the alert threshold,
+  and nodes are only added again once COOLDOWN has passed. """
+
+
+  @classmethod
+  def advise(cls, options):
+    """ Samples a deployment, prints recommendations, and applies them if
+    asked to.
+
+    Args:
+      options: A Namespace that has fields for each parameter that can be
+        passed in via the command-line interface.
+    Returns:
+      A tuple of the list of Recommendations and the list of Moves.
+    """
+    samples = cls.collect_samples(options.keyname, options.samples,
+                                  options.interval)
+    windows = cls.get_node_windows(samples)
+    recommendations = cls.recommend(windows, samples)
+    moves = cls.find_moves(windows, recommendations)
+    cls.print_advice(recommendations, moves)
+
+    if options.apply:
+      cls.apply(options, recommendations)
+    return recommendations, moves
+
+
+  @classmethod
+  def collect_samples(cls, keyname, count, interval):
+    """ Takes samples of a deployment, one interval apart.
+
+    Args:
+      keyname: A str, the name of the deployment's SSH keypair.
+      count: An int, how many samples to take.
+      interval: A number of seconds to wait between samples.
+    Returns:
+      A list of ClusterSamples.
+    """
+    if count < 1:
+      raise BadConfigurationException('At least one sample is needed.')
+
+    AppScaleLogger.log('Taking {0} sample(s), {1}s apart'.format(
+      count, interval))
+    samples = []
+    for index in range(count):
+      if index:
+        time.sleep(interval)
+      samples.append(cls.take_sample(keyname))
+    return samples
+
+
+  @classmethod
+  def take_sample(cls, keyname):
+    """ Gathers node, service, and proxy statistics from a deployment.
+
+    Args:
+      keyname: A str, the name of the deployment's SSH keypair.
+    Returns:
+      A ClusterSample.
+    """
+    acc = AppControllerClient(LocalState.get_login_host(keyname),
+                              LocalState.get_secret_key(keyname))
+    nodes, _, services = AppScaleTools.parse_cluster_stats(
+      acc.get_all_private_ips(), acc.get_cluster_stats())
+
+    try:
+      raw_proxy_stats, _ = _get_stats(keyname, 'proxies', SAMPLE_PROXY_LIST)
+    except requests.RequestException as error:
+      AppScaleLogger.warn('Unable to get proxy stats: {0}'.format(error))
+      raw_proxy_stats = {}
+    proxies = None
+    if raw_proxy_stats:
+      proxies = ClusterSample.summarize_proxies(raw_proxy_stats)
+    return ClusterSample(nodes, services, proxies)
+
+
+  @classmethod
+  def get_node_windows(cls, samples):
+    """ Groups samples by node.
+
+    Args:
+      samples: A list of ClusterSamples.
+    Returns:
+      A list of NodeWindows, one for each node that reported its stats.
+    """
+    windows = {}
+    for sample in samples:
+      for node in sample.nodes:
+        if node.private_ip not in windows:
+          windows[node.private_ip] = NodeWindow(node)
+        windows[node.private_ip].add(node)
+    return [windows[ip] for ip in sorted(windows)]
+
+
+  @classmethod
+  def recommend(cls, windows, samples):
+    """ Works out how many nodes of each kind a deployment should add.
+
+    Args:
+      windows: A list of NodeWindows.
+      samples: The list of ClusterSamples the windows came from.
+    Returns:
+      A list of Recommendations.
+    """
+    recommendations = []
+    for group in sorted(ROLE_GROUPS):
+      members = [window for window in windows if group in window.groups()]
+      if not members:
+        continue
+
+      count, reasons = cls.nodes_for_load(members)
+      if group == 'compute':
+        queue_count, queue_reason = cls.nodes_for_queues(members, samples)
+        if queue_count > count:
+          count = queue_count
+        if queue_reason:
+          reasons.append(queue_reason)
+      elif group == 'database':
+        disk_count, disk_reason = cls.nodes_for_disk(members)
+        if disk_count > count:
+          count = disk_count
+        if disk_reason:
+          reasons.append(disk_reason)
+
+      if count > 0:
+        recommendations.append(Recommendation(
+          group, min(count, MAX_NODES_PER_STEP), '; '.join(reasons)))
+    return recommendations
+
+
+  @classmethod
+  def nodes_for_load(cls, members):
+    """ Works out how many nodes would bring a group's load to TARGET_LOADAVG.
+
+    Args:
+      members: A list of NodeWindows for the nodes in the group.
+    Returns:
+      A tuple of the number of nodes to add and a list of reasons.
+    """
+    overloaded = [window for window in members if window.is_overloaded()]
+    if not overloaded:
+      return 0, []
+
+    reasons = ['{0} of {1} node(s) overloaded'.format(len(overloaded),
+                                                      len(members))]
+    cpus_per_node = float(sum(window.cpu_count for window in members)) / \
+      len(members)
+    total_load = sum(window.mean_load() * window.cpu_count
+                     for window in members)
+    needed = int(math.ceil(total_load / (cpus_per_node * TARGET_LOADAVG)))
+    count = needed - len(members)
+
+    # Load doesn't show memory pressure, so every node that is short on
+    # memory gets a node to take work off of it.
+    low_memory = sum(1 for window in overloaded if window.is_low_on_memory())
+    if low_memory:
+      reasons.append('{0} node(s) low on memory'.format(low_memory))
+    return max(count, low_memory, 1), reasons
+
+
+  @classmethod
+  def nodes_for_queues(cls, members, samples):
+    """ Works out how many compute nodes would keep requests from queueing.
+
+    Args:
+      members: A list of NodeWindows for the compute nodes.
+      samples: A list of ClusterSamples.
+    Returns:
+      A tuple of the number of nodes to add and a reason, or (0, None).
+    """
+    pressured = [sample for sample in samples if sample.has_queue_pressure()]
+    if len(pressured) < SUSTAINED_FRACTION * len(samples):
+      return 0, None
+
+    queued = float(sum(sample.queued_requests() for sample in pressured)) / \
+      len(pressured)
+    appservers = max(sum(sample.appservers() for sample in pressured) /
+                     len(pressured), 1)
+    ratio = queued / (MAX_QUEUED_PER_APPSERVER * appservers)
+    count = int(math.ceil(len(members) * ratio)) - len(members)
+    reason = '{0:.0f} request(s) queued for {1} app server(s)'.format(
+      queued, appservers)
+    return max(count, 1), reason
+
+
+  @classmethod
+  def nodes_for_disk(cls, members):
+    """ Works out how many database nodes would bring free disk space up to
+    TARGET_FREE_DISK_DB.
+
+    Args:
+      members: A list of NodeWindows for the database nodes.
+    Returns:
+      A tuple of the number of nodes to add and a reason, or (0, None).
+    """
+    full = [window for window in members
+            if window.disk.free_percent < MIN_FREE_DISK_DB]
+    if not full:
+      return 0, None
+
+    used = sum(window.disk.used for window in members)
+    capacity_per_node = float(sum(window.disk.total for window in members)) / \
+      len(members)
+    usable = capacity_per_node * (1 - TARGET_FREE_DISK_DB / 100)
+    count = int(math.ceil(used / usable)) - len(members)
+    reason = '{0} node(s) under {1:.0f}% free disk'.format(
+      len(full), MIN_FREE_DISK_DB)
+    return max(count, 1), reason
+
+
+  @classmethod
+  def find_moves(cls, windows, recommendations):
+    """ Finds overloaded nodes that run more than one kind of service, and
+    picks a role to move off of each.
+
+    Args:
+      windows: A list of NodeWindows.
+      recommendations: A list of Recommendations.
+    Returns:
+      A list of Moves.
+    """
+    adding = set(recommendation.group for recommendation in recommendations)
+    moves = []
+    for window in windows:
+      groups = window.groups()
+      if not window.is_overloaded():
+        continue
+      if len(groups) < 2 and not ('shadow' in window.roles and groups):
+        continue
+
+      for group in MOVABLE_GROUPS:
+        if group not in groups:
+          continue
+        others = [other for other in windows if other is not window and
+                  group in other.groups()]
+        if others or group in adding:
+          moves.append(Move(window, group, 'also runs {0}'.format(
+            ', '.join(role for role in window.roles
+                      if role not in ROLE_GROUPS[group]))))
+          break
+    return moves
+
+
+  @classmethod
+  def print_advice(cls, recommendations, moves):
+    """ Prints recommendations and moves as tables.
+
+    Args:
+      recommendations: A list of Recommendations.
+      moves: A list of Moves.
+    """
+    if not recommendations and not moves:
+      AppScaleLogger.success('No scaling needed.')
+      return
+
+    if recommendations:
+      table = [(recommendation.group, '+{0}'.format(recommendation.count),
+                recommendation.reason) for recommendation in recommendations]
+      AppScaleLogger.log('\n' + tabulate(
+        table, headers=['NODES', 'ADD', 'REASON'], tablefmt='plain'))
+    if moves:
+      table = [(move.node.public_ip, move.group, move.reason)
+               for move in moves]
+      AppScaleLogger.log('\n' + tabulate(
+        table, headers=['MOVE FROM', 'ROLE', 'REASON'], tablefmt='plain'))
+
+
+  @classmethod
+  def apply(cls, options, recommendations):
+    """ Adds the recommended compute nodes through add_instances.
+
+    Replicated services can't be resized while they run, so database and
+    taskqueue recommendations are left to the user.
+
+    Args:
+      options: A Namespace with keyname, verbose, and spare_ips fields.
+      recommendations: A list of Recommendations.
+    Returns:
+      A list of strs, the IPs that were added.
+    """
+    for recommendation in recommendations:
+      if recommendation.group != 'compute':
+        AppScaleLogger.warn('Not adding {0} {1} node(s) automatically; '
+                            'plan them with a new layout.'.format(
+                              recommendation.count, recommendation.group))
+
+    compute = next((recommendation for recommendation in recommendations
+                    if recommendation.group == 'compute'), None)
+    if compute is None:
+      return []
+
+    state = cls.load_state(options.keyname)
+    waited = time.time() - state.get('last_added', 0)
+    if waited < COOLDOWN:
+      AppScaleLogger.log('Nodes were added {0:.0f}s ago; waiting {1:.0f}s '
+                         'more before adding others.'.format(
+                           waited, COOLDOWN - waited))
+      return []
+
+    spare_ips = [ip for ip in options.spare_ips or []
+                 if ip not in state.get('added', [])]
+    if not spare_ips:
+      raise BadConfigurationException(
+        'Adding compute nodes needs machines to add. Pass them with '
+        '--spare_ips.')
+
+    hosts = spare_ips[:compute.count]
+    if len(hosts) < compute.count:
+      AppScaleLogger.warn('Only {0} spare machine(s) for {1} compute '
+                          'node(s).'.format(len(hosts), compute.count))
+    AppScaleTools.add_instances(argparse.Namespace(
+      ips={AppScaleTools.AUTO_PLACEMENT_KEY: hosts}, keyname=options.keyname,
+      verbose=options.verbose))
+
+    state['last_added'] = time.time()
+    state['added'] = state.get('added', []) + hosts
+    cls.save_state(options.keyname, state)
+    return hosts
+
+
+  @classmethod
+  def load_state(cls, keyname):
+    """ Reads what earlier runs added to a deployment.
+
+    Args:
+      keyname: A str, the name of the deployment's SSH keypair.
+    Returns:
+      A dict, empty if nothing has been added yet.
+    """
+    try:
+      with open(LocalState.get_scaling_state_location(keyname)) as state_file:
+        state = json.load(state_file)
+    except (IOError, ValueError):
+      return {}
+    return state if isinstance(state, dict) else {}
+
+
+  @classmethod
+  def save_state(cls, keyname, state):
+    """ Records what was added to a deployment.
+
+    Args:
+      keyname: A str, the name of the deployment's SSH keypair.
+      state: A dict with the time nodes were last added and their IPs.
+    """
+    location = LocalState.get_scaling_state_location(keyname)
+    temp_location = location + '.tmp'
+    with open(temp_location, 'w') as state_file:
+      json.dump(state, state_file)
+    os.rename(temp_location, location)
@@ -7,6 +7,7 @@ from termcolor import cprint
 
 from appscale.tools import version_helper
 from appscale.tools.appscale import AppScale
+from appscale.tools.daemon import AppScaleDaemon
 from appscale.tools.local_state import APPSCALE_VERSION
 from appscale.tools.local_state import LocalState
 from appscale.tools.registration_helper import RegistrationHelper
@@ -23,6 +24,12 @@ def main():
     sys.exit(1)
 
   command = sys.argv[1]
+
+  # Let a running appscaled answer the commands it serves.
+  status = AppScaleDaemon.forward(command, sys.argv[2:])
+  if status is not None:
+    sys.exit(status)
+
   if command == "init":
     if len(sys.argv) < 2:
       cprint("Usage: appscale init [cloud | cluster]", 'red')
@@ -74,25 +81,49 @@ def main():
       LocalState.generate_crash_log(exception, traceback.format_exc())
       sys.exit(1)
 
+  elif command == "scale":
+    try:
+      appscale.scale(sys.argv[2:])
+    except Exception as exception:
+      LocalState.generate_crash_log(exception, traceback.format_exc())
+      sys.exit(1)
+
   elif command == "status":
     try:
       appscale.status(sys.argv[2:])
     except Exception as exception:
       LocalState.generate_crash_log(exception, traceback.format_exc())
       sys.exit(1)
+  elif command == "daemon":
+    if len(sys.argv) != 3 or sys.argv[2] not in ['start', 'stop', 'status']:
+      cprint("Usage: appscale daemon [start|stop|status]", 'red')
+      sys.exit(1)
+
+    try:
+      appscale.daemon(sys.argv[2])
+    except Exception as exception:
+      LocalState.generate_crash_log(exception, traceback.format_exc())
+      sys.exit(1)
   elif command == "deploy":
     try:
-      if len(sys.argv) < 3 or len(sys.argv) > 5:
-        cprint("Usage: appscale deploy [--project <id>] <path to your app>", 'red')
+      args = sys.argv[2:]
+      dry_run = '--dry-run' in args
+      if dry_run:
+        args.remove('--dry-run')
+
+      if len(args) < 1 or len(args) > 3:
+        cprint("Usage: appscale deploy [--project <id>] [--dry-run] "
+               "<path to your app>", 'red')
         sys.exit(1)
 
-      if len(sys.argv) == 3:
-        appscale.deploy(sys.argv[2])
-      elif len(sys.argv) == 5:
-        if sys.argv[2] != '--project':
-          cprint("Usage: appscale deploy [--project <id>] <path to your app>", 'red')
+      if len(args) == 1:
+        appscale.deploy(args[0], dry_run=dry_run)
+      elif len(args) == 3:
+        if args[0] != '--project':
+          cprint("Usage: appscale deploy [--project <id>] [--dry-run] "
+                 "<path to your app>", 'red')
           sys.exit(1)
-        appscale.deploy(sys.argv[4], sys.argv[3])
+        appscale.deploy(args[2], args[1], dry_run=dry_run)
     except Exception as exception:
       LocalState.generate_crash_log(exception, traceback.format_exc())
       sys.exit(1)
@@ -148,22 +179,33 @@ def main():
       LocalState.generate_crash_log(exception, traceback.format_exc())
       sys.exit(1)
   elif command == "tail":
-    if len(sys.argv) < 3:
+    args = sys.argv[2:]
+    grep_pattern = None
+    if '--grep' in args:
+      flag_index = args.index('--grep')
+      if flag_index + 1 >= len(args):
+        cprint("Usage: appscale tail [<node id, role, or 'all'>] [<regex>] "
+               "[--grep <pattern>]", 'red')
+        sys.exit(1)
+      grep_pattern = args[flag_index + 1]
+      del args[flag_index:flag_index + 2]
+
+    if len(args) < 1:
       # by default, tail the first node's logs, since that node is
       # typically the head node
       index = 0
     else:
-      index = sys.argv[2]
+      index = args[0]
 
-    if len(sys.argv) < 4:
+    if len(args) < 2:
       # by default, tail the AppController logs, since that's the
       # service we most often tail from
       regex = "controller*"
     else:
-      regex = sys.argv[3]
+      regex = args[1]
 
     try:
-      appscale.tail(index, regex)
+      appscale.tail(index, regex, grep_pattern)
     except KeyboardInterrupt:
       # don't print the stack trace on a Control-C
       pass
@@ -175,8 +217,38 @@ def main():
       cprint("Usage: appscale logs <location to copy logs to>", 'red')
       sys.exit(1)
 
+    if sys.argv[2] == "search":
+      if len(sys.argv) < 4:
+        cprint("Usage: appscale logs search <pattern> [--roles <roles>] "
+               "[--since <time>] [--until <time>]", 'red')
+        sys.exit(1)
+
+      try:
+        appscale.search_logs(sys.argv[3], sys.argv[4:])
+      except KeyboardInterrupt:
+        # don't print the stack trace on a Control-C
+        pass
+      except Exception as exception:
+        LocalState.generate_crash_log(exception, traceback.format_exc())
+        sys.exit(1)
+    else:
+      try:
+        appscale.logs(sys.argv[2], sys.argv[3:])
+      except Exception as exception:
+        LocalState.generate_crash_log(exception, traceback.format_exc())
+        sys.exit(1)
+  elif command == "exec":
+    if len(sys.argv) < 3:
+      cprint("Usage: appscale exec --role <role> | --all [--max_parallel "
+             "<number>] [--timeout <seconds>] [--format text|json] <command>",
+             'red')
+      sys.exit(1)
+
     try:
-      appscale.logs(sys.argv[2], sys.argv[3:])
+      sys.exit(appscale.exec_command(sys.argv[2:]))
+    except KeyboardInterrupt:
+      # don't print the stack trace on a Control-C
+      sys.exit(1)
     except Exception as exception:
       LocalState.generate_crash_log(exception, traceback.format_exc())
       sys.exit(1)
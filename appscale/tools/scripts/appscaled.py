@@ -0,0 +1,23 @@
+from __future__ import absolute_import
+
+import sys
+
+from termcolor import cprint
+
+from appscale.tools import version_helper
+from appscale.tools.daemon import AppScaleDaemon
+
+version_helper.ensure_valid_python_is_used()
+
+
+def main():
+  """ Execute appscaled, which serves one deployment until it goes idle. """
+  if len(sys.argv) != 2:
+    cprint("Usage: appscaled <keyname>", 'red')
+    sys.exit(1)
+
+  AppScaleDaemon(sys.argv[1]).serve()
+
+
+if __name__ == '__main__':
+  main()
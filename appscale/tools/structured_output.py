@@ -0,0 +1,72 @@
+""" Writes the records behind the tools' tables (nodes, services, processes,
+proxies) for scripts and monitoring, as JSON or newline-delimited JSON. Records
+are written as they are produced, so large clusters don't need to be held in
+memory or rendered as tables first. """
+
+from __future__ import absolute_import
+
+import json
+import sys
+
+
+# The formats that commands with tables accept. 'text' renders tables for
+# people, and the rest are handled by RecordWriter.
+OUTPUT_FORMATS = ['text', 'json', 'ndjson']
+
+
+class RecordWriter(object):
+  """ RecordWriter streams sections of records to a file.
+
+  In 'json' format, the output is a single object with a list of records for
+  each section. In 'ndjson' format, each record is written on its own line
+  with a 'kind' field naming its section, and flushed right away.
+  """
+
+
+  def __init__(self, output_format, stream=None):
+    """ Creates a new RecordWriter.
+
+    Args:
+      output_format: A str, either 'json' or 'ndjson'.
+      stream: The file to write to. Defaults to stdout.
+    Raises:
+      ValueError: If output_format isn't supported.
+    """
+    if output_format not in ('json', 'ndjson'):
+      raise ValueError('Unsupported output format: {}'.format(output_format))
+    self.output_format = output_format
+    self.stream = stream or sys.stdout
+    self.sections = []
+
+
+  def write(self, kind, records):
+    """ Writes a section of records. Each section should be written once.
+
+    Args:
+      kind: A str naming the section, like 'nodes'.
+      records: An iterable of dicts that can be encoded as JSON.
+    """
+    if self.output_format == 'ndjson':
+      for record in records:
+        line = dict(record)
+        line['kind'] = kind
+        self.stream.write(json.dumps(line, sort_keys=True) + '\n')
+        self.stream.flush()
+      self.sections.append(kind)
+      return
+
+    opening = '{' if not self.sections else ',\n'
+    self.stream.write('{0}{1}: ['.format(opening, json.dumps(kind)))
+    separator = '\n  '
+    for record in records:
+      self.stream.write(separator + json.dumps(record, sort_keys=True))
+      separator = ',\n  '
+    self.stream.write('\n]' if separator != '\n  ' else ']')
+    self.sections.append(kind)
+
+
+  def close(self):
+    """ Finishes the output. """
+    if self.output_format == 'json':
+      self.stream.write('{}\n'.format('}' if self.sections else '{}'))
+    self.stream.flush()
@@ -0,0 +1,368 @@
+#!/usr/bin/env python
+""" Phase-level tracing for long-running AppScale Tools commands.
+
+Spans are only recorded after Tracer.enable has been called (which happens
+when a user passes --trace). While tracing is disabled, every instrumented
+call path costs a single attribute check.
+"""
+
+import atexit
+import functools
+import inspect
+import json
+import os
+import threading
+import time
+
+
+# The longest command string we keep in a span's arguments. Longer commands
+# (like generated remote scripts) are truncated to keep trace files readable.
+MAX_ARG_LENGTH = 200
+
+
+class _NullSpan(object):
+  """ A span that records nothing, used while tracing is disabled. """
+
+  def __enter__(self):
+    return self
+
+  def __exit__(self, *exc_info):
+    return False
+
+  def set(self, key, value):
+    """ Discards the given argument. """
+    pass
+
+
+# A single shared null span, so disabled tracing allocates nothing per call.
+NULL_SPAN = _NullSpan()
+
+
+class Span(object):
+  """ A timed region of work, optionally nested inside another span. """
+
+  def __init__(self, name, args):
+    """ Creates a new Span.
+
+    Args:
+      name: A str naming the phase this span measures.
+      args: A dict of arguments (host, command, etc.) to attach to the span.
+    """
+    self.name = name
+    self.args = args
+    self.start = None
+    self.parent = None
+
+  def __enter__(self):
+    stack = Tracer.get_stack()
+    if stack:
+      self.parent = stack[-1]
+    stack.append(self)
+    self.start = time.time()
+    return self
+
+  def __exit__(self, exc_type, exc_value, _):
+    duration = time.time() - self.start
+    stack = Tracer.get_stack()
+    if stack and stack[-1] is self:
+      stack.pop()
+    if exc_type is not None:
+      self.args['error'] = '{0}: {1}'.format(exc_type.__name__, exc_value)
+    Tracer.record(self, duration)
+    return False
+
+  def set(self, key, value):
+    """ Attaches an argument to this span, e.g. the number of retries.
+
+    Args:
+      key: A str naming the argument.
+      value: The value to record. It must be JSON-serializable.
+    """
+    self.args[key] = value
+
+  def path(self):
+    """ Returns the names of this span and all of its parents.
+
+    Returns:
+      A list of strs, outermost span first.
+    """
+    names = []
+    span = self
+    while span is not None:
+      names.append(span.name)
+      span = span.parent
+    return list(reversed(names))
+
+
+class Tracer(object):
+  """ Tracer collects spans for the current process and exports them either
+  as Chrome trace-event JSON (viewable in chrome://tracing or Perfetto) or as
+  a summarized flame table.
+  """
+
+
+  # Whether or not spans should be recorded.
+  enabled = False
+
+
+  # A list of (Span, duration) tuples for each finished span.
+  finished = []
+
+
+  # The time at which tracing was enabled, used as the trace's origin.
+  origin = None
+
+
+  # Guards finished, since spans can end on worker threads.
+  lock = threading.Lock()
+
+
+  # Holds the stack of open spans for each thread.
+  local = threading.local()
+
+
+  # The file that spans are written to when the process exits, if any.
+  exit_location = None
+
+
+  @classmethod
+  def enable(cls):
+    """ Starts recording spans, discarding anything recorded before. """
+    with cls.lock:
+      cls.finished = []
+    cls.origin = time.time()
+    cls.enabled = True
+
+
+  @classmethod
+  def trace_to(cls, location):
+    """ Starts recording spans, and writes them to a file when the process
+    exits. Commands can parse their arguments more than once, so only the
+    first call has any effect.
+
+    Args:
+      location: A str, the path of the file to write.
+    """
+    if cls.exit_location is not None:
+      return
+    cls.exit_location = location
+    cls.enable()
+    atexit.register(cls.write, location)
+
+
+  @classmethod
+  def disable(cls):
+    """ Stops recording spans. Recorded spans are kept for exporting. """
+    cls.enabled = False
+
+
+  @classmethod
+  def get_stack(cls):
+    """ Returns the stack of open spans for the calling thread.
+
+    Returns:
+      A list of Spans, innermost span last.
+    """
+    stack = getattr(cls.local, 'stack', None)
+    if stack is None:
+      stack = []
+      cls.local.stack = stack
+    return stack
+
+
+  @classmethod
+  def span(cls, name, **args):
+    """ Creates a span that measures the wrapped block of code.
+
+    Args:
+      name: A str naming the phase being measured.
+      **args: Arguments to attach to the span, such as host or command.
+    Returns:
+      A context manager. While tracing is disabled, a shared no-op span.
+    """
+    if not cls.enabled:
+      return NULL_SPAN
+
+    for key, value in args.items():
+      if isinstance(value, basestring) and len(value) > MAX_ARG_LENGTH:
+        args[key] = value[:MAX_ARG_LENGTH] + '...'
+    return Span(name, args)
+
+
+  @classmethod
+  def record(cls, span, duration):
+    """ Stores a finished span.
+
+    Args:
+      span: The Span that finished.
+      duration: A float, the number of seconds the span took.
+    """
+    span.tid = threading.current_thread().ident
+    with cls.lock:
+      cls.finished.append((span, duration))
+
+
+  @classmethod
+  def wrap(cls, target, prefix):
+    """ Makes each public method call on an object be traced.
+
+    The object's methods are replaced on the object itself, rather than
+    behind a proxy, so that isinstance checks and attribute assignments
+    behave the same whether or not tracing is enabled.
+
+    Args:
+      target: The object to trace, e.g. an infrastructure agent.
+      prefix: A str to prepend to each span name.
+    Returns:
+      target.
+    """
+    if not cls.enabled:
+      return target
+
+    for name in dir(target):
+      if name.startswith('_'):
+        continue
+      method = getattr(target, name)
+      if inspect.ismethod(method):
+        setattr(target, name, traced('{0}.{1}'.format(prefix, name))(method))
+    return target
+
+
+  @classmethod
+  def to_chrome_trace(cls):
+    """ Converts the recorded spans to the Chrome trace-event format.
+
+    Returns:
+      A dict that can be dumped as JSON and loaded into chrome://tracing.
+    """
+    pid = os.getpid()
+    events = []
+    thread_ids = set()
+    with cls.lock:
+      finished = list(cls.finished)
+
+    for span, duration in finished:
+      thread_ids.add(span.tid)
+      events.append({
+        'name': span.name,
+        'cat': span.name.split('.')[0],
+        'ph': 'X',
+        'ts': int((span.start - cls.origin) * 1000000),
+        'dur': int(duration * 1000000),
+        'pid': pid,
+        'tid': span.tid,
+        'args': span.args
+      })
+
+    main_thread = threading.current_thread().ident
+    for tid in thread_ids:
+      events.append({
+        'name': 'thread_name',
+        'ph': 'M',
+        'pid': pid,
+        'tid': tid,
+        'args': {'name': 'main' if tid == main_thread else 'worker-{0}'
+                 .format(tid)}
+      })
+
+    events.sort(key=lambda event: event.get('ts', 0))
+    return {'traceEvents': events, 'displayTimeUnit': 'ms'}
+
+
+  @classmethod
+  def summarize(cls):
+    """ Aggregates the recorded spans by their call path.
+
+    Returns:
+      A list of (path, calls, total seconds, self seconds, max seconds)
+      tuples, sorted by path so that children follow their parents.
+    """
+    totals = {}
+    child_time = {}
+    with cls.lock:
+      finished = list(cls.finished)
+
+    for span, duration in finished:
+      path = ';'.join(span.path())
+      calls, total, longest = totals.get(path, (0, 0.0, 0.0))
+      totals[path] = (calls + 1, total + duration, max(longest, duration))
+      if span.parent is not None:
+        parent_path = ';'.join(span.parent.path())
+        child_time[parent_path] = child_time.get(parent_path, 0.0) + duration
+
+    rows = []
+    for path in sorted(totals):
+      calls, total, longest = totals[path]
+      self_time = max(total - child_time.get(path, 0.0), 0.0)
+      rows.append((path, calls, total, self_time, longest))
+    return rows
+
+
+  @classmethod
+  def format_summary(cls):
+    """ Renders the summarized spans as an indented flame table.
+
+    Returns:
+      A str holding the table.
+    """
+    from tabulate import tabulate
+
+    table = []
+    for path, calls, total, self_time, longest in cls.summarize():
+      names = path.split(';')
+      label = '  ' * (len(names) - 1) + names[-1]
+      table.append((label, calls, '{0:.3f}'.format(total),
+                    '{0:.3f}'.format(self_time), '{0:.3f}'.format(longest)))
+    return tabulate(table, headers=['PHASE', 'CALLS', 'TOTAL (s)', 'SELF (s)',
+                                    'MAX (s)'])
+
+
+  @classmethod
+  def write(cls, location):
+    """ Writes the recorded spans to disk.
+
+    Files ending in '.json' get Chrome trace-event JSON, and all others get the
+    summarized flame table.
+
+    Args:
+      location: A str, the path of the file to write.
+    """
+    cls.disable()
+    with open(location, 'w') as file_handle:
+      if location.endswith('.json'):
+        json.dump(cls.to_chrome_trace(), file_handle)
+      else:
+        file_handle.write(cls.format_summary() + '\n')
+
+
+def traced(name=None, record=()):
+  """ Decorates a function so that each call to it is recorded as a span.
+
+  Args:
+    name: A str naming the span. Defaults to the function's name.
+    record: A tuple of argument names whose values should be attached to
+      the span, e.g. ('host',).
+  Returns:
+    A decorator for the function.
+  """
+  def decorator(function):
+    span_name = name or function.__name__
+    arg_names = inspect.getargspec(function).args
+    positions = [(arg, arg_names.index(arg)) for arg in record
+                 if arg in arg_names]
+
+    @functools.wraps(function)
+    def wrapper(*args, **kwargs):
+      if not Tracer.enabled:
+        return function(*args, **kwargs)
+
+      span_args = {}
+      for arg, position in positions:
+        if arg in kwargs:
+          span_args[arg] = kwargs[arg]
+        elif position < len(args):
+          span_args[arg] = args[position]
+      with Tracer.span(span_name, **span_args):
+        return function(*args, **kwargs)
+    return wrapper
+  return decorator
@@ -0,0 +1,99 @@
+""" Keeps track of how far an 'appscale upgrade' has gotten on each node, so
+that an interrupted upgrade can pick up where it left off. """
+
+from __future__ import absolute_import
+
+import json
+import os
+
+
+class UpgradeProgress(object):
+  """ UpgradeProgress records which phase each node of a deployment has
+  finished while upgrading to a given AppScale version. """
+
+
+  # A node has the new code checked out next to the running code.
+  STAGED = 'staged'
+
+
+  # A node is running the new code.
+  UPGRADED = 'upgraded'
+
+
+  # The order in which nodes go through each phase.
+  PHASES = [STAGED, UPGRADED]
+
+
+  def __init__(self, location, version, nodes=None):
+    """ Creates a new UpgradeProgress.
+
+    Args:
+      location: A str, the path of the file that stores progress.
+      version: A str, the AppScale version being upgraded to.
+      nodes: A dict mapping each node's IP to the last phase it finished.
+    """
+    self.location = location
+    self.version = version
+    self.nodes = nodes or {}
+
+
+  @classmethod
+  def load(cls, location, version):
+    """ Reads the progress of an earlier upgrade to the same version.
+
+    Args:
+      location: A str, the path of the file that stores progress.
+      version: A str, the AppScale version being upgraded to.
+    Returns:
+      An UpgradeProgress. It is empty if there is no earlier upgrade, if the
+      file is unreadable, or if the earlier upgrade was to another version.
+    """
+    try:
+      with open(location) as progress_file:
+        contents = json.load(progress_file)
+    except (IOError, ValueError):
+      return cls(location, version)
+
+    if not isinstance(contents, dict) or contents.get('version') != version:
+      return cls(location, version)
+    return cls(location, version, contents.get('nodes'))
+
+
+  def has_finished(self, ip, phase):
+    """ Checks if a node has finished the given phase (or a later one).
+
+    Args:
+      ip: A str, the public IP of the node.
+      phase: A str, one of PHASES.
+    Returns:
+      True if the node has finished the phase, and False otherwise.
+    """
+    finished = self.nodes.get(ip)
+    if finished not in self.PHASES:
+      return False
+    return self.PHASES.index(finished) >= self.PHASES.index(phase)
+
+
+  def mark(self, ip, phase):
+    """ Records that a node has finished a phase and saves the progress.
+
+    Args:
+      ip: A str, the public IP of the node.
+      phase: A str, one of PHASES.
+    """
+    self.nodes[ip] = phase
+    self.save()
+
+
+  def save(self):
+    """ Writes the progress to disk, replacing the old file atomically. """
+    temp_location = self.location + '.tmp'
+    with open(temp_location, 'w') as progress_file:
+      json.dump({'version': self.version, 'nodes': self.nodes}, progress_file)
+    os.rename(temp_location, self.location)
+
+
+  def remove(self):
+    """ Deletes the progress file once the upgrade has finished. """
+    if os.path.exists(self.location):
+      os.remove(self.location)
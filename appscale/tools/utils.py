@@ -6,6 +6,7 @@ import tarfile
 import zipfile
 from xml.etree import ElementTree
 
+from .archive_index import ArchiveIndex, CONFIG_FILES
 from .custom_exceptions import BadConfigurationException
 
 
@@ -39,6 +40,9 @@ def config_from_tar_gz(file_name, tar_location):
   Returns:
     The contents of the configuration file.
   """
+  if file_name in CONFIG_FILES:
+    return ArchiveIndex.for_archive(tar_location).config(file_name)
+
   with tarfile.open(tar_location, 'r:gz') as tar:
     paths = [member.name for member in tar.getmembers()]
     shortest_path = shortest_path_from_list(file_name, paths)
@@ -61,13 +65,15 @@ def config_from_zip(file_name, zip_location):
   Returns:
     The contents of the configuration file or None.
   """
+  if file_name in CONFIG_FILES:
+    return ArchiveIndex.for_archive(zip_location).config(file_name)
+
   with zipfile.ZipFile(zip_location) as zip_file:
     shortest_path = shortest_path_from_list(file_name, zip_file.namelist())
     if shortest_path is None:
       return None
 
-    with zip_file.extract(shortest_path) as config_file:
-      return config_file.read()
+    return zip_file.read(shortest_path)
 
 
 def shortest_directory_path(file_name, source_path):
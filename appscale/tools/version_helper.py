@@ -16,15 +16,27 @@ import urllib2
 # The location of appscale-tools on PyPI.
 PYPI_URL = 'https://pypi.python.org/pypi/appscale-tools'
 
+# The location of the appscale-tools release metadata on PyPI.
+PYPI_JSON_URL = '{}/json'.format(PYPI_URL)
 
-def latest_tools_version():
+# How long, in seconds, to wait on PyPI when no cache is given.
+PYPI_TIMEOUT = 10
+
+
+def latest_tools_version(cache=None):
   """ Fetches the latest tools version available on PyPI.
 
+  Args:
+    cache: A MetadataCache to look the release metadata up in. If None, it is
+      always fetched from PyPI.
   Returns:
     A string containing a version number.
   """
-  response = urllib2.urlopen('{}/json'.format(PYPI_URL))
-  pypi_info = json.loads(response.read())
+  if cache is not None:
+    pypi_info = cache.get(PYPI_JSON_URL)
+  else:
+    response = urllib2.urlopen(PYPI_JSON_URL, timeout=PYPI_TIMEOUT)
+    pypi_info = json.loads(response.read())
   return pypi_info['info']['version']
 
 
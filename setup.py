@@ -81,6 +81,7 @@ setup(
       'appscale=appscale.tools.scripts.appscale:main',
       'appscale-add-instances=appscale.tools.scripts.add_instances:main',
       'appscale-add-keypair=appscale.tools.scripts.add_keypair:main',
+      'appscaled=appscale.tools.scripts.appscaled:main',
       'appscale-show-stats=appscale.tools.scripts.show_stats:main',
       'appscale-describe-instances=' +
         'appscale.tools.scripts.describe_instances:main',
@@ -90,6 +91,7 @@ setup(
       'appscale-remove-app=appscale.tools.scripts.remove_app:main',
       'appscale-reset-pwd=appscale.tools.scripts.reset_pwd:main',
       'appscale-run-instances=appscale.tools.scripts.run_instances:main',
+      'appscale-search-logs=appscale.tools.scripts.search_logs:main',
       'appscale-set-property=appscale.tools.scripts.set_property:main',
       'appscale-terminate-instances=' +
         'appscale.tools.scripts.terminate_instances:main',
@@ -0,0 +1,134 @@
+#!/usr/bin/env python
+
+
+# General-purpose Python library imports
+import os
+import shutil
+import tempfile
+import unittest
+
+
+# Third party libraries
+from flexmock import flexmock
+
+
+# AppScale import, the library that we're testing here
+from appscale.tools.app_files import IgnoreRule
+from appscale.tools.app_files import UploadFilter
+from appscale.tools.app_files import collect_app_files
+from appscale.tools.app_files import size_by_top_level_dir
+
+
+class TestAppFiles(unittest.TestCase):
+
+
+  def setUp(self):
+    self.app_dir = tempfile.mkdtemp()
+
+
+  def tearDown(self):
+    shutil.rmtree(self.app_dir)
+
+
+  def write_files(self, files):
+    for path, contents in files.items():
+      full_path = os.path.join(self.app_dir, path)
+      if not os.path.isdir(os.path.dirname(full_path)):
+        os.makedirs(os.path.dirname(full_path))
+      with open(full_path, 'w') as app_file:
+        app_file.write(contents)
+
+
+  def ignored(self, lines, path, is_dir=False):
+    rules = [IgnoreRule.parse(line) for line in lines]
+    upload_filter = UploadFilter(
+      ignore_rules=[rule for rule in rules if rule is not None])
+    return upload_filter.skips(path, is_dir)
+
+
+  def test_ignore_patterns_follow_gitignore_rules(self):
+    # Patterns without a slash match at any depth.
+    self.assertTrue(self.ignored(['*.log'], 'debug.log'))
+    self.assertTrue(self.ignored(['*.log'], 'logs/today/debug.log'))
+    self.assertFalse(self.ignored(['*.log'], 'debug.log.txt'))
+
+    # Patterns with a slash are relative to the root, and '*' stops at '/'.
+    self.assertTrue(self.ignored(['/build'], 'build', is_dir=True))
+    self.assertFalse(self.ignored(['/build'], 'src/build', is_dir=True))
+    self.assertTrue(self.ignored(['docs/*.md'], 'docs/index.md'))
+    self.assertFalse(self.ignored(['docs/*.md'], 'docs/api/index.md'))
+
+    # '**' matches any number of directories.
+    self.assertTrue(self.ignored(['**/fixtures'], 'a/b/fixtures', True))
+    self.assertTrue(self.ignored(['a/**/b.txt'], 'a/b.txt'))
+    self.assertTrue(self.ignored(['a/**/b.txt'], 'a/x/y/b.txt'))
+    self.assertTrue(self.ignored(['vendor/**'], 'vendor/lib/x.py'))
+
+    # A trailing slash only matches directories.
+    self.assertTrue(self.ignored(['cache/'], 'app/cache', is_dir=True))
+    self.assertFalse(self.ignored(['cache/'], 'app/cache'))
+
+    # Later negations bring files back, and comments are ignored.
+    lines = ['# secrets', '*.json', '!package.json']
+    self.assertTrue(self.ignored(lines, 'keys.json'))
+    self.assertFalse(self.ignored(lines, 'package.json'))
+    self.assertFalse(self.ignored(lines, '# secrets'))
+
+    self.assertTrue(self.ignored(['file[0-9].txt'], 'file7.txt'))
+    self.assertFalse(self.ignored(['file[!0-9].txt'], 'file7.txt'))
+    self.assertTrue(self.ignored(['\\#notes'], '#notes'))
+
+
+  def test_skip_files_match_whole_paths(self):
+    upload_filter = UploadFilter([r'^(.*/)?.*~$', r'^tmp/.*$'])
+    self.assertTrue(upload_filter.skips('main.py~'))
+    self.assertTrue(upload_filter.skips('lib/util.py~'))
+    self.assertTrue(upload_filter.skips('tmp', is_dir=True))
+    self.assertFalse(upload_filter.skips('lib/tmp', is_dir=True))
+    self.assertFalse(upload_filter.skips('tmp.py'))
+
+    # Compiled Python files are always left out.
+    self.assertTrue(UploadFilter().skips('main.pyc'))
+    self.assertFalse(UploadFilter().has_rules())
+
+
+  def test_collect_app_files_prunes_skipped_directories(self):
+    self.write_files({
+      'app.yaml': 'runtime: python27\nskip_files:\n- ^node_modules/.*$\n',
+      '.appscaleignore': '.git/\n*.log\n!keep.log\n',
+      'main.py': '',
+      'main.pyc': '',
+      'keep.log': '',
+      'lib/util.py': '',
+      'lib/debug.log': '',
+      'node_modules/left-pad/index.js': '',
+      '.git/HEAD': ''
+    })
+
+    listed = []
+    original_listdir = os.listdir
+    def record_listdir(path):
+      listed.append(os.path.relpath(path, self.app_dir))
+      return original_listdir(path)
+    flexmock(os).should_receive('listdir').replace_with(record_listdir)
+
+    upload_filter = UploadFilter.for_app(self.app_dir)
+    self.assertTrue(upload_filter.has_rules())
+    app_files = collect_app_files(self.app_dir, upload_filter)
+
+    uploaded = sorted(os.path.normpath(path) for path in app_files)
+    self.assertEquals(['.appscaleignore', 'app.yaml', 'keep.log',
+                       'lib/util.py', 'main.py'], uploaded)
+    self.assertEquals(['.', 'lib'], sorted(listed))
+
+
+  def test_size_by_top_level_dir(self):
+    self.write_files({
+      'main.py': 'x' * 10,
+      'static/a.css': 'x' * 100,
+      'static/img/b.png': 'x' * 200,
+      'lib/c.py': 'x' * 5
+    })
+    totals = size_by_top_level_dir(collect_app_files(self.app_dir))
+    self.assertEquals([('static/', 2, 300), ('./', 1, 10), ('lib/', 1, 5)],
+                      totals)
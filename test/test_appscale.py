@@ -18,6 +18,7 @@ from flexmock import flexmock
 
 
 # AppScale import, the library that we're testing here
+from appscale.tools import appscale as appscale_module
 from appscale.tools.agents.ec2_agent import EC2Agent
 from appscale.tools.appscale import AppScale
 from appscale.tools.appscale_tools import AppScaleTools
@@ -596,6 +597,64 @@ class TestAppScale(unittest.TestCase):
     appscale.tail(1, "c*")
 
 
+  def testTailWithRoleFollowsEveryNodeWithThatRole(self):
+    # calling 'appscale tail compute c* --grep ERROR' should follow the logs
+    # on both compute nodes, filtering lines on the nodes themselves
+    appscale = AppScale()
+
+    contents = { 'keyname' : 'boo' }
+    yaml_dumped_contents = yaml.dump(contents)
+
+    nodes = {'node_info': [
+      {'public_ip': 'blarg1', 'jobs': ['shadow', 'load_balancer']},
+      {'public_ip': 'blarg2', 'jobs': ['compute']},
+      {'public_ip': 'blarg3', 'jobs': ['compute', 'memcache']}
+    ]}
+    nodes_contents = json.dumps(nodes)
+
+    mock = self.addMockForAppScalefile(appscale, yaml_dumped_contents)
+    (mock.should_receive('open')
+      .with_args(appscale.get_locations_json_file('boo'))
+      .and_return(flexmock(read=lambda: nodes_contents)))
+
+    followed = []
+    def fake_multiplexer(streams):
+      followed.extend(streams)
+      return flexmock(run=lambda: None)
+    (flexmock(appscale_module)
+      .should_receive('StreamMultiplexer')
+      .replace_with(fake_multiplexer))
+
+    appscale.tail('compute', 'c*', 'ERROR')
+
+    self.assertEquals(['blarg2', 'blarg3'],
+                      [stream.host for stream in followed])
+    self.assertEquals('blarg2 compute', followed[0].label)
+    self.assertEquals(
+      "tail -F /var/log/appscale/c* | grep --line-buffered -E ERROR",
+      followed[0].command)
+    self.assertEquals(
+      "tail -n 0 -F /var/log/appscale/c* | grep --line-buffered -E ERROR",
+      followed[0].reconnect_command)
+
+
+  def testTailWithUnusedRole(self):
+    # calling 'appscale tail search' when no node runs search should fail
+    appscale = AppScale()
+
+    contents = { 'keyname' : 'boo' }
+    yaml_dumped_contents = yaml.dump(contents)
+    nodes_contents = json.dumps(
+      {'node_info': [{'public_ip': 'blarg1', 'jobs': ['shadow']}]})
+
+    mock = self.addMockForAppScalefile(appscale, yaml_dumped_contents)
+    (mock.should_receive('open')
+      .with_args(appscale.get_locations_json_file('boo'))
+      .and_return(flexmock(read=lambda: nodes_contents)))
+
+    self.assertRaises(AppScaleException, appscale.tail, 'search', '')
+
+
   def testGetLogsWithNoAppScalefile(self):
     # calling 'appscale logs' with no AppScalefile in the local
     # directory should throw up and die
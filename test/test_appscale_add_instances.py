@@ -158,3 +158,16 @@ appengine: 1.2.3.4
     ]
     options = ParseArgs(argv, self.function).args
     AppScaleTools.add_instances(options)
+
+
+  def test_auto_placement(self):
+    ips = {'auto': ['1.2.3.5', '1.2.3.6'], 'database': '1.2.3.7'}
+    flexmock(LocalState).should_receive('get_local_nodes_info').\
+      with_args(self.keyname).and_return([
+        {'public_ip': '1.2.3.4', 'instance_type': 'm3.large',
+         'jobs': ['shadow', 'load_balancer', 'compute']}])
+
+    roles_to_ips = AppScaleTools.place_added_nodes(ips, self.keyname)
+    self.assertEquals({'database': ['1.2.3.7'],
+                       'compute': ['1.2.3.5', '1.2.3.6'],
+                       'memcache': ['1.2.3.5', '1.2.3.6']}, roles_to_ips)
@@ -21,9 +21,12 @@ from flexmock import flexmock
 # AppScale import, the library that we're testing here
 from appscale.tools.appscale_logger import AppScaleLogger
 from appscale.tools.appscale_tools import AppScaleTools
+from appscale.tools.custom_exceptions import AppScaleException
 from appscale.tools.custom_exceptions import BadConfigurationException
+from appscale.tools.custom_exceptions import ShellException
 from appscale.tools.local_state import LocalState
 from appscale.tools.parse_args import ParseArgs
+from appscale.tools.remote_helper import RemoteHelper
 
 from test_ip_layouts import (FOUR_NODE_CLUSTER, IP_1, IP_2, IP_3, IP_4)
 
@@ -162,3 +165,45 @@ class TestAppScaleAddKeypair(unittest.TestCase):
     ]
     options = ParseArgs(argv, self.function).args
     AppScaleTools.add_keypair(options)
+
+
+  def test_auto_copies_keys_in_parallel_and_reports_every_failure(self):
+    flexmock(LocalState).should_receive('require_ssh_commands').with_args(
+      False, False).once()
+    flexmock(LocalState).should_receive('make_appscale_directory')
+    flexmock(LocalState).should_receive('generate_rsa_key').and_return(
+      ('/tmp/boo.pub', '/tmp/boo.key'))
+
+    # The machine at IP_3 isn't running ssh, and IP_2 rejects our password.
+    flexmock(RemoteHelper).should_receive('is_port_open').replace_with(
+      lambda host, port, is_verbose: host != IP_3)
+    flexmock(RemoteHelper).should_receive('create_askpass_script').\
+      and_return('/tmp/askpass')
+    flexmock(os).should_receive('remove').with_args('/tmp/askpass').once()
+
+    authorized = []
+    def authorize_key(host, public_key, password, askpass, is_verbose):
+      self.assertEquals('/tmp/boo.key.pub', public_key)
+      self.assertEquals('hunter2', password)
+      if host == IP_2:
+        raise ShellException('Permission denied')
+      authorized.append(host)
+    flexmock(RemoteHelper).should_receive('authorize_key').replace_with(
+      authorize_key)
+
+    argv = [
+      "--ips_layout", base64.b64encode(yaml.dump(FOUR_NODE_CLUSTER)),
+      "--keyname", self.keyname,
+      "--auto",
+      "--root_password", "hunter2"
+    ]
+    options = ParseArgs(argv, self.function).args
+    with self.assertRaises(AppScaleException) as context:
+      AppScaleTools.add_keypair(options)
+
+    self.assertEquals(sorted([IP_1, IP_4]), sorted(authorized))
+    message = str(context.exception)
+    self.assertIn('2 of 4 machine(s)', message)
+    self.assertIn(IP_2, message)
+    self.assertIn('Permission denied', message)
+    self.assertIn(IP_3, message)
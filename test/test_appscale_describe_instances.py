@@ -1,6 +1,9 @@
 #!/usr/bin/env python
 
 # General-purpose Python library imports
+import json
+import StringIO
+import sys
 import unittest
 
 from SOAPpy import faultType
@@ -95,7 +98,7 @@ class TestPrintAppscaleStatus(unittest.TestCase):
              success=fake_logger.success)
 
     # Do actual call to tested function
-    options = flexmock(keyname="bla-bla", verbose=False)
+    options = flexmock(keyname="bla-bla", verbose=False, format="text")
     AppScaleTools.print_cluster_status(options)
 
     # Verify if output matches expectation
@@ -122,5 +125,73 @@ class TestPrintAppscaleStatus(unittest.TestCase):
          .with_args("AppScale deployment is probably down")
          .once())
 
-      options = flexmock(keyname="bla-bla", verbose=False)
+      options = flexmock(keyname="bla-bla", verbose=False, format="text")
       self.assertRaises(err, AppScaleTools.print_cluster_status, options)
+
+  def test_status_as_json(self):
+    flexmock(LocalState).should_receive("get_login_host").and_return("1.1.1.1")
+    flexmock(LocalState).should_receive("get_secret_key").and_return("xxxxxxx")
+    fake_ac_client = flexmock()
+    (flexmock(appscale_tools)
+       .should_receive("AppControllerClient")
+       .and_return(fake_ac_client))
+    (fake_ac_client.should_receive("get_all_private_ips")
+       .and_return(["10.10.4.220", "10.10.7.12"]))
+    (fake_ac_client.should_receive("get_cluster_stats")
+       .and_return([{
+         'private_ip': '10.10.4.220',
+         'public_ip': '1.1.1.1',
+         'roles': ['shadow', 'db_master'],
+         'is_initialized': True,
+         'is_loaded': False,
+         'apps': {
+           'guestbook_default_v1': {
+             'http': 8080, 'language': 'python', 'total_reqs': 5,
+             'appservers': 0, 'pending_appservers': 2, 'https': 4380,
+             'reqs_enqueued': 1}},
+         'memory': {'available': 50, 'total': 1000, 'used': 950},
+         'disk': [{'/': {'total': 100, 'free': 1, 'used': 99}}],
+         'cpu': {'count': 2, 'idle': 50.0, 'system': 20.0, 'user': 30.0},
+         'loadavg': {'last_1_min': 0.5, 'last_5_min': 0.5,
+                     'last_15_min': 0.5, 'scheduling_entities': 381,
+                     'runnable_entities': 3},
+         'state': 'Starting up',
+         'swap': {'used': 0, 'free': 0},
+         'services': {},
+       }]))
+
+    # Nothing goes through the logger, so the output is only JSON.
+    flexmock(appscale_tools.AppScaleLogger).should_receive("log").never()
+    flexmock(appscale_tools.AppScaleLogger).should_receive("warn").never()
+    flexmock(appscale_tools.AppScaleLogger).should_receive("success").never()
+
+    output = StringIO.StringIO()
+    old_stdout, sys.stdout = sys.stdout, output
+    try:
+      options = flexmock(keyname="bla-bla", verbose=False, format="json")
+      AppScaleTools.print_cluster_status(options)
+    finally:
+      sys.stdout = old_stdout
+
+    status = json.loads(output.getvalue())
+    self.assertEqual([{
+      'nodes': 2, 'reported_nodes': 1, 'initialized_nodes': 1,
+      'loaded_nodes': 0, 'services': 1, 'started_services': 0,
+      'dashboard_url': 'http://1.1.1.1:1080/status'}], status['summary'])
+    self.assertEqual([{'private_ip': '10.10.7.12'}],
+                     status['unreported_nodes'])
+
+    node = status['nodes'][0]
+    self.assertEqual(('1.1.1.1', 50.0, 5.0),
+                     (node['public_ip'], node['cpu']['load'],
+                      node['memory']['available_percent']))
+    self.assertEqual('/', node['disk']['most_loaded'])
+    self.assertEqual(99, node['disk']['partitions'][0]['used'])
+
+    self.assertEqual([('guestbook', 'default', 'Starting')],
+                     [(service['project_id'], service['service_id'],
+                       service['state']) for service in status['services']])
+    self.assertEqual(
+      ["Only 1.0% of '/' partition at db node is free",
+       "Only 5.0% of memory is available"],
+      [alert['message'] for alert in status['alerts']])
@@ -0,0 +1,163 @@
+#!/usr/bin/env python
+
+
+# General-purpose Python library imports
+import json
+import os
+import shutil
+import StringIO
+import sys
+import tempfile
+import time
+import unittest
+
+
+# Third party libraries
+from flexmock import flexmock
+from mock import patch
+
+
+# AppScale import, the library that we're testing here
+from appscale.tools.appscale_logger import AppScaleLogger
+from appscale.tools.appscale_tools import AppScaleTools
+from appscale.tools.custom_exceptions import AppScaleException
+from appscale.tools.custom_exceptions import BadConfigurationException
+from appscale.tools.custom_exceptions import CancelledException
+from appscale.tools.local_state import LocalState
+from appscale.tools.parse_args import ParseArgs
+from appscale.tools.remote_helper import RemoteHelper
+from appscale.tools.remote_ops import ProcessOperation
+from appscale.tools.remote_ops import RemoteEngine
+
+
+class TestAppScaleExec(unittest.TestCase):
+
+  def setUp(self):
+    self.keyname = "boobazblargfoo"
+    self.function = "appscale-exec"
+    self.nodes = [
+      {'public_ip': 'public1', 'jobs': ['shadow', 'load_balancer']},
+      {'public_ip': 'public2', 'jobs': ['compute']},
+      {'public_ip': 'public3', 'jobs': ['database', 'compute']},
+      {'public_ip': 'public4', 'jobs': ['compute']}
+    ]
+    flexmock(LocalState).should_receive('get_local_nodes_info') \
+      .with_args(self.keyname).and_return(self.nodes)
+    flexmock(AppScaleLogger).should_receive('success')
+    flexmock(AppScaleLogger).should_receive('warn')
+
+    # Each machine runs its own local command in place of the real one.
+    self.machines = {}
+    self.submitted = []
+    self.operations = []
+    def ssh_operation(host, keyname, command, is_verbose, num_retries,
+                      timeout, limit):
+      self.submitted.append((host, command, num_retries, limit.size))
+      operation = ProcessOperation(self.machines[host], timeout=timeout,
+                                   limit=limit)
+      self.operations.append(operation)
+      return operation
+    flexmock(RemoteHelper).should_receive('ssh_operation') \
+      .replace_with(ssh_operation)
+
+
+  def run_exec(self, argv):
+    """ Runs exec_command, returning its exit status and what it printed. """
+    options = ParseArgs(["--keyname", self.keyname] + argv, self.function).args
+    output = StringIO.StringIO()
+    old_stdout, sys.stdout = sys.stdout, output
+    try:
+      status = AppScaleTools.exec_command(options)
+    finally:
+      sys.stdout = old_stdout
+    return status, output.getvalue()
+
+
+  def test_exec_groups_identical_output(self):
+    self.machines = {'public2': 'echo 4.4.0', 'public3': 'echo 4.4.0',
+                     'public4': 'echo 4.9.0; exit 3'}
+    status, output = self.run_exec(["--role", "compute", "--max_parallel",
+                                    "2", "uname", "-r"])
+
+    self.assertEquals(1, status)
+    self.assertEquals(
+      [('public2', 'uname -r', 1, 2), ('public3', 'uname -r', 1, 2),
+       ('public4', 'uname -r', 1, 2)], self.submitted)
+    self.assertIn("==> public2, public3 (exit 0) <==\n4.4.0\n", output)
+    self.assertIn("==> public4 (exit 3) <==\n4.9.0\n", output)
+    self.assertEquals(1, output.count('4.4.0'))
+
+
+  def test_exec_reports_json_with_timeouts(self):
+    self.machines = {'public1': 'echo ok', 'public2': 'echo ok',
+                     'public3': 'echo partial; sleep 5', 'public4': 'echo ok'}
+    status, output = self.run_exec(["--all", "--timeout", "1", "--format",
+                                    "json", "--", "check"])
+
+    self.assertEquals(1, status)
+    report = json.loads(output)
+    self.assertEquals('check', report['command'])
+    self.assertEquals([
+      {'exit_code': 0, 'hosts': ['public1', 'public2', 'public4'],
+       'output': 'ok\n', 'timed_out': False},
+      {'exit_code': None, 'hosts': ['public3'], 'output': 'partial\n',
+       'timed_out': True}], report['groups'])
+    self.assertEquals([0, 0, 1, 0],
+                      [result['group'] for result in report['results']])
+    self.assertEquals(['database', 'compute'], report['results'][2]['roles'])
+
+
+  def test_exec_succeeds_everywhere(self):
+    self.machines = {'public1': 'true'}
+    status, output = self.run_exec(["--role", "shadow", "hostname"])
+    self.assertEquals(0, status)
+    self.assertIn("==> public1 (exit 0) <==", output)
+
+
+  def test_exec_needs_targets_and_a_command(self):
+    base = ["--keyname", self.keyname]
+    self.assertRaises(BadConfigurationException, ParseArgs, base + ["uptime"],
+                      self.function)
+    self.assertRaises(BadConfigurationException, ParseArgs, base + ["--all",
+                      "--role", "compute", "uptime"], self.function)
+    self.assertRaises(BadConfigurationException, ParseArgs, base + ["--all"],
+                      self.function)
+    self.assertRaises(BadConfigurationException, ParseArgs,
+                      base + ["--all", "--max_parallel", "0", "uptime"],
+                      self.function)
+
+    options = ParseArgs(base + ["--role", "search", "uptime"],
+                        self.function).args
+    self.assertRaises(AppScaleException, AppScaleTools.exec_command, options)
+
+
+  def test_interrupting_exec_stops_the_commands(self):
+    temp_dir = tempfile.mkdtemp()
+    marker = os.path.join(temp_dir, 'marker')
+    self.machines = {'public1': 'sleep 1; touch {0}'.format(marker),
+                     'public3': 'sleep 1; touch {0}'.format(marker)}
+
+    # Ctrl-C arrives once the commands have started.
+    original_wait = RemoteEngine.wait
+    interrupts = [KeyboardInterrupt()]
+    def interrupted_wait(engine, *args, **kwargs):
+      if interrupts:
+        original_wait(engine, timeout=0.2)
+        raise interrupts.pop()
+      return original_wait(engine, *args, **kwargs)
+
+    try:
+      with patch.object(RemoteEngine, 'wait', autospec=True,
+                        side_effect=interrupted_wait):
+        self.assertRaises(KeyboardInterrupt, self.run_exec,
+                          ["--role", "database", "--role", "load_balancer",
+                           "uptime"])
+      self.assertEquals(2, len(self.operations))
+      for operation in self.operations:
+        self.assertIsNotNone(operation.started)
+        self.assertIsInstance(operation.error, CancelledException)
+
+      time.sleep(1.5)
+      self.assertFalse(os.path.exists(marker))
+    finally:
+      shutil.rmtree(temp_dir)
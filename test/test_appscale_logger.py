@@ -3,8 +3,13 @@
 
 # General-purpose Python library imports
 import httplib
+import json
 import os
+import shutil
 import sys
+import tempfile
+import threading
+import time
 import unittest
 
 
@@ -26,6 +31,12 @@ class TestAppScaleLogger(unittest.TestCase):
     builtins = flexmock(sys.modules['__builtin__'])
     builtins.should_receive('print').and_return()
 
+    # keep spooled messages out of the user's ~/.appscale
+    self.spool_dir = tempfile.mkdtemp()
+    flexmock(AppScaleLogger, SPOOL_LOCATION=os.path.join(self.spool_dir,
+      'spool.json'), _spool_taken=False)
+    flexmock(os, environ={})
+
     # pretend that our credentials are valid.
     fake_ec2 = flexmock(name="fake_ec2")
     fake_ec2.should_receive('get_all_instances')
@@ -71,6 +82,8 @@ class TestAppScaleLogger(unittest.TestCase):
       "instance_type" : "m3.medium",
       "ips" : None,
       "ips_layout" : None,
+      "placement" : "simple",
+      "expected_app_servers" : None,
       "keyname" : "appscale",
       "login_host" : None,
       "default_max_appserver_memory" : 400,
@@ -82,6 +95,7 @@ class TestAppScaleLogger(unittest.TestCase):
       "static_ip" : None,
       "table" : "cassandra",
       "test" : False,
+      "trace" : None,
       "use_spot_instances" : False,
       "user_commands" : [],
       "verbose" : False,
@@ -108,30 +122,96 @@ class TestAppScaleLogger(unittest.TestCase):
       "table=cassandra&test=False&version=False"
 
 
+  def tearDown(self):
+    shutil.rmtree(self.spool_dir)
+
+
+  def fake_connection(self, sent, error=None):
+    """ Returns an HTTPConnection that records what it posts, or fails. """
+    connection = flexmock(name="fake_connection")
+    def request(method, url, payload, headers):
+      if error is not None:
+        raise error
+      sent.append(payload)
+    connection.should_receive('request').replace_with(request)
+    connection.should_receive('getresponse').and_return(
+      flexmock(read=lambda: ''))
+    connection.should_receive('close')
+    return connection
+
+
   def test_remote_log_tools_state_when_remote_is_up(self):
-    # mock out the posting to the remote app
-    fake_connection = flexmock(name="fake_connection")
-    fake_connection.should_receive('request').with_args('POST',
-      '/upload', self.payload, AppScaleLogger.HEADERS) \
-      .and_return()
-    flexmock(httplib).should_receive('HTTPConnection') \
-      .and_return(fake_connection)
+    sent = []
+    flexmock(httplib).should_receive('HTTPConnection').with_args(
+      AppScaleLogger.LOGS_HOST, timeout=AppScaleLogger.LOGS_TIMEOUT) \
+      .and_return(self.fake_connection(sent))
 
     actual = AppScaleLogger.remote_log_tools_state(self.options, self.my_id,
       "started", "X.Y.Z")
     self.assertEquals(self.expected, actual)
 
+    AppScaleLogger.finish_remote_logs(grace_period=5)
+    self.assertEquals(1, len(sent))
+    self.assertTrue(sent[0].startswith(
+      "?boo=baz&my_id=12345&state=started&version=X.Y.Z&"))
+    self.assertFalse(os.path.exists(AppScaleLogger.SPOOL_LOCATION))
+
 
   def test_remote_log_tools_state_when_remote_is_down(self):
-    # mock out the posting to the remote app, which should
-    # fail since we're pretending the app is down
-    fake_connection = flexmock(name="fake_connection")
-    fake_connection.should_receive('request').with_args('POST',
-      '/upload', self.payload, AppScaleLogger.HEADERS) \
-      .and_raise(Exception)
+    # posting fails since we're pretending the app is down, so the message
+    # is spooled
     flexmock(httplib).should_receive('HTTPConnection') \
-      .and_return(fake_connection)
+      .and_return(self.fake_connection([], error=Exception('down')))
 
     actual = AppScaleLogger.remote_log_tools_state(self.options, self.my_id,
     "started", "X.Y.Z")
     self.assertEquals(self.expected, actual)
+    AppScaleLogger.finish_remote_logs(grace_period=5)
+    with open(AppScaleLogger.SPOOL_LOCATION) as spool:
+      self.assertEquals(1, len(json.load(spool)))
+
+    # once the app is back, the spooled message is sent after the new one
+    sent = []
+    flexmock(httplib).should_receive('HTTPConnection') \
+      .and_return(self.fake_connection(sent))
+    AppScaleLogger.remote_log_tools_state(self.options, self.my_id,
+      "finished", "X.Y.Z")
+    AppScaleLogger.finish_remote_logs(grace_period=5)
+    self.assertEquals(['finished', 'started'],
+                      [payload.split('&')[2][len('state='):]
+                       for payload in sent])
+    self.assertFalse(os.path.exists(AppScaleLogger.SPOOL_LOCATION))
+
+
+  def test_remote_log_tools_state_never_waits_on_remote(self):
+    # the remote app hangs until we let it go
+    release = threading.Event()
+    connection = flexmock(name="fake_connection")
+    connection.should_receive('request').replace_with(
+      lambda method, url, payload, headers: release.wait(5))
+    connection.should_receive('getresponse').and_raise(Exception('hung'))
+    connection.should_receive('close')
+    flexmock(httplib).should_receive('HTTPConnection').and_return(connection)
+
+    start = time.time()
+    AppScaleLogger.remote_log_tools_state(self.options, self.my_id,
+      "started", "X.Y.Z")
+    self.assertTrue(time.time() - start < 1)
+
+    # at exit, the message that couldn't be sent yet is spooled
+    sender = AppScaleLogger._sender
+    AppScaleLogger.finish_remote_logs(grace_period=0)
+    release.set()
+    sender.join(5)
+    with open(AppScaleLogger.SPOOL_LOCATION) as spool:
+      self.assertEquals(1, len(json.load(spool)))
+
+
+  def test_remote_log_tools_state_when_opted_out(self):
+    flexmock(os, environ={AppScaleLogger.OPT_OUT_VAR: '1'})
+    flexmock(httplib).should_receive('HTTPConnection').never()
+
+    actual = AppScaleLogger.remote_log_tools_state(self.options, self.my_id,
+      "started", "X.Y.Z")
+    self.assertEquals(self.expected, actual)
+    AppScaleLogger.finish_remote_logs(grace_period=0)
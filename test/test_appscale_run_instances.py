@@ -3,7 +3,6 @@
 
 # General-purpose Python library imports
 import base64
-import httplib
 import json
 import os
 import re
@@ -30,6 +29,7 @@ from appscale.tools.appscale_tools import AppScaleTools
 from appscale.tools.local_state import APPSCALE_VERSION
 from appscale.tools.local_state import LocalState
 from appscale.tools.parse_args import ParseArgs
+from appscale.tools.preflight import Preflight
 from appscale.tools.remote_helper import RemoteHelper
 from appscale.tools.custom_exceptions import BadConfigurationException
 
@@ -49,6 +49,9 @@ class TestAppScaleRunInstances(unittest.TestCase):
     AppScaleLogger.should_receive('log').and_return()
     AppScaleLogger.should_receive('success').and_return()
 
+    # mock out talking to logs.appscale.com
+    AppScaleLogger.should_receive('remote_log_tools_state').and_return()
+
     # mock out all sleeping
     flexmock(time)
     time.should_receive('sleep').and_return()
@@ -188,9 +191,7 @@ EC2_SECRET_KEY: 'baz'
     self.local_state.should_receive('shell').with_args(re.compile('ssh'),
       False, 5, stdin=re.compile(RemoteHelper.CONFIG_DIR)).and_return()
 
-    flexmock(RemoteHelper)
-    RemoteHelper.should_receive('get_host_appscale_version').\
-      and_return(APPSCALE_VERSION)
+    flexmock(Preflight).should_receive('check_nodes').and_return()
 
     # Assume we are using a supported database.
     db_file = '{}/{}/{}'.\
@@ -283,17 +284,10 @@ EC2_SECRET_KEY: 'baz'
     self.local_state.should_receive('ensure_appscale_isnt_running').and_return()
     self.local_state.should_receive('make_appscale_directory').and_return()
 
+    # The head node's files and commands go over in one remote script.
     rh = flexmock(RemoteHelper)
-    rh.should_receive('copy_deployment_credentials').and_return()
-
-    # mock out talking to logs.appscale.com
-    fake_connection = flexmock(name='fake_connection')
-    fake_connection.should_receive('request').\
-      with_args('POST', '/upload', str, AppScaleLogger.HEADERS).and_return()
-
-    flexmock(httplib)
-    httplib.should_receive('HTTPConnection').\
-      with_args('logs.appscale.com').and_return(fake_connection)
+    rh.should_receive('run_script').and_return([])
+    rh.should_receive('add_credential_steps').and_return()
 
     # mock out generating the secret key
     flexmock(uuid)
@@ -324,19 +318,6 @@ EC2_SECRET_KEY: 'baz'
       .with_args(re.compile('^openssl'),False,stdin=None)\
       .and_return()
 
-    # mock out removing the old json file
-    self.local_state.should_receive('shell')\
-      .with_args(re.compile('^ssh'),False,5,stdin=re.compile('rm -rf'))\
-      .and_return()
-
-    # assume that we started monit fine
-    self.local_state.should_receive('shell')\
-      .with_args(re.compile('^ssh'),False,5,stdin=re.compile('monit'))\
-      .and_return()
-
-    self.local_state.should_receive('shell').with_args(
-      re.compile('^ssh'), False, 5, stdin='service appscale-controller start')
-
     self.local_state.should_receive('shell').\
       with_args('ssh -i /root/.appscale/boobazblargfoo.key -o LogLevel=quiet '
                 '-o NumberOfPasswordPrompts=0 -o StrictHostkeyChecking=no '
@@ -355,29 +336,6 @@ EC2_SECRET_KEY: 'baz'
         "jobs": ["shadow", "login"]
       }])))
 
-    # Assume the locations files were copied successfully.
-    locations_file = '{}/locations-bookey.yaml'.\
-      format(RemoteHelper.CONFIG_DIR)
-    self.local_state.should_receive('shell')\
-      .with_args(re.compile('^scp .*{}'.format(locations_file)), False, 5)\
-      .and_return()
-
-    locations_json = '{}/locations-bookey.json'.\
-      format(RemoteHelper.CONFIG_DIR)
-    self.local_state.should_receive('shell')\
-      .with_args(re.compile('^scp .*{}'.format(locations_json)), False, 5)\
-      .and_return()
-
-    user_locations = '/root/.appscale/locations-bookey.json'
-    self.local_state.should_receive('shell')\
-      .with_args(re.compile('^scp .*{}'.format(user_locations)), False, 5)\
-      .and_return()
-
-    # Assume the secret key was copied successfully.
-    self.local_state.should_receive('shell')\
-      .with_args(re.compile('^scp .*.secret'), False, 5)\
-      .and_return()
-
     flexmock(AppControllerClient)
     AppControllerClient.should_receive('does_user_exist').and_return(True)
 
@@ -404,15 +362,6 @@ EC2_SECRET_KEY: 'baz'
     self.local_state.should_receive('get_key_path_from_name').and_return(
       local_appscale_path)
 
-    # mock out talking to logs.appscale.com
-    fake_connection = flexmock(name='fake_connection')
-    fake_connection.should_receive('request').with_args('POST', '/upload', str,
-      AppScaleLogger.HEADERS).and_return()
-
-    flexmock(httplib)
-    httplib.should_receive('HTTPConnection').with_args('logs.appscale.com') \
-      .and_return(fake_connection)
-
     # mock out generating the secret key
     flexmock(uuid)
     uuid.should_receive('uuid4').and_return('the secret')
@@ -450,43 +399,8 @@ EC2_SECRET_KEY: 'baz'
       False, 5, stdin='ls').and_return(
       'Please login as the user "ubuntu" rather than the user "root"')
 
-    # assume that we can enable root login
-    self.local_state.should_receive('shell').with_args(
-      re.compile('ssh'), False, 5,
-      stdin='sudo touch /root/.ssh/authorized_keys').and_return()
-
-    self.local_state.should_receive('shell').with_args(
-      re.compile('ssh'), False, 5,
-      stdin='sudo chmod 600 /root/.ssh/authorized_keys').and_return()
-
-    self.local_state.should_receive('shell').with_args(
-      re.compile('ssh'), False, 5, stdin='mktemp').and_return()
-
-    self.local_state.should_receive('shell').with_args(
-      re.compile('ssh'), False, 5,
-      stdin=re.compile(
-        'sudo sort -u ~/.ssh/authorized_keys /root/.ssh/authorized_keys -o '
-      )
-    ).and_return()
-
-    self.local_state.should_receive('shell').with_args(
-      re.compile('ssh'), False, 5,
-      stdin=re.compile(
-        'sudo sed -n '
-        '\'\/\.\*Please login\/d; w\/root\/\.ssh\/authorized_keys\' '
-      )
-    ).and_return()
-
-    self.local_state.should_receive('shell').with_args(
-      re.compile('ssh'), False, 5, stdin=re.compile('rm -f ')
-    ).and_return()
-
-    # and assume that we can copy over our ssh keys fine
-    self.local_state.should_receive('shell').\
-      with_args(re.compile('scp .*[r|d]sa'), False, 5).and_return()
-    self.local_state.should_receive('shell').\
-      with_args(re.compile('scp .*{0}'.format(self.keyname)), False, 5).\
-      and_return()
+    # enabling root login and copying our ssh keys over go through
+    # run_script, which is mocked out below
 
     self.local_state.should_receive('shell').\
       with_args('ssh -i /root/.appscale/bookey.key -o LogLevel=quiet -o '
@@ -519,13 +433,6 @@ EC2_SECRET_KEY: 'baz'
     self.local_state.should_receive('shell').with_args(re.compile('openssl'),
       False, stdin=None)
 
-    # assume that we started monit fine
-    self.local_state.should_receive('shell').with_args(re.compile('ssh'),
-      False, 5, stdin=re.compile('monit'))
-
-    self.local_state.should_receive('shell').with_args(
-      re.compile('^ssh'), False, 5, stdin='service appscale-controller start')
-
     self.setup_socket_mocks('elastic-ip')
     self.setup_appcontroller_mocks('elastic-ip', 'private1')
 
@@ -537,15 +444,8 @@ EC2_SECRET_KEY: 'baz'
         "jobs": ["shadow", "login"]
       }])))
 
-    # copying over the locations yaml and json files should be fine
-    self.local_state.should_receive('shell').with_args(re.compile('scp'),
-      False, 5, stdin=re.compile('locations-{0}'.format(self.keyname)))
-
-    # same for the secret key
-    self.local_state.should_receive('shell').with_args(re.compile('scp'),
-      False, 5, stdin=re.compile('{0}.secret'.format(self.keyname)))
-
-    flexmock(RemoteHelper).should_receive('copy_deployment_credentials')
+    flexmock(RemoteHelper).should_receive('run_script').and_return([])
+    flexmock(RemoteHelper).should_receive('add_credential_steps')
     flexmock(AppControllerClient)
     AppControllerClient.should_receive('does_user_exist').and_return(True)
 
@@ -597,15 +497,6 @@ EC2_SECRET_KEY: 'baz'
     self.local_state.should_receive('get_key_path_from_name').and_return(
       local_appscale_path)
 
-    # mock out talking to logs.appscale.com
-    fake_connection = flexmock(name='fake_connection')
-    fake_connection.should_receive('request').with_args('POST', '/upload', str,
-      AppScaleLogger.HEADERS).and_return()
-
-    flexmock(httplib)
-    httplib.should_receive('HTTPConnection').with_args('logs.appscale.com') \
-      .and_return(fake_connection)
-
     # mock out generating the secret key
     flexmock(uuid)
     uuid.should_receive('uuid4').and_return('the secret')
@@ -636,42 +527,8 @@ EC2_SECRET_KEY: 'baz'
       False, 5, stdin='ls').and_return(
       'Please login as the user "ubuntu" rather than the user "root"')
 
-    # assume that we can enable root login
-    self.local_state.should_receive('shell').with_args(
-      re.compile('ssh'), False, 5,
-      stdin='sudo touch /root/.ssh/authorized_keys').and_return()
-
-    self.local_state.should_receive('shell').with_args(
-      re.compile('ssh'), False, 5,
-      stdin='sudo chmod 600 /root/.ssh/authorized_keys').and_return()
-
-    self.local_state.should_receive('shell').with_args(
-      re.compile('ssh'), False, 5, stdin='mktemp').and_return()
-
-    self.local_state.should_receive('shell').with_args(
-      re.compile('ssh'), False, 5,
-      stdin=re.compile(
-        'sudo sort -u ~/.ssh/authorized_keys /root/.ssh/authorized_keys -o '
-      )
-    ).and_return()
-
-    self.local_state.should_receive('shell').with_args(
-      re.compile('ssh'), False, 5,
-      stdin=re.compile(
-        'sudo sed -n '
-        '\'\/\.\*Please login\/d; w\/root\/\.ssh\/authorized_keys\' '
-      )
-    ).and_return()
-
-    self.local_state.should_receive('shell').with_args(
-      re.compile('ssh'), False, 5, stdin=re.compile('rm -f ')
-    ).and_return()
-
-    # and assume that we can copy over our ssh keys fine
-    self.local_state.should_receive('shell').with_args(re.compile('scp .*[r|d]sa'),
-      False, 5).and_return()
-    self.local_state.should_receive('shell').with_args(re.compile('scp .*{0}'
-      .format(self.keyname)), False, 5).and_return()
+    # enabling root login and copying our ssh keys over go through
+    # run_script, which is mocked out below
 
     self.setup_appscale_compatibility_mocks()
 
@@ -679,13 +536,6 @@ EC2_SECRET_KEY: 'baz'
     self.local_state.should_receive('shell').with_args(re.compile('openssl'),
       False, stdin=None)
 
-    # assume that we started monit fine
-    self.local_state.should_receive('shell').with_args(re.compile('ssh'),
-      False, 5, stdin=re.compile('monit'))
-
-    self.local_state.should_receive('shell').with_args(
-      re.compile('^ssh'), False, 5, stdin='service appscale-controller start')
-
     self.setup_socket_mocks('public1')
     self.setup_appcontroller_mocks('public1', 'private1')
 
@@ -697,14 +547,6 @@ EC2_SECRET_KEY: 'baz'
         "jobs" : ["shadow", "login"]
       }])))
 
-    # copying over the locations json file should be fine
-    self.local_state.should_receive('shell').with_args(re.compile('scp'),
-      False, 5, stdin=re.compile('locations-{0}'.format(self.keyname)))
-
-    # same for the secret key
-    self.local_state.should_receive('shell').with_args(re.compile('scp'),
-      False, 5, stdin=re.compile('{0}.secret'.format(self.keyname)))
-
     self.local_state.should_receive('shell').with_args('ssh -i /root/.appscale/boobazbargfoo.key -o LogLevel=quiet -o NumberOfPasswordPrompts=0 -o StrictHostkeyChecking=no -o UserKnownHostsFile=/dev/null root@public1 ', False, 5, stdin='cp /root/appscale/AppController/scripts/appcontroller /etc/init.d/').and_return()
 
     self.local_state.should_receive('shell').with_args('ssh -i /root/.appscale/boobazblargfoo.key -o LogLevel=quiet -o NumberOfPasswordPrompts=0 -o StrictHostkeyChecking=no -o UserKnownHostsFile=/dev/null root@elastic-ip ', False, 5, stdin='cp /root/appscale/AppController/scripts/appcontroller /etc/init.d/').and_return()
@@ -715,7 +557,8 @@ EC2_SECRET_KEY: 'baz'
 
     self.local_state.should_receive('shell').with_args('ssh -i /root/.appscale/boobazblargfoo.key -o LogLevel=quiet -o NumberOfPasswordPrompts=0 -o StrictHostkeyChecking=no -o UserKnownHostsFile=/dev/null root@public1 ', False, 5, stdin='chmod +x /etc/init.d/appcontroller').and_return()
 
-    flexmock(RemoteHelper).should_receive('copy_deployment_credentials')
+    flexmock(RemoteHelper).should_receive('run_script').and_return([])
+    flexmock(RemoteHelper).should_receive('add_credential_steps')
     flexmock(AppControllerClient)
     AppControllerClient.should_receive('does_user_exist').and_return(True)
 
@@ -774,8 +617,7 @@ EC2_SECRET_KEY: 'baz'
 
     flexmock(RemoteHelper)
     RemoteHelper.should_receive('enable_root_ssh').and_return()
-    RemoteHelper.should_receive('ensure_machine_is_compatible')\
-        .and_return()
+    flexmock(Preflight).should_receive('check_nodes').and_return()
     RemoteHelper.should_receive('start_head_node')\
         .and_return((IP_1, 'i-ABCDEFG'))
     RemoteHelper.should_receive('sleep_until_port_is_open').and_return()
@@ -0,0 +1,108 @@
+#!/usr/bin/env python
+
+
+# General-purpose Python library imports
+import gzip
+import os
+import shutil
+import subprocess
+import tempfile
+import unittest
+
+
+# Third party libraries
+from flexmock import flexmock
+
+
+# AppScale import, the library that we're testing here
+from appscale.tools import appscale_tools
+from appscale.tools.appscale_tools import AppScaleTools
+from appscale.tools.custom_exceptions import AppScaleException
+from appscale.tools.custom_exceptions import BadConfigurationException
+from appscale.tools.local_state import LocalState
+from appscale.tools.parse_args import ParseArgs
+
+
+class TestAppScaleSearchLogs(unittest.TestCase):
+
+  def setUp(self):
+    self.keyname = "boobazblargfoo"
+    self.function = "appscale-search-logs"
+    self.nodes = [
+      {'public_ip': 'public1', 'jobs': ['shadow', 'load_balancer']},
+      {'public_ip': 'public2', 'jobs': ['compute']},
+      {'public_ip': 'public3', 'jobs': ['database', 'compute']}
+    ]
+    flexmock(LocalState).should_receive('get_local_nodes_info') \
+      .with_args(self.keyname).and_return(self.nodes)
+
+
+  def test_search_only_runs_on_nodes_with_roles(self):
+    searched = []
+    def fake_multiplexer(streams):
+      searched.extend(streams)
+      return flexmock(run=lambda: None)
+    (flexmock(appscale_tools)
+      .should_receive('StreamMultiplexer')
+      .replace_with(fake_multiplexer))
+
+    argv = ["--keyname", self.keyname, "--pattern", "req-123",
+            "--roles", "compute", "--since", "2018-01-01"]
+    options = ParseArgs(argv, self.function).args
+    AppScaleTools.search_logs(options)
+
+    self.assertEquals(['public2', 'public3'],
+                      [stream.host for stream in searched])
+    self.assertIn("-newermt '2018-01-01 00:00:00'", searched[0].command)
+    self.assertIsNone(searched[0].reconnect_command)
+
+
+  def test_search_with_unused_role(self):
+    argv = ["--keyname", self.keyname, "--pattern", "req-123",
+            "--roles", "search"]
+    options = ParseArgs(argv, self.function).args
+    self.assertRaises(AppScaleException, AppScaleTools.search_logs, options)
+
+
+  def test_times_are_normalized(self):
+    argv = ["--keyname", self.keyname, "--pattern", "req-123",
+            "--since", "2018-01-01T10:30", "--until", "2018-01-02"]
+    options = ParseArgs(argv, self.function).args
+    self.assertEquals('2018-01-01 10:30:00', options.since)
+    self.assertEquals('2018-01-02 23:59:59', options.until)
+
+    argv = ["--keyname", self.keyname, "--pattern", "req-123",
+            "--since", "yesterday"]
+    self.assertRaises(BadConfigurationException, ParseArgs, argv,
+                      self.function)
+
+    # A pattern is required.
+    self.assertRaises(BadConfigurationException, ParseArgs,
+                      ["--keyname", self.keyname], self.function)
+
+
+  def test_search_command_reads_rotated_logs_within_time_range(self):
+    log_dir = tempfile.mkdtemp()
+    try:
+      with open(os.path.join(log_dir, 'app.log'), 'w') as log_file:
+        log_file.write('2018-01-01 10:00:00 req-123 in range\n'
+                       '2018-01-03 10:00:00 req-123 too late\n'
+                       'unstamped req-123\n'
+                       '2018-01-01 11:00:00 req-456\n')
+      rotated = gzip.open(os.path.join(log_dir, 'app.log.1.gz'), 'wb')
+      rotated.write('2018-01-02 10:00:00 req-123 rotated\n')
+      rotated.close()
+
+      flexmock(AppScaleTools, LOG_PATHS=[{'remote': log_dir},
+                                         {'remote': '/nonexistent/path*'}])
+      command = AppScaleTools.get_log_search_command(
+        'req-123', '2018-01-01 00:00:00', '2018-01-02 23:59:59')
+      output = subprocess.check_output(['bash', '-c', command])
+    finally:
+      shutil.rmtree(log_dir)
+
+    self.assertEquals(sorted([
+      '{0}/app.log:2018-01-01 10:00:00 req-123 in range'.format(log_dir),
+      '{0}/app.log:unstamped req-123'.format(log_dir),
+      '{0}/app.log.1.gz:2018-01-02 10:00:00 req-123 rotated'.format(log_dir)
+    ]), sorted(output.splitlines()))
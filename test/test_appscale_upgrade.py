@@ -0,0 +1,93 @@
+#!/usr/bin/env python
+
+
+# General-purpose Python library imports
+import json
+import os
+import shutil
+import tempfile
+import unittest
+
+
+# Third party libraries
+from flexmock import flexmock
+
+
+# AppScale import, the library that we're testing here
+from appscale.tools.appscale_logger import AppScaleLogger
+from appscale.tools.appscale_tools import AppScaleTools
+from appscale.tools.custom_exceptions import AppScaleException
+from appscale.tools.custom_exceptions import ShellException
+from appscale.tools.remote_helper import RemoteHelper
+from appscale.tools.upgrade_progress import UpgradeProgress
+
+
+class TestAppScaleUpgrade(unittest.TestCase):
+
+
+  def setUp(self):
+    flexmock(AppScaleLogger)
+    AppScaleLogger.should_receive('log').and_return()
+    AppScaleLogger.should_receive('success').and_return()
+    AppScaleLogger.should_receive('warn').and_return()
+
+    self.temp_dir = tempfile.mkdtemp()
+    self.progress_location = os.path.join(self.temp_dir, 'upgrade-bookey.json')
+    self.options = flexmock(keyname='bookey', verbose=False, test=True)
+    self.node_layout = flexmock(nodes=[
+      flexmock(public_ip='1.2.3.4'), flexmock(public_ip='1.2.3.5'),
+      flexmock(public_ip='1.2.3.4')])
+
+
+  def tearDown(self):
+    shutil.rmtree(self.temp_dir)
+
+
+  def test_progress_is_only_resumed_for_the_same_version(self):
+    progress = UpgradeProgress.load(self.progress_location, '3.5.0')
+    self.assertFalse(progress.has_finished('1.2.3.4', UpgradeProgress.STAGED))
+
+    progress.mark('1.2.3.4', UpgradeProgress.UPGRADED)
+    with open(self.progress_location) as progress_file:
+      self.assertEquals({'version': '3.5.0',
+                         'nodes': {'1.2.3.4': 'upgraded'}},
+                        json.load(progress_file))
+
+    resumed = UpgradeProgress.load(self.progress_location, '3.5.0')
+    self.assertTrue(resumed.has_finished('1.2.3.4', UpgradeProgress.STAGED))
+    self.assertTrue(resumed.has_finished('1.2.3.4', UpgradeProgress.UPGRADED))
+
+    other_version = UpgradeProgress.load(self.progress_location, '3.6.0')
+    self.assertFalse(other_version.has_finished('1.2.3.4',
+                                                UpgradeProgress.STAGED))
+
+
+  def test_staging_failure_stops_before_the_outage(self):
+    progress = UpgradeProgress(self.progress_location, '3.5.0')
+
+    def ssh(ip, keyname, command, is_verbose):
+      self.assertIn('git clone --quiet --depth 1 --branch 3.5.0', command)
+      if ip == '1.2.3.5':
+        raise ShellException('unable to reach github')
+
+    flexmock(RemoteHelper).should_receive('ssh').replace_with(ssh)
+    self.assertRaises(AppScaleException, AppScaleTools.stage_upgrade,
+                      self.options, self.node_layout, progress)
+    self.assertTrue(progress.has_finished('1.2.3.4', UpgradeProgress.STAGED))
+    self.assertFalse(progress.has_finished('1.2.3.5', UpgradeProgress.STAGED))
+
+
+  def test_resumed_upgrade_skips_finished_nodes(self):
+    progress = UpgradeProgress(self.progress_location, '3.5.0')
+    progress.mark('1.2.3.4', UpgradeProgress.UPGRADED)
+    progress.mark('1.2.3.5', UpgradeProgress.STAGED)
+
+    commands = []
+    flexmock(RemoteHelper).should_receive('ssh').replace_with(
+      lambda ip, keyname, command, is_verbose: commands.append((ip, command)))
+    flexmock(AppScaleTools).should_receive('run_upgrade_script').once()
+
+    AppScaleTools.upgrade_appscale(self.options, self.node_layout, progress)
+    self.assertEquals(['1.2.3.5'], [ip for ip, _ in commands])
+    self.assertIn('mv ~/appscale-3.5.0 ~/appscale', commands[0][1])
+    self.assertFalse(os.path.exists(self.progress_location))
@@ -260,7 +260,8 @@ class TestAppScaleUploadApp(unittest.TestCase):
       and_return(login_host)
     flexmock(LocalState).should_receive('get_secret_key').and_return(secret)
     flexmock(RemoteHelper).should_receive('copy_app_to_host').\
-      with_args(extracted_dir, app_id, self.keyname, False, {}, None).\
+      with_args(extracted_dir, app_id, self.keyname, False, {}, None, None,
+                {}).\
       and_return(source_path)
     flexmock(AdminClient).should_receive('create_version').\
       and_return(operation_id)
@@ -287,8 +288,54 @@ class TestAppScaleUploadApp(unittest.TestCase):
     given_host, given_port = AppScaleTools.upload_app(options)
     self.assertEquals(given_host, login_host)
     self.assertEquals(given_port, port)
- 
- 
+
+
+  def test_upload_app_dry_run(self):
+    app_dir = tempfile.mkdtemp()
+    try:
+      contents = {
+        'application': 'guestbook',
+        'runtime': 'python27',
+        'api_version': 1,
+        'threadsafe': True,
+        'handlers': [{'url': '/.*', 'script': 'main.app'}],
+        'skip_files': [r'^node_modules/.*$']
+      }
+      files = {
+        'app.yaml': yaml.dump(contents),
+        '.appscaleignore': 'tests/\n',
+        'main.py': 'app = None\n',
+        'static/site.css': 'x' * 2048,
+        'node_modules/left-pad/index.js': 'x' * 4096,
+        'tests/test_main.py': 'pass\n'
+      }
+      for path, data in files.items():
+        full_path = os.path.join(app_dir, path)
+        if not os.path.isdir(os.path.dirname(full_path)):
+          os.makedirs(os.path.dirname(full_path))
+        with open(full_path, 'w') as app_file:
+          app_file.write(data)
+
+      logged = []
+      flexmock(AppScaleLogger).should_receive('log').replace_with(
+        logged.append)
+      flexmock(LocalState).should_receive('get_login_host').never()
+      flexmock(RemoteHelper).should_receive('copy_app_to_host').never()
+
+      argv = ['--keyname', self.keyname, '--file', app_dir, '--test',
+              '--dry-run']
+      options = ParseArgs(argv, self.function).args
+      self.assertIsNone(AppScaleTools.upload_app(options))
+    finally:
+      shutil.rmtree(app_dir)
+
+    report = logged[-1]
+    self.assertIn('static/', report)
+    self.assertIn('2.0 KB', report)
+    self.assertNotIn('node_modules', report)
+    self.assertNotIn('tests/', report)
+
+
   def test_java_bad_sdk_version(self):
     bad_jars = ['test.jar', 'appengine-api-1.0-sdk-1.7.3.jar']
     flexmock(os)
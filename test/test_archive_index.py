@@ -0,0 +1,119 @@
+#!/usr/bin/env python
+
+
+# General-purpose Python library imports
+import os
+import shutil
+import StringIO
+import tarfile
+import tempfile
+import unittest
+
+
+# Third party libraries
+from flexmock import flexmock
+
+
+# AppScale import, the library that we're testing here
+from appscale.tools import utils
+from appscale.tools.admin_api.version import Version
+from appscale.tools.archive_index import ArchiveIndex
+from appscale.tools.archive_index import TarGzIndex
+
+
+class TestArchiveIndex(unittest.TestCase):
+
+
+  def setUp(self):
+    self.temp_dir = tempfile.mkdtemp()
+
+
+  def tearDown(self):
+    shutil.rmtree(self.temp_dir)
+
+
+  def make_tarball(self, files):
+    tar_location = os.path.join(self.temp_dir, 'app.tar.gz')
+    with tarfile.open(tar_location, 'w:gz') as tar:
+      for name, contents in files:
+        info = tarfile.TarInfo(name)
+        info.size = len(contents)
+        tar.addfile(info, StringIO.StringIO(contents))
+    return tar_location
+
+
+  def test_deploy_steps_share_one_scan(self):
+    tar_location = self.make_tarball([
+      ('app.yaml', 'application: guestbook\nruntime: python27\n'
+                   'threadsafe: true\nhandlers:\n- url: /.*\n'
+                   '  script: main.app\n'),
+      ('static/cron.yaml', 'cron: []\n'),
+      ('cron.yaml', 'cron:\n- url: /tick\n'),
+      ('queue.xml', '<queue-entries/>'),
+      ('main.py', 'print "hi"\n'),
+    ])
+    flexmock(tarfile).should_call('open').once()
+
+    version = Version.from_tar_gz(tar_location)
+    self.assertEquals('guestbook', version.project_id)
+    self.assertEquals('cron:\n- url: /tick\n',
+                      utils.config_from_tar_gz('cron.yaml', tar_location))
+    self.assertIsNone(utils.config_from_tar_gz('queue.yaml', tar_location))
+    self.assertEquals('<queue-entries/>',
+                      utils.config_from_tar_gz('queue.xml', tar_location))
+
+
+  def test_only_flat_tarballs_are_uploaded_as_is(self):
+    flat = ArchiveIndex.for_archive(self.make_tarball([
+      ('./app.yaml', 'runtime: python27\n'), ('./main.py', '')]))
+    self.assertTrue(flat.can_upload_as_is())
+
+    os.remove(os.path.join(self.temp_dir, 'app.tar.gz'))
+    nested = ArchiveIndex.for_archive(self.make_tarball([
+      ('guestbook/app.yaml', 'runtime: python27\n')]))
+    self.assertFalse(nested.can_upload_as_is())
+
+    os.remove(os.path.join(self.temp_dir, 'app.tar.gz'))
+    compiled = ArchiveIndex.for_archive(self.make_tarball([
+      ('app.yaml', 'runtime: python27\n'), ('main.pyc', 'junk')]))
+    self.assertFalse(compiled.can_upload_as_is())
+
+
+  def test_links_cant_extract_outside_the_target(self):
+    outside = os.path.join(self.temp_dir, 'outside')
+    extract_to = os.path.join(self.temp_dir, 'extracted')
+    os.mkdir(outside)
+    os.mkdir(extract_to)
+
+    tar_location = os.path.join(self.temp_dir, 'app.tar.gz')
+    with tarfile.open(tar_location, 'w:gz') as tar:
+      def add_link(name, linkname, link_type=tarfile.SYMTYPE):
+        info = tarfile.TarInfo(name)
+        info.type = link_type
+        info.linkname = linkname
+        tar.addfile(info)
+      def add_file(name):
+        info = tarfile.TarInfo(name)
+        info.size = 4
+        tar.addfile(info, StringIO.StringIO('evil'))
+
+      add_link('etc', outside)
+      add_file('etc/cron.d/x')
+      add_link('passwd', '../outside/passwd', tarfile.LNKTYPE)
+      # Each of these links looks safe on its own, but 'up/top/parent'
+      # resolves to the directory above the target once 'up/top' exists.
+      add_link('up/top', '..')
+      add_link('up/top/parent', '..')
+      add_file('up/top/parent/outside/y')
+      add_file('app.yaml')
+
+    index = ArchiveIndex.for_archive(tar_location, extract_to=extract_to)
+
+    self.assertEquals(['etc', 'passwd', 'up/top/parent'], index.unsafe_names)
+    self.assertEquals([], os.listdir(outside))
+    self.assertFalse(os.path.islink(os.path.join(extract_to, 'etc')))
+    self.assertTrue(os.path.isfile(os.path.join(extract_to, 'app.yaml')))
+
+    # Links out of the archive are caught without extracting it, too.
+    self.assertEquals(['etc', 'passwd'],
+                      TarGzIndex.scan(tar_location).unsafe_names)
@@ -0,0 +1,106 @@
+#!/usr/bin/env python
+
+
+# General-purpose Python library imports
+import os
+import shutil
+import StringIO
+import sys
+import tempfile
+import threading
+import unittest
+
+
+# Third party libraries
+from flexmock import flexmock
+
+
+# AppScale import, the library that we're testing here
+from appscale.tools.appscale import AppScale
+from appscale.tools.appscale_logger import AppScaleLogger
+from appscale.tools.custom_exceptions import AppScaleException
+from appscale.tools.daemon import AppScaleDaemon
+from appscale.tools.local_state import LocalState
+
+
+class TestAppScaleDaemon(unittest.TestCase):
+
+
+  def setUp(self):
+    self.temp_dir = tempfile.mkdtemp()
+    self.old_cwd = os.getcwd()
+    os.chdir(self.temp_dir)
+    with open('AppScalefile', 'w') as appscalefile:
+      appscalefile.write('keyname: bookey\n')
+
+    self.socket_location = os.path.join(self.temp_dir, 'appscaled.sock')
+    flexmock(LocalState).should_receive('get_daemon_socket_location').\
+      with_args('bookey').and_return(self.socket_location)
+    flexmock(LocalState).should_receive('generate_crash_log').replace_with(
+      lambda exception, stacktrace: AppScaleLogger.warn(str(exception)))
+
+
+  def tearDown(self):
+    os.chdir(self.old_cwd)
+    shutil.rmtree(self.temp_dir)
+
+
+  def start_daemon(self):
+    daemon = AppScaleDaemon('bookey')
+    thread = threading.Thread(target=daemon.serve)
+    thread.daemon = True
+    thread.start()
+    while AppScaleDaemon.ping('bookey') is None:
+      thread.join(0.05)
+    return thread
+
+
+  def forward(self, command, args):
+    """ Forwards a command, returning its exit status and what it printed. """
+    output = StringIO.StringIO()
+    old_stdout, sys.stdout = sys.stdout, output
+    try:
+      status = AppScaleDaemon.forward(command, args)
+    finally:
+      sys.stdout = old_stdout
+    return status, output.getvalue()
+
+
+  def test_commands_run_directly_without_a_daemon(self):
+    self.assertEquals((None, ''), self.forward('status', []))
+
+    # Commands the daemon doesn't serve are never forwarded.
+    self.assertEquals((None, ''), self.forward('up', []))
+
+    os.remove('AppScalefile')
+    self.assertEquals((None, ''), self.forward('status', []))
+
+
+  def test_daemon_runs_commands_and_reuses_their_output(self):
+    calls = []
+    def status(options):
+      calls.append((os.getcwd(), options))
+      print 'all good'
+    flexmock(AppScale).should_receive('status').replace_with(status)
+    flexmock(AppScale).should_receive('get').and_raise(
+      AppScaleException('deployment is down'))
+
+    thread = self.start_daemon()
+    self.assertEquals((None, ''), self.forward('stats', ['--watch', '5']))
+    self.assertEquals((0, 'all good\n'), self.forward('status', ['--verbose']))
+    self.assertEquals((0, 'all good\n'), self.forward('status', ['--verbose']))
+    self.assertEquals([(os.path.realpath(self.temp_dir), ['--verbose'])],
+                      [(os.path.realpath(cwd), options)
+                       for cwd, options in calls])
+
+    # Failures are reported with the command's status, and aren't reused.
+    status, output = self.forward('get', ['.*'])
+    self.assertEquals(1, status)
+    self.assertIn('deployment is down', output)
+
+    flexmock(AppScaleLogger).should_receive('success')
+    AppScaleDaemon.stop('bookey')
+    thread.join(5)
+    self.assertFalse(thread.is_alive())
+    self.assertFalse(os.path.exists(self.socket_location))
+    self.assertEquals((None, ''), self.forward('status', []))
@@ -7,6 +7,7 @@ import unittest
 # AppScale import, the library that we're testing here
 from appscale.tools.agents.factory import InfrastructureAgentFactory
 from appscale.tools.custom_exceptions import UnknownInfrastructureException
+from appscale.tools.tracing import Tracer
 
 
 class TestFactory(unittest.TestCase):
@@ -16,3 +17,23 @@ class TestFactory(unittest.TestCase):
     # Passing in an invalid agent name should raise an exception.
     self.assertRaises(UnknownInfrastructureException,
       InfrastructureAgentFactory.create_agent, 'bad agent name')
+
+
+  def test_agents_are_loaded_by_name(self):
+    from appscale.tools.agents.ec2_agent import EC2Agent
+    self.assertEquals(EC2Agent,
+                      InfrastructureAgentFactory.get_agent_class('ec2'))
+    self.assertTrue(isinstance(InfrastructureAgentFactory.create_agent('ec2'),
+                               EC2Agent))
+
+
+  def test_traced_agents_keep_their_class(self):
+    from appscale.tools.agents.ec2_agent import EC2Agent
+    Tracer.enable()
+    try:
+      agent = InfrastructureAgentFactory.create_agent('ec2')
+    finally:
+      Tracer.disable()
+    self.assertTrue(isinstance(agent, EC2Agent))
+    # Its methods are traced on the agent itself.
+    self.assertIn('describe_instances', vars(agent))
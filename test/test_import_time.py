@@ -0,0 +1,86 @@
+#!/usr/bin/env python
+
+
+# General-purpose Python library imports
+import json
+import os
+import subprocess
+import sys
+import unittest
+
+
+# A script that imports the appscale command's entry point in a fresh
+# interpreter and reports, -X importtime style, how long each import took.
+IMPORT_TIMER = """
+import __builtin__
+import json
+import sys
+import time
+
+original_import = __builtin__.__import__
+timings = []
+depth = [0]
+
+def timed_import(name, *args, **kwargs):
+  start = time.time()
+  depth[0] += 1
+  try:
+    return original_import(name, *args, **kwargs)
+  finally:
+    depth[0] -= 1
+    timings.append((depth[0], name, time.time() - start))
+
+__builtin__.__import__ = timed_import
+start = time.time()
+import appscale.tools.scripts.appscale
+elapsed = time.time() - start
+__builtin__.__import__ = original_import
+
+print json.dumps({'elapsed': elapsed, 'timings': timings,
+                  'modules': sorted(sys.modules.keys())})
+"""
+
+
+class TestImportTime(unittest.TestCase):
+
+
+  # Modules that only cloud deployments or specific commands need, and that
+  # should not be loaded just to start the appscale command.
+  DEFERRED_MODULES = ['SOAPpy', 'adal', 'apiclient', 'azure', 'boto',
+                      'googleapiclient', 'oauth2client']
+
+
+  @classmethod
+  def setUpClass(cls):
+    package_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    environment = os.environ.copy()
+    environment['PYTHONPATH'] = package_root
+    output = subprocess.check_output([sys.executable, '-c', IMPORT_TIMER],
+                                     env=environment, cwd=package_root)
+    cls.report = json.loads(output.strip().splitlines()[-1])
+
+
+  def format_report(self):
+    """ Renders the slowest imports, with nesting shown by indentation. """
+    slowest = sorted(self.report['timings'], key=lambda timing: -timing[2])
+    return '\n'.join('{0:8.1f} ms {1}{2}'.format(seconds * 1000, '  ' * depth,
+                                                 name)
+                     for depth, name, seconds in slowest[:25])
+
+
+  def test_cloud_sdks_are_not_imported_at_startup(self):
+    loaded = [module for module in self.report['modules']
+              if module.split('.')[0] in self.DEFERRED_MODULES]
+    self.assertEquals([], loaded, 'Deferred modules loaded at startup:\n' +
+                      self.format_report())
+
+
+  # Wall-clock time depends on the machine, so the budget is only checked when
+  # it's given, in seconds, through this environment variable.
+  @unittest.skipUnless(os.environ.get('APPSCALE_IMPORT_BUDGET'),
+                       'APPSCALE_IMPORT_BUDGET is not set')
+  def test_startup_is_within_budget(self):
+    budget = float(os.environ['APPSCALE_IMPORT_BUDGET'])
+    self.assertTrue(self.report['elapsed'] < budget,
+                    'Importing appscale took {0:.2f}s:\n{1}'.format(
+                      self.report['elapsed'], self.format_report()))
@@ -6,8 +6,11 @@ import json
 import os
 import platform
 import re
+import shutil
+import StringIO
 import subprocess
 import sys
+import tarfile
 import tempfile
 import time
 import unittest
@@ -23,6 +26,7 @@ from flexmock import flexmock
 # AppScale import, the library that we're testing here
 from appscale.tools.appcontroller_client import AppControllerClient
 from appscale.tools.appscale_logger import AppScaleLogger
+from appscale.tools.archive_index import ArchiveIndex
 from appscale.tools.custom_exceptions import AppScaleException
 from appscale.tools.custom_exceptions import BadConfigurationException
 from appscale.tools.custom_exceptions import ShellException
@@ -263,49 +267,56 @@ class TestLocalState(unittest.TestCase):
     LocalState.update_local_metadata(options, 'public1', 'public1')
 
 
-  def test_extract_tgz_app_to_dir(self):
-    flexmock(os)
-    os.should_receive('mkdir').and_return()
-    flexmock(os.path)
-    os.path.should_receive('abspath').with_args('relative/app.tar.gz') \
-      .and_return('/tmp/relative/app.tar.gz')
+  def make_tarball(self, files):
+    """ Builds a tar.gz file in a temporary directory with the given members.
+    """
+    temp_dir = tempfile.mkdtemp()
+    self.addCleanup(shutil.rmtree, temp_dir)
+    tar_location = os.path.join(temp_dir, 'app.tar.gz')
+    with tarfile.open(tar_location, 'w:gz') as tar:
+      for name, contents in files:
+        info = tarfile.TarInfo(name)
+        info.size = len(contents)
+        tar.addfile(info, StringIO.StringIO(contents))
 
-    flexmock(LocalState)
-    LocalState.should_receive('shell') \
-      .with_args(re.compile("tar zxvf '/tmp/relative/app.tar.gz'"), False) \
-      .and_return()
+    extract_dir = os.path.join(temp_dir, 'extracted')
+    os.mkdir(extract_dir)
+    flexmock(LocalState).should_receive('make_extraction_dir')\
+      .and_return(extract_dir)
+    return tar_location
 
-    os.should_receive('listdir').and_return(['one_folder'])
-    os.path.should_receive('isdir').with_args(re.compile('one_folder')) \
-      .and_return(True)
 
-    location = LocalState.extract_tgz_app_to_dir('relative/app.tar.gz', False)
-    self.assertEquals(True, 'one_folder' in location)
+  def test_extract_tgz_app_to_dir(self):
+    tar_location = self.make_tarball([
+      ('one_folder/app.yaml', 'runtime: python27\n'),
+      ('one_folder/main.py', 'print "hi"\n'),
+      ('../escape.py', 'bad'),
+    ])
+    flexmock(LocalState).should_receive('shell').never()
+
+    location = LocalState.extract_tgz_app_to_dir(tar_location, False)
+    self.assertTrue(location.endswith('one_folder'))
+    self.assertTrue(os.path.exists(os.path.join(location, 'main.py')))
+    self.assertFalse(os.path.exists(os.path.join(location, '..', '..',
+                                                 'escape.py')))
+
+    # Extracting also indexes the tarball, so reading its configuration
+    # doesn't need another pass over it.
+    index = ArchiveIndex.cached(tar_location)
+    self.assertEquals('runtime: python27\n', index.config('app.yaml'))
+    self.assertEquals(['../escape.py'], index.unsafe_names)
+    self.assertEquals(index, ArchiveIndex.for_archive(tar_location))
 
 
   def test_extract_tgz_app_to_dir_with_dotfiles(self):
-    flexmock(os)
-    os.should_receive('mkdir').and_return()
-    flexmock(os.path)
-    os.path.should_receive('abspath').with_args('relative/app.tar.gz') \
-      .and_return('/tmp/relative/app.tar.gz')
-
-    flexmock(LocalState)
-    LocalState.should_receive('shell') \
-      .with_args(re.compile("tar zxvf '/tmp/relative/app.tar.gz'"), False) \
-      .and_return()
+    tar_location = self.make_tarball([
+      ('one_folder/app.yaml', 'runtime: python27\n'),
+      ('.dot_file', ''),
+      ('.dot_folder/file', ''),
+    ])
 
-    os.should_receive('listdir').and_return(['one_folder', '.dot_file',
-      '.dot_folder'])
-    os.path.should_receive('isdir').with_args(re.compile('one_folder')) \
-      .and_return(True)
-    os.path.should_receive('isdir').with_args(re.compile('.dot_file')) \
-      .and_return(False)
-    os.path.should_receive('isdir').with_args(re.compile('.dot_folder')) \
-      .and_return(True)
-
-    location = LocalState.extract_tgz_app_to_dir('relative/app.tar.gz', False)
-    self.assertTrue('one_folder' in location)
+    location = LocalState.extract_tgz_app_to_dir(tar_location, False)
+    self.assertTrue(location.endswith('one_folder'))
 
 
   def test_shell_exceptions(self):
@@ -328,14 +339,18 @@ class TestLocalState(unittest.TestCase):
     flexmock(time).should_receive('sleep').and_return()
 
     self.assertRaises(ShellException, LocalState.shell, 'fake_cmd', False)
-    self.assertRaises(ShellException, LocalState.shell, 'fake_cmd', False,
-        stdin='fake_stdin')
+    # stdin can hold credentials, so it never goes into the error.
+    with self.assertRaises(ShellException) as context:
+      LocalState.shell('fake_cmd', False, stdin='fake_stdin')
+    self.assertNotIn('fake_stdin', str(context.exception))
 
     fake_subprocess.should_receive('Popen').and_raise(OSError)
 
     self.assertRaises(ShellException, LocalState.shell, 'fake_cmd', False)
-    self.assertRaises(ShellException, LocalState.shell, 'fake_cmd', False,
-        stdin='fake_stdin')
+    # stdin can hold credentials, so it never goes into the error.
+    with self.assertRaises(ShellException) as context:
+      LocalState.shell('fake_cmd', False, stdin='fake_stdin')
+    self.assertNotIn('fake_stdin', str(context.exception))
 
 
   def test_generate_crash_log(self):
@@ -402,3 +417,55 @@ class TestLocalState(unittest.TestCase):
     # and use it to append the given username (test) and _
     username = LocalState.generate_xmpp_username('test', 8)
     self.assertEquals(13, len(username))
+
+  def test_get_extra_go_dependencies_uses_cache(self):
+    flexmock(AppScaleLogger).should_receive('log')
+    work_dir = tempfile.mkdtemp()
+    try:
+      app_dir = os.path.join(work_dir, 'app')
+      goroot = os.path.join(work_dir, 'goroot')
+      gopath = os.path.join(work_dir, 'gopath')
+      dependency = os.path.join(gopath, 'src', 'lib', 'lib.go')
+      for directory in [app_dir, os.path.join(goroot, 'bin'),
+                        os.path.dirname(dependency)]:
+        os.makedirs(directory)
+      for path in [os.path.join(app_dir, 'main.go'),
+                   os.path.join(app_dir, 'app.yaml'),
+                   os.path.join(goroot, 'bin', 'go-app-builder'), dependency]:
+        open(path, 'w').close()
+
+      os.should_receive('getenv').with_args('GOROOT', None).\
+        and_return(goroot)
+      os.should_receive('getenv').with_args('GOPATH', None).\
+        and_return(gopath)
+      cache_location = os.path.join(work_dir, 'go-dependencies.json')
+      flexmock(LocalState).should_receive(
+        'get_go_dependencies_cache_location').and_return(cache_location)
+
+      runs = []
+      def go_app_builder(args):
+        runs.append(args)
+        return 'lib/lib.go|{}\n'.format(dependency)
+      flexmock(subprocess).should_receive('check_output').\
+        replace_with(go_app_builder)
+
+      expected = {os.path.join('gopath', 'src', 'lib', 'lib.go'): dependency}
+      app_files = {'./main.go': os.path.join(app_dir, 'main.go'),
+                   './app.yaml': os.path.join(app_dir, 'app.yaml')}
+      self.assertEquals(expected, LocalState.get_extra_go_dependencies(
+        app_dir, True, app_files))
+      self.assertEquals(['./main.go'], runs[0][-1:])
+
+      # Nothing changed, so go-app-builder doesn't need to run again.
+      self.assertEquals(expected, LocalState.get_extra_go_dependencies(
+        app_dir, True, app_files))
+      self.assertEquals(1, len(runs))
+
+      # Adding a Go file changes the inputs.
+      open(os.path.join(app_dir, 'util.go'), 'w').close()
+      app_files['./util.go'] = os.path.join(app_dir, 'util.go')
+      LocalState.get_extra_go_dependencies(app_dir, True, app_files)
+      self.assertEquals(2, len(runs))
+      self.assertEquals(['./main.go', './util.go'], runs[1][-2:])
+    finally:
+      shutil.rmtree(work_dir)
@@ -0,0 +1,118 @@
+#!/usr/bin/env python
+
+
+# General-purpose Python library imports
+import json
+import os
+import shutil
+import tempfile
+import time
+import unittest
+import urllib2
+
+
+# Third party libraries
+from flexmock import flexmock
+
+
+# AppScale import, the library that we're testing here
+from appscale.tools.appscale_logger import AppScaleLogger
+from appscale.tools.metadata_cache import MetadataCache
+
+
+TAGS_URL = 'https://api.github.com/repos/AppScale/appscale/tags'
+PYPI_URL = 'https://pypi.python.org/pypi/appscale-tools/json'
+
+
+class FakeResponse(object):
+  """ Stands in for what urlopen returns. """
+
+  def __init__(self, body, etag=None):
+    self.body = json.dumps(body)
+    self.headers = flexmock(getheader=lambda name: etag)
+
+  def read(self):
+    return self.body
+
+  def info(self):
+    return self.headers
+
+
+class TestMetadataCache(unittest.TestCase):
+
+
+  def setUp(self):
+    flexmock(AppScaleLogger).should_receive('warn')
+    self.cache_dir = tempfile.mkdtemp()
+    self.location = os.path.join(self.cache_dir, 'metadata-cache.json')
+
+    # Records the If-None-Match header of each request, and answers with
+    # whatever the test puts in self.responses.
+    self.requests = []
+    self.responses = {}
+    def urlopen(request, timeout):
+      self.requests.append((request.get_full_url(),
+                            request.get_header('If-none-match')))
+      response = self.responses[request.get_full_url()]
+      if isinstance(response, Exception):
+        raise response
+      return response
+    flexmock(urllib2).should_receive('urlopen').replace_with(urlopen)
+
+
+  def tearDown(self):
+    shutil.rmtree(self.cache_dir)
+
+
+  def test_fresh_documents_need_no_requests(self):
+    cache = MetadataCache(self.location, ttl=60)
+    self.responses[TAGS_URL] = FakeResponse([{'name': '3.6.0'}], etag='"v1"')
+    self.assertEquals([{'name': '3.6.0'}], cache.get(TAGS_URL))
+    self.assertEquals([(TAGS_URL, None)], self.requests)
+
+    # A new cache, like the next run of the tools, reads the same file.
+    self.assertEquals([{'name': '3.6.0'}],
+                      MetadataCache(self.location, ttl=60).get(TAGS_URL))
+    self.assertEquals(1, len(self.requests))
+
+
+  def test_stale_documents_are_revalidated(self):
+    cache = MetadataCache(self.location, ttl=60)
+    self.responses[TAGS_URL] = FakeResponse([{'name': '3.6.0'}], etag='"v1"')
+    cache.get(TAGS_URL)
+
+    later = time.time() + 61
+    flexmock(time).should_receive('time').and_return(later)
+    self.responses[TAGS_URL] = urllib2.HTTPError(
+      TAGS_URL, 304, 'Not Modified', {}, None)
+    self.assertEquals([{'name': '3.6.0'}], cache.get(TAGS_URL))
+    self.assertEquals((TAGS_URL, '"v1"'), self.requests[-1])
+
+    # The revalidated copy is fresh again.
+    cache.get(TAGS_URL)
+    self.assertEquals(2, len(self.requests))
+
+
+  def test_failures_and_offline_mode_use_cached_copies(self):
+    cache = MetadataCache(self.location, ttl=0)
+    self.responses[PYPI_URL] = FakeResponse({'info': {'version': '3.6.0'}})
+    cache.get(PYPI_URL)
+
+    self.responses[PYPI_URL] = urllib2.URLError('timed out')
+    self.responses[TAGS_URL] = urllib2.URLError('timed out')
+    self.assertEquals({'info': {'version': '3.6.0'}}, cache.get(PYPI_URL))
+    self.assertRaises(urllib2.URLError, cache.get, TAGS_URL)
+
+    offline = MetadataCache(self.location, ttl=0, offline=True)
+    self.assertEquals({'info': {'version': '3.6.0'}}, offline.get(PYPI_URL))
+    self.assertRaises(urllib2.URLError, offline.get, TAGS_URL)
+    self.assertEquals(3, len(self.requests))
+
+
+  def test_get_many_skips_documents_that_cannot_be_fetched(self):
+    cache = MetadataCache(self.location)
+    self.responses[PYPI_URL] = FakeResponse({'info': {'version': '3.6.0'}})
+    self.responses[TAGS_URL] = urllib2.URLError('rate limited')
+    self.assertEquals({PYPI_URL: {'info': {'version': '3.6.0'}}},
+                      cache.get_many([PYPI_URL, TAGS_URL]))
+    self.assertEquals([PYPI_URL], json.load(open(self.location)).keys())
@@ -3,6 +3,7 @@
 
 # General-purpose Python library imports
 import os
+import time
 import unittest
 
 
@@ -410,3 +411,81 @@ class TestNodeLayout(unittest.TestCase):
 
     with self.assertRaises(BadConfigurationException):
       node_layout.from_locations_json_list(self.reattach_node_info)
+
+
+  def test_indexes_follow_node_changes(self):
+    options = self.default_options.copy()
+    options['ips'] = FOUR_NODE_CLUSTER
+    layout = NodeLayout(options)
+
+    for role in NodeLayout.VALID_ROLES:
+      self.assertEquals(
+        [node for node in layout.nodes if node.is_role(role)],
+        layout.get_nodes(role, True))
+      self.assertEquals(
+        [node for node in layout.nodes if not node.is_role(role)],
+        layout.get_nodes(role, False))
+
+    node = layout.other_nodes()[0]
+    self.assertIs(node, layout.node_with_ip(node.public_ip))
+    self.assertIsNone(layout.node_with_instance_id('i-12345'))
+
+    # Changing roles and addresses shows up in the next lookup.
+    node.add_role('search')
+    node.public_ip = '10.0.0.99'
+    node.instance_id = 'i-12345'
+    self.assertIn(node, layout.get_nodes('search', True))
+    self.assertIs(node, layout.node_with_ip('10.0.0.99'))
+    self.assertIs(node, layout.node_with_instance_id('i-12345'))
+
+    layout.nodes = [layout.head_node()]
+    self.assertEquals([], layout.other_nodes())
+
+
+  def test_large_layouts(self):
+    # Builds, validates, and queries layouts of increasing size. Each step is
+    # linear in the number of nodes, so even the largest layout stays fast.
+    timings = {}
+    for node_count in [10, 100, 1000]:
+      ips = ['10.{0}.{1}.{2}'.format(index // 65536, index // 256 % 256,
+                                     index % 256)
+             for index in range(1, node_count)]
+      options = self.default_options.copy()
+      options['ips'] = [
+        {'roles': ['master', 'database', 'zookeeper'], 'nodes': '10.255.0.1'},
+        {'roles': ['compute', 'database'], 'nodes': ips}
+      ]
+
+      start = time.time()
+      layout = NodeLayout(options)
+      for node in layout.nodes:
+        layout.node_with_ip(node.public_ip)
+      layout.db_master()
+      layout.other_nodes()
+      layout.from_locations_json_list(layout.to_list())
+      timings[node_count] = time.time() - start
+
+      self.assertEquals(node_count, len(layout.nodes))
+      self.assertEquals(node_count - 1, len(layout.other_nodes()))
+      self.assertEquals(node_count, len(layout.get_nodes('database', True)))
+
+    self.assertTrue(timings[1000] < 10, timings)
+
+
+  def test_balanced_placement(self):
+    options = {'infrastructure': 'ec2', 'min_machines': 4, 'max_machines': 4,
+               'instance_type': 'm3.large', 'placement': 'balanced',
+               'table': 'cassandra'}
+    layout = NodeLayout(options)
+    self.assertEquals(4, len(layout.nodes))
+    head_node = layout.head_node()
+    self.assertFalse(head_node.is_role('compute'))
+    self.assertEquals(3, len(layout.get_nodes('database', True)))
+    self.assertEquals(1, len(layout.get_nodes('db_master', True)))
+    self.assertEquals(3, len(layout.get_nodes('compute', True)))
+
+    # Layouts that don't fit say how many nodes would be enough.
+    options['min_machines'] = options['max_machines'] = 2
+    options['replication'] = 3
+    with self.assertRaisesRegexp(BadConfigurationException, 'fit on 3 nodes'):
+      NodeLayout(options)
@@ -0,0 +1,96 @@
+#!/usr/bin/env python
+
+
+# General-purpose Python library imports
+import threading
+import unittest
+
+
+# AppScale import, the library that we're testing here
+from appscale.tools import parallel
+from appscale.tools.parallel import BatchWorker
+from appscale.tools.parallel import run_in_parallel
+
+
+class TestParallel(unittest.TestCase):
+
+
+  def test_results_keep_input_order(self):
+    def square(value):
+      if value == 3:
+        raise ValueError('three')
+      return value * value
+
+    results = run_in_parallel(square, [1, 2, 3, 4], max_workers=2)
+    self.assertEquals([1, 2, 3, 4], [result.item for result in results])
+    self.assertEquals([1, 4, None, 16], [result.value for result in results])
+    self.assertEquals([True, True, False, True],
+                      [result.succeeded for result in results])
+    self.assertEquals('ValueError: three', results[2].describe_failure())
+
+
+  def test_concurrency_is_bounded(self):
+    lock = threading.Lock()
+    counts = {'running': 0, 'most': 0}
+
+    def work(_):
+      with lock:
+        counts['running'] += 1
+        counts['most'] = max(counts['most'], counts['running'])
+      threading.Event().wait(0.01)
+      with lock:
+        counts['running'] -= 1
+
+    run_in_parallel(work, range(12), max_workers=3)
+    self.assertTrue(counts['most'] <= 3)
+
+
+  def test_slow_calls_time_out_without_blocking_others(self):
+    release = threading.Event()
+    reported = []
+
+    def work(value):
+      if value == 'slow':
+        release.wait(5)
+      return value
+
+    original_interval = parallel.POLL_INTERVAL
+    parallel.POLL_INTERVAL = 0.01
+    try:
+      results = run_in_parallel(work, ['slow', 'fast'], max_workers=2,
+                                timeout=0.1, on_result=reported.append)
+    finally:
+      parallel.POLL_INTERVAL = original_interval
+      release.set()
+
+    self.assertTrue(results[0].timed_out)
+    self.assertFalse(results[0].succeeded)
+    self.assertEquals('fast', results[1].value)
+    self.assertEquals(['fast', 'slow'], [result.item for result in reported])
+
+
+  def test_batch_worker_groups_items_and_collects_failures(self):
+    batches = []
+    started = threading.Event()
+    release = threading.Event()
+
+    def process(batch):
+      batches.append(batch)
+      if batch == ['a']:
+        started.set()
+        release.wait(5)
+      if 'c' in batch:
+        raise ValueError('cannot process c')
+
+    worker = BatchWorker(process)
+    worker.start()
+    worker.put('a')
+    started.wait(5)
+    worker.put('b')
+    worker.put('c')
+    release.set()
+    failures = worker.close()
+
+    self.assertEquals([['a'], ['b', 'c']], batches)
+    self.assertEquals(1, len(failures))
+    self.assertEquals(['b', 'c'], failures[0][0])
@@ -0,0 +1,70 @@
+#!/usr/bin/env python
+
+
+# General-purpose Python library imports
+import unittest
+
+
+# AppScale import, the library that we're testing here
+from appscale.tools.custom_exceptions import BadConfigurationException
+from appscale.tools.placement import PlacementPlanner
+
+
+class TestPlacement(unittest.TestCase):
+
+
+  def test_replicas_spread_and_head_node_kept_light(self):
+    placement = PlacementPlanner('m3.xlarge').plan(6)
+    nodes = placement.nodes
+    self.assertEquals(['master', 'login'], nodes[0].roles)
+
+    for role, count in [('database', 3), ('zookeeper', 3), ('taskqueue', 1)]:
+      hosts = [node for node in nodes if role in node.roles]
+      self.assertEquals(count, len(hosts))
+
+    # Every other node runs app servers, with memcache next to them.
+    for node in nodes[1:]:
+      self.assertIn('compute', node.roles)
+      self.assertIn('memcache', node.roles)
+
+    layout = placement.to_layout()
+    self.assertEquals(6, sum(node_set['nodes'] for node_set in layout))
+    self.assertEquals({'roles': ['master', 'login'], 'nodes': 1,
+                       'instance_type': 'm3.xlarge'}, layout[0])
+    self.assertIn('database: 3 replica(s), each on its own node.',
+                  placement.explain())
+
+
+  def test_single_node_runs_everything(self):
+    placement = PlacementPlanner('m3.large').plan(1)
+    self.assertEquals(
+      set(['master', 'login', 'database', 'zookeeper', 'taskqueue',
+           'compute', 'memcache']), set(placement.nodes[0].roles))
+
+
+  def test_expected_app_servers_must_fit(self):
+    placement = PlacementPlanner('m3.large', app_servers=10).plan(3)
+    self.assertEquals(10, sum(node.app_servers for node in placement.nodes))
+    self.assertEquals(0, placement.nodes[0].app_servers)
+
+    planner = PlacementPlanner('m3.large', app_servers=100)
+    self.assertRaises(BadConfigurationException, planner.plan, 3)
+    self.assertTrue(len(planner.plan_smallest().nodes) > 3)
+
+
+  def test_replication_needs_enough_nodes(self):
+    planner = PlacementPlanner('m3.large', replication=3)
+    self.assertRaises(BadConfigurationException, planner.plan, 2)
+    self.assertEquals(3, len(planner.plan_smallest().nodes))
+
+
+  def test_plan_additions(self):
+    existing_nodes = [{'public_ip': '1.2.3.4', 'instance_type': 'm3.large',
+                       'jobs': ['shadow', 'load_balancer', 'compute']}]
+    placement = PlacementPlanner('m3.large').plan_additions(
+      existing_nodes, ['1.2.3.5', '1.2.3.6'])
+    self.assertEquals(['1.2.3.5', '1.2.3.6'],
+                      [node.name for node in placement.nodes])
+    self.assertEquals(['compute', 'memcache'], placement.nodes[0].roles)
+    self.assertTrue(any('runs app servers' in line
+                        for line in placement.explain()))
@@ -0,0 +1,95 @@
+#!/usr/bin/env python
+
+
+# General-purpose Python library imports
+import time
+import unittest
+
+
+# Third party libraries
+from flexmock import flexmock
+
+
+# AppScale import, the library that we're testing here
+from appscale.tools.appscale_logger import AppScaleLogger
+from appscale.tools.custom_exceptions import AppScaleException
+from appscale.tools.custom_exceptions import ShellException
+from appscale.tools.local_state import APPSCALE_VERSION
+from appscale.tools.preflight import Preflight
+from appscale.tools.remote_helper import RemoteHelper
+
+
+class TestPreflight(unittest.TestCase):
+
+
+  def setUp(self):
+    flexmock(AppScaleLogger)
+    AppScaleLogger.should_receive('log').and_return()
+    self.now = 1500000000
+    flexmock(time).should_receive('time').and_return(self.now)
+
+
+  def facts(self, **overrides):
+    facts = {
+      'version': APPSCALE_VERSION,
+      'appscale_dir': 'yes',
+      'disk_free_mb': '20000',
+      'memory_available_mb': '4096',
+      'time': str(self.now)
+    }
+    facts.update(overrides)
+    return '\n'.join('{0}={1}'.format(key, value)
+                     for key, value in facts.items())
+
+
+  def test_healthy_nodes_pass_in_one_ssh_call_each(self):
+    flexmock(RemoteHelper).should_receive('ssh')\
+      .with_args(str, 'bookey', Preflight.SCRIPT, False, num_retries=1)\
+      .and_return(self.facts()).twice()
+    Preflight.check_nodes(['1.2.3.4', '1.2.3.5'], 'bookey', False)
+
+
+  def test_problems_on_all_nodes_are_reported_together(self):
+    outputs = {
+      '1.2.3.4': self.facts(version='2.9.0'),
+      '1.2.3.5': self.facts(appscale_dir='no', time=str(self.now + 60)),
+      '1.2.3.7': self.facts(),
+    }
+
+    def ssh(host, keyname, command, is_verbose, num_retries):
+      if host == '1.2.3.6':
+        raise ShellException('Permission denied (publickey)')
+      return outputs[host]
+
+    flexmock(RemoteHelper).should_receive('ssh').replace_with(ssh)
+    try:
+      Preflight.check_nodes(['1.2.3.4', '1.2.3.5', '1.2.3.6', '1.2.3.7'],
+                            'bookey', False)
+      self.fail('Preflight should have found problems')
+    except AppScaleException as error:
+      message = str(error)
+
+    self.assertIn('Found problems with 3 machine(s)', message)
+    self.assertIn('runs AppScale 2.9.0', message)
+    self.assertIn('/root/appscale is missing', message)
+    self.assertIn('clock is +60s off from the other machines', message)
+    self.assertIn('unable to log in as root over SSH', message)
+
+
+  def test_resources_and_our_clock_are_only_warned_about(self):
+    outputs = {
+      '1.2.3.4': self.facts(disk_free_mb='100', time=str(self.now + 300)),
+      '1.2.3.5': self.facts(memory_available_mb='200',
+                            time=str(self.now + 302)),
+    }
+    flexmock(RemoteHelper).should_receive('ssh').replace_with(
+      lambda host, keyname, command, is_verbose, num_retries: outputs[host])
+    warnings = []
+    AppScaleLogger.should_receive('warn').replace_with(warnings.append)
+
+    Preflight.check_nodes(['1.2.3.4', '1.2.3.5'], 'bookey', False)
+
+    self.assertEquals(2, len(warnings))
+    self.assertIn("clocks are +300s off from this machine's", warnings[0])
+    self.assertIn('only 100 MB free on /', warnings[1])
+    self.assertIn('only 200 MB of memory available', warnings[1])
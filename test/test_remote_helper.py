@@ -1,13 +1,16 @@
 #!/usr/bin/env python
 
 # General-purpose Python library imports
+import hashlib
 import json
 import os
 import re
+import shutil
 import socket
 import subprocess
 import sys
 import tempfile
+import threading
 import time
 import unittest
 
@@ -25,10 +28,15 @@ from appscale.tools.agents.gce_agent import CredentialTypes
 from appscale.tools.agents.gce_agent import GCEAgent
 from appscale.tools.appcontroller_client import AppControllerClient
 from appscale.tools.appscale_logger import AppScaleLogger
+from appscale.tools.custom_exceptions import AppControllerException
+from appscale.tools.custom_exceptions import AppScaleException
 from appscale.tools.custom_exceptions import BadConfigurationException
+from appscale.tools.custom_exceptions import ShellException
 from appscale.tools.local_state import LocalState
 from appscale.tools.node_layout import NodeLayout
 from appscale.tools.node_layout import Node
+from appscale.tools import remote_helper
+from appscale.tools import remote_script
 from appscale.tools.remote_helper import RemoteHelper
 
 from test_ip_layouts import (ONE_NODE_CLOUD, THREE_NODE_CLOUD, FOUR_NODE_CLOUD,
@@ -270,20 +278,9 @@ class TestRemoteHelper(unittest.TestCase):
     flexmock(time).should_receive('sleep').and_return()
 
     flexmock(RemoteHelper).\
-      should_receive('copy_deployment_credentials').\
+      should_receive('bootstrap_head_node').\
       with_args('some IP', self.options).\
-      and_return()
-
-    flexmock(RemoteHelper).\
-      should_receive('run_user_commands').\
-      with_args('some IP', self.options.user_commands,
-                self.options.keyname, self.options.verbose).\
-      and_return()
-
-    flexmock(RemoteHelper).\
-      should_receive('start_remote_appcontroller').\
-      with_args('some IP', self.options.keyname, self.options.verbose).\
-      and_return()
+      and_return([])
 
     layout = {}
     flexmock(NodeLayout).should_receive('to_list').and_return(layout)
@@ -322,6 +319,70 @@ class TestRemoteHelper(unittest.TestCase):
     RemoteHelper.rsync_files('public1', 'booscale', '/tmp/booscale-local',
       False)
 
+  def record_scripts(self):
+    """ Replaces run_script with a function that keeps each script. """
+    scripts = []
+    flexmock(RemoteHelper).should_receive('run_script').replace_with(
+      lambda host, keyname, script, is_verbose, user='root':
+        scripts.append((host, script)))
+    return scripts
+
+
+  def fake_script_output(self, script_text, failed_step=None):
+    """ Returns what a rendered RemoteScript would print if every step before
+    failed_step succeeded. """
+    lines = []
+    for marker, name in re.findall(r"echo '(\S+) begin (\S+)'", script_text):
+      status = 1 if name == failed_step else 0
+      lines.extend(['{0} begin {1}'.format(marker, name),
+                    'output of {0}'.format(name), '',
+                    '{0} end {1} {2} 10.0 10.5'.format(marker, name, status)])
+      if status:
+        break
+    return '\n'.join(lines) + '\n'
+
+
+  def fail_ssh(self):
+    """ Makes every ssh session fail to connect, with an error that repeats
+    the command it was given. Returns the list that each command goes in. """
+    sessions = []
+    def failed_ssh(host, keyname, command, is_verbose, user='root'):
+      sessions.append(command)
+      output = 'ssh: connect to host {0} port 22: Connection refused'.format(
+        host)
+      raise ShellException("Executing command 'ssh {0} {1}' failed:\n{2}".
+                           format(host, command, output), output=output)
+    flexmock(RemoteHelper).should_receive('ssh').replace_with(failed_ssh)
+    return sessions
+
+
+  def assert_script_not_in(self, script_text, message):
+    """ Checks that none of a script's lines, including the base64 lines of
+    its bundle, made it into an error message. """
+    for line in script_text.splitlines():
+      if len(line) >= 20:
+        self.assertNotIn(line, message)
+
+
+  def test_run_script_never_reports_the_script(self):
+    self.fail_ssh()
+    script = remote_script.RemoteScript()
+    script.bundle.add_contents('the-private-key', '/root/.ssh/id_rsa')
+    script.add_step('start_controller', 'service appscale-controller start')
+
+    with self.assertRaises(ShellException) as context:
+      RemoteHelper.run_script('public1', 'bookey', script, False)
+
+    # The error names the host, the steps and what ssh said, but not the
+    # script (whose markers all carry its token) or the key inside it.
+    message = str(context.exception)
+    self.assertIn('install_files, start_controller on public1', message)
+    self.assertIn('Connection refused', message)
+    self.assertNotIn(script.token, message)
+    self.assertNotIn('service appscale-controller start', message)
+    self.assertNotIn('the-private-key', message)
+
+
   def test_copy_deployment_credentials_in_cloud(self):
     options = flexmock(
       keyname='key1',
@@ -330,21 +391,39 @@ class TestRemoteHelper(unittest.TestCase):
     )
 
     local_state = flexmock(LocalState)
-    remote_helper = flexmock(RemoteHelper)
-    local_state.should_receive('get_secret_key_location').and_return()
-    local_state.should_receive('get_key_path_from_name').and_return()
-    local_state.should_receive('get_certificate_location').and_return()
-    local_state.should_receive('get_private_key_location').and_return()
-
-    remote_helper.should_receive('scp').and_return()
+    local_state.should_receive('get_secret_key_location').\
+      and_return('/key1.secret')
+    local_state.should_receive('get_key_path_from_name').\
+      and_return('/key1.key')
+    local_state.should_receive('get_certificate_location').\
+      and_return('/key1-cert.pem')
+    local_state.should_receive('get_private_key_location').\
+      and_return('/key1-key.pem')
+
+    scripts = self.record_scripts()
     local_state.should_receive('generate_ssl_cert').and_return()
-    popen_object = flexmock(communicate=lambda: ['hash_id'])
+    popen_object = flexmock(communicate=lambda: ['hash_id\n'])
     flexmock(subprocess).should_receive('Popen').and_return(popen_object)
-    remote_helper.should_receive('ssh').and_return()
     flexmock(AppScaleLogger).should_receive('log').and_return()
 
     RemoteHelper.copy_deployment_credentials('public1', options)
 
+    # Every file goes over in one script, which also links the certificate.
+    host, script = scripts[0]
+    self.assertEquals('public1', host)
+    self.assertEquals(['install_files', 'link_certificate'],
+                      script.get_step_names())
+    self.assertEquals([
+      ('/etc/appscale/secret.key', 0600, '/key1.secret'),
+      ('/etc/appscale/ssh.key', 0600, '/key1.key'),
+      ('/etc/appscale/certs/mycert.pem', 0644, '/key1-cert.pem'),
+      ('/etc/appscale/certs/mykey.pem', 0600, '/key1-key.pem')
+    ], [(remote_path, mode, local_path)
+        for remote_path, mode, local_path, _ in script.bundle.files])
+    self.assertEquals(
+      'ln -fs /etc/appscale/certs/mycert.pem /etc/ssl/certs/hash_id.0',
+      script.steps[0][1])
+
     flexmock(GCEAgent).should_receive('get_secrets_type').\
       and_return(CredentialTypes.OAUTH)
     flexmock(os.path).should_receive('exists').and_return(True)
@@ -354,25 +433,25 @@ class TestRemoteHelper(unittest.TestCase):
       infrastructure='gce',
       verbose=True,
     )
-    local_state.should_receive('get_oauth2_storage_location').and_return()
+    local_state.should_receive('get_client_secrets_location').\
+      and_return('/key1-secrets.json')
+    local_state.should_receive('get_oauth2_storage_location').\
+      and_return('/key1-oauth2.dat')
 
     RemoteHelper.copy_deployment_credentials('public1', options)
+    _, script = scripts[1]
+    self.assertEquals(['/etc/appscale/client_secrets.json',
+                       '/etc/appscale/oauth2.dat'],
+                      [remote_path for remote_path, _, _, _
+                       in script.bundle.files[-2:]])
 
   def test_start_remote_appcontroller(self):
-    # mock out removing the old json file
-    local_state = flexmock(LocalState)
-    local_state.should_receive('shell')\
-      .with_args(re.compile('^ssh'),False,5,stdin=re.compile('rm -rf'))\
-      .and_return()
-
-    # assume we started monit on public1 fine
-    local_state.should_receive('shell')\
-      .with_args(re.compile('^ssh'), False, 5, stdin=re.compile('monit'))\
-      .and_return()
-
-    # and assume we started the AppController on public1 fine
-    local_state.should_receive('shell').with_args(
-      re.compile('^ssh'), False, 5, stdin='service appscale-controller start')
+    # All of the steps run in one SSH session, and all of them succeed.
+    sessions = []
+    def fake_ssh(host, keyname, command, is_verbose, user='root'):
+      sessions.append(command)
+      return self.fake_script_output(command)
+    flexmock(RemoteHelper).should_receive('ssh').replace_with(fake_ssh)
 
     # finally, assume the appcontroller comes up after a few tries
     # assume that ssh comes up on the third attempt
@@ -382,38 +461,134 @@ class TestRemoteHelper(unittest.TestCase):
       .and_raise(Exception).and_return(None)
     socket.should_receive('socket').and_return(fake_socket)
 
-    # Mock out additional remote calls. 
-    local_state.should_receive('shell').with_args('ssh -i /root/.appscale/bookey.key -o LogLevel=quiet -o NumberOfPasswordPrompts=0 -o StrictHostkeyChecking=no -o UserKnownHostsFile=/dev/null root@public1 ', False, 5, stdin='cp /root/appscale/AppController/scripts/appcontroller /etc/init.d/').and_return()
-
-    local_state.should_receive('shell').with_args('ssh -i /root/.appscale/bookey.key -o LogLevel=quiet -o NumberOfPasswordPrompts=0 -o StrictHostkeyChecking=no -o UserKnownHostsFile=/dev/null root@public1 ', False, 5, stdin='chmod +x /etc/init.d/appcontroller').and_return()
-
-    local_state.should_receive('shell').with_args('ssh -i /root/.appscale/boobazblargfoo.key -o LogLevel=quiet -o NumberOfPasswordPrompts=0 -o StrictHostkeyChecking=no -o UserKnownHostsFile=/dev/null root@elastic-ip ', False, 5, stdin='chmod +x /etc/init.d/appcontroller').and_return()
-
     RemoteHelper.start_remote_appcontroller('public1', 'bookey', False)
+    self.assertEquals(1, len(sessions))
+    self.assertIn('rm -rf /etc/appscale/appcontroller-state.json', sessions[0])
+    self.assertIn('service monit start', sessions[0])
+    self.assertIn('service appscale-controller start', sessions[0])
 
+    # A failed step is reported by name, and later steps don't run.
+    flexmock(RemoteHelper).should_receive('ssh').replace_with(
+      lambda host, keyname, command, is_verbose, user='root':
+        self.fake_script_output(command, failed_step='start_monit'))
+    with self.assertRaisesRegexp(ShellException,
+                                 "Step 'start_monit' failed on public1"):
+      RemoteHelper.start_remote_appcontroller('public1', 'bookey', False)
 
-  def test_copy_local_metadata(self):
-    # Assume the locations files were copied successfully.
-    local_state = flexmock(LocalState)
-    locations_yaml = '{}/locations-bookey.yaml'.\
-      format(RemoteHelper.CONFIG_DIR)
-    local_state.should_receive('shell').with_args(
-      re.compile('^scp .*{}'.format(locations_yaml)), False, 5)
-
-    locations_json = '{}/locations-bookey.json'.\
-      format(RemoteHelper.CONFIG_DIR)
-    local_state.should_receive('shell').with_args(
-      re.compile('^scp .*{}'.format(locations_json)), False, 5)
-
-    local_state.should_receive('shell').with_args(
-      re.compile('^scp .*/root/.appscale/locations-bookey.json'), False, 5)
 
-    # Assume the secret file was copied successfully.
-    local_state.should_receive('shell').with_args(
-      re.compile('^scp .*bookey.secret'), False, 5)
+  def test_copy_local_metadata(self):
+    flexmock(LocalState).should_receive('get_locations_json_location').\
+      with_args('bookey').and_return('/root/.appscale/locations-bookey.json')
+    flexmock(LocalState).should_receive('get_secret_key_location').\
+      with_args('bookey').and_return('/root/.appscale/bookey.secret')
+    scripts = self.record_scripts()
 
     RemoteHelper.copy_local_metadata('public1', 'bookey', False)
 
+    # Both files go over in a single session.
+    host, script = scripts[0]
+    self.assertEquals('public1', host)
+    self.assertEquals([
+      ('/etc/appscale/locations-bookey.json',
+       '/root/.appscale/locations-bookey.json'),
+      ('/etc/appscale/bookey.secret', '/root/.appscale/bookey.secret')
+    ], [(remote_path, local_path)
+        for remote_path, _, local_path, _ in script.bundle.files])
+
+
+  def test_merge_authorized_keys(self):
+    sessions = []
+    def fake_run_script(host, keyname, script, is_verbose, user='root'):
+      sessions.append((host, user, script))
+      return []
+    flexmock(RemoteHelper).should_receive('run_script').\
+      replace_with(fake_run_script)
+
+    RemoteHelper.merge_authorized_keys('public1', 'bookey', 'ubuntu', False)
+
+    # Every step runs in a single session as the given user.
+    self.assertEquals(1, len(sessions))
+    host, user, script = sessions[0]
+    self.assertEquals(('public1', 'ubuntu'), (host, user))
+    self.assertEquals(['create_root_keys', 'merge_keys'],
+                      script.get_step_names())
+
+    # Run the script against a fake home directory to check what it does.
+    home = tempfile.mkdtemp()
+    try:
+      for user_dir in ['user', 'root']:
+        os.makedirs(os.path.join(home, user_dir, '.ssh'))
+      with open(os.path.join(home, 'user/.ssh/authorized_keys'), 'w') as keys:
+        keys.write('ssh-rsa key2\nssh-rsa key1\n')
+      with open(os.path.join(home, 'root/.ssh/authorized_keys'), 'w') as keys:
+        keys.write('command="echo Please login as ubuntu" ssh-rsa key1\n')
+
+      rendered = script.render().replace('sudo ', '').\
+        replace('~/.ssh', os.path.join(home, 'user/.ssh')).\
+        replace('/root/.ssh', os.path.join(home, 'root/.ssh'))
+      process = subprocess.Popen(['bash'], stdin=subprocess.PIPE,
+                                 stdout=subprocess.PIPE)
+      output = process.communicate(rendered)[0]
+      with open(os.path.join(home, 'root/.ssh/authorized_keys')) as keys:
+        root_keys = keys.read()
+    finally:
+      shutil.rmtree(home)
+
+    self.assertEquals([0, 0], [result.status
+                               for result in script.parse(output)])
+    self.assertEquals('ssh-rsa key1\nssh-rsa key2\n', root_keys)
+
+
+  def test_copy_ssh_keys_to_node(self):
+    flexmock(LocalState).should_receive('get_key_path_from_name').\
+      with_args('bookey').and_return('/root/.appscale/bookey.key')
+    scripts = self.record_scripts()
+
+    RemoteHelper.copy_ssh_keys_to_node('public1', 'bookey', False)
+
+    # The key goes to all three places in a single session.
+    host, script = scripts[0]
+    self.assertEquals('public1', host)
+    self.assertEquals([
+      ('/root/.ssh/id_dsa', 0600), ('/root/.ssh/id_rsa', 0600),
+      ('/etc/appscale/bookey.key', 0600)
+    ], [(remote_path, mode) for remote_path, mode, local_path, _
+        in script.bundle.files
+        if local_path == '/root/.appscale/bookey.key'])
+
+
+  def test_copying_keys_or_metadata_never_reports_them(self):
+    local_dir = tempfile.mkdtemp()
+    try:
+      for name, contents in [('bookey.key', 'the-private-key'),
+                             ('bookey.secret', 'the-secret'),
+                             ('locations-bookey.json', '{}')]:
+        with open(os.path.join(local_dir, name), 'w') as local_file:
+          local_file.write(contents)
+      local_state = flexmock(LocalState)
+      local_state.should_receive('get_key_path_from_name').\
+        and_return(os.path.join(local_dir, 'bookey.key'))
+      local_state.should_receive('get_secret_key_location').\
+        and_return(os.path.join(local_dir, 'bookey.secret'))
+      local_state.should_receive('get_locations_json_location').\
+        and_return(os.path.join(local_dir, 'locations-bookey.json'))
+      sessions = self.fail_ssh()
+
+      with self.assertRaises(ShellException) as keys_context:
+        RemoteHelper.copy_ssh_keys_to_node('public1', 'bookey', False)
+      with self.assertRaises(ShellException) as metadata_context:
+        RemoteHelper.copy_local_metadata('public1', 'bookey', False)
+    finally:
+      shutil.rmtree(local_dir)
+
+    for context, session in zip([keys_context, metadata_context], sessions):
+      message = str(context.exception)
+      self.assertIn('install_files on public1', message)
+      self.assertIn('Connection refused', message)
+      self.assertNotIn('the-private-key', message)
+      self.assertNotIn('the-secret', message)
+      self.assert_script_not_in(session, message)
+
 
   def test_create_user_accounts(self):
     # mock out reading the secret key
@@ -635,3 +810,237 @@ class TestRemoteHelper(unittest.TestCase):
     LocalState.should_receive('get_local_nodes_info').and_return(node_info)
 
     self.assertRaises(BadConfigurationException)
+
+
+  def test_terminate_virtualized_cluster_backs_off_while_idle(self):
+    LocalState.should_receive('get_host_with_role').and_return('1.2.3.4')
+    LocalState.should_receive('get_secret_key').and_return('secret')
+    flexmock(AppControllerClient)
+    AppControllerClient.should_receive('get_all_public_ips')\
+      .and_return(['1.2.3.4', '1.2.3.5', '1.2.3.6'])
+    AppControllerClient.should_receive('run_terminate')
+    AppControllerClient.should_receive('receive_server_message')\
+      .and_return('[]')\
+      .and_return('[]')\
+      .and_return(json.dumps([{'ip': '1.2.3.5', 'status': True,
+                               'output': ''}]))\
+      .and_return('[]')\
+      .and_return(json.dumps([{'ip': '1.2.3.6', 'status': True,
+                               'output': ''}]))
+    # The head node is still stopping after every other node has reported.
+    AppControllerClient.should_receive('is_appscale_terminated')\
+      .and_return(False).and_return(False).and_return(False)\
+      .and_return(False).and_return(True)
+
+    sleeps = []
+    time.should_receive('sleep').replace_with(sleeps.append)
+    flexmock(RemoteHelper).should_receive('stop_remote_appcontroller').once()
+
+    RemoteHelper.terminate_virtualized_cluster('bookey', False, False)
+
+    # After the initial pause, idle polls should wait longer each time, and a
+    # report resets the wait.
+    self.assertEquals([2, 1, 2, 1, 1], sleeps)
+
+
+  def test_terminate_virtualized_cluster_waits_for_a_lone_head_node(self):
+    LocalState.should_receive('get_host_with_role').and_return('1.2.3.4')
+    LocalState.should_receive('get_secret_key').and_return('secret')
+    flexmock(AppControllerClient)
+    AppControllerClient.should_receive('get_all_public_ips')\
+      .and_return(['1.2.3.4'])
+    AppControllerClient.should_receive('run_terminate')
+    AppControllerClient.should_receive('receive_server_message').never()
+    AppControllerClient.should_receive('is_appscale_terminated')\
+      .and_return(False).and_return(False).and_return(True)
+
+    sleeps = []
+    time.should_receive('sleep').replace_with(sleeps.append)
+    flexmock(RemoteHelper).should_receive('stop_remote_appcontroller').once()
+
+    RemoteHelper.terminate_virtualized_cluster('bookey', False, False)
+    self.assertEquals([2, 1, 2], sleeps)
+
+
+  def test_terminate_virtualized_cluster_gives_up_after_deadline(self):
+    LocalState.should_receive('get_host_with_role').and_return('1.2.3.4')
+    LocalState.should_receive('get_secret_key').and_return('secret')
+    LocalState.should_receive('generate_crash_log').once()
+    flexmock(AppControllerClient)
+    AppControllerClient.should_receive('get_all_public_ips')\
+      .and_return(['1.2.3.4', '1.2.3.5'])
+    AppControllerClient.should_receive('run_terminate')
+    AppControllerClient.should_receive('receive_server_message')\
+      .and_raise(AppControllerException('no route to host'))
+    AppControllerClient.should_receive('is_appscale_terminated')\
+      .and_return(False)
+
+    clock = iter([0, 10, RemoteHelper.TERMINATE_TIMEOUT + 1])
+    time.should_receive('time').replace_with(lambda: next(clock))
+    flexmock(RemoteHelper).should_receive('stop_remote_appcontroller').never()
+
+    self.assertRaises(AppScaleException,
+                      RemoteHelper.terminate_virtualized_cluster, 'bookey',
+                      False, False)
+
+
+  def test_terminate_cloud_infrastructure_pipelines_disk_release(self):
+    agents = []
+    fake_agent = FakeAgent()
+    fake_agent.PARAM_INSTANCE_IDS = 'instance_ids'
+    terminated = []
+    detached = []
+    fake_agent.get_cloud_params = lambda keyname: {}
+    fake_agent.describe_instances = lambda params, pending: (
+      [], [], ['i-1', 'i-2', 'i-3'])
+    first_termination = threading.Event()
+    def terminate_instances(params):
+      terminated.extend(params['instance_ids'])
+      first_termination.set()
+    fake_agent.terminate_instances = terminate_instances
+    fake_agent.cleanup_state = lambda params: None
+
+    def detach_disk(params, disk, instance_id):
+      detached.append(disk)
+      return disk != 'vol-2'
+
+    fake_agent.detach_disk = detach_disk
+    def create_agent(infrastructure):
+      agents.append(infrastructure)
+      return fake_agent
+    flexmock(factory.InfrastructureAgentFactory).should_receive('create_agent')\
+      .replace_with(create_agent)
+    LocalState.should_receive('get_infrastructure').and_return('ec2')
+    LocalState.should_receive('get_local_nodes_info').and_return([
+      {'public_ip': IP_1, 'instance_id': 'i-1', 'disk': 'vol-1'},
+      {'public_ip': IP_2, 'instance_id': 'i-2', 'disk': 'vol-2'},
+      {'public_ip': IP_3, 'instance_id': 'i-3', 'disk': None},
+      {'public_ip': IP_4, 'instance_id': 'i-4', 'disk': 'vol-4'}
+    ])
+    fake_agent.describe_instances = lambda params, pending: (
+      [], [], ['i-1', 'i-2', 'i-3', 'i-4'])
+    LocalState.should_receive('cleanup_keyname').never()
+    def unmount_persistent_disk(host, keyname, is_verbose):
+      if host == IP_4:
+        raise ShellException('umount: /opt/appscale: target is busy')
+    flexmock(RemoteHelper).should_receive('unmount_persistent_disk')\
+      .replace_with(unmount_persistent_disk)
+    AppScaleLogger.should_receive('warn').with_args(
+      re.compile('vol-2(.|\n)*vol-4(.|\n)*busy')).once()
+
+    # Wait for the first termination before releasing any disks.
+    original_run_in_parallel = remote_helper.run_in_parallel
+    def run_after_first_termination(*args, **kwargs):
+      first_termination.wait(5)
+      return original_run_in_parallel(*args, **kwargs)
+    flexmock(remote_helper).should_receive('run_in_parallel')\
+      .replace_with(run_after_first_termination)
+
+    self.assertRaises(AppScaleException,
+                      RemoteHelper.terminate_cloud_infrastructure, 'bookey',
+                      False)
+    self.assertEquals(['vol-1', 'vol-2'], sorted(detached))
+    # The instance without a disk should not have had to wait for detaching.
+    self.assertEquals('i-3', terminated[0])
+    # Instances whose disks are still mounted or attached are left running.
+    self.assertEquals(['i-1', 'i-3'], sorted(terminated))
+    # Each disk is released with an agent of its own.
+    self.assertEquals(['ec2'] * 4, agents)
+
+
+  def test_relay_files_doubles_the_nodes_with_a_copy_each_round(self):
+    flexmock(RemoteHelper).should_receive('scp').once()
+    commands = []
+    flexmock(RemoteHelper).should_receive('ssh').replace_with(
+      lambda host, keyname, command, is_verbose: commands.append(
+        (host, command)))
+    rounds = []
+    original_run_in_parallel = remote_helper.run_in_parallel
+    def record_round(function, pairs, **kwargs):
+      rounds.append(len(pairs))
+      return original_run_in_parallel(function, pairs, **kwargs)
+    flexmock(remote_helper).should_receive('run_in_parallel')\
+      .replace_with(record_round)
+
+    nodes = [('public{0}'.format(i), 'private{0}'.format(i))
+             for i in range(8)]
+    RemoteHelper.relay_files(nodes, 'bookey', '/root/appscale', False,
+                             RemoteHelper.RSYNC_EXCLUDES)
+
+    self.assertEquals([1, 2, 4], rounds)
+    self.assertEquals(7, len(commands))
+    targets = [re.search('root@(private\d+):/root/appscale/', command).group(1)
+               for _, command in commands]
+    self.assertEquals(sorted('private{0}'.format(i) for i in range(1, 8)),
+                      sorted(targets))
+    self.assertEquals('public0', commands[0][0])
+    self.assertIn("--exclude='AppDB/logs/*'", commands[0][1])
+
+
+  def test_verify_files_compares_checksums(self):
+    local_dir = tempfile.mkdtemp()
+    try:
+      os.makedirs(os.path.join(local_dir, 'AppDB', 'logs'))
+      for path in ['a.txt', '.hidden', 'AppDB/logs/db.log', 'AppDB/b.py']:
+        with open(os.path.join(local_dir, path), 'w') as file_handle:
+          file_handle.write(path)
+
+      manifest = RemoteHelper.get_file_manifest(local_dir,
+                                                RemoteHelper.RSYNC_EXCLUDES)
+      self.assertEquals(['AppDB/b.py', 'a.txt'],
+                        [path for path, _ in manifest])
+
+      good = hashlib.md5(''.join('{0}  {1}\n'.format(digest, path)
+                                 for path, digest in manifest)).hexdigest()
+      checksums = {'public1': good, 'public2': 'bad'}
+      flexmock(RemoteHelper).should_receive('ssh').replace_with(
+        lambda host, keyname, command, is_verbose: checksums[host] + '  -\n')
+
+      RemoteHelper.verify_files(['public1'], 'bookey', local_dir,
+                                '/root/appscale', False,
+                                RemoteHelper.RSYNC_EXCLUDES)
+      self.assertRaises(AppScaleException, RemoteHelper.verify_files,
+                        ['public1', 'public2'], 'bookey', local_dir,
+                        '/root/appscale', False, RemoteHelper.RSYNC_EXCLUDES)
+    finally:
+      shutil.rmtree(local_dir)
+
+
+  def test_authorize_key_answers_ssh_with_the_password(self):
+    flexmock(os).should_call('chmod')
+    askpass = RemoteHelper.create_askpass_script()
+    handle, public_key = tempfile.mkstemp()
+    try:
+      with os.fdopen(handle, 'w') as key_file:
+        key_file.write('ssh-rsa AAAA boo\n')
+
+      # The askpass script prints the password it is given.
+      environment = dict(os.environ, APPSCALE_SSH_PASSWORD='hunter2 $HOME')
+      process = subprocess.Popen([askpass], stdout=subprocess.PIPE,
+                                 env=environment)
+      self.assertEquals('hunter2 $HOME\n', process.communicate()[0])
+
+      calls = []
+      def fake_popen(command, **kwargs):
+        calls.append((command, kwargs))
+        process = flexmock(returncode=0)
+        process.should_receive('communicate').with_args(
+          'ssh-rsa AAAA boo\n').and_return(('', None))
+        return process
+      flexmock(subprocess).should_receive('Popen').replace_with(fake_popen)
+
+      RemoteHelper.authorize_key('public1', public_key, 'hunter2', askpass,
+                                 False)
+      command, kwargs = calls[0]
+      self.assertEquals('root@public1', command[-2])
+      self.assertEquals(askpass, kwargs['env']['SSH_ASKPASS'])
+      self.assertEquals('hunter2', kwargs['env']['APPSCALE_SSH_PASSWORD'])
+      self.assertEquals(os.setsid, kwargs['preexec_fn'])
+
+      flexmock(subprocess).should_receive('Popen').and_return(
+        flexmock(returncode=255, communicate=lambda key: ('denied', None)))
+      self.assertRaises(ShellException, RemoteHelper.authorize_key, 'public1',
+                        public_key, 'bad', askpass, False)
+    finally:
+      os.remove(askpass)
+      os.remove(public_key)
@@ -0,0 +1,141 @@
+#!/usr/bin/env python
+
+
+# General-purpose Python library imports
+import os
+import shutil
+import socket
+import tempfile
+import time
+import unittest
+
+
+# AppScale import, the library that we're testing here
+from appscale.tools.custom_exceptions import CancelledException
+from appscale.tools.custom_exceptions import ShellException
+from appscale.tools.custom_exceptions import TimeoutException
+from appscale.tools.remote_ops import CallOperation
+from appscale.tools.remote_ops import Limit
+from appscale.tools.remote_ops import PortOperation
+from appscale.tools.remote_ops import ProcessOperation
+from appscale.tools.remote_ops import RemoteEngine
+
+
+class TestRemoteOps(unittest.TestCase):
+
+
+  def setUp(self):
+    self.temp_dir = tempfile.mkdtemp()
+
+
+  def tearDown(self):
+    shutil.rmtree(self.temp_dir)
+
+
+  def test_processes_run_at_once_within_their_limit(self):
+    engine = RemoteEngine()
+    limit = Limit(2)
+    log = os.path.join(self.temp_dir, 'log')
+    command = ('echo start >> {0}; sleep 0.3; echo stop >> {0}; '
+               'cat'.format(log))
+    operations = [engine.submit(ProcessOperation(command, stdin=str(index),
+                                                 limit=limit))
+                  for index in range(4)]
+
+    start = time.time()
+    engine.wait()
+    self.assertLess(time.time() - start, 1.1)
+    self.assertEquals(['0', '1', '2', '3'],
+                      [operation.result() for operation in operations])
+
+    # No more than two processes were ever running at once.
+    running = 0
+    for line in open(log).read().split():
+      running += 1 if line == 'start' else -1
+      self.assertLessEqual(running, 2)
+    self.assertEquals(0, limit.active)
+
+
+  def test_failed_processes_are_retried(self):
+    marker = os.path.join(self.temp_dir, 'marker')
+    command = 'if [ -e {0} ]; then echo ok; else touch {0}; exit 1; fi'.\
+      format(marker)
+    engine = RemoteEngine()
+    self.assertEquals('ok\n', engine.run_one(
+      ProcessOperation(command, num_retries=2, retry_delay=0)))
+
+    failed = ProcessOperation('echo boom; exit 1', num_retries=2,
+                              retry_delay=0)
+    self.assertRaises(ShellException, engine.run_one, failed)
+    self.assertEquals(2, failed.attempts)
+    self.assertIn('boom', str(failed.error))
+
+
+  def test_deadlines_and_cancellation_stop_processes(self):
+    marker = os.path.join(self.temp_dir, 'marker')
+    engine = RemoteEngine()
+    slow = engine.submit(ProcessOperation(
+      'sleep 1; touch {0}'.format(marker), timeout=0.2))
+    full = Limit(1)
+    full.active = 1
+    queued = engine.submit(ProcessOperation('sleep 1', limit=full))
+    queued.cancel()
+
+    engine.wait()
+    self.assertIsInstance(slow.error, TimeoutException)
+    self.assertIsInstance(queued.error, CancelledException)
+    self.assertIsNone(queued.started)
+
+    running = engine.submit(ProcessOperation('sleep 5'))
+    engine.wait(timeout=0.1)
+    self.assertFalse(running.done())
+    engine.cancel_all()
+    self.assertIsInstance(running.error, CancelledException)
+
+    time.sleep(1)
+    self.assertFalse(os.path.exists(marker))
+
+
+  def test_ports(self):
+    listener = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    listener.bind(('127.0.0.1', 0))
+    listener.listen(1)
+    open_port = listener.getsockname()[1]
+
+    closed = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    closed.bind(('127.0.0.1', 0))
+    closed_port = closed.getsockname()[1]
+    closed.close()
+
+    try:
+      engine = RemoteEngine()
+      self.assertTrue(engine.run_one(PortOperation('127.0.0.1', open_port)))
+      self.assertFalse(engine.run_one(PortOperation('127.0.0.1', closed_port)))
+
+      waiting = PortOperation('127.0.0.1', closed_port, wait=True,
+                              interval=0.05, timeout=0.3)
+      self.assertRaises(TimeoutException, engine.run_one, waiting)
+    finally:
+      listener.close()
+
+
+  def test_calls_report_values_and_errors(self):
+    def divide(numerator, denominator):
+      return numerator / denominator
+
+    engine = RemoteEngine()
+    good = engine.submit(CallOperation(divide, (6, 3)))
+    bad = engine.submit(CallOperation(divide, (1, 0)))
+    slow = engine.submit(CallOperation(time.sleep, (1,), timeout=0.1))
+    chained = []
+    good.add_done_callback(lambda operation: chained.append(operation.value))
+
+    engine.wait()
+    self.assertEquals(2, good.result())
+    self.assertEquals([2], chained)
+    self.assertIsInstance(bad.error, ZeroDivisionError)
+    self.assertIsInstance(slow.error, TimeoutException)
+
+
+if __name__ == '__main__':
+  unittest.main()
@@ -0,0 +1,89 @@
+#!/usr/bin/env python
+
+
+# General-purpose Python library imports
+import io
+import os
+import shutil
+import subprocess
+import tarfile
+import tempfile
+import unittest
+
+
+# AppScale import, the library that we're testing here
+from appscale.tools.remote_script import FileBundle
+from appscale.tools.remote_script import RemoteScript
+
+
+class TestRemoteScript(unittest.TestCase):
+
+
+  def setUp(self):
+    self.temp_dir = tempfile.mkdtemp()
+
+
+  def tearDown(self):
+    shutil.rmtree(self.temp_dir)
+
+
+  def run_locally(self, script):
+    process = subprocess.Popen(['bash'], stdin=subprocess.PIPE,
+                               stdout=subprocess.PIPE,
+                               stderr=subprocess.STDOUT)
+    output, _ = process.communicate(script.render())
+    self.assertEquals(0, process.returncode)
+    return script.parse(output)
+
+
+  def test_steps_stop_at_first_failure(self):
+    script = RemoteScript()
+    script.add_step('greet', 'echo hello\necho world >&2')
+    script.add_step('fail', 'echo before\nfalse\necho after')
+    script.add_step('never', 'echo unreachable')
+
+    results = self.run_locally(script)
+    self.assertEquals(['greet', 'fail', 'never'],
+                      [result.name for result in results])
+    self.assertEquals([0, 1, None], [result.status for result in results])
+    self.assertEquals('hello\nworld', results[0].output)
+    self.assertEquals('before', results[1].output)
+    self.assertTrue(results[0].duration >= 0)
+    self.assertIsNone(results[2].duration)
+
+
+  def test_steps_cannot_read_the_rest_of_the_script(self):
+    script = RemoteScript()
+    script.add_step('read', 'cat')
+    script.add_step('after', 'echo still here')
+
+    results = self.run_locally(script)
+    self.assertEquals([0, 0], [result.status for result in results])
+    self.assertEquals('still here', results[1].output)
+
+
+  def test_bundle_keeps_paths_and_modes(self):
+    local_path = os.path.join(self.temp_dir, 'secret')
+    with open(local_path, 'w') as local_file:
+      local_file.write('the secret')
+
+    bundle = FileBundle()
+    bundle.add_file(local_path, '/etc/appscale/secret.key')
+    bundle.add_contents('{}', '/etc/appscale/locations.json', mode=0644)
+
+    tar = tarfile.open(fileobj=io.BytesIO(bundle.to_tarball()))
+    members = dict((member.name, member) for member in tar.getmembers())
+    self.assertEquals(['etc/appscale/locations.json',
+                       'etc/appscale/secret.key'], sorted(members))
+    self.assertEquals(0600, members['etc/appscale/secret.key'].mode)
+    self.assertEquals(0644, members['etc/appscale/locations.json'].mode)
+    self.assertEquals(0, members['etc/appscale/secret.key'].uid)
+    self.assertEquals('the secret', tar.extractfile(
+      members['etc/appscale/secret.key']).read())
+
+    # Files are installed by a first step of their own.
+    script = RemoteScript()
+    script.bundle = bundle
+    script.add_step('start', 'true')
+    self.assertEquals(['install_files', 'start'], script.get_step_names())
+    self.assertIn('tar -xzpf', script.render())
@@ -0,0 +1,93 @@
+#!/usr/bin/env python
+
+
+# General-purpose Python library imports
+import StringIO
+import threading
+import unittest
+
+
+# Third party libraries
+from flexmock import flexmock
+
+
+# AppScale import, the library that we're testing here
+from appscale.tools.remote_helper import RemoteHelper
+from appscale.tools.remote_streams import RemoteStream
+from appscale.tools.remote_streams import StreamMultiplexer
+
+
+class TestRemoteStreams(unittest.TestCase):
+
+
+  def fake_process(self, output, returncode=0):
+    process = flexmock(stdout=StringIO.StringIO(output))
+    process.should_receive('wait').and_return(returncode)
+    process.should_receive('poll').and_return(returncode)
+    return process
+
+
+  def test_stream_without_reconnect_ends_with_command(self):
+    stream = RemoteStream('1.2.3.4', 'bookey', 'grep foo log')
+    flexmock(RemoteHelper).should_receive('open_remote_stream') \
+      .with_args('1.2.3.4', 'bookey', 'grep foo log') \
+      .and_return(self.fake_process('foo 1\nfoo 2', returncode=1)).once()
+
+    stream.run()
+
+    self.assertTrue(stream.finished)
+    self.assertEquals(1, stream.returncode)
+    self.assertEquals('foo 1\n', stream.lines.get_nowait())
+    self.assertEquals('foo 2\n', stream.lines.get_nowait())
+
+
+  def test_stream_reconnects_with_reconnect_command(self):
+    stream = RemoteStream('1.2.3.4', 'bookey', 'tail -F log',
+                          reconnect_command='tail -n 0 -F log')
+    stream.INITIAL_RECONNECT_DELAY = 0
+
+    flexmock(RemoteHelper).should_receive('open_remote_stream') \
+      .with_args('1.2.3.4', 'bookey', 'tail -F log') \
+      .and_return(self.fake_process('line 1\n', returncode=255)).once()
+
+    def reconnect(host, keyname, command):
+      # Stop after the second connection so the test finishes.
+      stream.stopped.set()
+      return self.fake_process('')
+    flexmock(RemoteHelper).should_receive('open_remote_stream') \
+      .with_args('1.2.3.4', 'bookey', 'tail -n 0 -F log') \
+      .replace_with(reconnect).once()
+
+    stream.run()
+
+    self.assertEquals('line 1\n', stream.lines.get_nowait())
+    self.assertIn('reconnecting', stream.lines.get_nowait())
+    self.assertTrue(stream.finished)
+
+
+  def test_full_buffer_blocks_until_stopped(self):
+    stream = RemoteStream('1.2.3.4', 'bookey', 'tail -F log', buffer_size=1)
+    stream.POLL_INTERVAL = 0.01
+    self.assertTrue(stream.put('first'))
+
+    threading.Timer(0.05, stream.stop).start()
+    self.assertFalse(stream.put('second'))
+    self.assertEquals(1, stream.lines.qsize())
+
+
+  def test_multiplexer_takes_turns_between_streams(self):
+    chatty = RemoteStream('1.1.1.1', 'bookey', 'tail', label='chatty')
+    quiet = RemoteStream('2.2.2.2', 'bookey', 'tail', label='quiet')
+    for index in range(StreamMultiplexer.LINES_PER_TURN + 10):
+      chatty.lines.put('chatty {0}\n'.format(index))
+    quiet.lines.put('quiet 0\n')
+
+    output = StringIO.StringIO()
+    multiplexer = StreamMultiplexer([chatty, quiet], output=output)
+    self.assertTrue(multiplexer.write_available())
+
+    lines = output.getvalue().splitlines()
+    self.assertEquals(StreamMultiplexer.LINES_PER_TURN + 1, len(lines))
+    self.assertEquals('[chatty] chatty 0', lines[0])
+    self.assertEquals('[quiet ] quiet 0', lines[-1])
+    self.assertEquals(10, chatty.lines.qsize())
@@ -0,0 +1,150 @@
+#!/usr/bin/env python
+
+
+# General-purpose Python library imports
+import argparse
+import os
+import shutil
+import tempfile
+import time
+import unittest
+
+
+# Third party libraries
+from flexmock import flexmock
+
+
+# AppScale import, the library that we're testing here
+from appscale.tools.appscale_logger import AppScaleLogger
+from appscale.tools.appscale_tools import AppScaleTools
+from appscale.tools.cluster_stats import NodeStats
+from appscale.tools.cluster_stats import ServiceInfo
+from appscale.tools.local_state import LocalState
+from appscale.tools.scaling import COOLDOWN
+from appscale.tools.scaling import ClusterSample
+from appscale.tools.scaling import Recommendation
+from appscale.tools.scaling import ScalingAdvisor
+
+
+def node(ip, roles, load=0.5, cpus=2, available_memory=50, free_disk=80):
+  """ Builds a NodeStats with the given load, memory, and disk. """
+  total = 1000
+  return NodeStats(ip, {
+    'public_ip': 'public-' + ip, 'state': 'Done', 'is_initialized': True,
+    'is_loaded': True, 'roles': roles,
+    'cpu': {'count': cpus, 'idle': 50.0, 'system': 10.0, 'user': 40.0},
+    'memory': {'total': total, 'available': available_memory * 10,
+               'used': total - available_memory * 10},
+    'swap': {'free': 0, 'used': 0},
+    'disk': [{'/': {'total': total, 'free': free_disk * 10,
+                    'used': total - free_disk * 10}}],
+    'loadavg': {'last_1_min': load * cpus, 'last_5_min': load * cpus,
+                'last_15_min': load * cpus, 'runnable_entities': 1,
+                'scheduling_entities': 100}
+  })
+
+
+def service(appservers, reqs_enqueued):
+  """ Builds a ServiceInfo with the given app servers and queued requests. """
+  return ServiceInfo('guestbook', 'default', {
+    'language': 'python', 'appservers': appservers, 'pending_appservers': 0,
+    'http': 8080, 'https': 4380, 'reqs_enqueued': reqs_enqueued,
+    'total_reqs': 1000})
+
+
+class TestScaling(unittest.TestCase):
+
+
+  def setUp(self):
+    flexmock(AppScaleLogger).should_receive('log')
+    flexmock(AppScaleLogger).should_receive('warn')
+    flexmock(AppScaleLogger).should_receive('success')
+
+
+  def advise(self, samples):
+    windows = ScalingAdvisor.get_node_windows(samples)
+    recommendations = ScalingAdvisor.recommend(windows, samples)
+    moves = ScalingAdvisor.find_moves(windows, recommendations)
+    return ({recommendation.group: recommendation.count
+             for recommendation in recommendations},
+            [(move.node.private_ip, move.group) for move in moves])
+
+
+  def test_sustained_load_adds_compute_nodes(self):
+    busy = [node('10.0.0.1', ['appengine'], load=4.0),
+            node('10.0.0.2', ['appengine'], load=4.0)]
+    samples = [ClusterSample(busy, [service(4, 0)], {}) for _ in range(3)]
+
+    # A load of 16 over 2 CPUs per node needs 6 nodes to get down to 1.5 per
+    # CPU, so 4 are added.
+    self.assertEquals(({'compute': 4}, []), self.advise(samples))
+
+    # A single busy sample isn't enough to scale for.
+    quiet = [node('10.0.0.1', ['appengine']), node('10.0.0.2', ['appengine'])]
+    samples = [ClusterSample(quiet, [service(4, 0)], {}),
+               ClusterSample(quiet, [service(4, 0)], {}),
+               ClusterSample(busy, [service(4, 0)], {})]
+    self.assertEquals(({}, []), self.advise(samples))
+
+
+  def test_queued_requests_add_compute_nodes(self):
+    nodes = [node('10.0.0.1', ['appengine']), node('10.0.0.2', ['appengine'])]
+    # 30 requests wait in the AppController and 30 in HAProxy for 4 app
+    # servers, three times what they should.
+    samples = [ClusterSample(nodes, [service(4, 30)],
+                             {'guestbook_default_v1': (30, 100)})
+               for _ in range(3)]
+    self.assertEquals(({'compute': 4}, []), self.advise(samples))
+
+    # Long HAProxy queue times count too, even with few requests waiting.
+    samples = [ClusterSample(nodes, [service(4, 0)],
+                             {'guestbook_default_v1': (1, 2000)})
+               for _ in range(3)]
+    self.assertEquals(({'compute': 1}, []), self.advise(samples))
+
+
+  def test_full_database_disks_add_database_nodes(self):
+    nodes = [node('10.0.0.1', ['db_master'], free_disk=20),
+             node('10.0.0.2', ['db_slave'], free_disk=30),
+             node('10.0.0.3', ['appengine'])]
+    samples = [ClusterSample(nodes, [service(2, 0)], {})]
+    # 1500 of 2000 bytes are used, and each node should keep half free.
+    self.assertEquals(({'database': 1}, []), self.advise(samples))
+
+
+  def test_overloaded_shared_nodes_move_roles(self):
+    nodes = [node('10.0.0.1', ['shadow', 'appengine', 'db_master'], load=5.0),
+             node('10.0.0.2', ['appengine']),
+             node('10.0.0.3', ['taskqueue_master', 'db_slave'], load=5.0)]
+    samples = [ClusterSample(nodes, [service(4, 0)], {}) for _ in range(2)]
+    counts, moves = self.advise(samples)
+    self.assertEquals([('10.0.0.1', 'compute'), ('10.0.0.3', 'taskqueue')],
+                      moves)
+    self.assertEquals(set(['compute', 'database', 'taskqueue']), set(counts))
+
+
+  def test_apply_adds_compute_nodes_once_per_cooldown(self):
+    state_dir = tempfile.mkdtemp()
+    self.addCleanup(shutil.rmtree, state_dir)
+    flexmock(LocalState).should_receive('get_scaling_state_location').\
+      and_return(os.path.join(state_dir, 'scaling-bookey.json'))
+
+    added = []
+    flexmock(AppScaleTools).should_receive('add_instances').replace_with(
+      lambda options: added.append(options.ips))
+
+    options = argparse.Namespace(keyname='bookey', verbose=False,
+                                 spare_ips=['10.0.0.5', '10.0.0.6'])
+    recommendations = [Recommendation('compute', 1, 'busy'),
+                       Recommendation('database', 1, 'full')]
+    self.assertEquals(['10.0.0.5'],
+                      ScalingAdvisor.apply(options, recommendations))
+    self.assertEquals([{'auto': ['10.0.0.5']}], added)
+
+    # Nothing more is added until the cooldown has passed, and machines
+    # that were already added are not used again.
+    self.assertEquals([], ScalingAdvisor.apply(options, recommendations))
+    later = time.time() + COOLDOWN + 1
+    flexmock(time).should_receive('time').and_return(later)
+    self.assertEquals(['10.0.0.6'],
+                      ScalingAdvisor.apply(options, recommendations))
@@ -1,13 +1,15 @@
 import unittest
 import StringIO
 import argparse
+import json
 
 from mock import patch, Mock
 
 from appscale.tools.appscale_stats import (
   get_node_stats_rows, get_process_stats_rows, get_summary_process_stats_rows, get_proxy_stats_rows,
   sort_process_stats_rows, sort_proxy_stats_rows, show_stats,
-  INCLUDE_NODE_LIST, _get_stats
+  get_include_lists, fetch_stats, INCLUDE_NODE_LIST, INCLUDE_PROXY_LIST,
+  _get_stats
 )
 
 
@@ -419,7 +421,7 @@ class TestStats(unittest.TestCase):
 
   @patch("appscale.tools.appscale_stats.LocalState.get_login_host")
   @patch("appscale.tools.appscale_stats.LocalState.get_secret_key")
-  @patch("requests.get")
+  @patch("requests.Session.get")
   def test_get_stats(self, mock_get, mock_get_secret_key, mock_get_login_host):
     mock_get_login_host.return_value = "192.168.33.10"
     mock_get_secret_key.return_value = "secret_key"
@@ -513,6 +515,10 @@ class TestStats(unittest.TestCase):
     options.types = ["proxies"]
     options.verbose = False
     options.apps_only = False
+    options.node_ips = None
+    options.apps = None
+    options.format = "text"
+    options.watch = None
 
     buf = StringIO.StringIO()
 
@@ -533,3 +539,163 @@ class TestStats(unittest.TestCase):
       self.assertNotIn(table_name, buf.getvalue())
 
     self.assertIn(expected_table_name, buf.getvalue())
+
+  @patch("appscale.tools.appscale_stats.get_roles")
+  @patch("appscale.tools.appscale_stats._get_stats")
+  def test_write_stats_as_ndjson(self, mock_get_stats, mock_get_roles):
+    def get_stats(keyname, stats_kind, include_lists, errors):
+      if stats_kind == "nodes":
+        return self.test_raw_node_stats, {"192.168.33.12": "timed out"}
+      if stats_kind == "processes":
+        return self.test_raw_process_stats, {}
+      errors.append("Failed to get proxies stats (503)")
+      return {}, {}
+    mock_get_stats.side_effect = get_stats
+    mock_get_roles.return_value = self.test_all_roles
+
+    options = argparse.Namespace(
+      keyname="keyname", types=["nodes", "processes", "proxies"],
+      roles=["shadow"], order_processes="mem", top=2, verbose=False,
+      apps_only=False, node_ips=None, apps=None, format="ndjson", watch=None)
+
+    buf = StringIO.StringIO()
+    with patch("sys.stdout", buf):
+      show_stats(options=options)
+
+    # Nothing is rendered or styled, and every line is a record.
+    self.assertNotIn("\x1b", buf.getvalue())
+    records = [json.loads(line) for line in buf.getvalue().splitlines()]
+    self.assertEqual(
+      ["nodes", "processes", "processes", "failures", "errors"],
+      [record["kind"] for record in records])
+
+    self.assertEqual("192.168.33.10", records[0]["private_ip"])
+    self.assertEqual(self.test_all_roles["192.168.33.10"], records[0]["roles"])
+    self.assertEqual(4, len(records[0]["partitions"]))
+    self.assertEqual(["cassandra", "datastore"],
+                     [record["service"] for record in records[1:3]])
+    self.assertEqual(1310, records[1]["memory_mb"])
+    self.assertEqual({"kind": "failures", "stats_kind": "nodes",
+                      "ip": "192.168.33.12", "failure": "timed out"},
+                     records[3])
+    self.assertEqual("Failed to get proxies stats (503)", records[4]["message"])
+
+  @patch("appscale.tools.appscale_stats._get_stats")
+  def test_write_proxy_stats_as_json(self, mock_get_stats):
+    mock_get_stats.return_value = (self.test_raw_proxy_stats, {})
+    options = argparse.Namespace(
+      keyname="keyname", types=["proxies"], verbose=False, apps_only=True,
+      node_ips=None, apps=None, format="json", watch=None)
+
+    buf = StringIO.StringIO()
+    with patch("sys.stdout", buf):
+      show_stats(options=options)
+
+    document = json.loads(buf.getvalue())
+    self.assertEqual([], document["failures"])
+    self.assertEqual(["app (app_test)", "app (appscaledashboard)"],
+                     [proxy["service"] for proxy in document["proxies"]])
+    self.assertEqual(1, document["proxies"][0]["servers_down_count"])
+    self.assertEqual(26157, document["proxies"][0]["bin"])
+
+  def test_get_include_lists(self):
+    # Nodes are fetched only for their core count when only processes are
+    # shown, and tables only ask for the memory they render.
+    self.assertEqual(
+      {'node': ['cpu'], 'node.cpu': ['count']},
+      get_include_lists("nodes", ["processes"], verbose=False))
+    include_lists = get_include_lists("nodes", ["nodes"], verbose=False)
+    self.assertEqual(['memory', 'loadavg', 'partitions_dict'],
+                     include_lists['node'])
+    self.assertEqual(['available', 'total'], include_lists['node.memory'])
+    self.assertEqual(
+      INCLUDE_NODE_LIST,
+      get_include_lists("nodes", ["nodes"], verbose=False, records=True))
+
+    self.assertNotIn(
+      'monit_name',
+      get_include_lists("processes", ["processes"], False)['process'])
+    self.assertIn(
+      'monit_name',
+      get_include_lists("processes", ["processes"], True)['process'])
+
+    include_lists = get_include_lists("proxies", ["proxies"], verbose=False)
+    self.assertEqual(['req_rate', 'req_tot', 'hrsp_5xx', 'hrsp_4xx'],
+                     include_lists['proxy.frontend'])
+    self.assertEqual(['qcur'], include_lists['proxy.backend'])
+    self.assertEqual(INCLUDE_PROXY_LIST,
+                     get_include_lists("proxies", ["proxies"], True))
+
+  @patch("appscale.tools.appscale_stats._get_stats")
+  def test_fetch_stats_filters_nodes_and_apps(self, mock_get_stats):
+    mock_get_stats.return_value = (
+      self.test_raw_proxy_stats,
+      {"192.168.33.10": "timed out", "192.168.33.12": "timed out"}
+    )
+    options = argparse.Namespace(
+      keyname="keyname", types=["proxies"], verbose=False, format="text",
+      node_ips=["192.168.33.10"], apps=["app_test"])
+
+    raw_proxy_stats, failures = fetch_stats(options, "proxies")
+
+    self.assertEqual({"192.168.33.10": "timed out"}, failures)
+    self.assertEqual(
+      ["app_test"],
+      [proxy["application_id"]
+       for proxy in raw_proxy_stats["192.168.33.10"]["proxies_stats"]])
+    # The stats that were fetched aren't changed.
+    self.assertEqual(
+      6, len(self.test_raw_proxy_stats["192.168.33.10"]["proxies_stats"]))
+
+    # Tables that aren't verbose render proxies without the fields they
+    # didn't ask for.
+    raw_proxy_stats["192.168.33.10"]["proxies_stats"] = [
+      {'unified_service_name': 'application', 'application_id': 'app_test',
+       'servers_count': 1, 'servers': [{'status': 'UP'}],
+       'frontend': {'req_rate': 1, 'req_tot': 5, 'hrsp_5xx': 0,
+                    'hrsp_4xx': 0},
+       'backend': {'qcur': 2}}
+    ]
+    _, proxy_stats = get_proxy_stats_rows(
+      raw_proxy_stats=raw_proxy_stats, verbose=False, apps_filter=False)
+    self.assertEqual([['app (app_test)', '1 | 0', '1 | 5', '0 | 0', 2]],
+                     proxy_stats)
+
+  @patch("appscale.tools.appscale_stats.time.sleep")
+  @patch("appscale.tools.appscale_stats._get_stats")
+  def test_watch_stats_writes_changed_records(self, mock_get_stats,
+                                              mock_sleep):
+    proxies = [
+      {'unified_service_name': 'application', 'application_id': app_id,
+       'servers_count': 1, 'servers': [{'status': 'UP'}],
+       'frontend': {'req_rate': 0, 'req_tot': 10, 'hrsp_5xx': 0,
+                    'hrsp_4xx': 0, 'bin': 0, 'bout': 0, 'scur': 0},
+       'backend': {'qcur': 0}}
+      for app_id in ("app_a", "app_b", "app_c")
+    ]
+    rounds = [proxies, [proxies[0], dict(proxies[1], servers_count=2)],
+              [proxies[0], dict(proxies[1], servers_count=2)]]
+    mock_get_stats.side_effect = [
+      ({"192.168.33.10": {"proxies_stats": round_proxies}}, {})
+      for round_proxies in rounds
+    ]
+
+    options = argparse.Namespace(
+      keyname="keyname", types=["proxies"], verbose=False, apps_only=False,
+      node_ips=None, apps=None, format="ndjson", watch=5, count=3)
+
+    buf = StringIO.StringIO()
+    with patch("sys.stdout", buf):
+      show_stats(options=options)
+
+    records = [json.loads(line) for line in buf.getvalue().splitlines()]
+    self.assertEqual(
+      [(1, "app (app_a)"), (1, "app (app_b)"), (1, "app (app_c)"),
+       (2, "app (app_b)"), (2, "app (app_c)")],
+      [(record["revision"], record["service"]) for record in records])
+    self.assertEqual(2, records[3]["servers_count"])
+    self.assertEqual(
+      {"kind": "proxies", "service": "app (app_c)", "removed": True,
+       "revision": 2}, records[4])
+    self.assertEqual(2, mock_sleep.call_count)
+    mock_sleep.assert_called_with(5)
@@ -0,0 +1,143 @@
+#!/usr/bin/env python
+
+
+# General-purpose Python library imports
+import atexit
+import json
+import os
+import shutil
+import tempfile
+import time
+import unittest
+
+
+# Third party libraries
+from flexmock import flexmock
+
+
+# AppScale import, the library that we're testing here
+from appscale.tools.tracing import NULL_SPAN
+from appscale.tools.tracing import Tracer
+from appscale.tools.tracing import traced
+
+
+class FakeAgent(object):
+  def describe_instances(self, parameters):
+    return parameters
+
+
+class TestTracing(unittest.TestCase):
+
+
+  def setUp(self):
+    self.temp_dir = tempfile.mkdtemp()
+
+
+  def tearDown(self):
+    Tracer.disable()
+    Tracer.exit_location = None
+    shutil.rmtree(self.temp_dir)
+
+
+  def test_disabled_tracer_records_nothing(self):
+    @traced('work')
+    def work(value):
+      return value * 2
+
+    self.assertEquals(NULL_SPAN, Tracer.span('anything', host='1.2.3.4'))
+    self.assertEquals(4, work(2))
+
+    agent = FakeAgent()
+    self.assertEquals(agent, Tracer.wrap(agent, 'ec2'))
+
+
+  def test_nested_spans_become_chrome_events(self):
+    @traced('remote.ssh', record=('host',))
+    def ssh(host, command):
+      with Tracer.span('shell', command=command) as span:
+        span.set('attempts', 2)
+      return command
+
+    Tracer.enable()
+    with Tracer.span('tools.run_instances'):
+      self.assertEquals('ls', ssh('1.2.3.4', command='ls'))
+
+    trace = Tracer.to_chrome_trace()
+    events = dict((event['name'], event) for event in trace['traceEvents']
+                  if event['ph'] == 'X')
+    self.assertEquals(['remote.ssh', 'shell', 'tools.run_instances'],
+                      sorted(events.keys()))
+    self.assertEquals({'host': '1.2.3.4'}, events['remote.ssh']['args'])
+    self.assertEquals({'command': 'ls', 'attempts': 2},
+                      events['shell']['args'])
+
+    outer = events['tools.run_instances']
+    inner = events['shell']
+    self.assertTrue(outer['ts'] <= inner['ts'])
+    self.assertTrue(outer['ts'] + outer['dur'] >= inner['ts'] + inner['dur'])
+
+
+  def test_failed_span_records_error(self):
+    Tracer.enable()
+    try:
+      with Tracer.span('failing'):
+        raise ValueError('boom')
+    except ValueError:
+      pass
+
+    span, _ = Tracer.finished[0]
+    self.assertEquals('ValueError: boom', span.args['error'])
+
+
+  def test_summary_separates_self_time(self):
+    Tracer.enable()
+    clock = iter([0.0, 1.0, 3.0, 10.0])
+    flexmock(time).should_receive('time').replace_with(lambda: next(clock))
+
+    with Tracer.span('up'):
+      with Tracer.span('rsync'):
+        pass
+
+    self.assertEquals([
+      ('up', 1, 10.0, 8.0, 10.0),
+      ('up;rsync', 1, 2.0, 2.0, 2.0)
+    ], Tracer.summarize())
+
+
+  def test_wrapped_agent_calls_are_traced(self):
+    Tracer.enable()
+    agent = Tracer.wrap(FakeAgent(), 'ec2')
+    self.assertTrue(isinstance(agent, FakeAgent))
+    self.assertEquals({'a': 1}, agent.describe_instances({'a': 1}))
+
+    span, _ = Tracer.finished[0]
+    self.assertEquals('ec2.describe_instances', span.name)
+
+
+  def test_tracing_is_set_up_once(self):
+    flexmock(atexit).should_receive('register')\
+      .with_args(Tracer.write, 'first.json').once()
+
+    Tracer.trace_to('first.json')
+    with Tracer.span('up'):
+      pass
+    Tracer.trace_to('second.json')
+
+    self.assertEquals('first.json', Tracer.exit_location)
+    self.assertEquals(1, len(Tracer.finished))
+
+
+  def test_write_picks_format_from_extension(self):
+    Tracer.enable()
+    with Tracer.span('up'):
+      pass
+    json_location = os.path.join(self.temp_dir, 'trace.json')
+    Tracer.write(json_location)
+    with open(json_location) as file_handle:
+      self.assertIn('traceEvents', json.load(file_handle))
+
+    text_location = os.path.join(self.temp_dir, 'trace.txt')
+    Tracer.write(text_location)
+    with open(text_location) as file_handle:
+      self.assertIn('PHASE', file_handle.read())
+    self.assertFalse(Tracer.enabled)